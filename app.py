@@ -1,19 +1,117 @@
-from flask import Flask, render_template, request, jsonify
-from models import db, Match, Player, PlayerPoints
+from flask import (Blueprint, Flask, Response, current_app, render_template, request, jsonify, url_for,
+                   stream_with_context)
+from models import db, Match, MatchInnings, Player, PlayerPoints, PlayerMatchStats, Contest, ContestTeam
+from config import init_database
+from leaderboard import leaderboard
+from serializers import (InvalidCursor, match_row_to_dict, match_rows, page_limit,
+                         player_row_to_dict, points_history_rows, points_row_to_dict,
+                         DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT)
+from queries import PAGE_SIZE, QueryError, match_page, player_page
+from migrations import head, lock_schema, pending, upgrade
 from scraper import fetch_live_matches
-from score_calculator import calculate_batting_points, calculate_bowling_points
-from datetime import datetime
+from ingestion import IngestionPipeline
+from match_sync import sync_matches
+from deliveries import append_deliveries, batting_inputs, bowling_inputs, fielding_inputs
+from scheduler import scrape_scheduler
+from stream import stream_hub
+from cache import response_cache
+from stats import table_stats
+from recompute import RECOMPUTE_JOBS, ConcurrentRecompute, MissingPlayers, recompute_retrying
+from scoring_rules import get_rule_book
+from contests import contests, enter_teams, unpack_lineup
+from projections import projections
+from score_parser import innings_to_dict, store_scores
+from metrics import metrics
+import bulk_io
+from rollups import find_person, fold_matches, fold_pending_locked, player_summary, rebuild, team_summary
+from sqlalchemy.exc import IntegrityError
+import click
+from contextlib import nullcontext
+from functools import partial
+import json
+import os
 
-app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///cricket.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+main = Blueprint('main', __name__, cli_group=None)
 
-db.init_app(app)
+def create_app(config=None):
+    """
+    Фабрика приложения. В БД не обращается: схему создает и обновляет
+    flask deploy (migrations.py), тестовые данные - flask seed; фоновые
+    потоки запускает start_background_jobs в уже запущенном воркере.
+    """
+    app = Flask(__name__)
+    app.config['LEADERBOARD_CAPACITY'] = 100
+    app.config['LEADERBOARD_MAX_AGE'] = 60
+    # Страницы с live-матчами через запятую; пусто - используются mock-данные scraper.py
+    app.config['SCRAPE_SOURCES'] = [url.strip() for url in os.environ.get('SCRAPE_SOURCES', '').split(',') if url.strip()]
+    app.config['SCRAPE_WORKERS'] = int(os.environ.get('SCRAPE_WORKERS', 8))
+    # Фоновый планировщик скрапинга (SCRAPE_SCHEDULER=1), интервалы в секундах
+    app.config['SCRAPE_SCHEDULER'] = os.environ.get('SCRAPE_SCHEDULER', '0') == '1'
+    app.config['SCRAPE_LIVE_INTERVAL'] = int(os.environ.get('SCRAPE_LIVE_INTERVAL', 30))
+    app.config['SCRAPE_SCHEDULED_INTERVAL'] = int(os.environ.get('SCRAPE_SCHEDULED_INTERVAL', 900))
+    app.config['SCRAPE_IDLE_INTERVAL'] = int(os.environ.get('SCRAPE_IDLE_INTERVAL', 3600))
+    # Live-поток (SSE): подписчиков на воркер (каждый занимает поток gthread, см. Procfile)
+    # и период опроса журнала изменений, с
+    app.config['STREAM_MAX_SUBSCRIBERS'] = int(os.environ.get('STREAM_MAX_SUBSCRIBERS', 100))
+    app.config['STREAM_POLL_INTERVAL'] = float(os.environ.get('STREAM_POLL_INTERVAL', 1.0))
+    # Кэш ответов read-API: записей LRU на воркер, TTL в секундах и необязательный
+    # общий уровень (redis://... или sqlite:///путь/к/файлу). Без общего уровня запись
+    # сбрасывает кэш только своего воркера, поэтому TTL по умолчанию 2 (с ним - 30);
+    # при нескольких воркерах (WEB_CONCURRENCY > 1) задайте CACHE_SHARED_URL
+    app.config['CACHE_ENABLED'] = os.environ.get('CACHE_ENABLED', '1') == '1'
+    app.config['CACHE_MAX_ENTRIES'] = int(os.environ.get('CACHE_MAX_ENTRIES', 1024))
+    app.config['CACHE_TTL'] = float(os.environ['CACHE_TTL']) if os.environ.get('CACHE_TTL') else None
+    app.config['CACHE_SHARED_URL'] = os.environ.get('CACHE_SHARED_URL')
+    # Период сверки счетчиков строк с COUNT(*), с (0 - не сверять)
+    app.config['STATS_RECOUNT_INTERVAL'] = int(os.environ.get('STATS_RECOUNT_INTERVAL', 300))
+    # Как часто доска контеста подтягивает новые команды и очки из БД, с
+    app.config['CONTEST_REFRESH_INTERVAL'] = float(os.environ.get('CONTEST_REFRESH_INTERVAL', 2))
+    # Метрики (/metrics): порог журнала медленных SQL-запросов, мс (0 - не писать);
+    # профилировщик запроса по заголовку X-Profile: <PROFILE_TOKEN> (пусто - выключен)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 250))
+    app.config['PROFILE_TOKEN'] = os.environ.get('PROFILE_TOKEN') or None
+    app.config['PROFILE_INTERVAL'] = float(os.environ.get('PROFILE_INTERVAL', 0.005))
+    # Прогноз очков (Монте-Карло): симуляций по умолчанию и максимум на запрос,
+    # процессов пула (0 или 1 - в процессе воркера) и TTL кэша сводок, с
+    app.config['PROJECTION_SIMULATIONS'] = int(os.environ.get('PROJECTION_SIMULATIONS', 100000))
+    app.config['PROJECTION_MAX_SIMULATIONS'] = int(os.environ.get('PROJECTION_MAX_SIMULATIONS', 1000000))
+    app.config['PROJECTION_WORKERS'] = int(os.environ.get('PROJECTION_WORKERS', min(os.cpu_count() or 1, 8)))
+    app.config['PROJECTION_CACHE_TTL'] = float(os.environ.get('PROJECTION_CACHE_TTL', 300))
+    app.config.update(config or {})
+
+    # БД: DATABASE_URL, пул и прагмы SQLite - см. config.py
+    init_database(app)
+    leaderboard.init_app(app)
+    stream_hub.init_app(app)
+    response_cache.init_app(app)
+    table_stats.init_app(app)
+    contests.init_app(app)
+    metrics.init_app(app)
+    projections.init_app(app)
+
+    ingestion = None
+    if app.config['SCRAPE_SOURCES']:
+        ingestion = IngestionPipeline(app.config['SCRAPE_SOURCES'], max_workers=app.config['SCRAPE_WORKERS'])
+    scrape_scheduler.init_app(app, ingestion=ingestion)
+
+    app.register_blueprint(main)
+    return app
+
+def start_background_jobs(app):
+    """Фоновые потоки воркера - после fork (gunicorn.conf.py) или при запуске python app.py"""
+    if app.config['SCRAPE_SCHEDULER']:
+        scrape_scheduler.start()
 
 def init_sample_data():
-    """Инициализация тестовых данных"""
+    """Инициализация тестовых данных (flask seed): только в пустую базу"""
     try:
-        if Match.query.count() > 0:
+        # Под блокировкой схемы: одновременные seed выполняются по очереди,
+        # следующий увидит матчи предыдущего и ничего не добавит
+        lock_schema(db.session.connection())
+        if db.session.query(Match.id).first() is not None:
+            db.session.rollback()
+            print("⚠️ В базе уже есть матчи, тестовые данные не добавлены.")
             return
 
         match1 = Match(
@@ -36,7 +134,8 @@ def init_sample_data():
         
         db.session.add(match1)
         db.session.add(match2)
-        db.session.commit()
+        db.session.flush()
+        store_scores([(m.id, m.score, m.format) for m in (match1, match2)])
         
         players_data = [
             {"name": "Virat Kohli", "role": "batsman", "team": "India", "match_id": 1, "runs": 45, "balls_faced": 32},
@@ -58,99 +157,145 @@ def init_sample_data():
         print(f"❌ Ошибка при инициализации данных: {e}")
         db.session.rollback()
 
-with app.app_context():
-    db.create_all()
-    init_sample_data()
+def deploy():
+    """Миграции схемы и служебные данные - один раз на выкладку, до старта воркеров"""
+    applied = upgrade()
+    for m in applied:
+        print(f"✅ Миграция {m.version}: {m.name}")
+    if not applied:
+        print(f"✅ Схема БД актуальна (версия {head()})")
+    # Счетчики строк - под той же блокировкой, что и seed: иначе вставки
+    # seed могут пройти мимо еще не созданных счетчиков
+    lock_schema(db.session.connection())
+    table_stats.ensure()
+    db.session.commit()
+    fold_pending_locked()
 
 # Веб-интерфейс
-@app.route('/')
+@main.route('/')
 def index():
-    matches_count = Match.query.count()
-    players_count = Player.query.count()
-    calculations_count = PlayerPoints.query.count()
+    counts = table_stats.counts()
     return render_template('index.html', 
-                          matches_count=matches_count,
-                          players_count=players_count,
-                          calculations_count=calculations_count)
+                          matches_count=counts['match'],
+                          players_count=counts['player'],
+                          calculations_count=counts['player_points'])
 
-@app.route('/matches')
+def list_page(template, page, **context):
+    """HTML-страница списка: одна страница строк по фильтрам из query string и ссылка на следующую"""
+    args = {name: value for name, value in request.args.items() if value}  # пустые поля формы не переносим в ссылки
+    context['page_size'] = PAGE_SIZE
+    try:
+        rows, next_cursor = page(request.args, PAGE_SIZE)
+    except (InvalidCursor, QueryError) as e:
+        return render_template(template, rows=[], filters=args, error=str(e), **context), 400
+    next_url = url_for(request.endpoint, **{**args, 'cursor': next_cursor}) if next_cursor else None
+    first_url = url_for(request.endpoint, **{k: v for k, v in args.items() if k != 'cursor'}) if 'cursor' in args else None
+    return render_template(template, rows=rows, filters=args, next_url=next_url, first_url=first_url, **context)
+
+@main.route('/matches')
 def matches_page():
-    matches = Match.query.all()
-    return render_template('matches.html', matches=matches)
+    return list_page('matches.html', match_page)
 
-@app.route('/players')
+@main.route('/players')
 def players_page():
-    players = Player.query.all()
-    return render_template('players.html', players=players)
+    return list_page('players.html', player_page)
 
-@app.route('/calculate')
+@main.route('/calculate')
 def calculate_page():
-    players = Player.query.all()
-    return render_template('calculate.html', players=players)
+    # Игроки подгружаются в выпадающий список через /api/players?q=... (поиск по имени)
+    return render_template('calculate.html')
 
-@app.route('/admin')
+@main.route('/admin')
 def admin_page():
-    matches = Match.query.all()
-    players = Player.query.all()
-    points_history = PlayerPoints.query.order_by(PlayerPoints.calculation_date.desc()).limit(10).all()
-    return render_template('admin.html', matches=matches, players=players, points_history=points_history)
+    matches, _ = match_rows(limit=MAX_PAGE_SIZE)
+    points_history, _ = points_history_rows(limit=HISTORY_DEFAULT_LIMIT)
+    return render_template('admin.html', matches=matches, points_history=points_history)
 
 # API endpoints
-@app.route('/api/health')
+def paginated_response(items, next_cursor):
+    """JSON-список; курсор следующей страницы - в заголовках X-Next-Cursor и Link"""
+    response = jsonify(items)
+    if next_cursor:
+        args = request.args.to_dict()
+        args['cursor'] = next_cursor
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for(request.endpoint, **request.view_args, **args)}>; rel="next"'
+    return response
+
+@main.route('/api/health')
+@response_cache.cached('matches', 'players', 'points', ttl=5)
 def health_check():
     try:
-        matches = Match.query.count()
-        players = Player.query.count()
-        points = PlayerPoints.query.count()
+        counts = table_stats.counts()
         return jsonify({
             "status": "healthy",
             "service": "Cricket Score API",
             "database": "connected",
             "stats": {
-                "matches": matches,
-                "players": players,
-                "calculations": points
+                "matches": counts['match'],
+                "players": counts['player'],
+                "calculations": counts['player_points']
             }
         })
     except Exception as e:
         return jsonify({"status": "error", "message": str(e)}), 500
 
-@app.route('/api/matches', methods=['GET'])
+@main.route('/api/health/live')
+def liveness_probe():
+    """Процесс жив и обслуживает запросы (без обращения к БД)"""
+    return jsonify({"status": "alive"})
+
+@main.route('/api/health/ready')
+def readiness_probe():
+    """Готовность принимать трафик: БД отвечает и схема обновлена (flask deploy)"""
+    try:
+        missing = [m.version for m in pending(db.session.connection())]
+        if missing:
+            return jsonify({"status": "unavailable", "database": "connected",
+                            "message": "Schema is not up to date, run flask deploy",
+                            "pending_migrations": missing}), 503
+        return jsonify({"status": "ready", "database": "connected", "schema_version": head()})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({"status": "unavailable", "database": "error", "message": str(e)}), 503
+
+@main.route('/api/matches', methods=['GET'])
+@response_cache.cached('matches')
 def get_matches_api():
     try:
-        matches = Match.query.all()
-        return jsonify([match.to_dict() for match in matches])
+        limit = page_limit(request.args.get('limit', type=int), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        rows, next_cursor = match_page(request.args, limit)
+        return paginated_response([match_row_to_dict(row) for row in rows], next_cursor)
+    except (InvalidCursor, QueryError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/matches/<int:match_id>', methods=['GET'])
+@main.route('/api/matches/<int:match_id>', methods=['GET'])
+@response_cache.cached('matches')
 def get_match_api(match_id):
     try:
         match = Match.query.get(match_id)
         if not match:
             return jsonify({'error': 'Match not found'}), 404
-        return jsonify(match.to_dict())
+        innings = MatchInnings.query.filter_by(match_id=match_id).order_by(MatchInnings.position)
+        return jsonify({**match.to_dict(), 'innings': [innings_to_dict(row) for row in innings]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/players', methods=['GET'])
+@main.route('/api/players', methods=['GET'])
+@response_cache.cached('players')
 def get_players_api():
     try:
-        role = request.args.get('role')
-        team = request.args.get('team')
-        
-        query = Player.query
-        if role:
-            query = query.filter_by(role=role)
-        if team:
-            query = query.filter_by(team=team)
-        
-        players = query.all()
-        return jsonify([player.to_dict() for player in players])
+        limit = page_limit(request.args.get('limit', type=int), DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+        rows, next_cursor = player_page(request.args, limit)
+        return paginated_response([player_row_to_dict(row) for row in rows], next_cursor)
+    except (InvalidCursor, QueryError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/players/<int:player_id>', methods=['GET'])
+@main.route('/api/players/<int:player_id>', methods=['GET'])
 def get_player_api(player_id):
     try:
         player = Player.query.get(player_id)
@@ -160,21 +305,69 @@ def get_player_api(player_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/players/top/<role>', methods=['GET'])
+@main.route('/api/players/<int:player_id>/summary', methods=['GET'])
+@response_cache.cached('rollups')
+def player_summary_api(player_id):
+    """Итоги игрока по завершенным матчам: карьера, сезоны, форматы, команды (из витрин)"""
+    try:
+        player = db.session.get(Player, player_id)
+        if not player:
+            return jsonify({'error': 'Player not found'}), 404
+        person_id = find_person(player)
+        return jsonify({'player_id': player.id, 'person_id': person_id, 'name': player.name,
+                        **player_summary(person_id)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/teams/<team>/summary', methods=['GET'])
+@response_cache.cached('rollups')
+def team_summary_api(team):
+    """Итоги команды по завершенным матчам и лучшие игроки команды по очкам (из витрин)"""
+    try:
+        summary = team_summary(team)
+        if summary is None:
+            return jsonify({'error': 'Team not found'}), 404
+        return jsonify({'team': team, **summary})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/players/top/<role>', methods=['GET'])
+@response_cache.cached('players', 'points', 'matches')
 def get_top_players(role):
+    """Топ игроков роли; ?k=, ?team=, ?format=, ?by=runs|wickets|points"""
     try:
-        if role == 'batsman':
-            players = Player.query.filter_by(role='batsman').order_by(Player.runs.desc()).limit(5).all()
-        elif role == 'bowler':
-            players = Player.query.filter_by(role='bowler').order_by(Player.wickets.desc()).limit(5).all()
-        else:
-            return jsonify({'error': 'Invalid role. Use batsman or bowler'}), 400
-        
-        return jsonify([player.to_dict() for player in players])
+        default_metrics = {'batsman': 'runs', 'bowler': 'wickets', 'all-rounder': 'points'}
+        if role not in default_metrics:
+            return jsonify({'error': 'Invalid role. Use batsman, bowler or all-rounder'}), 400
+
+        metric = request.args.get('by', default_metrics[role])
+        if metric not in ('runs', 'wickets', 'points'):
+            return jsonify({'error': 'Invalid ranking. Use runs, wickets or points'}), 400
+
+        k = request.args.get('k', 5, type=int)
+        if k < 1 or k > 1000:
+            return jsonify({'error': 'k must be between 1 and 1000'}), 400
+
+        ranking = leaderboard.top(metric, role,
+                                  team=request.args.get('team') or None,
+                                  match_format=request.args.get('format') or None,
+                                  k=k)
+
+        players = {p.id: p for p in Player.query.filter(Player.id.in_([pid for pid, _ in ranking])).all()}
+        result = []
+        for player_id, score in ranking:
+            player = players.get(player_id)
+            if player:
+                item = player.to_dict()
+                if metric == 'points':
+                    item['points'] = round(score, 2)
+                result.append(item)
+
+        return jsonify(result)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/calculate', methods=['POST'])
+@main.route('/api/calculate', methods=['POST'])
 def calculate_points_api():
     try:
         data = request.json
@@ -187,59 +380,526 @@ def calculate_points_api():
         if not player:
             return jsonify({'error': 'Player not found'}), 404
         
-        points = 0
-        if player.role == 'batsman':
-            batting_data = {
-                'runs': player.runs,
-                'balls_faced': player.balls_faced if player.balls_faced > 0 else 1,
-                'fours': data.get('fours', 0),
-                'sixes': data.get('sixes', 0),
-                'dismissal_type': data.get('dismissal_type', 'not_out')
-            }
-            points = calculate_batting_points(batting_data)
-        elif player.role == 'bowler':
-            bowling_data = {
-                'wickets': player.wickets,
-                'runs_conceded': player.runs_conceded,
-                'overs_bowled': data.get('overs_bowled', 4),
-                'maidens': data.get('maidens', 0)
-            }
-            points = calculate_bowling_points(bowling_data)
-        
-        player_points = PlayerPoints(
-            player_id=player_id,
-            match_id=data.get('match_id', 1),
-            points=points
-        )
-        
-        db.session.add(player_points)
-        db.session.commit()
+        match_id = data.get('match_id') or player.match_id or 1
+        # Есть подачи матча - считаем по агрегатам, иначе по итогам игрока и данным запроса;
+        # повторный расчет с теми же данными ничего не пишет
+        has_stats = db.session.get(PlayerMatchStats, (player_id, match_id)) is not None
+        result = recompute_retrying([{**data, 'player_id': player_id, 'match_id': match_id}])
+        leaderboard.points_changed(result.changed_player_ids)
+        contests.points_changed(result.changed_match_ids)
+        record = result.records[0]
         
         return jsonify({
             'status': 'success',
             'player': player.name,
             'role': player.role,
-            'points': points,
-            'record_id': player_points.id
+            'points': record['points'],
+            'record_id': record['record_id'],
+            'changed': record['changed'],
+            'rules': record['rules'],
+            'source': 'deliveries' if has_stats else 'request'
         })
         
+    except ConcurrentRecompute as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/points/history', methods=['GET'])
+@main.route('/api/calculate/batch', methods=['POST'])
+def calculate_points_batch_api():
+    """Пакетный расчет очков: пересчитываются и пишутся только изменившиеся пары (игрок, матч)"""
+    try:
+        data = request.json or {}
+        items = data.get('items') if isinstance(data, dict) else None
+
+        if not items:
+            return jsonify({'error': 'items is required'}), 400
+        if not isinstance(items, list) or any(not isinstance(item, dict) for item in items):
+            return jsonify({'error': 'items must be a list of objects'}), 400
+        if any(not item.get('player_id') for item in items):
+            return jsonify({'error': 'player_id is required for every item'}), 400
+
+        player_ids = {item['player_id'] for item in items}
+        players = {p.id: p for p in db.session.query(Player.id, Player.name, Player.role, Player.match_id)
+                   .filter(Player.id.in_(player_ids))}
+        missing = sorted(player_ids - players.keys())
+        if missing:
+            return jsonify({'error': 'Player not found', 'player_ids': missing}), 404
+
+        default_match_id = data.get('match_id')
+        result = recompute_retrying([
+            {**item, 'match_id': item.get('match_id') or default_match_id or players[item['player_id']].match_id or 1}
+            for item in items
+        ])
+        leaderboard.points_changed(result.changed_player_ids)
+        contests.points_changed(result.changed_match_ids)
+
+        return jsonify({
+            'status': 'success',
+            'records_created': result.inserted,
+            **result.to_dict(),
+            'results': [
+                {'player_id': record['player_id'], 'match_id': record['match_id'],
+                 'player': players[record['player_id']].name, 'role': players[record['player_id']].role,
+                 'points': record['points'], 'record_id': record['record_id'], 'changed': record['changed'],
+                 'rules': record['rules']}
+                for record in result.records
+            ]
+        })
+
+    except MissingPlayers as e:
+        db.session.rollback()
+        return jsonify({'error': 'Player not found', 'player_ids': e.player_ids}), 404
+    except ConcurrentRecompute as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/scoring/rules', methods=['GET'])
+def scoring_rules_api():
+    """Наборы правил подсчета очков (после наследования) и форматы, к которым они относятся"""
+    try:
+        return jsonify(get_rule_book().to_list())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/points/recompute', methods=['POST'])
+def recompute_points_api():
+    """
+    Массовый пересчет очков пачками; ответ - NDJSON с прогрессом после каждой пачки.
+    job=rules - записи, посчитанные по другим правилам (правила или формат матча изменились);
+    job=deliveries - пары, у которых изменились агрегаты подач.
+    """
+    data = request.json or {}
+    job = data.get('job', 'rules')
+    if job not in RECOMPUTE_JOBS:
+        return jsonify({'error': f"job must be one of {', '.join(RECOMPUTE_JOBS)}"}), 400
+    chunk_size = data.get('chunk_size')
+    if chunk_size is not None and (isinstance(chunk_size, bool) or not isinstance(chunk_size, int)):
+        return jsonify({'error': 'chunk_size must be an integer'}), 400
+    chunk_size = page_limit(chunk_size, 1000, 10000)
+
+    def generate():
+        try:
+            for progress in RECOMPUTE_JOBS[job](chunk_size):
+                leaderboard.points_changed(progress.pop('changed_player_ids', ()))
+                contests.points_changed(progress.pop('changed_match_ids', ()))
+                yield json.dumps(progress) + '\n'
+            if job == 'rules':
+                leaderboard.reset()
+                contests.points_changed()
+        except Exception as e:
+            db.session.rollback()
+            yield json.dumps({'error': str(e)}) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@main.cli.command('deploy')
+def deploy_command():
+    """Миграции схемы БД, счетчики строк и витрины (один раз на выкладку)"""
+    deploy()
+
+@main.cli.command('seed')
+def seed_command():
+    """Тестовые матчи и игроки (только в пустую базу)"""
+    missing = pending(db.session.connection())
+    db.session.rollback()
+    if missing:
+        raise click.ClickException(f"Схема БД не обновлена ({len(missing)} миграций): сначала flask deploy")
+    init_sample_data()
+    fold_pending_locked()
+
+@main.cli.command('recompute-points')
+@click.option('--job', type=click.Choice(list(RECOMPUTE_JOBS)), default='rules')
+@click.option('--chunk-size', type=int, default=1000)
+def recompute_points_command(job, chunk_size):
+    """Массовый пересчет очков (см. POST /api/points/recompute)"""
+    progress = {}
+    for progress in RECOMPUTE_JOBS[job](chunk_size):
+        progress.pop('changed_player_ids', None)
+        progress.pop('changed_match_ids', None)
+        click.echo(json.dumps(progress))
+    print(f"✅ Пересчет завершен: {progress}")
+
+@main.cli.command('rebuild-rollups')
+@click.option('--chunk-size', type=int, default=200)
+def rebuild_rollups_command(chunk_size):
+    """Витрины игроков и команд с нуля по всем завершенным матчам"""
+    progress = {}
+    for progress in rebuild(chunk_size):
+        click.echo(json.dumps(progress))
+    print(f"✅ Витрины пересобраны: {progress}")
+
+@main.route('/api/export/<table>', methods=['GET'])
+def export_table_api(table):
+    """Выгрузка таблицы потоком: ?format=ndjson|csv|parquet|arrow"""
+    fmt = request.args.get('format', 'ndjson')
+    try:
+        model = bulk_io.table_model(table)
+        if fmt not in bulk_io.FORMATS:
+            raise ValueError(f"format must be one of {', '.join(bulk_io.FORMATS)}")
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    chunk_size = page_limit(request.args.get('chunk_size', type=int), bulk_io.DEFAULT_CHUNK_SIZE, 50000)
+    try:
+        parts = bulk_io.export_rows(model, fmt, chunk_size)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 501
+    return Response(stream_with_context(parts),
+                    mimetype=bulk_io.MIMETYPES[fmt],
+                    headers={'Content-Disposition': f'attachment; filename={table}.{fmt}'})
+
+@main.route('/api/import/<table>', methods=['POST'])
+def import_table_api(table):
+    """
+    Загрузка таблицы из тела запроса (?format=ndjson|csv), разбор построчно
+    без чтения тела целиком; пачки коммитятся по мере записи.
+    """
+    fmt = request.args.get('format', 'csv' if request.mimetype == 'text/csv' else 'ndjson')
+    progress = {'rows': 0, 'chunks': 0}
+    try:
+        model = bulk_io.table_model(table)
+        if fmt not in bulk_io.TEXT_FORMATS:
+            raise ValueError(f"format must be one of {', '.join(bulk_io.TEXT_FORMATS)} (Parquet/Arrow - flask import-data)")
+        chunk_size = page_limit(request.args.get('chunk_size', type=int), bulk_io.DEFAULT_CHUNK_SIZE, 50000)
+        rows = bulk_io.read_rows(bulk_io.text_stream(request.stream), fmt)
+        for progress in bulk_io.import_rows(model, rows, chunk_size):
+            pass
+        if model is not Match:
+            leaderboard.reset()
+            contests.points_changed()
+        return jsonify({'status': 'success', **progress})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), **progress}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e), **progress}), 500
+
+def _require_pyarrow():
+    try:
+        bulk_io.require_pyarrow()
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+
+@main.cli.command('export-data')
+@click.argument('table', type=click.Choice(list(bulk_io.TABLES)))
+@click.option('--output', '-o', default='-', help='Файл (по умолчанию stdout)')
+@click.option('--format', 'fmt', type=click.Choice(bulk_io.FORMATS), help='По умолчанию - по расширению файла')
+@click.option('--chunk-size', type=int, default=bulk_io.DEFAULT_CHUNK_SIZE)
+def export_data_command(table, output, fmt, chunk_size):
+    """Выгрузка matches / players / points в NDJSON, CSV, Parquet или Arrow"""
+    fmt = fmt or bulk_io.format_from_path(output)
+    binary = fmt in bulk_io.ARROW_FORMATS
+    if binary:
+        _require_pyarrow()
+    with click.open_file(output, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+        for part in bulk_io.export_rows(bulk_io.table_model(table), fmt, chunk_size):
+            f.write(part)
+
+@main.cli.command('import-data')
+@click.argument('table', type=click.Choice(list(bulk_io.TABLES)))
+@click.argument('path')
+@click.option('--format', 'fmt', type=click.Choice(bulk_io.FORMATS), help='По умолчанию - по расширению файла')
+@click.option('--chunk-size', type=int, default=bulk_io.DEFAULT_CHUNK_SIZE)
+@click.option('--skip-rollups', is_flag=True, help='Не обновлять витрины (потом flask rebuild-rollups)')
+def import_data_command(table, path, fmt, chunk_size, skip_rollups):
+    """Загрузка matches / players / points из файла (- = stdin)"""
+    fmt = fmt or bulk_io.format_from_path(path)
+    model = bulk_io.table_model(table)
+    if fmt in bulk_io.ARROW_FORMATS:
+        _require_pyarrow()
+    # Parquet/Arrow читаются по пути (группами строк), текстовые форматы - построчно из файла или stdin
+    source = nullcontext(path) if fmt in bulk_io.ARROW_FORMATS else click.open_file(path, 'r', encoding='utf-8')
+    progress = {}
+    with source as f:
+        for progress in bulk_io.import_rows(model, bulk_io.read_rows(f, fmt, chunk_size), chunk_size, not skip_rollups):
+            click.echo(json.dumps(progress), err=True)
+    print(f"✅ Импорт завершен: {progress}")
+
+@main.route('/api/match', methods=['POST'])
+def create_match_api():
+    """Добавление матча из админ-панели"""
+    try:
+        data = request.json or {}
+        if not data.get('team1') or not data.get('team2'):
+            return jsonify({'error': 'team1 and team2 are required'}), 400
+
+        match = Match(
+            team1=data['team1'],
+            team2=data['team2'],
+            venue=data.get('venue'),
+            format=data.get('format'),
+            status=data.get('status', 'Scheduled'),
+            score=data.get('score')
+        )
+        db.session.add(match)
+        db.session.flush()
+        store_scores([(match.id, match.score, match.format)])
+        stream_hub.record_matches([match.id], 'inserted')
+        fold_matches([match.id])
+        db.session.commit()
+
+        return jsonify({'status': 'success', 'match': match.to_dict()}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/match/<int:match_id>', methods=['PUT'])
+def update_match_api(match_id):
+    """Изменение полей матча (статус, счет и т.п.)"""
+    try:
+        match = Match.query.get(match_id)
+        if not match:
+            return jsonify({'error': 'Match not found'}), 404
+
+        data = request.json or {}
+        for field in ('team1', 'team2', 'venue', 'format', 'status', 'score'):
+            if field in data:
+                setattr(match, field, data[field])
+        db.session.flush()
+        if 'score' in data or 'format' in data:
+            store_scores([(match.id, match.score, match.format)])
+        stream_hub.record_matches([match.id], 'updated')
+        fold_matches([match.id])
+        db.session.commit()
+
+        return jsonify({'status': 'success', 'match': match.to_dict()})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/match/<int:match_id>', methods=['DELETE'])
+def delete_match_api(match_id):
+    """Удаление матча без привязанных игроков и расчетов очков"""
+    try:
+        match = Match.query.get(match_id)
+        if not match:
+            return jsonify({'error': 'Match not found'}), 404
+        if (db.session.query(Player.id).filter_by(match_id=match_id).first()
+                or db.session.query(PlayerPoints.id).filter_by(match_id=match_id).first()):
+            return jsonify({'error': 'Match has players or points records'}), 409
+
+        MatchInnings.query.filter_by(match_id=match_id).delete()
+        db.session.delete(match)
+        stream_hub.record('match', [{'change': 'deleted', 'id': match_id}])
+        db.session.commit()
+
+        return jsonify({'status': 'success'})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/matches/<int:match_id>/deliveries', methods=['POST'])
+def append_deliveries_api(match_id):
+    """Пакетная запись подач матча (ball-by-ball); повторы позиций пропускаются"""
+    try:
+        if not db.session.get(Match, match_id):
+            return jsonify({'error': 'Match not found'}), 404
+
+        data = request.json
+        items = data.get('deliveries') if isinstance(data, dict) else data
+        if not items or not isinstance(items, list):
+            return jsonify({'error': 'deliveries is required'}), 400
+
+        result = append_deliveries(match_id, items)
+        leaderboard.players_changed(result.player_ids)
+
+        return jsonify({'status': 'success', **result.to_dict()})
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': 'Deliveries were appended concurrently, retry the request'}), 409
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/matches/<int:match_id>/stats', methods=['GET'])
+@response_cache.cached('players')
+def match_stats_api(match_id):
+    """Агрегаты игроков за матч, накопленные по подачам"""
+    try:
+        rows = (db.session.query(PlayerMatchStats, Player.name, Player.team)
+                .join(Player, Player.id == PlayerMatchStats.player_id)
+                .filter(PlayerMatchStats.match_id == match_id)
+                .order_by(Player.id)
+                .all())
+        return jsonify([
+            {
+                'player_id': stats.player_id,
+                'name': name,
+                'team': team,
+                **batting_inputs(stats),
+                **bowling_inputs(stats),
+                **fielding_inputs(stats),
+                'balls_faced': stats.balls_faced,
+                'legal_balls': stats.legal_balls
+            }
+            for stats, name, team in rows
+        ])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/matches/<int:match_id>/projections', methods=['GET'])
+def match_projections_api(match_id):
+    """Прогноз итоговых очков игроков матча (Монте-Карло по остатку матча)"""
+    try:
+        match = db.session.get(Match, match_id)
+        if not match:
+            return jsonify({'error': 'Match not found'}), 404
+        simulations = request.args.get('simulations', type=int)
+        seed = request.args.get('seed', 0, type=int)
+        return jsonify(projections.project(match, simulations, seed))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/points/history', methods=['GET'])
 def get_points_history():
     try:
-        limit = request.args.get('limit', 10, type=int)
-        history = PlayerPoints.query.order_by(PlayerPoints.calculation_date.desc()).limit(limit).all()
-        return jsonify([record.to_dict() for record in history])
+        limit = page_limit(request.args.get('limit', type=int), HISTORY_DEFAULT_LIMIT, HISTORY_MAX_LIMIT)
+        rows, next_cursor = points_history_rows(limit=limit, cursor=request.args.get('cursor'))
+        return paginated_response([points_row_to_dict(row) for row in rows], next_cursor)
+    except InvalidCursor as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/contests', methods=['POST'])
+def create_contest_api():
+    """Создание контеста по матчу"""
+    try:
+        data = request.json or {}
+        if not data.get('name') or not data.get('match_id'):
+            return jsonify({'error': 'name and match_id are required'}), 400
+        if not db.session.get(Match, data['match_id']):
+            return jsonify({'error': 'Match not found'}), 404
+
+        contest = Contest(name=data['name'], match_id=data['match_id'])
+        db.session.add(contest)
+        db.session.commit()
+
+        return jsonify({'status': 'success', 'contest': contest.to_dict()}), 201
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/contests/<int:contest_id>', methods=['GET'])
+def get_contest(contest_id):
+    try:
+        contest = db.session.get(Contest, contest_id)
+        if not contest:
+            return jsonify({'error': 'Contest not found'}), 404
+        return jsonify({**contest.to_dict(), 'teams': len(contests.board(contest_id))})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/contests/<int:contest_id>/teams', methods=['POST'])
+def enter_contest_api(contest_id):
+    """
+    Заявка команд: одна команда {user, players[11], captain_id, vice_captain_id}
+    или пачка {"teams": [...]}; неверный состав - 400, ничего не записывается.
+    """
+    try:
+        contest = db.session.get(Contest, contest_id)
+        if not contest:
+            return jsonify({'error': 'Contest not found'}), 404
+
+        data = request.json or {}
+        entries = data['teams'] if 'teams' in data else [data]
+        if not isinstance(entries, list):
+            return jsonify({'error': 'teams must be a list'}), 400
+        team_ids = enter_teams(contest, entries)
+        contests.teams_added(contest_id)
+
+        return jsonify({'status': 'success', 'team_ids': team_ids}), 201
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/contests/<int:contest_id>/leaderboard', methods=['GET'])
+def contest_leaderboard(contest_id):
+    """Лучшие команды контеста; при равных очках место общее"""
+    try:
+        board = contests.board(contest_id)
+        if board is None:
+            return jsonify({'error': 'Contest not found'}), 404
+
+        rows = board.top(page_limit(request.args.get('limit', type=int), 100, 1000))
+        users = dict(db.session.query(ContestTeam.id, ContestTeam.user_name)
+                     .filter(ContestTeam.id.in_([row['team_id'] for row in rows])))
+        return jsonify({'contest_id': contest_id, 'teams': len(board),
+                        'leaderboard': [{**row, 'user': users.get(row['team_id'])} for row in rows]})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@main.route('/api/contests/<int:contest_id>/teams/<int:team_id>', methods=['GET'])
+def contest_team(contest_id, team_id):
+    """Состав команды, ее очки и место в контесте"""
+    try:
+        team = db.session.get(ContestTeam, team_id)
+        board = contests.board(contest_id)
+        if not team or team.contest_id != contest_id or board is None:
+            return jsonify({'error': 'Team not found'}), 404
+
+        standing = board.standing(team_id)
+        if standing is None:
+            # Команда записана другим воркером после последнего обновления доски
+            contests.teams_added(contest_id)
+            standing = contests.board(contest_id).standing(team_id)
+
+        players = unpack_lineup(team.lineup)
+        return jsonify({**standing, 'user': team.user_name, 'players': players,
+                        'captain_id': players[0], 'vice_captain_id': players[1]})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/scrape/matches')
+def save_ingested_matches(app, matches_data):
+    """Приемник фонового конвейера: пишет изменившиеся матчи в своем app context"""
+    with app.app_context():
+        try:
+            result = sync_matches(matches_data)
+            print(f"✅ Фоновая загрузка: добавлено {result.inserted}, обновлено {result.updated} матчей")
+        except Exception:
+            db.session.rollback()
+            raise
+
+@main.route('/api/scrape/matches')
 def scrape_matches():
     """API эндпоинт для веб-скрапинга"""
     try:
+        if scrape_scheduler.enabled:
+            scrape_scheduler.trigger()
+            return jsonify({
+                'status': 'success',
+                'message': 'Загрузка матчей поставлена в очередь планировщика',
+                'matches_added': 0,
+                'total_matches': table_stats.count(Match),
+                'scheduler': scrape_scheduler.status()
+            }), 202
+
+        ingestion = scrape_scheduler.ingestion
+        if ingestion is not None:
+            started = ingestion.start(sink=partial(save_ingested_matches, current_app._get_current_object()))
+            last_run = ingestion.last_result.to_dict() if ingestion.last_result else None
+            return jsonify({
+                'status': 'success',
+                'message': 'Загрузка матчей запущена в фоне' if started else 'Загрузка матчей уже выполняется',
+                'matches_added': 0,
+                'total_matches': table_stats.count(Match),
+                'last_run': last_run
+            }), 202
+
         matches_data = fetch_live_matches()
         
         if not matches_data:
@@ -247,36 +907,18 @@ def scrape_matches():
                 'status': 'success',
                 'message': 'Нет данных для добавления',
                 'matches_added': 0,
-                'total_matches': Match.query.count()
+                'total_matches': table_stats.count(Match)
             })
         
-        matches_added = 0
-        for match_data in matches_data:
-            existing_match = Match.query.filter_by(
-                team1=match_data.get('team1', ''),
-                team2=match_data.get('team2', '')
-            ).first()
-            
-            if not existing_match:
-                new_match = Match(
-                    team1=match_data.get('team1', 'Team A'),
-                    team2=match_data.get('team2', 'Team B'),
-                    venue=match_data.get('venue', 'Неизвестно'),
-                    format=match_data.get('format', 'Неизвестно'),
-                    status=match_data.get('status', 'Scheduled'),
-                    score=match_data.get('score', ''),
-                    match_date=datetime.utcnow()
-                )
-                db.session.add(new_match)
-                matches_added += 1
-        
-        db.session.commit()
+        result = sync_matches(matches_data)
         
         return jsonify({
             'status': 'success',
-            'message': f'Добавлено {matches_added} новых матчей',
-            'matches_added': matches_added,
-            'total_matches': Match.query.count()
+            'message': f'Добавлено {result.inserted} новых матчей, обновлено {result.updated}',
+            'matches_added': result.inserted,
+            'matches_updated': result.updated,
+            'matches_unchanged': result.unchanged,
+            'total_matches': table_stats.count(Match)
         })
         
     except Exception as e:
@@ -287,5 +929,57 @@ def scrape_matches():
             'matches_added': 0
         }), 500
 
+@main.route('/api/stream/matches')
+def stream_matches():
+    """Live-поток изменений матчей и очков (Server-Sent Events)"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    subscriber = stream_hub.subscribe(int(last_event_id) if last_event_id and last_event_id.isdigit() else None)
+    if subscriber is None:
+        return jsonify({'error': 'Too many subscribers, retry later'}), 503
+
+    response = Response(stream_with_context(stream_hub.stream(subscriber)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@main.route('/metrics')
+def metrics_endpoint():
+    """Метрики воркера в текстовом формате Prometheus"""
+    if not current_app.config['METRICS_ENABLED']:
+        return jsonify({'error': 'Metrics are disabled'}), 404
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@main.route('/metrics/profiles/<int:profile_id>')
+def profile_endpoint(profile_id):
+    """Профиль запроса (collapsed stacks) по X-Profile-Id; тот же токен, что и для включения"""
+    if not metrics.profile_token or request.headers.get('X-Profile') != metrics.profile_token:
+        return jsonify({'error': 'Profiling is disabled or token is invalid'}), 403
+    profile = metrics.profile(profile_id)
+    if profile is None:
+        return jsonify({'error': 'Profile not found'}), 404
+    return Response(profile, mimetype='text/plain')
+
+@main.route('/api/cache/stats')
+def cache_stats():
+    """Счетчики кэша ответов текущего воркера"""
+    return jsonify(response_cache.stats())
+
+@main.route('/api/scrape/status')
+def scrape_status():
+    """Состояние фонового планировщика скрапинга"""
+    try:
+        return jsonify(scrape_scheduler.status())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+# gunicorn app:app, flask --app app ...
+app = create_app()
+
 if __name__ == '__main__':
+    # Локальный запуск: выкладка и тестовые данные сразу
+    with app.app_context():
+        deploy()
+        init_sample_data()
+        fold_pending_locked()
+    start_background_jobs(app)
     app.run(debug=True, host='0.0.0.0', port=5000)
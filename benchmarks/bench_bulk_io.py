@@ -0,0 +1,144 @@
+"""
+Бенчмарк потокового импорта/экспорта (bulk_io.py): 1M строк Player и
+PlayerPoints в каждую сторону - NDJSON и CSV (Parquet/Arrow - если
+установлен pyarrow). Кроме скорости показывается память за проход:
+прирост RSS (в него входят кэш страниц и WAL SQLite) или, с --trace,
+пик кучи Python по tracemalloc (медленнее) - он не зависит от числа строк.
+
+Запуск: python benchmarks/bench_bulk_io.py [--rows 1000000] [--chunk-size 5000] [--trace]
+"""
+import argparse
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import delete, insert
+
+import bulk_io
+from config import init_database
+from models import db, Match
+
+MATCHES = 1000
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def rss_mb() -> float:
+    """Текущий RSS процесса (Linux), иначе пиковый"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def write_source(path, table, rows):
+    """Входной NDJSON без id, как из внешней системы"""
+    rng = random.Random(1)
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(rows):
+            if table == 'players':
+                row = {'name': f'Player {i % 5000}', 'role': ('batsman', 'bowler', 'all-rounder')[i % 3],
+                       'team': f'Team {i % 20}', 'match_id': 1 + i % MATCHES, 'runs': rng.randrange(120),
+                       'wickets': rng.randrange(6), 'balls_faced': rng.randrange(90), 'runs_conceded': rng.randrange(60)}
+            else:
+                row = {'player_id': 1 + i, 'match_id': 1 + i % MATCHES, 'points': rng.randrange(15000) / 100,
+                       'calculation_date': '2024-05-01T12:00:00', 'rules_version': 1}
+            f.write(json.dumps(row) + '\n')
+
+
+def measure(label, rows, run, trace=False):
+    """run() - генератор прогресса; RSS снимается после каждой пачки"""
+    if trace:
+        tracemalloc.start()
+    base = peak = rss_mb()
+    started = time.perf_counter()
+    for _ in run():
+        peak = max(peak, rss_mb())
+    elapsed = time.perf_counter() - started
+    if trace:
+        memory = f"пик кучи Python {tracemalloc.get_traced_memory()[1] / 1024 / 1024:6.1f} МБ"
+        tracemalloc.stop()
+    else:
+        memory = f"прирост RSS {peak - base:6.1f} МБ"
+    print(f"  {label:<28} {elapsed:6.1f} с  {rows / elapsed:>10,.0f} строк/с  {memory}")
+
+
+def bench_table(tmp, table, rows, chunk_size, formats, trace):
+    model = bulk_io.TABLES[table]
+    source = os.path.join(tmp, f'{table}_source.ndjson')
+    write_source(source, table, rows)
+    print(f"\n{table}: {rows:,} строк")
+
+    def run_import(path, fmt):
+        def run():
+            if fmt in bulk_io.ARROW_FORMATS:
+                yield from bulk_io.import_rows(model, bulk_io.read_rows(path, fmt, chunk_size), chunk_size)
+                return
+            with open(path, encoding='utf-8', newline='') as f:
+                yield from bulk_io.import_rows(model, bulk_io.read_rows(f, fmt), chunk_size)
+        return run
+
+    def run_export(path, fmt):
+        def run():
+            binary = fmt in bulk_io.ARROW_FORMATS
+            with open(path, 'wb' if binary else 'w', encoding=None if binary else 'utf-8') as f:
+                for part in bulk_io.export_rows(model, fmt, chunk_size):
+                    f.write(part)
+                    yield
+        return run
+
+    measure('импорт NDJSON', rows, run_import(source, 'ndjson'), trace)
+    for fmt in formats:
+        path = os.path.join(tmp, f'{table}.{fmt}')
+        measure(f'экспорт {fmt}', rows, run_export(path, fmt), trace)
+    for fmt in formats:
+        # Повторная загрузка выгрузки (с id) в очищенную таблицу
+        db.session.execute(delete(model))
+        db.session.commit()
+        measure(f'импорт {fmt} (из выгрузки)', rows, run_import(os.path.join(tmp, f'{table}.{fmt}'), fmt), trace)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--chunk-size', type=int, default=bulk_io.DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--trace', action='store_true', help='пик кучи Python вместо RSS')
+    args = parser.parse_args()
+
+    formats = list(bulk_io.TEXT_FORMATS)
+    try:
+        bulk_io.require_pyarrow()
+        formats += list(bulk_io.ARROW_FORMATS)
+    except RuntimeError:
+        print("pyarrow не установлен - Parquet/Arrow пропущены")
+
+    print("=== Бенчмарк потокового импорта/экспорта ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bulk.db'))
+        with app.app_context():
+            db.create_all()
+            db.session.execute(insert(Match), [{'team1': f'Home {i}', 'team2': f'Away {i}', 'status': 'Live'}
+                                               for i in range(MATCHES)])
+            db.session.commit()
+            for table in ('players', 'points'):
+                bench_table(tmp, table, args.rows, args.chunk_size, formats, args.trace)
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
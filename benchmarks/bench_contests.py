@@ -0,0 +1,159 @@
+"""
+Бенчмарк контестов (contests.py): запись и холодная загрузка команд,
+построение обратного индекса, задержка обновления мест после изменения
+очков одного игрока (инкрементально против полного пересчета), запросы
+"мое место" и top-100, память доски.
+
+Популярность игроков неравномерная, как в реальных контестах: есть игрок
+почти в каждой команде и игроки, выбранные в каждой десятой.
+
+Запуск: python benchmarks/bench_contests.py [--teams 1000000] [--queries 10000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from config import init_database
+from contests import LINEUP_DTYPE, SLOT_WEIGHTS, TEAM_SIZE, ContestEngine
+from models import db, Contest, ContestTeam, Match, Player, PlayerPoints
+
+POOL = 22
+CHUNK = 50000
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def generate_lineups(rng, count, weights):
+    """Составы без повторов с вероятностью выбора по весам (ключи Эфраимидиса-Спиракиса)"""
+    keys = rng.random((count, POOL)) ** (1 / weights)
+    chosen = np.argpartition(-keys, TEAM_SIZE, axis=1)[:, :TEAM_SIZE]
+    # Капитан и вице - игроки с наибольшими ключами, популярные чаще
+    order = np.argsort(-np.take_along_axis(keys, chosen, axis=1), axis=1)
+    return np.take_along_axis(chosen, order, axis=1) + 1
+
+
+def populate(teams):
+    db.session.execute(insert(Match), [{'team1': 'Home', 'team2': 'Away', 'status': 'Live'}])
+    db.session.execute(insert(Player), [{'name': f'Player {i}', 'role': 'batsman', 'team': 'Home', 'match_id': 1}
+                                        for i in range(POOL)])
+    db.session.execute(insert(Contest), [{'name': 'Bench', 'match_id': 1}])
+    rng = np.random.default_rng(1)
+    db.session.execute(insert(PlayerPoints), [{'player_id': 1 + i, 'match_id': 1, 'points': float(points)}
+                                              for i, points in enumerate(rng.integers(0, 120, POOL))])
+    db.session.commit()
+
+    weights = np.linspace(4.0, 0.2, POOL)
+    started = time.perf_counter()
+    for start in range(0, teams, CHUNK):
+        lineups = generate_lineups(rng, min(CHUNK, teams - start), weights).astype(LINEUP_DTYPE)
+        db.session.execute(insert(ContestTeam), [{'contest_id': 1, 'user_name': f'user{start + i}', 'lineup': row.tobytes()}
+                                                 for i, row in enumerate(lineups)])
+        db.session.commit()
+    elapsed = time.perf_counter() - started
+    print(f"  запись {teams:,} команд: {elapsed:.1f} с ({teams / elapsed:,.0f} команд/с)")
+
+
+def timed(func, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - started) / repeats
+
+
+def set_points(player_id, points):
+    db.session.query(PlayerPoints).filter_by(player_id=player_id, match_id=1).update({'points': points})
+    db.session.commit()
+
+
+def bench(tmp, teams, queries):
+    app = create_app(os.path.join(tmp, 'contests.db'))
+    with app.app_context():
+        db.create_all()
+        print(f"\n{teams:,} команд из {POOL} игроков матча:")
+        populate(teams)
+
+        engine = ContestEngine(refresh_interval=3600)
+        started = time.perf_counter()
+        board = engine.board(1)
+        loaded = time.perf_counter() - started
+        started = time.perf_counter()
+        board._build_index()
+        indexed = time.perf_counter() - started
+        index_bytes = sum(part.nbytes for part in board._index)
+        board_bytes = (board.team_ids.nbytes + board.lineups.nbytes + board.totals.nbytes
+                       + board.ranks.neg.nbytes + board.ranks.rows.nbytes)
+        print(f"  холодная загрузка доски: {loaded:.2f} с, обратный индекс: {indexed * 1000:.0f} мс")
+        print(f"  память: составы, очки и места {board_bytes / 1024 / 1024:.1f} МБ, "
+              f"индекс {index_bytes / 1024 / 1024:.1f} МБ")
+
+        print("\nОбновление мест после изменения очков одного игрока:")
+        share = np.bincount(board.lineups.ravel(), minlength=POOL + 1)[1:] / teams
+        for label, player_id in (('редкий', int(np.argmin(np.abs(share - 0.1))) + 1),
+                                 ('популярный', int(np.argmax(share)) + 1)):
+            values = iter(range(1, 10 ** 6))
+
+            def incremental():
+                set_points(player_id, float(next(values)))
+                engine.points_changed([1])
+                engine.board(1)
+
+            def apply_only():
+                board.apply_points({**board.points, player_id: float(next(values))})
+
+            def full():
+                points = np.zeros(POOL + 1)
+                for pid, value in board.points.items():
+                    points[pid] = value
+                totals = (points[board.lineups] * SLOT_WEIGHTS).sum(axis=1)
+                np.argsort(-totals, kind='stable')
+
+            print(f"  {label} игрок ({share[player_id - 1]:.0%} команд): доска "
+                  f"{timed(apply_only, 10) * 1000:5.1f} мс, с записью и чтением очков из БД "
+                  f"{timed(incremental, 10) * 1000:5.1f} мс; полный пересчет {timed(full, 3) * 1000:5.1f} мс")
+
+        rng = np.random.default_rng(2)
+        team_ids = rng.choice(board.team_ids, queries)
+        calls = iter(team_ids.tolist())
+        my_rank = timed(lambda: board.standing(next(calls)), queries)
+        top = timed(lambda: board.top(100), 1000)
+        print(f"\nЗапросы: мое место {my_rank * 1e6:.1f} мкс, top-100 {top * 1e6:.1f} мкс")
+
+        # Проверка: очки и порядок мест совпадают с полным пересчетом
+        points = np.zeros(POOL + 1)
+        for pid, value in board.points.items():
+            points[pid] = value
+        expected = np.round((points[board.lineups] * SLOT_WEIGHTS).sum(axis=1), 3)
+        assert np.allclose(board.totals, expected), "очки команд разошлись с полным пересчетом"
+        assert np.all(np.diff(board.ranks.neg) >= 0) and np.array_equal(-board.totals[board.ranks.rows], board.ranks.neg), \
+            "порядок мест разошелся"
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--teams', type=int, default=1_000_000)
+    parser.add_argument('--queries', type=int, default=10000)
+    args = parser.parse_args()
+
+    print("=== Бенчмарк контестов ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        bench(tmp, args.teams, args.queries)
+
+
+if __name__ == "__main__":
+    main()
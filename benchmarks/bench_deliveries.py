@@ -0,0 +1,211 @@
+"""
+Бенчмарк журнала подач: запись ball-by-ball с инкрементальными агрегатами.
+
+1. Тестовый матч (~3000 подач): подачи приходят по одной (live-лента) и
+   по оверу; для сравнения - чтение входных данных для расчета очков из
+   агрегатов против пересуммирования журнала (rebuild_match_stats).
+2. 1000 одновременных T20: овер за овером по всем матчам сразу
+   (несколько потоков-писателей), всего ~240 000 подач.
+
+В конце агрегаты сверяются с пересчетом по журналу.
+
+Запуск: python benchmarks/bench_deliveries.py [--t20 1000] [--writers 4]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from config import init_database
+from deliveries import STATS_FIELDS, append_deliveries, load_match_stats, rebuild_match_stats
+from models import db, Match, Player, PlayerMatchStats
+
+# Исход подачи и его вероятность
+OUTCOMES = [('dot', 0.42), (1, 0.30), (2, 0.08), (3, 0.01), (4, 0.10), (6, 0.03),
+            ('wide', 0.02), ('no_ball', 0.01), ('wicket', 0.03)]
+WICKETS = ['caught', 'caught', 'bowled', 'lbw', 'run_out', 'stumped']
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def create_matches(count, match_format):
+    """Матчи и по 11 игроков на команду одной пакетной вставкой"""
+    first = (db.session.query(db.func.max(Match.id)).scalar() or 0) + 1
+    db.session.execute(insert(Match), [
+        {'team1': f'Home {first + i}', 'team2': f'Away {first + i}', 'format': match_format, 'status': 'Live'}
+        for i in range(count)
+    ])
+    match_ids = list(range(first, first + count))
+    first_player = (db.session.query(db.func.max(Player.id)).scalar() or 0) + 1
+    db.session.execute(insert(Player), [
+        {'name': f'Player {match_id}-{n}', 'role': 'batsman' if n % 11 < 6 else 'bowler',
+         'team': f'{"Home" if n < 11 else "Away"} {match_id}', 'match_id': match_id}
+        for match_id in match_ids for n in range(22)
+    ])
+    db.session.commit()
+    teams = {match_id: (list(range(first_player + k * 22, first_player + k * 22 + 11)),
+                        list(range(first_player + k * 22 + 11, first_player + k * 22 + 22)))
+             for k, match_id in enumerate(match_ids)}
+    return match_ids, teams
+
+
+def innings_overs(rng, batting, bowling, innings, max_overs, wicket_rate):
+    """Генератор оверов (списков подач) одного иннинга"""
+    striker, non_striker, next_batter = batting[0], batting[1], 2
+    wickets = 0
+    outcomes = [outcome for outcome, _ in OUTCOMES]
+    weights = [wicket_rate if outcome == 'wicket' else weight for outcome, weight in OUTCOMES]
+    for over in range(max_overs):
+        bowler = bowling[6 + over % 5]
+        deliveries, legal, ball = [], 0, 0
+        while legal < 6:
+            ball += 1
+            outcome = rng.choices(outcomes, weights)[0]
+            delivery = {'innings': innings, 'over': over, 'ball': ball, 'batter_id': striker, 'bowler_id': bowler}
+            if outcome in ('wide', 'no_ball'):
+                delivery.update(extras=1, extra_type=outcome)
+            elif outcome == 'wicket':
+                kind = rng.choice(WICKETS)
+                delivery['wicket'] = kind
+                if kind in ('caught', 'stumped', 'run_out'):
+                    delivery['fielder_id'] = bowling[0 if kind == 'stumped' else rng.randrange(11)]
+            elif outcome != 'dot':
+                delivery['runs'] = outcome
+            deliveries.append(delivery)
+            if outcome != 'wide':
+                legal += 1 if outcome != 'no_ball' else 0
+            if outcome == 'wicket':
+                wickets += 1
+                if wickets == 10:
+                    yield deliveries
+                    return
+                striker, next_batter = batting[next_batter], next_batter + 1
+            elif outcome in (1, 3):
+                striker, non_striker = non_striker, striker
+        striker, non_striker = non_striker, striker
+        yield deliveries
+
+
+def match_overs(rng, teams, innings_count, max_overs, wicket_rate=0.03):
+    home, away = teams
+    for innings in range(1, innings_count + 1):
+        batting, bowling = (home, away) if innings % 2 else (away, home)
+        yield from innings_overs(rng, batting, bowling, innings, max_overs, wicket_rate)
+
+
+def verify(match_ids):
+    stored = {}
+    for row in PlayerMatchStats.query.filter(PlayerMatchStats.match_id.in_(match_ids)):
+        stored.setdefault(row.match_id, {})[row.player_id] = {f: getattr(row, f) for f in STATS_FIELDS}
+    mismatched = [match_id for match_id in match_ids if rebuild_match_stats(match_id) != stored.get(match_id, {})]
+    return mismatched
+
+
+def bench_test_match(tmp):
+    print("\nТестовый матч (4 иннинга по 150 оверов максимум):")
+    for mode in ('по одной подаче', 'по оверу'):
+        app = create_app(os.path.join(tmp, f'test_{mode == "по оверу"}.db'))
+        with app.app_context():
+            db.create_all()
+            (match_id,), teams = create_matches(1, 'Test Match')
+            overs = list(match_overs(random.Random(1), teams[match_id], 4, 150, wicket_rate=0.009))
+            total = sum(len(over) for over in overs)
+
+            calls = 0
+            start = time.perf_counter()
+            for over in overs:
+                for chunk in ([[d] for d in over] if mode == 'по одной подаче' else [over]):
+                    append_deliveries(match_id, chunk)
+                    calls += 1
+            elapsed = time.perf_counter() - start
+            print(f"  {mode:<16} {total:,} подач за {elapsed:6.2f} с ({total / elapsed:8,.0f} подач/с, "
+                  f"{elapsed / calls * 1000:.2f} мс на вызов)")
+
+            if mode == 'по оверу':
+                players = [pid for side in teams[match_id] for pid in side]
+                start = time.perf_counter()
+                for _ in range(100):
+                    load_match_stats((pid, match_id) for pid in players)
+                    db.session.expunge_all()
+                aggregates = (time.perf_counter() - start) / 100
+                start = time.perf_counter()
+                for _ in range(10):
+                    rebuild_match_stats(match_id)
+                resum = (time.perf_counter() - start) / 10
+                print(f"  входные данные для очков 22 игроков: агрегаты {aggregates * 1000:.2f} мс, "
+                      f"пересуммирование журнала {resum * 1000:.1f} мс (x{resum / aggregates:.0f})")
+                print(f"  сверка с журналом: {'OK' if not verify([match_id]) else 'РАСХОЖДЕНИЕ'}")
+            db.session.remove()
+            db.engine.dispose()
+
+
+def bench_t20(tmp, count, writers):
+    print(f"\n{count} одновременных T20 (овер за овером по всем матчам, {writers} потоков-писателей):")
+    app = create_app(os.path.join(tmp, 't20.db'))
+    with app.app_context():
+        db.create_all()
+        match_ids, teams = create_matches(count, 'T20 International')
+        rng = random.Random(2)
+        feeds = {match_id: list(match_overs(rng, teams[match_id], 2, 20)) for match_id in match_ids}
+        db.session.remove()
+
+    rounds = max(len(overs) for overs in feeds.values())
+    total = sum(len(over) for overs in feeds.values() for over in overs)
+    latencies = []
+    lock = threading.Lock()
+
+    def append(match_id, over):
+        with app.app_context():
+            started = time.perf_counter()
+            append_deliveries(match_id, over)
+            elapsed = time.perf_counter() - started
+            db.session.remove()
+        with lock:
+            latencies.append(elapsed)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as pool:
+        for r in range(rounds):
+            jobs = [pool.submit(append, match_id, overs[r]) for match_id, overs in feeds.items() if r < len(overs)]
+            for job in jobs:
+                job.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    print(f"  {total:,} подач, {len(latencies):,} вызовов за {elapsed:.1f} с: {total / elapsed:,.0f} подач/с, "
+          f"p50 {latencies[len(latencies) // 2] * 1000:.1f} мс, p99 {latencies[int(len(latencies) * 0.99)] * 1000:.1f} мс")
+    with app.app_context():
+        sample = random.Random(3).sample(match_ids, min(50, len(match_ids)))
+        print(f"  сверка 50 матчей с журналом: {'OK' if not verify(sample) else 'РАСХОЖДЕНИЕ'}")
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--t20', type=int, default=1000)
+    parser.add_argument('--writers', type=int, default=4)
+    args = parser.parse_args()
+
+    print("=== Бенчмарк журнала подач ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_test_match(tmp)
+        bench_t20(tmp, args.t20, args.writers)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Бенчмарк конвейера загрузки матчей против локального сервера фикстур.
+
+Сравнивает последовательные requests.get без пула соединений (как в
+scrape_real_cricket_data) с IngestionPipeline: холодный проход, повторный
+проход (все 304) и проход, где изменилась часть страниц.
+
+Запуск: python benchmarks/bench_ingestion.py [--pages 200] [--workers 16] [--delay 0.005]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+from fixture_server import FixtureServer
+from ingestion import IngestionPipeline
+from scraper import parse_matches_html
+
+
+def sequential(urls):
+    start = time.perf_counter()
+    matches = 0
+    for url in urls:
+        response = requests.get(url, timeout=10)
+        response.raise_for_status()
+        matches += len(parse_matches_html(response.content))
+    elapsed = time.perf_counter() - start
+    return elapsed, matches
+
+
+def report(name, result):
+    print(f"  {name:<28} {result.pages_total:>5} стр. за {result.elapsed:6.3f} с "
+          f"= {result.pages_per_second:>8.0f} стр/с | 200: {result.pages_fetched}, "
+          f"304: {result.pages_not_modified}, без изменений: {result.pages_unchanged}, "
+          f"ошибок: {result.pages_failed}, изменилось матчей: {len(result.changed)}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=200)
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--delay', type=float, default=0.005, help='задержка ответа сервера, с')
+    args = parser.parse_args()
+
+    for validators in (True, False):
+        server = FixtureServer(pages=args.pages, validators=validators, delay=args.delay).start()
+        urls = server.urls()
+        title = 'с ETag/Last-Modified' if validators else 'без валидаторов (сравнение по хэшу)'
+        print(f"\n=== {args.pages} страниц, сервер {title}, задержка {args.delay * 1000:.0f} мс ===")
+
+        elapsed, matches = sequential(urls)
+        print(f"  {'последовательно, без пула':<28} {len(urls):>5} стр. за {elapsed:6.3f} с "
+              f"= {len(urls) / elapsed:>8.0f} стр/с | матчей: {matches}")
+
+        pipeline = IngestionPipeline(urls, max_workers=args.workers)
+        report('конвейер: холодный', pipeline.run())
+        report('конвейер: без изменений', pipeline.run())
+        server.bump(range(0, args.pages, 10))
+        report('конвейер: 10% изменилось', pipeline.run())
+
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Бенчмарк рейтингов: прямой ORDER BY ... LIMIT против досок leaderboard.
+
+Запуск: python benchmarks/bench_leaderboard.py [кол-во игроков ...]
+"""
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from leaderboard import Leaderboard
+from models import db, Match, Player, PlayerPoints
+
+ROLES = ['batsman', 'bowler', 'all-rounder']
+TEAMS = ['India', 'Australia', 'England', 'Pakistan', 'New Zealand', 'South Africa', 'Sri Lanka', 'Bangladesh']
+FORMATS = ['T20 International', 'ODI', 'Test Match']
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate(size, rng):
+    db.session.execute(insert(Match), [
+        {'team1': f'{rng.choice(TEAMS)} {i}', 'team2': rng.choice(TEAMS), 'format': FORMATS[i % 3], 'status': 'Finished'}
+        for i in range(1000)
+    ])
+    chunk = 50_000
+    for offset in range(0, size, chunk):
+        db.session.execute(insert(Player), [
+            {
+                'name': f'Player {offset + i}',
+                'role': rng.choice(ROLES),
+                'team': rng.choice(TEAMS),
+                'match_id': rng.randint(1, 1000),
+                'runs': rng.randint(0, 150),
+                'wickets': rng.randint(0, 7),
+                'balls_faced': rng.randint(1, 120),
+                'runs_conceded': rng.randint(0, 70),
+            }
+            for i in range(min(chunk, size - offset))
+        ])
+        db.session.execute(insert(PlayerPoints), [
+            {'player_id': offset + i + 1, 'match_id': 1, 'points': rng.uniform(-10, 200)}
+            for i in range(0, min(chunk, size - offset), 5)
+        ])
+    db.session.commit()
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def run(size):
+    rng = random.Random(42)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'bench.db'))
+        board = Leaderboard(capacity=100, max_age=3600)
+        board.init_app(app)
+        with app.app_context():
+            db.create_all()
+            start = time.perf_counter()
+            populate(size, rng)
+            print(f"\n{size:,} игроков (заполнение {time.perf_counter() - start:.1f} с)")
+
+            def direct(team=None):
+                query = Player.query.filter_by(role='batsman')
+                if team:
+                    query = query.filter_by(team=team)
+                return query.order_by(Player.runs.desc()).limit(5).all()
+
+            cases = [
+                ('top-5 batsman по runs', lambda: direct(), lambda: board.top('runs', 'batsman')),
+                ('top-5 batsman India', lambda: direct('India'), lambda: board.top('runs', 'batsman', team='India')),
+                ('top-5 bowler ODI', None, lambda: board.top('wickets', 'bowler', match_format='ODI')),
+                ('top-5 batsman по points', None, lambda: board.top('points', 'batsman')),
+            ]
+            for name, sql, cached in cases:
+                cold = timed(cached, 1)
+                warm = timed(cached, 200)
+                sql_ms = f"{timed(sql, 20):8.3f} мс" if sql else "       -   "
+                print(f"  {name:<26} SQL: {sql_ms} | доска: холодная {cold:8.3f} мс, теплая {warm:.4f} мс")
+
+            ids = [rng.randint(1, size) for _ in range(200)]
+
+            def update():
+                player = db.session.get(Player, ids.pop())
+                player.runs = rng.randint(0, 250)
+                db.session.commit()
+                board.top('runs', 'batsman')
+
+            print(f"  обновление игрока + чтение доски: {timed(update, 200):.3f} мс")
+            db.session.remove()
+            db.engine.dispose()
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100_000, 1_000_000]
+    print("=== Бенчмарк рейтингов игроков ===")
+    for size in sizes:
+        run(size)
@@ -0,0 +1,132 @@
+"""
+Бенчмарк синхронизации матчей: прежний цикл из scrape_matches
+(запрос filter_by(team1, team2).first() на каждый матч) против
+match_sync.sync_matches.
+
+Запуск: python benchmarks/bench_match_sync.py [--existing 20000] [--batch 1000 5000]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+from match_sync import sync_matches
+from models import db, Match
+
+FORMATS = ['T20 International', 'ODI', 'Test Match']
+START_DAY = date(2024, 1, 1)
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def scraped_match(i):
+    day = START_DAY + timedelta(days=i % 365)
+    return {
+        'team1': f'Team {i}',
+        'team2': f'Rival {i}',
+        'venue': f'Ground {i % 50}',
+        'format': FORMATS[i % 3],
+        'status': 'Live',
+        'score': f'Team {i} {100 + i % 200}/{i % 10}',
+        'match_date': day.isoformat(),
+    }
+
+
+def make_batch(existing, size, rng):
+    """Треть новых, треть с новым счетом, треть без изменений"""
+    batch = []
+    for n in range(size):
+        kind = n % 3
+        if kind == 0:
+            batch.append(scraped_match(existing + n))
+        else:
+            match = scraped_match(rng.randrange(existing))
+            if kind == 1:
+                match['score'] += ' *'
+                match['status'] = 'Finished'
+            batch.append(match)
+    return batch
+
+
+def legacy_loop(matches_data):
+    """Копия прежнего кода scrape_matches"""
+    matches_added = 0
+    for match_data in matches_data:
+        existing_match = Match.query.filter_by(
+            team1=match_data.get('team1', ''),
+            team2=match_data.get('team2', '')
+        ).first()
+        if not existing_match:
+            db.session.add(Match(
+                team1=match_data.get('team1', 'Team A'),
+                team2=match_data.get('team2', 'Team B'),
+                venue=match_data.get('venue', 'Неизвестно'),
+                format=match_data.get('format', 'Неизвестно'),
+                status=match_data.get('status', 'Scheduled'),
+                score=match_data.get('score', ''),
+                match_date=datetime.utcnow()
+            ))
+            matches_added += 1
+    db.session.commit()
+    return matches_added
+
+
+def run(existing, batch_size):
+    rng = random.Random(7)
+    batch = make_batch(existing, batch_size, rng)
+    timings = {}
+    for name in ('legacy', 'sync'):
+        with tempfile.TemporaryDirectory() as tmp:
+            app = create_app(os.path.join(tmp, 'bench.db'))
+            with app.app_context():
+                db.create_all()
+                db.session.execute(insert(Match), [
+                    {**{k: v for k, v in scraped_match(i).items() if k != 'match_date'},
+                     'match_date': datetime.fromisoformat(scraped_match(i)['match_date']),
+                     'match_day': date.fromisoformat(scraped_match(i)['match_date'])}
+                    for i in range(existing)
+                ])
+                db.session.commit()
+
+                start = time.perf_counter()
+                if name == 'legacy':
+                    outcome = f"добавлено {legacy_loop(batch)}, счет не обновляется"
+                else:
+                    result = sync_matches(batch)
+                    outcome = (f"добавлено {result.inserted}, обновлено {result.updated}, "
+                               f"без изменений {result.unchanged}")
+                timings[name] = time.perf_counter() - start
+                print(f"  {name:<7} {timings[name]:8.3f} с ({batch_size / timings[name]:>10,.0f} матчей/с) | {outcome}")
+                db.session.remove()
+                db.engine.dispose()
+    print(f"  ускорение x{timings['legacy'] / timings['sync']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--existing', type=int, default=20_000)
+    parser.add_argument('--batch', type=int, nargs='+', default=[1000, 5000])
+    args = parser.parse_args()
+
+    print("=== Бенчмарк синхронизации матчей ===")
+    for batch_size in args.batch:
+        print(f"\nВ базе {args.existing:,} матчей, пачка из {batch_size:,}:")
+        run(args.existing, batch_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Микробенчмарки горячих функций для сравнения релизов: расчет очков
+(score_calculator.py, поштучный и колоночный) и сериализация ответов API
+(to_dict моделей и *_row_to_dict из serializers.py).
+
+Данные - сгенерированный набор (datagen.py) во временной SQLite: реальные
+строки результатов запросов и ORM-объекты, стат-линии - входные данные
+сохраненных очков. Каждая функция прогоняется --repeats кругами пачками
+не короче ~0.1 с; в отчете - лучшее и медианное время на операцию.
+
+Запуск: python benchmarks/bench_micro.py [--matches 500] [--repeats 5] [--json micro.json] [--baseline prev.json]
+"""
+import argparse
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy.orm import joinedload
+
+import report
+from datagen import create_app, generate
+from migrations import upgrade
+from models import db, Contest, Match, MatchInnings, Player, PlayerPoints
+from recompute import BATTING_FIELDS, BOWLING_FIELDS, FIELDING_FIELDS, deserialize_inputs
+from score_calculator import (calculate_batting_points, calculate_bowling_points, calculate_fielding_points,
+                              calculate_points, calculate_points_batch, encode_dismissals)
+from score_parser import innings_to_dict
+from serializers import (MATCH_COLUMNS, PLAYER_COLUMNS, POINTS_COLUMNS, match_row_to_dict, player_row_to_dict,
+                         points_row_to_dict)
+
+BATCH_SIZES = (22, 1000, 100000)
+MIN_TIME = 0.1  # с на один замер
+PAGE = 500
+
+
+def calibrate(func) -> int:
+    """Сколько вызовов func() занимают не меньше MIN_TIME"""
+    func()  # прогрев
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        elapsed = time.perf_counter() - started
+        if elapsed >= MIN_TIME:
+            return loops
+        loops *= 2 if elapsed <= 0 else max(2, int(MIN_TIME / elapsed * 1.2))
+
+
+def measure(cases, repeats: int) -> dict:
+    """
+    нс на операцию для (имя, func, ops): замеры идут кругами по всем
+    функциям, чтобы замедление машины на время одного круга не испортило
+    все замеры одной функции; берется лучший круг. Без сборки мусора, как timeit.
+    """
+    loops = {name: calibrate(func) for name, func, _ in cases}
+    timings = {name: [] for name, _, _ in cases}
+    gc.collect()
+    gc.disable()
+    try:
+        for _ in range(repeats):
+            for name, func, ops in cases:
+                started = time.perf_counter()
+                for _ in range(loops[name]):
+                    func()
+                timings[name].append((time.perf_counter() - started) / (loops[name] * ops) * 1e9)
+    finally:
+        gc.enable()
+    results = {}
+    for name, per_op in timings.items():
+        best = min(per_op)
+        results[name] = {'ns_per_op': round(best, 1), 'median_ns': round(statistics.median(per_op), 1),
+                         'ops_per_s': round(1e9 / best, 1)}
+    return results
+
+
+def columns(lines, size):
+    """Колонки calculate_points_batch из стат-линий, повторенных до size"""
+    picked = [lines[i % len(lines)] for i in range(size)]
+    batting = {name: np.array([line[name] for line in picked]) for name in BATTING_FIELDS if name != 'dismissal_type'}
+    batting['dismissal_type'] = encode_dismissals([line['dismissal_type'] for line in picked])
+    bowling = {name: np.array([line[name] for line in picked], dtype=np.float64) for name in BOWLING_FIELDS}
+    fielding = {name: np.array([line[name] for line in picked]) for name in FIELDING_FIELDS}
+    return [line['role'] for line in picked], batting, bowling, fielding
+
+
+def scoring_cases(lines):
+    batting = [{name: line[name] for name in BATTING_FIELDS} for line in lines]
+    bowling = [{name: line[name] for name in BOWLING_FIELDS} for line in lines]
+    fielding = [{name: line[name] for name in FIELDING_FIELDS} for line in lines]
+    roles = [line['role'] for line in lines]
+    stat_lines = list(zip(roles, batting, bowling, fielding))
+    cases = [
+        ('scoring.calculate_batting_points', lambda: [calculate_batting_points(b) for b in batting], len(lines)),
+        ('scoring.calculate_bowling_points', lambda: [calculate_bowling_points(b) for b in bowling], len(lines)),
+        ('scoring.calculate_fielding_points', lambda: [calculate_fielding_points(f) for f in fielding], len(lines)),
+        ('scoring.calculate_points', lambda: [calculate_points(*line) for line in stat_lines], len(lines)),
+    ]
+    for size in BATCH_SIZES:
+        args = columns(lines, size)
+        # на операцию - один игрок пачки
+        cases.append((f'scoring.calculate_points_batch[{size}]', lambda args=args: calculate_points_batch(*args), size))
+    return cases
+
+
+def serializer_cases():
+    matches = db.session.query(Match).limit(PAGE).all()
+    players = db.session.query(Player).limit(PAGE).all()
+    points = (db.session.query(PlayerPoints)
+              .options(joinedload(PlayerPoints.player), joinedload(PlayerPoints.match)).limit(PAGE).all())
+    contests = [Contest(id=i, name=f'Contest {i}', match_id=matches[i % len(matches)].id,
+                        created_at=datetime(2025, 1, 1, 12, i % 60)) for i in range(PAGE)]
+    match_rows = db.session.query(*MATCH_COLUMNS).limit(PAGE).all()
+    player_rows = db.session.query(*PLAYER_COLUMNS).limit(PAGE).all()
+    points_rows = (db.session.query(*POINTS_COLUMNS).join(Player, PlayerPoints.player_id == Player.id)
+                   .outerjoin(Match, PlayerPoints.match_id == Match.id).limit(PAGE).all())
+    innings_rows = db.session.query(MatchInnings).limit(PAGE).all()
+    return [
+        ('to_dict.Match', lambda: [m.to_dict() for m in matches], len(matches)),
+        ('to_dict.Player', lambda: [p.to_dict() for p in players], len(players)),
+        ('to_dict.PlayerPoints', lambda: [p.to_dict() for p in points], len(points)),
+        ('to_dict.Contest', lambda: [c.to_dict() for c in contests], len(contests)),
+        ('serializers.match_row_to_dict', lambda: [match_row_to_dict(r) for r in match_rows], len(match_rows)),
+        ('serializers.player_row_to_dict', lambda: [player_row_to_dict(r) for r in player_rows], len(player_rows)),
+        ('serializers.points_row_to_dict', lambda: [points_row_to_dict(r) for r in points_rows], len(points_rows)),
+        ('serializers.innings_to_dict', lambda: [innings_to_dict(r) for r in innings_rows], len(innings_rows)),
+        # Страница /api/matches целиком: словари + JSON
+        (f'serializers.match_page_json[{len(match_rows)}]',
+         lambda: json.dumps([match_row_to_dict(r) for r in match_rows]), 1),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=500, help='размер сгенерированного набора')
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--filter', help='только бенчмарки, в имени которых есть эта строка')
+    report.add_arguments(parser)
+    args = parser.parse_args()
+
+    print(f"=== Микробенчмарки: {args.matches:,} матчей (seed {args.seed}), повторов {args.repeats} ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'micro.db'))
+        with app.app_context():
+            upgrade()
+            generate(args.matches, seed=args.seed, rollups=False, verbose=False)
+            lines = [deserialize_inputs(inputs) for (inputs,) in
+                     db.session.query(PlayerPoints.inputs).order_by(PlayerPoints.id).limit(PAGE)]
+            cases = [case for case in scoring_cases(lines) + serializer_cases()
+                     if not args.filter or args.filter in case[0]]
+            results = measure(cases, args.repeats)
+            for name, result in results.items():
+                print(f"  {name:<44} {result['ns_per_op']:12,.1f} нс/оп (медиана {result['median_ns']:,.1f}), "
+                      f"{result['ops_per_s']:14,.0f} оп/с")
+            db.session.remove()
+
+    parameters = {'matches': args.matches, 'repeats': args.repeats, 'seed': args.seed}
+    sys.exit(report.finish(args, 'micro', parameters, results, {'ns_per_op': False}))
+
+
+if __name__ == "__main__":
+    main()
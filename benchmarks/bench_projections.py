@@ -0,0 +1,127 @@
+"""
+Бенчмарк прогноза очков (projections.py): скорость симуляций Монте-Карло
+для матча из 22 игроков в процессе и в пуле из разного числа процессов,
+воспроизводимость (тот же seed - тот же результат при любом числе процессов)
+и сравнение с поштучным расчетом (calculate_points на каждую стат-линию).
+
+Запуск: python benchmarks/bench_projections.py [--simulations 100000] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+
+from config import init_database
+from migrations import upgrade
+from models import db, Match, Player
+from projections import CHUNK_SIZE, ProjectionEngine, build_model, simulate, simulate_chunk, _rules_for
+from score_calculator import calculate_points
+
+ROLES = ('batsman',) * 5 + ('wicket-keeper',) + ('all-rounder',) * 2 + ('bowler',) * 3
+SCALAR_SIMULATIONS = 2000
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def populate():
+    """Предстоящий T20-матч: две команды по 11 игроков без истории (априорные значения ролей)"""
+    match = Match(team1='India', team2='Australia', venue='Ground', format='T20', status='Scheduled')
+    db.session.add(match)
+    db.session.flush()
+    for team in (match.team1, match.team2):
+        for i, role in enumerate(ROLES):
+            db.session.add(Player(name=f'{team} {i}', role=role, team=team, match_id=match.id))
+    db.session.commit()
+    return match
+
+
+def scalar_points(model, simulations, seed):
+    """Те же стат-линии, но очки - calculate_points на каждого игрока каждой симуляции"""
+    import projections
+    lines = {}
+    original = projections.calculate_points_batch
+
+    def capture(roles, batting, bowling, fielding, rules):
+        lines.update(batting=batting, bowling=bowling, fielding=fielding)
+        return original(roles, batting, bowling, fielding, rules)
+
+    projections.calculate_points_batch = capture
+    try:
+        simulate_chunk(model, simulations, np.random.SeedSequence(seed))
+    finally:
+        projections.calculate_points_batch = original
+    rules = _rules_for(model)
+    dismissal_kinds = {code: kind for kind, code in projections.DISMISSAL_CODES.items()}
+
+    started = time.perf_counter()
+    for row in range(simulations):
+        for column, role in enumerate(model['roles']):
+            pick = lambda section: {name: values[row, column] if np.ndim(values) == 2 else values[column]
+                                    for name, values in lines[section].items()}
+            batting = pick('batting')
+            batting['dismissal_type'] = dismissal_kinds.get(int(batting['dismissal_type']))
+            calculate_points(role, batting, pick('bowling'), pick('fielding'), rules)
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--simulations', type=int, default=100000)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"=== Бенчмарк прогноза: {args.simulations:,} симуляций, 22 игрока, "
+          f"пачки по {CHUNK_SIZE:,}, ядер: {os.cpu_count()} ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'projections.db'))
+        with app.app_context():
+            upgrade()
+            model = build_model(populate())
+
+            elapsed = scalar_points(model, SCALAR_SIMULATIONS, 0)
+            scalar_rate = SCALAR_SIMULATIONS / elapsed
+            print(f"  поштучный calculate_points: {scalar_rate:12,.0f} симуляций/с "
+                  f"(≈{args.simulations / scalar_rate:.1f} с на {args.simulations:,})")
+
+            reference = None
+            for workers in args.workers:
+                engine = ProjectionEngine(workers=workers)
+                executor = engine.executor()
+                started = time.perf_counter()
+                simulate(model, CHUNK_SIZE * max(workers, 1), 0, executor)  # запуск процессов пула
+                warmup = time.perf_counter() - started
+
+                timings = []
+                for _ in range(args.repeats):
+                    started = time.perf_counter()
+                    points = simulate(model, args.simulations, 0, executor)
+                    timings.append(time.perf_counter() - started)
+                engine.shutdown()
+
+                if reference is None:
+                    reference = points
+                same = '✅' if np.array_equal(points, reference) else '❌'
+                best = min(timings)
+                print(f"  процессов {workers}: {best * 1000:8.1f} мс, {args.simulations / best:12,.0f} симуляций/с "
+                      f"(запуск пула {warmup * 1000:.0f} мс), результат как у 1 процесса {same}")
+
+            means = reference.mean(axis=0)
+            print(f"  средний прогноз: бэттер {means[0]:.1f}, уикет-кипер {means[5]:.1f}, "
+                  f"боулер {means[8]:.1f} очков")
+
+
+if __name__ == "__main__":
+    main()
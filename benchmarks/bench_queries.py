@@ -0,0 +1,151 @@
+"""
+Бенчмарк слоя списков (queries.py): время страницы игроков и матчей с
+фильтрами, поиском и сортировкой при растущей таблице - против прежней
+загрузки всей таблицы (.all()), которую страницы передавали в шаблон.
+Для каждого сценария печатается план запроса SQLite (какой индекс выбран).
+
+Запуск: python benchmarks/bench_queries.py [--players 10000 100000 1000000] [--queries 50]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event, insert, text
+
+from config import init_database
+from models import db, Match, Player
+from migrations import upgrade
+from queries import PAGE_SIZE, match_page, player_page
+from serializers import PLAYER_COLUMNS, match_row_to_dict, player_row_to_dict
+
+FIRST_NAMES = ('Virat', 'Rohit', 'Steve', 'Joe', 'Kane', 'Babar', 'Ben', 'Pat', 'Shaheen', 'Rashid')
+LAST_NAMES = ('Kohli', 'Sharma', 'Smith', 'Root', 'Williamson', 'Azam', 'Stokes', 'Cummins', 'Afridi', 'Khan')
+TEAMS = ('India', 'Australia', 'England', 'Pakistan', 'New Zealand', 'Afghanistan')
+STATUSES = ('Live', 'Finished', 'Scheduled')
+CHUNK = 50000
+
+PLAYER_SCENARIOS = (
+    ('по id', {}),
+    ('роль, сортировка по ранам', {'role': 'batsman', 'sort': '-runs'}),
+    ('команда + min_runs', {'team': 'India', 'min_runs': '90'}),
+    ('поиск по имени', {'q': 'vir koh'}),
+    ('поиск + сортировка по имени', {'q': 'smi', 'sort': 'name'}),
+)
+MATCH_SCENARIOS = (
+    ('по id', {}),
+    ('статус, новые по дате', {'status': 'Live', 'sort': '-date'}),
+    ('диапазон дат + формат', {'date_from': '2024-03-01', 'date_to': '2024-03-31', 'format': 'ODI'}),
+    ('поиск по команде', {'q': 'new zea'}),
+)
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def populate(players):
+    rng = random.Random(1)
+    matches = max(1, players // 22)
+    first_day = date(2020, 1, 1).toordinal()
+    for start in range(0, matches, CHUNK):
+        db.session.execute(insert(Match), [
+            {'team1': TEAMS[i % len(TEAMS)], 'team2': f'{TEAMS[(i + 1) % len(TEAMS)]} {i}',
+             'venue': f'Ground {i % 40}', 'format': ('T20', 'ODI', 'Test')[i % 3],
+             'status': rng.choice(STATUSES), 'match_day': date.fromordinal(first_day + i % 2000)}
+            for i in range(start, min(start + CHUNK, matches))
+        ])
+    for start in range(0, players, CHUNK):
+        db.session.execute(insert(Player), [
+            {'name': f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}', 'role': ('batsman', 'bowler', 'all-rounder')[i % 3],
+             'team': TEAMS[i % len(TEAMS)], 'match_id': 1 + i % matches,
+             'runs': rng.randrange(120), 'wickets': rng.randrange(6), 'balls_faced': rng.randrange(90)}
+            for i in range(start, min(start + CHUNK, players))
+        ])
+        db.session.commit()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+
+
+def plan(page, args) -> str:
+    """План SQLite для запроса страницы: перехватывается последний SELECT"""
+    statements = []
+    connection = db.session.connection()
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(connection, 'before_cursor_execute', capture)
+    try:
+        page(args, PAGE_SIZE)
+    finally:
+        event.remove(connection, 'before_cursor_execute', capture)
+    statement, parameters = statements[-1]
+    rows = connection.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).all()
+    return '; '.join(row[-1] for row in rows)
+
+
+def timed_page(page, to_dict, args, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        rows, cursor = page(args, PAGE_SIZE)
+        body = json.dumps([to_dict(row) for row in rows])
+    # Следующая страница по курсору - та же цена
+    if cursor:
+        page({**args, 'cursor': cursor}, PAGE_SIZE)
+    return (time.perf_counter() - started) / repeats, len(body)
+
+
+def bench(tmp, players, queries, show_plans):
+    app = create_app(os.path.join(tmp, f'queries_{players}.db'))
+    with app.app_context():
+        upgrade()  # схема с FTS-индексами и триггерами
+        started = time.perf_counter()
+        populate(players)
+        print(f"\n{players:,} игроков (наполнение с FTS-триггерами {time.perf_counter() - started:.1f} с):")
+
+        started = time.perf_counter()
+        rows = db.session.query(*PLAYER_COLUMNS).all()
+        body = json.dumps([player_row_to_dict(row) for row in rows])
+        full = time.perf_counter() - started
+        print(f"  вся таблица (.all(), как раньше): {full * 1000:9.1f} мс, {len(body) / 1024 / 1024:7.1f} МБ")
+
+        for label, args in PLAYER_SCENARIOS:
+            elapsed, size = timed_page(player_page, player_row_to_dict, args, queries)
+            print(f"  игроки: {label:<30} {elapsed * 1000:7.2f} мс, {size / 1024:6.1f} КБ")
+            if show_plans:
+                print(f"      {plan(player_page, args)}")
+        for label, args in MATCH_SCENARIOS:
+            elapsed, size = timed_page(match_page, match_row_to_dict, args, queries)
+            print(f"  матчи:  {label:<30} {elapsed * 1000:7.2f} мс, {size / 1024:6.1f} КБ")
+            if show_plans:
+                print(f"      {plan(match_page, args)}")
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--players', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--plans', action='store_true', help='печатать планы запросов')
+    args = parser.parse_args()
+
+    print(f"=== Бенчмарк списков: страница {PAGE_SIZE} строк ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        for players in args.players:
+            bench(tmp, players, args.queries, args.plans)
+
+
+if __name__ == "__main__":
+    main()
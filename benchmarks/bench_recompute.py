@@ -0,0 +1,207 @@
+"""
+Бенчмарк пересчета очков: прежняя схема (каждый расчет - новая строка
+PlayerPoints) против идемпотентного пересчета (recompute.py) на
+повторяющихся раундах, где между раундами меняется малая доля
+входных данных. Затем - пересчет всей таблицы после изменения набора
+правил (rescore_all): скорость и пиковая память Python.
+
+Запуск: python benchmarks/bench_recompute.py [--pairs 20000] [--rounds 10] [--changed 0.05] [--rescore-rows 200000]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert
+
+import recompute
+from config import init_database
+from models import db, Match, Player, PlayerPoints, PointsHistory
+from recompute import rescore_all, score_inputs, scoring_inputs, serialize_inputs, fingerprint
+from scoring_rules import RULES_DIR, get_rule_book, reload_rule_book
+
+CHUNK = 2000
+ROLES = ('batsman', 'bowler', 'all-rounder')
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def file_size(path):
+    return sum(os.path.getsize(path + suffix) for suffix in ('', '-wal') if os.path.exists(path + suffix))
+
+
+def drop_unique_constraint():
+    """Таблица PlayerPoints в прежнем виде - без уникальности (игрок, матч)"""
+    ddl = db.session.execute(db.text(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'player_points'")).scalar()
+    ddl = re.sub(r',\s*CONSTRAINT uq_player_points_player_match UNIQUE \([^)]*\)', '', ddl)
+    db.session.execute(db.text('DROP TABLE player_points'))
+    db.session.execute(db.text(ddl))
+    db.session.commit()
+
+
+def create_pairs(count):
+    """По одному игроку на пару (игрок, матч), матчей - count / 22"""
+    matches = max(1, count // 22)
+    db.session.execute(insert(Match), [{'team1': f'Home {i}', 'team2': f'Away {i}', 'status': 'Live'}
+                                       for i in range(matches)])
+    rng = random.Random(1)
+    db.session.execute(insert(Player), [
+        {'name': f'Player {i}', 'role': ROLES[i % 3], 'team': f'Team {i % 50}', 'match_id': 1 + i % matches,
+         'runs': rng.randrange(120), 'balls_faced': rng.randrange(1, 90),
+         'wickets': rng.randrange(6), 'runs_conceded': rng.randrange(60)}
+        for i in range(count)
+    ])
+    db.session.commit()
+    return [{'player_id': 1 + i, 'match_id': 1 + i % matches, 'fours': 0} for i in range(count)]
+
+
+def rounds_of(items, rounds, changed):
+    """Раунды расчета: в каждом следующем у доли пар меняются данные запроса"""
+    rng = random.Random(2)
+    current = [dict(item) for item in items]
+    for _ in range(rounds):
+        yield current
+        for item in rng.sample(current, int(len(current) * changed)):
+            item['fours'] += 1
+
+
+def run_append_only(items):
+    """Прежняя схема: /api/calculate/batch вставлял строку на каждый расчет"""
+    now = datetime.utcnow()
+    players = {p.id: p for p in db.session.query(
+        Player.id, Player.role, Player.runs, Player.balls_faced, Player.wickets, Player.runs_conceded)}
+    for start in range(0, len(items), CHUNK):
+        chunk = items[start:start + CHUNK]
+        points = score_inputs([scoring_inputs(players[item['player_id']], None, item) for item in chunk])
+        db.session.execute(insert(PlayerPoints), [
+            {'player_id': item['player_id'], 'match_id': item['match_id'], 'points': value, 'calculation_date': now}
+            for item, value in zip(chunk, points)
+        ])
+        db.session.commit()
+    return len(items)
+
+
+def run_recompute(items):
+    written = 0
+    for start in range(0, len(items), CHUNK):
+        result = recompute.recompute(items[start:start + CHUNK])
+        written += result.inserted + result.updated
+    return written
+
+
+def bench_rounds(tmp, pairs, rounds, changed):
+    print(f"\n{pairs:,} пар (игрок, матч), {rounds} раундов расчета, между раундами меняется {changed:.0%} пар:")
+    for name, runner in (('append-only', run_append_only), ('recompute', run_recompute)):
+        path = os.path.join(tmp, f'{name}.db')
+        app = create_app(path)
+        with app.app_context():
+            db.create_all()
+            if runner is run_append_only:
+                drop_unique_constraint()
+            items = create_pairs(pairs)
+            db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+            base_size = file_size(path)
+
+            written, timings = 0, []
+            for round_items in rounds_of(items, rounds, changed):
+                started = time.perf_counter()
+                written += runner(round_items)
+                timings.append(time.perf_counter() - started)
+            db.session.execute(db.text('PRAGMA wal_checkpoint(TRUNCATE)'))
+
+            rows = db.session.query(PlayerPoints).count()
+            history = db.session.query(PointsHistory).count()
+            later = sum(timings[1:]) / max(1, len(timings) - 1)
+            print(f"  {name:<12} записано строк {written:>9,} | PlayerPoints {rows:>9,}, история {history:>7,} | "
+                  f"прирост файла {(file_size(path) - base_size) / 1024 / 1024:6.1f} МБ | "
+                  f"1-й раунд {timings[0]:5.2f} с, следующие {later:5.2f} с")
+            db.session.remove()
+            db.engine.dispose()
+
+
+def change_rules(tmp):
+    """Копия rules/ с новой версией default (очки за ран 1.0 -> 1.5), как после правки файла"""
+    directory = os.path.join(tmp, 'rules')
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(RULES_DIR):
+        with open(os.path.join(RULES_DIR, name), encoding='utf-8') as f:
+            definition = json.load(f)
+        if definition['name'] == 'default':
+            definition['version'] += 1
+            definition['batting']['per_run'] = 1.5
+        with open(os.path.join(directory, name), 'w', encoding='utf-8') as f:
+            json.dump(definition, f)
+    reload_rule_book(directory)
+
+
+def bench_rescore(tmp, rows, chunk_size):
+    print(f"\nПересчет {rows:,} записей после изменения правил (пачки по {chunk_size}):")
+    path = os.path.join(tmp, 'rescore.db')
+    app = create_app(path)
+    with app.app_context():
+        db.create_all()
+        items = create_pairs(min(rows, 50000))
+        players = {p.id: p for p in db.session.query(
+            Player.id, Player.role, Player.runs, Player.balls_faced, Player.wickets, Player.runs_conceded)}
+        now = datetime.utcnow()
+        rules = get_rule_book().default
+        rng = random.Random(3)
+        for start in range(0, rows, 10000):
+            batch = []
+            for n in range(start, min(rows, start + 10000)):
+                item = items[n % len(items)]
+                inputs = scoring_inputs(players[item['player_id']], None, {'fours': rng.randrange(10)})
+                inputs_json = serialize_inputs(inputs)
+                batch.append({'player_id': item['player_id'], 'match_id': item['match_id'] + n // len(items) * 100000,
+                              'points': 0.0, 'calculation_date': now, 'rules_version': rules.version,
+                              'inputs_hash': fingerprint(inputs_json, rules), 'inputs': inputs_json})
+            db.session.execute(insert(PlayerPoints), batch)
+            db.session.commit()
+
+        change_rules(tmp)
+        tracemalloc.start()
+        started = time.perf_counter()
+        progress = {}
+        for progress in rescore_all(chunk_size):
+            pass
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"  {progress['rescored']:,} записей за {elapsed:.1f} с ({progress['rescored'] / elapsed:,.0f} записей/с), "
+              f"изменились очки у {progress['changed']:,}; пик памяти Python {peak / 1024 / 1024:.1f} МБ")
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pairs', type=int, default=20000)
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--changed', type=float, default=0.05)
+    parser.add_argument('--rescore-rows', type=int, default=200000)
+    parser.add_argument('--chunk-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    print("=== Бенчмарк пересчета очков ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        bench_rounds(tmp, args.pairs, args.rounds, args.changed)
+        bench_rescore(tmp, args.rescore_rows, args.chunk_size)
+
+
+if __name__ == "__main__":
+    main()
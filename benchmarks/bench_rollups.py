@@ -0,0 +1,124 @@
+"""
+Бенчмарк витрин (rollups.py): сворачивание завершенных матчей и время
+ответа итогов игрока и команды при растущей истории матчей - из витрин
+против группировки строк Player на лету.
+
+Запуск: python benchmarks/bench_rollups.py [--matches 1000 10000 50000] [--queries 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, insert
+
+from config import init_database
+from models import db, Match, Player, PlayerPoints
+from rollups import fold_pending, player_summary, team_summary
+
+PERSONS = 300
+TEAMS = 12
+PLAYERS_PER_MATCH = 22
+FORMATS = ('T20', 'ODI', 'Test')
+FIRST_DAY = date(2010, 1, 1).toordinal()
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def populate(matches):
+    """Матчи подряд по дням (сезонов - по числу лет); игроки - из общего пула, строка Player на каждый матч"""
+    rng = random.Random(1)
+    first = 1
+    for start in range(0, matches, 2000):
+        count = min(2000, matches - start)
+        db.session.execute(insert(Match), [
+            {'team1': f'Team {i % TEAMS}', 'team2': f'Team {(i + 1) % TEAMS}', 'status': 'Finished',
+             'format': FORMATS[i % 3], 'match_day': date.fromordinal(FIRST_DAY + i // TEAMS)}
+            for i in range(start, start + count)
+        ])
+        players = []
+        for m in range(start, start + count):
+            for slot in range(PLAYERS_PER_MATCH):
+                person = (m * 7 + slot) % PERSONS
+                players.append({'name': f'Player {person}', 'role': 'batsman', 'match_id': m + 1,
+                                'team': f'Team {(m + slot // 11) % TEAMS}',
+                                'runs': rng.randrange(120), 'balls_faced': rng.randrange(1, 90),
+                                'wickets': rng.randrange(4), 'runs_conceded': rng.randrange(50)})
+        db.session.execute(insert(Player), players)
+        db.session.execute(insert(PlayerPoints), [
+            {'player_id': first + n, 'match_id': row['match_id'], 'points': float(rng.randrange(150))}
+            for n, row in enumerate(players)
+        ])
+        first += len(players)
+        db.session.commit()
+
+
+def timed(func, repeats):
+    started = time.perf_counter()
+    for _ in range(repeats):
+        func()
+    return (time.perf_counter() - started) / repeats
+
+
+def on_the_fly(name):
+    """Итоги без витрин: группировка всех строк игрока по формату"""
+    return (db.session.query(Match.format, func.count(), func.sum(Player.runs), func.sum(Player.wickets),
+                             func.sum(PlayerPoints.points))
+            .join(Match, Match.id == Player.match_id)
+            .outerjoin(PlayerPoints, (PlayerPoints.player_id == Player.id) & (PlayerPoints.match_id == Player.match_id))
+            .filter(Player.name == name)
+            .group_by(Match.format)
+            .all())
+
+
+def bench(tmp, matches, queries):
+    app = create_app(os.path.join(tmp, f'rollups_{matches}.db'))
+    with app.app_context():
+        db.create_all()
+        populate(matches)
+
+        started = time.perf_counter()
+        progress = {}
+        for progress in fold_pending(500):
+            pass
+        folded = time.perf_counter() - started
+
+        rng = random.Random(2)
+        persons = iter([rng.randrange(1, PERSONS + 1) for _ in range(queries)])
+        names = iter([f'Player {rng.randrange(PERSONS)}' for _ in range(queries)])
+        teams = iter([f'Team {rng.randrange(TEAMS)}' for _ in range(queries)])
+        player = timed(lambda: player_summary(next(persons)), queries)
+        team = timed(lambda: team_summary(next(teams)), queries)
+        naive = timed(lambda: on_the_fly(next(names)), max(1, queries // 10))
+        print(f"  {matches:>7,} матчей ({progress['lines']:>9,} строк игроков): сворачивание "
+              f"{progress['lines'] / folded:8,.0f} строк/с | игрок {player * 1000:5.2f} мс, "
+              f"команда {team * 1000:5.2f} мс | на лету {naive * 1000:7.2f} мс")
+        db.session.remove()
+        db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--queries', type=int, default=200)
+    args = parser.parse_args()
+
+    print("=== Бенчмарк витрин игроков и команд ===")
+    with tempfile.TemporaryDirectory() as tmp:
+        for matches in args.matches:
+            bench(tmp, matches, args.queries)
+
+
+if __name__ == "__main__":
+    main()
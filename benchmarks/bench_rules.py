@@ -0,0 +1,184 @@
+"""
+Микро-бенчмарк правил подсчета очков: загрузка и компиляция rules/*.json,
+стоимость одного вызова (скомпилированные правила против прежних
+if/elif) и стоимость пачки на игрока для каждого формата и для смешанной
+пачки (T20 + ODI + Test).
+
+Запуск: python benchmarks/bench_rules.py [--calls 200000] [--sizes 1000 100000 1000000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_scoring import generate_stat_lines, score_batch
+from score_calculator import calculate_points, encode_dismissals
+from scoring_rules import get_rule_book, load_rule_book
+
+FORMATS = ('T20 International', 'ODI', 'Test Match')
+
+
+def legacy_batting(batting):
+    """Прежний calculate_batting_points: правила зашиты в цепочки if/elif"""
+    points = 0.0
+    runs = batting.get('runs', 0)
+    points += runs * 1.0
+    balls_faced = batting.get('balls_faced', 1)
+    strike_rate = (runs / balls_faced) * 100 if balls_faced > 0 else 0
+    if strike_rate > 140:
+        points += 20
+    elif strike_rate > 120:
+        points += 10
+    elif strike_rate < 60:
+        points -= 10
+    points += batting.get('fours', 0) * 0.5
+    points += batting.get('sixes', 0) * 1.0
+    if runs >= 100:
+        points += 25
+    elif runs >= 50:
+        points += 10
+    dismissal = batting.get('dismissal_type', 'not_out')
+    if dismissal == 'bowled' or dismissal == 'lbw':
+        points -= 5
+    elif dismissal == 'not_out':
+        points += 10
+    return round(points, 2)
+
+
+def legacy_bowling(bowling):
+    points = 0.0
+    wickets = bowling.get('wickets', 0)
+    points += wickets * 20
+    if wickets >= 5:
+        points += 25
+    elif wickets >= 3:
+        points += 10
+    runs_conceded = bowling.get('runs_conceded', 0)
+    overs_bowled = bowling.get('overs_bowled', 1)
+    economy_rate = runs_conceded / overs_bowled if overs_bowled > 0 else float('inf')
+    if economy_rate < 5.0:
+        points += 20
+    elif economy_rate < 7.0:
+        points += 10
+    elif economy_rate > 10.0:
+        points -= 10
+    points += bowling.get('maidens', 0) * 10
+    return round(points, 2)
+
+
+def legacy_fielding(fielding):
+    points = 0.0
+    points += fielding.get('catches', 0) * 10
+    points += fielding.get('stumpings', 0) * 12
+    points += fielding.get('run_outs', 0) * 15
+    return round(points, 2)
+
+
+def legacy_points(role, batting, bowling, fielding):
+    """Сложение прежних функций по роли, как в /api/calculate до наборов правил"""
+    points = 0.0
+    if role == 'batsman':
+        points += legacy_batting(batting)
+    elif role == 'bowler':
+        points += legacy_bowling(bowling)
+    points += legacy_fielding(fielding)
+    return round(points, 2)
+
+
+def stat_dicts(lines, count):
+    rows = []
+    for i in range(count):
+        rows.append((
+            str(lines['role'][i]),
+            {'runs': int(lines['runs'][i]), 'balls_faced': int(lines['balls_faced'][i]),
+             'fours': int(lines['fours'][i]), 'sixes': int(lines['sixes'][i]),
+             'dismissal_type': str(lines['dismissal_type'][i])},
+            {'wickets': int(lines['wickets'][i]), 'runs_conceded': int(lines['runs_conceded'][i]),
+             'overs_bowled': float(lines['overs_bowled'][i]), 'maidens': int(lines['maidens'][i])},
+            {'catches': int(lines['catches'][i]), 'stumpings': int(lines['stumpings'][i]),
+             'run_outs': int(lines['run_outs'][i])},
+        ))
+    return rows
+
+
+def bench_load():
+    runs = 50
+    start = time.perf_counter()
+    for _ in range(runs):
+        book = load_rule_book()
+    elapsed = (time.perf_counter() - start) / runs
+    print(f"\nЗагрузка и компиляция {len(book.rule_sets)} наборов правил: {elapsed * 1000:.2f} мс "
+          f"(один раз на процесс)")
+
+
+def bench_calls(calls):
+    print(f"\nОдин вызов ({calls:,} стат-линий по одной):")
+    rows = stat_dicts(generate_stat_lines(calls), calls)
+    book = get_rule_book()
+
+    start = time.perf_counter()
+    expected = [legacy_points(*row) for row in rows]
+    legacy = (time.perf_counter() - start) / calls
+    print(f"  {'прежние if/elif':<22} {legacy * 1e9:8.0f} нс/вызов")
+
+    for match_format in FORMATS:
+        rules = book.for_format(match_format)
+        start = time.perf_counter()
+        actual = [rules.score(*row) for row in rows]
+        compiled = (time.perf_counter() - start) / calls
+        start = time.perf_counter()
+        for row in rows:
+            calculate_points(*row, rules=rules)
+        wrapped = (time.perf_counter() - start) / calls
+        note = ''
+        if rules is book.default:
+            note = ' (совпадает с прежними)' if actual == expected else ' (РАСХОЖДЕНИЕ с прежними)'
+        print(f"  {rules.key:<22} {compiled * 1e9:8.0f} нс/вызов, через calculate_points "
+              f"{wrapped * 1e9:.0f} нс{note}")
+
+
+def bench_batches(sizes):
+    print("\nПачка (calculate_points_batch), нс на игрока:")
+    book = get_rule_book()
+    print(f"  {'строк':>9} | " + " | ".join(f"{book.for_format(f).key:>10}" for f in FORMATS) + " | смешанная")
+    for size in sizes:
+        lines = generate_stat_lines(size)
+        codes = encode_dismissals(list(lines['dismissal_type']))
+        cells = []
+        for match_format in FORMATS:
+            rules = book.for_format(match_format)
+            repeats = max(1, 1_000_000 // size)
+            start = time.perf_counter()
+            for _ in range(repeats):
+                score_batch(lines, codes, rules)
+            cells.append((time.perf_counter() - start) / repeats / size)
+
+        # Смешанная пачка: игроки трех форматов, по расчету на набор правил
+        format_index = np.arange(size) % len(FORMATS)
+        groups = [(book.for_format(f), np.flatnonzero(format_index == i)) for i, f in enumerate(FORMATS)]
+        start = time.perf_counter()
+        points = np.empty(size)
+        for rules, index in groups:
+            points[index] = score_batch({key: values[index] for key, values in lines.items()}, codes[index], rules)
+        mixed = (time.perf_counter() - start) / size
+        print(f"  {size:>9,} | " + " | ".join(f"{cell * 1e9:10.0f}" for cell in cells) + f" | {mixed * 1e9:9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=200_000)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print("=== Бенчмарк правил подсчета очков ===")
+    bench_load()
+    bench_calls(args.calls)
+    bench_batches(args.sizes)
+
+
+if __name__ == "__main__":
+    main()
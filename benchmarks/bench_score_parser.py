@@ -0,0 +1,236 @@
+"""
+Фаззинг и бенчмарк разбора счета (score_parser.py) на корпусе строк.
+
+Корпус (по умолчанию 1 000 000 строк, детерминированный по --seed):
+- сгенерированные счета T20/ODI/Test в разных записях (/ и -, оверы
+  "(20)", "(18.4 ov)", "(45 overs)", "(18.4/20 ov)", d/dec, f/o, target,
+  разделители , ; vs v, команды с числами в названии - "Team 1", "XI 2") -
+  с эталонными иннингами для сверки;
+- мутации таких строк (вставка, удаление, замена символов) и мусор -
+  разбор не должен падать, результат должен оставаться правдоподобным.
+
+Затем - скорость разбора (строк/с) и запрос "live-матчи, где догоняющим
+нужно > 10 ранов за овер" по индексу на --matches матчах против разбора
+всех строк счета в Python (как без хранения иннингов).
+
+Запуск: python benchmarks/bench_score_parser.py [--size 1000000] [--matches 100000] [--write corpus.ndjson]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import insert, text
+
+from config import init_database
+from migrations import upgrade
+from models import db, Match
+from score_parser import MAX_INNINGS, MAX_WICKETS, parse_score, store_scores
+
+TEAMS = ('India', 'Australia', 'England', 'Pakistan', 'New Zealand', 'South Africa', 'Sri Lanka', 'West Indies',
+         'Trinidad and Tobago', 'IND', 'AUS', 'NZ', 'PAK', 'SA', 'Mumbai Indians', 'Royal Challengers Bengaluru',
+         # Числа в названиях: заглушки скрапера ('Team A'), сборные вида "XI 2"
+         'Team A', 'Team 1', 'Team 2', 'XI 2', 'Under 19', 'Invitation XI 11')
+FORMATS = {'T20': 20, 'ODI': 50, 'Test': None}
+TEAM_SEPARATORS = (', ', ' vs ', ' v ', '; ', ' | ', ' vs. ')
+WICKET_SEPARATORS = ('/', '-')
+GARBAGE = 'abc xyz 0123456789/-&,;().: dvsfoDV\t'
+STATUSES = ('Live', 'Finished', 'Scheduled')
+
+
+def overs_text(rng, balls, limit):
+    overs = f"{balls // 6}.{balls % 6}" if balls % 6 else str(balls // 6)
+    style = rng.randrange(4)
+    if style == 0:
+        return f" ({overs})"
+    if style == 1:
+        return f" ({overs} ov)"
+    if style == 2:
+        return f" ({overs} overs)"
+    return f" ({overs}/{limit} ov)"
+
+
+def generate(rng):
+    """Случайный счет: (строка, формат, эталонные иннинги (team, runs, wickets, balls, declared, follow_on))"""
+    match_format = rng.choice(tuple(FORMATS))
+    limit = FORMATS[match_format]
+    teams = rng.sample(TEAMS, 2)
+    per_team = [rng.randint(1, 2), rng.randint(0, 2)] if limit is None else [1, rng.randrange(2)]
+    parts, expected = [], []
+    for team, count in zip(teams, per_team):
+        if count == 0:
+            continue
+        innings_texts = []
+        for number in range(count):
+            runs = rng.randrange(0, 600 if limit is None else 300)
+            declared = limit is None and rng.random() < 0.15
+            all_out = not declared and rng.random() < 0.3
+            wickets = None if all_out else rng.randrange(0, MAX_WICKETS)
+            score = str(runs) if all_out else f"{runs}{rng.choice(WICKET_SEPARATORS)}{wickets}"
+            if declared:
+                score += rng.choice(('d', 'dec', ' d'))
+            balls = None
+            if limit is not None and rng.random() < 0.8:
+                balls = rng.randrange(0, limit * 6 + 1)
+                score += overs_text(rng, balls, limit)
+            follow_on = limit is None and number == 1 and not declared and rng.random() < 0.1
+            if follow_on:
+                score += ' (f/o)'
+            innings_texts.append(score)
+            expected.append((team, runs, MAX_WICKETS if all_out else wickets, balls, declared, follow_on))
+        parts.append(f"{team} " + ' & '.join(innings_texts))
+    return rng.choice(TEAM_SEPARATORS).join(parts), match_format, expected
+
+
+def mutate(rng, value: str) -> str:
+    chars = list(value)
+    for _ in range(rng.randint(1, 4)):
+        action = rng.randrange(3)
+        position = rng.randrange(len(chars) + 1)
+        if action == 0:
+            chars.insert(position, rng.choice(GARBAGE))
+        elif action == 1 and chars:
+            del chars[min(position, len(chars) - 1)]
+        elif chars:
+            chars[min(position, len(chars) - 1)] = rng.choice(GARBAGE)
+    return ''.join(chars)
+
+
+def corpus(size: int, seed: int):
+    """(строка, формат, эталон или None); примерно 70% - счета, 25% - мутации, 5% - мусор"""
+    rng = random.Random(seed)
+    for _ in range(size):
+        value, match_format, expected = generate(rng)
+        roll = rng.random()
+        if roll < 0.7:
+            yield value, match_format, expected
+        elif roll < 0.95:
+            yield mutate(rng, value), match_format, None
+        else:
+            yield ''.join(rng.choice(GARBAGE) for _ in range(rng.randrange(60))), match_format, None
+
+
+def check(value, match_format, expected) -> str:
+    """Ошибка разбора строки или пустая строка"""
+    score = parse_score(value, match_format)
+    if len(score.innings) > MAX_INNINGS:
+        return 'too many innings'
+    for i in score.innings:
+        if i.wickets is not None and not 0 <= i.wickets <= MAX_WICKETS:
+            return 'wickets out of range'
+        if i.balls is not None and i.balls < 0:
+            return 'negative balls'
+    if score.required_rate is not None and (score.required_rate < 0 or score.target is None):
+        return 'bad required rate'
+    if expected is not None:
+        parsed = [(i.team, i.runs, i.wickets, i.balls, i.declared, i.follow_on) for i in score.innings]
+        if parsed != expected:
+            return f'parsed {parsed}, expected {expected}'
+    return ''
+
+
+def fuzz(size, seed, write):
+    out = open(write, 'w', encoding='utf-8') if write else None
+    failures, checked = [], 0
+    started = time.perf_counter()
+    for value, match_format, expected in corpus(size, seed):
+        if out:
+            out.write(json.dumps({'score': value, 'format': match_format, 'innings': expected}) + '\n')
+        try:
+            error = check(value, match_format, expected)
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        checked += 1
+        if error and len(failures) < 10:
+            failures.append((value, error))
+        elif error:
+            failures.append(None)
+    if out:
+        out.close()
+    status = '✅' if not failures else '❌'
+    print(f"  фаззинг: {checked:,} строк, ошибок {len(failures)} {status} ({time.perf_counter() - started:.1f} с)")
+    for failure in failures[:10]:
+        print(f"    {failure[0]!r}: {failure[1]}")
+    return not failures
+
+
+def bench_parse(size, seed):
+    strings = [(value, match_format) for value, match_format, _ in corpus(size, seed)]
+    started = time.perf_counter()
+    for value, match_format in strings:
+        parse_score(value, match_format)
+    elapsed = time.perf_counter() - started
+    print(f"  разбор: {size:,} строк за {elapsed:.2f} с - {size / elapsed:,.0f} строк/с, "
+          f"{elapsed / size * 1e6:.2f} мкс на строку")
+
+
+def bench_query(matches, seed):
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(tmp, 'scores.db')}"
+        init_database(app)
+        with app.app_context():
+            upgrade()
+            rows = []
+            for i in range(matches):
+                value, match_format, _ = generate(rng)
+                rows.append({'team1': f'Team {i}', 'team2': f'Team {i + 1}', 'format': match_format,
+                             'status': rng.choice(STATUSES), 'score': value,
+                             'match_day': date.fromordinal(date(2020, 1, 1).toordinal() + i % 2000)})
+            db.session.execute(insert(Match), rows)
+            started = time.perf_counter()
+            stored = store_scores(db.session.query(Match.id, Match.score, Match.format).all())
+            db.session.commit()
+            db.session.execute(text('ANALYZE'))
+            print(f"  {matches:,} матчей: разбор и запись {stored:,} иннингов за {time.perf_counter() - started:.2f} с")
+
+            started = time.perf_counter()
+            indexed = (db.session.query(Match.id)
+                       .filter(Match.status == 'Live', Match.required_rate > 10)
+                       .order_by(Match.id).all())
+            indexed_time = time.perf_counter() - started
+            statement = str(db.session.query(Match.id).filter(Match.status == 'Live', Match.required_rate > 10)
+                            .statement.compile(compile_kwargs={'literal_binds': True}))
+            plan = '; '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {statement}')))
+
+            started = time.perf_counter()
+            scanned = []
+            for match_id, status, value, match_format in db.session.query(Match.id, Match.status, Match.score,
+                                                                          Match.format):
+                if status == 'Live':
+                    rate = parse_score(value, match_format).required_rate
+                    if rate is not None and rate > 10:
+                        scanned.append(match_id)
+            scan_time = time.perf_counter() - started
+            same = '✅' if [row.id for row in indexed] == scanned else '❌'
+            print(f"  live, нужно > 10 за овер: по индексу {indexed_time * 1000:.1f} мс ({len(indexed):,} матчей), "
+                  f"разбор всех строк {scan_time * 1000:.0f} мс, совпадает {same}")
+            print(f"      план: {plan}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=int, default=1000000)
+    parser.add_argument('--matches', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--write', help='сохранить корпус в NDJSON')
+    args = parser.parse_args()
+
+    print(f"=== Разбор счета: корпус {args.size:,} строк ===")
+    ok = fuzz(args.size, args.seed, args.write)
+    bench_parse(args.size, args.seed)
+    if args.matches:
+        bench_query(args.matches, args.seed)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
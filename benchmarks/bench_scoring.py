@@ -0,0 +1,105 @@
+"""
+Бенчмарк: поштучный расчет очков (как в /api/calculate) против
+колоночного движка calculate_points_batch.
+
+Запуск: python benchmarks/bench_scoring.py [кол-во стат-линий ...]
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from score_calculator import (calculate_batting_points, calculate_bowling_points,
+                              calculate_fielding_points, calculate_points_batch,
+                              encode_dismissals)
+
+DISMISSALS = ['not_out', 'caught', 'bowled', 'lbw', 'run_out', 'stumped']
+ROLES = ['batsman', 'bowler', 'all-rounder']
+
+
+def generate_stat_lines(size, seed=42):
+    """Случайные, но правдоподобные стат-линии в колоночном виде"""
+    rng = np.random.default_rng(seed)
+    return {
+        'role': rng.choice(ROLES, size),
+        'runs': rng.integers(0, 150, size),
+        'balls_faced': rng.integers(1, 120, size),
+        'fours': rng.integers(0, 15, size),
+        'sixes': rng.integers(0, 8, size),
+        'dismissal_type': rng.choice(DISMISSALS, size),
+        'wickets': rng.integers(0, 7, size),
+        'runs_conceded': rng.integers(0, 70, size),
+        'overs_bowled': rng.integers(1, 11, size).astype(float),
+        'maidens': rng.integers(0, 3, size),
+        'catches': rng.integers(0, 3, size),
+        'stumpings': rng.integers(0, 2, size),
+        'run_outs': rng.integers(0, 2, size),
+    }
+
+
+def score_per_player(lines):
+    """Текущий путь: словарь и вызов функции на каждого игрока"""
+    results = []
+    for i in range(len(lines['role'])):
+        role = lines['role'][i]
+        points = 0
+        if role == 'batsman':
+            points = calculate_batting_points({
+                'runs': int(lines['runs'][i]),
+                'balls_faced': int(lines['balls_faced'][i]),
+                'fours': int(lines['fours'][i]),
+                'sixes': int(lines['sixes'][i]),
+                'dismissal_type': str(lines['dismissal_type'][i])
+            })
+        elif role == 'bowler':
+            points = calculate_bowling_points({
+                'wickets': int(lines['wickets'][i]),
+                'runs_conceded': int(lines['runs_conceded'][i]),
+                'overs_bowled': float(lines['overs_bowled'][i]),
+                'maidens': int(lines['maidens'][i])
+            })
+        points += calculate_fielding_points({
+            'catches': int(lines['catches'][i]),
+            'stumpings': int(lines['stumpings'][i]),
+            'run_outs': int(lines['run_outs'][i])
+        })
+        results.append(round(points, 2))
+    return results
+
+
+def score_batch(lines, dismissal_codes, rules=None):
+    batting = {key: lines[key] for key in ('runs', 'balls_faced', 'fours', 'sixes')}
+    batting['dismissal_type'] = dismissal_codes
+    bowling = {key: lines[key] for key in ('wickets', 'runs_conceded', 'overs_bowled', 'maidens')}
+    fielding = {key: lines[key] for key in ('catches', 'stumpings', 'run_outs')}
+    return calculate_points_batch(lines['role'], batting, bowling, fielding, rules)
+
+
+def run(size):
+    lines = generate_stat_lines(size)
+    dismissal_codes = encode_dismissals(list(lines['dismissal_type']))
+
+    start = time.perf_counter()
+    expected = score_per_player(lines)
+    per_player_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = score_batch(lines, dismissal_codes)
+    batch_time = time.perf_counter() - start
+
+    if not np.allclose(actual, expected):
+        raise AssertionError('Результаты batch-движка расходятся с поштучным расчетом')
+
+    print(f"{size:>9} строк | поштучно: {per_player_time:8.3f} с "
+          f"({size / per_player_time:>12,.0f} строк/с) | batch: {batch_time:8.3f} с "
+          f"({size / batch_time:>12,.0f} строк/с) | ускорение x{per_player_time / batch_time:.1f}")
+
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 1_000_000]
+    print("=== Бенчмарк расчета очков ===")
+    for size in sizes:
+        run(size)
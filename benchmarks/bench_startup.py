@@ -0,0 +1,103 @@
+"""
+Бенчмарк старта воркера: время от импорта app.py до первого ответа.
+
+Сравниваются прежний старт (при импорте create_all, FTS-индексы,
+счетчики, тестовые данные и витрины - в каждом воркере), новый старт
+(фабрика приложения без обращений к БД, схема готова заранее через
+flask deploy) и воркер gunicorn с preload - fork уже импортированного
+приложения. Каждый замер - в новом процессе на одной и той же базе.
+
+Запуск: python benchmarks/bench_startup.py [--runs 10] [--workers 8]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Код замера в новом интерпретаторе: печатает JSON с временами в секундах
+PROBE = r'''
+import json, sys, time
+started = time.perf_counter()
+mode = sys.argv[1]
+from app import app, deploy, init_sample_data
+imported = time.perf_counter()
+if mode == 'old':
+    import bs4, requests  # раньше scraper.py импортировал их сразу
+    with app.app_context():
+        deploy()
+        init_sample_data()
+client = app.test_client()
+assert client.get('/api/health/ready').status_code == 200
+assert client.get('/api/matches').status_code == 200
+print(json.dumps({'import': imported - started, 'first_response': time.perf_counter() - started,
+                  'modules': len(sys.modules), 'bs4': 'bs4' in sys.modules, 'requests': 'requests' in sys.modules}))
+'''
+
+# Мастер импортирует приложение один раз, воркеры - fork с первым запросом
+FORK_PROBE = r'''
+import json, os, sys, time
+from app import app
+workers = int(sys.argv[1])
+times = []
+for _ in range(workers):
+    read, write = os.pipe()
+    started = time.perf_counter()
+    pid = os.fork()
+    if pid == 0:
+        client = app.test_client()
+        ok = client.get('/api/health/ready').status_code == 200 and client.get('/api/matches').status_code == 200
+        os.write(write, json.dumps(time.perf_counter() - started if ok else -1).encode())
+        os._exit(0)
+    os.close(write)
+    with os.fdopen(read) as pipe:
+        times.append(json.loads(pipe.read()))
+    os.waitpid(pid, 0)
+print(json.dumps(times))
+'''
+
+
+def probe(env, *args, code=PROBE):
+    output = subprocess.run([sys.executable, '-c', code, *args], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--workers', type=int, default=8, help='воркеров для fork-замера')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, 'DATABASE_URL': f"sqlite:///{os.path.join(tmp, 'startup.db')}",
+               'STATS_RECOUNT_INTERVAL': '0', 'PYTHONDONTWRITEBYTECODE': '0'}
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'deploy'], cwd=ROOT, env=env,
+                       capture_output=True, check=True)
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'seed'], cwd=ROOT, env=env,
+                       capture_output=True, check=True)
+        probe(env, 'new')  # прогрев: байткод и файловый кэш
+
+        print(f"=== Старт воркера: медиана {args.runs} запусков, мс ===")
+        print(f"  {'режим':<34} {'импорт':>8} {'1-й ответ':>10}  модулей  bs4/requests")
+        for mode, label in (('old', 'прежний (БД при импорте)'), ('new', 'фабрика, схема через deploy')):
+            runs = [probe(env, mode) for _ in range(args.runs)]
+            imported = statistics.median(run['import'] for run in runs) * 1000
+            first = statistics.median(run['first_response'] for run in runs) * 1000
+            lazy = 'да' if runs[0]['bs4'] or runs[0]['requests'] else 'нет'
+            print(f"  {label:<34} {imported:8.1f} {first:10.1f}  {runs[0]['modules']:7d}  {lazy}")
+
+        if hasattr(os, 'fork'):
+            times = [value for _ in range(max(1, args.runs // 5)) for value in probe(env, str(args.workers),
+                                                                                   code=FORK_PROBE)]
+            if min(times) < 0:
+                raise SystemExit("❌ воркер после fork не ответил")
+            print(f"  {'preload + fork (gunicorn)':<34} {'-':>8} {statistics.median(times) * 1000:10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Нагрузочный тест live-потока: сколько SSE-подписчиков держит один воркер.
+
+Поднимает /api/stream/matches на многопоточном сервере (как gthread-воркер),
+открывает N соединений из одного потока-клиента (selectors), затем пишет
+события через stream_hub.record в БД и измеряет, сколько кадров дошло и
+с какой задержкой от коммита до получения.
+
+Запуск: python benchmarks/bench_stream.py [--subscribers 100 500 1000] [--events 20]
+"""
+import argparse
+import json
+import logging
+import os
+import resource
+import selectors
+import socket
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask, Response, stream_with_context
+from werkzeug.serving import make_server
+
+from models import db
+from stream import StreamHub
+
+
+def create_app(path, hub, max_subscribers):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['STREAM_MAX_SUBSCRIBERS'] = max_subscribers
+    app.config['STREAM_POLL_INTERVAL'] = 0.1
+    db.init_app(app)
+    hub.init_app(app)
+
+    # Тот же код, что и /api/stream/matches в app.py
+    @app.route('/api/stream/matches')
+    def stream_matches():
+        subscriber = hub.subscribe()
+        if subscriber is None:
+            return 'Too many subscribers', 503
+        return Response(stream_with_context(hub.stream(subscriber)), mimetype='text/event-stream')
+
+    return app
+
+
+class Clients:
+    """N SSE-клиентов на неблокирующих сокетах в одном потоке"""
+
+    def __init__(self, port, count):
+        self.selector = selectors.DefaultSelector()
+        self.received = [0] * count
+        self.latencies = []
+        self.buffers = [b''] * count
+        self.sockets = []
+        for i in range(count):
+            sock = socket.create_connection(('127.0.0.1', port))
+            sock.sendall(b'GET /api/stream/matches HTTP/1.1\r\nHost: localhost\r\nAccept: text/event-stream\r\n\r\n')
+            sock.setblocking(False)
+            self.selector.register(sock, selectors.EVENT_READ, i)
+            self.sockets.append(sock)
+
+    def pump(self, duration):
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            for key, _ in self.selector.select(timeout=0.05):
+                try:
+                    chunk = key.fileobj.recv(65536)
+                except BlockingIOError:
+                    continue
+                if not chunk:
+                    self.selector.unregister(key.fileobj)
+                    continue
+                now = time.time()
+                i = key.data
+                self.buffers[i] += chunk
+                *frames, self.buffers[i] = self.buffers[i].split(b'\n\n')
+                for frame in frames:
+                    for line in frame.split(b'\n'):
+                        if line.startswith(b'data: {') and b'"sent_at"' in line:
+                            self.received[i] += 1
+                            self.latencies.append(now - json.loads(line[6:])['sent_at'])
+
+    def close(self):
+        for sock in self.sockets:
+            self.selector.unregister(sock) if sock in self.selector.get_map().values() else None
+            sock.close()
+
+
+def percentile(values, q):
+    return statistics.quantiles(values, n=100)[q - 1] * 1000 if len(values) > 1 else 0.0
+
+
+def run(count, events):
+    hub = StreamHub()
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'stream.db'), hub, max_subscribers=count)
+        with app.app_context():
+            db.create_all()
+        server = make_server('127.0.0.1', 0, app, threaded=True)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        start = time.perf_counter()
+        clients = Clients(server.server_port, count)
+        clients.pump(0.5)
+        deadline = time.perf_counter() + 30
+        while hub.subscribers < count and time.perf_counter() < deadline:
+            clients.pump(0.1)
+        connect_time = time.perf_counter() - start
+
+        with app.app_context():
+            for n in range(events):
+                hub.record('match', [{'id': n, 'change': 'updated', 'status': 'Live', 'sent_at': time.time()}])
+                db.session.commit()
+                clients.pump(0.1)
+        clients.pump(1.0)
+
+        delivered = sum(clients.received)
+        expected = count * events
+        print(f"  {count:>5} подписчиков: подключены {hub.subscribers}/{count} за {connect_time:5.2f} с | "
+              f"доставлено {delivered}/{expected} ({delivered / expected:.1%}) | "
+              f"задержка p50 {percentile(clients.latencies, 50):6.1f} мс, p99 {percentile(clients.latencies, 99):6.1f} мс | "
+              f"потоков {threading.active_count()}, RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.0f} МБ")
+
+        clients.close()
+        hub.stop()
+        server.shutdown()
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--subscribers', type=int, nargs='+', default=[100, 500, 1000])
+    parser.add_argument('--events', type=int, default=20)
+    args = parser.parse_args()
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print("=== Нагрузочный тест SSE (один воркер, поток на подписчика) ===")
+    for count in args.subscribers:
+        run(count, args.events)
+
+
+if __name__ == "__main__":
+    main()
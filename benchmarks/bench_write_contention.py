@@ -0,0 +1,149 @@
+"""
+Бенчмарк конкурентной записи в SQLite: несколько процессов (как воркеры
+gunicorn) по несколько потоков шлют POST /api/calculate, параллельно
+читатели дергают историю очков. Сравниваются прежние настройки
+(rollback journal, synchronous=FULL, пул по умолчанию) и config.py
+(WAL, synchronous=NORMAL, busy_timeout, mmap, очередь писателей в
+процессе, подобранный пул).
+
+Запуск: python benchmarks/bench_write_contention.py [--processes 4] [--threads 8] [--requests 200]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+MODES = {
+    'before': {
+        'SQLITE_JOURNAL_MODE': 'DELETE',
+        'SQLITE_SYNCHRONOUS': 'FULL',
+        'SQLITE_BUSY_TIMEOUT': '5000',  # таймаут sqlite3.connect по умолчанию
+        'SQLITE_MMAP_SIZE': '0',
+        'DB_POOL_SIZE': '5',
+        'DB_MAX_OVERFLOW': '10',
+        'SQLITE_WRITE_LOCK': '0',
+    },
+    'after': {},  # значения по умолчанию из config.py
+}
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def configure_env(db_path, env):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['CACHE_ENABLED'] = '0'
+    os.environ['STATS_RECOUNT_INTERVAL'] = '0'
+    os.environ.update(env)
+
+
+def setup(db_path, env):
+    """Создает схему и тестовые данные до старта воркеров"""
+    configure_env(db_path, env)
+    from app import app, deploy, init_sample_data
+    with app.app_context():
+        deploy()
+        init_sample_data()
+
+
+def worker(db_path, env, threads, requests, start_event, results):
+    configure_env(db_path, env)
+    from app import app
+
+    latencies, errors, reads = [], [], [0]
+    lock = threading.Lock()
+    stop_readers = threading.Event()
+
+    def writer(n):
+        client = app.test_client()
+        for i in range(requests):
+            started = time.perf_counter()
+            response = client.post('/api/calculate', json={'player_id': 1 + (n + i) % 6, 'match_id': 1})
+            elapsed = time.perf_counter() - started
+            with lock:
+                if response.status_code == 200:
+                    latencies.append(elapsed)
+                else:
+                    errors.append((response.get_json() or {}).get('error', str(response.status_code)))
+
+    def reader():
+        client = app.test_client()
+        while not stop_readers.is_set():
+            client.get('/api/points/history?limit=20')
+            reads[0] += 1
+
+    start_event.wait()
+    writers = [threading.Thread(target=writer, args=(n,)) for n in range(threads)]
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    for thread in writers:
+        thread.start()
+    for thread in writers:
+        thread.join()
+    stop_readers.set()
+    reader_thread.join()
+    results.put((latencies, errors, reads[0]))
+
+
+def run(mode, processes, threads, requests):
+    ctx = multiprocessing.get_context('spawn')  # каждый процесс читает окружение заново, как воркер
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        process = ctx.Process(target=setup, args=(db_path, MODES[mode]))
+        process.start()
+        process.join()
+
+        start_event = ctx.Event()
+        results = ctx.Queue()
+        workers = [ctx.Process(target=worker, args=(db_path, MODES[mode], threads, requests, start_event, results))
+                   for _ in range(processes)]
+        for process in workers:
+            process.start()
+        time.sleep(2)  # дать воркерам импортировать приложение
+
+        started = time.perf_counter()
+        start_event.set()
+        collected = [results.get() for _ in workers]
+        elapsed = time.perf_counter() - started
+        for process in workers:
+            process.join()
+
+    latencies = [value for item in collected for value in item[0]]
+    errors = [value for item in collected for value in item[1]]
+    reads = sum(item[2] for item in collected)
+    locked = sum(1 for error in errors if 'locked' in error)
+    print(f"  {mode:<7} {len(latencies) / elapsed:8.0f} записей/с | "
+          f"p50 {percentile(latencies, 0.5) * 1000:7.1f} мс  p95 {percentile(latencies, 0.95) * 1000:7.1f} мс  "
+          f"p99 {percentile(latencies, 0.99) * 1000:7.1f} мс | ошибок {len(errors)} (locked: {locked}) | "
+          f"чтений {reads / elapsed:.0f}/с")
+    if errors:
+        print(f"          пример ошибки: {errors[0][:100]}")
+    return len(latencies) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--processes', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на поток')
+    args = parser.parse_args()
+
+    print("=== Конкурентная запись POST /api/calculate ===")
+    print(f"{args.processes} процессов x {args.threads} потоков x {args.requests} запросов, "
+          f"в каждом процессе поток-читатель истории\n")
+    throughput = {mode: run(mode, args.processes, args.threads, args.requests) for mode in MODES}
+    print(f"\n  ускорение x{throughput['after'] / throughput['before']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Проверка одновременного старта: N процессов на пустой базе разом
+выполняют flask deploy и flask seed (худший случай - каждый воркер
+готовит базу сам), еще N - стартуют как воркеры и отвечают на первый
+запрос. Схема должна оказаться применена один раз, тестовые данные - без
+дублей, счетчики строк - совпадать с COUNT(*). Код возврата 1 - ошибка.
+
+Запуск: python benchmarks/check_concurrent_boot.py [--workers 8]
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SEED_MATCHES = 2
+SEED_PLAYERS = 6
+
+
+def configure_env(db_path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'
+    os.environ['CACHE_ENABLED'] = '0'
+    os.environ['STATS_RECOUNT_INTERVAL'] = '0'
+
+
+def prepare(db_path, start_event, results):
+    """Как release-команда: deploy, затем seed"""
+    configure_env(db_path)
+    from app import app, deploy, fold_pending_locked, init_sample_data
+    start_event.wait()
+    try:
+        with app.app_context():
+            deploy()
+            init_sample_data()
+            fold_pending_locked()
+        results.put(None)
+    except Exception as e:
+        results.put(f"deploy/seed: {e!r}")
+
+
+def boot(db_path, start_event, results):
+    """Как воркер: импорт приложения и первый запрос, без подготовки базы"""
+    configure_env(db_path)
+    from app import app
+    start_event.wait()
+    try:
+        response = app.test_client().get('/api/health/live')
+        results.put(None if response.status_code == 200 else f"worker: {response.status_code}")
+    except Exception as e:
+        results.put(f"worker: {e!r}")
+
+
+def check(db_path):
+    configure_env(db_path)
+    from sqlalchemy import func, text
+
+    from app import app
+    from migrations import head
+    from models import db, Match, Player, TableCounter
+
+    with app.app_context():
+        migrations = db.session.execute(text('SELECT version FROM schema_migrations ORDER BY version')).scalars().all()
+        matches = db.session.query(func.count(Match.id)).scalar()
+        players = db.session.query(func.count(Player.id)).scalar()
+        counters = dict(db.session.query(TableCounter.table, TableCounter.count).all())
+
+    problems = []
+    if migrations != list(range(1, head() + 1)):
+        problems.append(f"миграции {migrations}, ожидалось 1..{head()}")
+    if (matches, players) != (SEED_MATCHES, SEED_PLAYERS):
+        problems.append(f"матчей {matches}, игроков {players} - ожидалось {SEED_MATCHES} и {SEED_PLAYERS}")
+    if counters.get('match') != matches or counters.get('player') != players:
+        problems.append(f"счетчики строк {counters} не совпадают с COUNT(*)")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context('spawn')
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'boot.db')
+        start_event = ctx.Event()
+        results = ctx.Queue()
+        processes = [ctx.Process(target=target, args=(db_path, start_event, results))
+                     for target in (prepare, boot) for _ in range(args.workers)]
+        for process in processes:
+            process.start()
+        start_event.set()
+        errors = [error for error in (results.get() for _ in processes) if error]
+        for process in processes:
+            process.join()
+        problems = errors + check(db_path)
+
+    print(f"=== Одновременный старт: {args.workers} x deploy+seed, {args.workers} воркеров ===")
+    if problems:
+        for problem in problems:
+            print(f"❌ {problem}")
+        sys.exit(1)
+    print(f"✅ схема применена один раз, {SEED_MATCHES} матча и {SEED_PLAYERS} игроков без дублей")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Регрессионная проверка числа SQL-запросов на построение ответов API.
+
+Наполняет временную БД, затем считает запросы (через события движка
+SQLAlchemy) для списков разного размера: число запросов не должно
+зависеть от количества записей (нет N+1). Списки матчей и игроков
+строятся так же, как в /api/matches и /api/players (queries.py), в том
+числе с фильтрами, поиском и сортировкой. Код возврата 1 - регрессия.
+
+Запуск: python benchmarks/check_query_count.py
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import event, insert
+
+from migrations import upgrade
+from models import db, Match, Player, PlayerPoints
+from queries import match_page, player_page
+import serializers
+
+# Запросов на построение одной страницы ответа
+EXPECTED = {
+    'matches': 1,
+    'matches?status&sort': 1,
+    'matches?q': 1,
+    'players': 1,
+    'players?role&sort': 1,
+    'players?q': 1,
+    'points_history': 1,
+}
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def populate(size):
+    db.session.execute(insert(Match), [
+        {'team1': f'Team {i}', 'team2': f'Team {i + 1}', 'format': 'ODI', 'status': 'Finished'}
+        for i in range(size)
+    ])
+    db.session.execute(insert(Player), [
+        {'name': f'Player {i}', 'role': 'batsman', 'team': 'India', 'match_id': i % size + 1, 'runs': i}
+        for i in range(size)
+    ])
+    db.session.execute(insert(PlayerPoints), [
+        {'player_id': i % size + 1, 'match_id': i % size + 1, 'points': float(i)}
+        for i in range(size)
+    ])
+    db.session.commit()
+
+
+def count_queries(func):
+    counter = {'queries': 0}
+
+    def before_cursor_execute(*args):
+        counter['queries'] += 1
+
+    event.listen(db.engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        func()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', before_cursor_execute)
+    return counter['queries']
+
+
+def main():
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app(os.path.join(tmp, 'check.db'))
+        with app.app_context():
+            upgrade()
+            populate(200)
+            db.session.remove()
+
+            def page(page_func, to_dict, args):
+                return lambda limit: [to_dict(r) for r in page_func(args, limit)[0]]
+
+            checks = {
+                'matches': page(match_page, serializers.match_row_to_dict, {}),
+                'matches?status&sort': page(match_page, serializers.match_row_to_dict,
+                                            {'status': 'Finished', 'sort': '-date'}),
+                'matches?q': page(match_page, serializers.match_row_to_dict, {'q': 'Team'}),
+                'players': page(player_page, serializers.player_row_to_dict, {}),
+                'players?role&sort': page(player_page, serializers.player_row_to_dict,
+                                          {'role': 'batsman', 'sort': '-runs'}),
+                'players?q': page(player_page, serializers.player_row_to_dict, {'q': 'Player'}),
+                'points_history': lambda limit: [serializers.points_row_to_dict(r)
+                                                 for r in serializers.points_history_rows(limit=limit)[0]],
+            }
+            for name, build in checks.items():
+                build(1)  # разовые проверки (есть ли FTS-индекс) кэшируются на процесс - не в счет
+                db.session.remove()
+                for limit in (1, 10, 100):
+                    queries = count_queries(lambda: build(limit))
+                    status = 'OK' if queries == EXPECTED[name] else 'FAIL'
+                    if status == 'FAIL':
+                        failures += 1
+                    print(f"{status:4} {name:<20} limit={limit:<4} запросов: {queries} (ожидается {EXPECTED[name]})")
+                    db.session.remove()
+            db.engine.dispose()
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,402 @@
+"""
+Генератор синтетических данных крикета для бенчмарков и нагрузочного теста.
+
+Набор детерминирован по --seed (тот же seed и размеры - та же база):
+- матчи T20/ODI/Test между сборными и франшизами на реальных стадионах:
+  сыгранные - в прошлом, со счетом в записи, которую понимает
+  score_parser (иннинги пишутся в match_innings), live - с незаконченным
+  иннингом, запланированные - в будущем, без счета. Естественный ключ
+  (день, команды, формат) уникален;
+- игроки: у каждой команды постоянный состав (PlayerIdentity), в матч
+  выходят по 11 с каждой стороны в обычном раскладе ролей; статистика -
+  по роли и формату;
+- очки (PlayerPoints) сыгранных матчей - с входными данными, отпечатком и
+  версией правил формата, как их пишет recompute (пересчет по новым
+  правилам работает и на сгенерированных строках). Запись одна на пару
+  (игрок, матч), а строка Player относится к одному матчу, поэтому очков
+  не больше, чем игроков сыгранных матчей - иначе ValueError до записи.
+
+Все пишется пакетными insert() пачками по --chunk строк с коммитом на
+пачку и поддержкой счетчиков таблиц (table_stats.add_rows); затем
+завершенные матчи сворачиваются в витрины (fold_pending).
+
+Запуск: python benchmarks/datagen.py --database bench.db [--matches 50000] [--players 1100000] [--points 800000]
+Из кода: generate(matches, players, points) в app_context с готовой схемой.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from sqlalchemy import func, insert
+
+from config import init_database
+from migrations import upgrade
+from models import db, Match, Player, PlayerIdentity, PlayerPoints
+from recompute import fingerprint, score_by_rules, serialize_inputs
+from rollups import fold_pending, name_key
+from score_parser import store_scores
+from scoring_rules import get_rule_book
+from stats import table_stats
+
+NATIONAL_TEAMS = ('India', 'Australia', 'England', 'Pakistan', 'New Zealand', 'South Africa',
+                  'Sri Lanka', 'West Indies', 'Bangladesh', 'Afghanistan', 'Ireland', 'Zimbabwe')
+FRANCHISES = ('Mumbai Indians', 'Chennai Super Kings', 'Royal Challengers Bengaluru', 'Kolkata Knight Riders',
+              'Sydney Sixers', 'Perth Scorchers', 'Lahore Qalandars', 'Trinbago Knight Riders')
+VENUES = ('Sydney Cricket Ground', "Lord's Cricket Ground", 'Eden Gardens', 'Melbourne Cricket Ground',
+          'Wankhede Stadium', 'The Oval', 'Gaddafi Stadium', 'Newlands', 'Basin Reserve', 'Kensington Oval',
+          'R. Premadasa Stadium', 'Sher-e-Bangla National Stadium', 'Adelaide Oval', 'Edgbaston',
+          'M. Chinnaswamy Stadium', 'Perth Stadium')
+FIRST_NAMES = ('Virat', 'Rohit', 'Steve', 'Joe', 'Kane', 'Babar', 'Ben', 'Pat', 'Shaheen', 'Rashid',
+               'Jasprit', 'David', 'Mitchell', 'Trent', 'Kagiso', 'Quinton', 'Shakib', 'Tamim', 'Jos', 'Glenn',
+               'Travis', 'Marnus', 'Shubman', 'Rishabh', 'Harry', 'Jofra', 'Devon', 'Aiden', 'Kusal', 'Nicholas')
+LAST_NAMES = ('Kohli', 'Sharma', 'Smith', 'Root', 'Williamson', 'Azam', 'Stokes', 'Cummins', 'Afridi', 'Khan',
+              'Bumrah', 'Warner', 'Starc', 'Boult', 'Rabada', 'de Kock', 'Hasan', 'Iqbal', 'Buttler', 'Maxwell',
+              'Head', 'Labuschagne', 'Gill', 'Pant', 'Brook', 'Archer', 'Conway', 'Markram', 'Mendis', 'Pooran')
+
+# Формат: (название в Match.format, лимит оверов, доля матчей, оверов на боулера)
+FORMATS = (
+    ('T20 International', 20, 0.40, 4),
+    ('ODI', 50, 0.30, 10),
+    ('Test Match', None, 0.15, 30),
+    ('T20', 20, 0.15, 4),  # лиги франшиз
+)
+# Ранов за мяч и мячей за иннинг отбивающего
+BATTING = {20: (1.35, 16), 50: (0.9, 32), None: (0.5, 70)}
+ECONOMY = {20: 8.0, 50: 5.4, None: 3.2}
+STATUSES = (('Finished', 0.70), ('Live', 0.05), ('Scheduled', 0.25))
+SQUAD_ROLES = ('batsman',) * 6 + ('wicket-keeper',) * 2 + ('all-rounder',) * 3 + ('bowler',) * 6
+XI = {'batsman': 4, 'wicket-keeper': 1, 'all-rounder': 2, 'bowler': 4}
+DISMISSALS = (('caught', 0.55), ('bowled', 0.17), ('lbw', 0.12), ('run_out', 0.06), ('stumped', 0.03),
+              ('caught_and_bowled', 0.04), ('hit_wicket', 0.01), ('not_out', 0.02))
+ANCHOR = date(2025, 1, 1)  # "сегодня" набора: сыгранные матчи раньше, запланированные позже
+HISTORY_DAYS = 3650
+SCHEDULE_DAYS = 365
+PLAYERS_PER_MATCH = 22
+CHUNK = 50000
+
+
+def _weighted(rng, choices):
+    roll, total = rng.random(), 0.0
+    for value, weight in choices:
+        total += weight
+        if roll < total:
+            return value
+    return choices[-1][0]
+
+
+def _overs(balls: int) -> str:
+    return f"{balls // 6}.{balls % 6}" if balls % 6 else str(balls // 6)
+
+
+def _limited_innings(rng, limit: int, target: Optional[int] = None, live: bool = False) -> Dict:
+    """Иннинг с лимитом оверов; target - погоня (останавливается на цели)"""
+    rate = max(0.6, rng.gauss(ECONOMY[limit] + (0.4 if limit == 20 else 0), 1.2)) / 6
+    balls = rng.randrange(6, limit * 6) if live else limit * 6
+    wickets = rng.randrange(8) if live else max(0, min(10, round(rng.gauss(6.5, 2.5))))
+    if wickets == 10 and not live:
+        balls = rng.randrange(limit * 3, limit * 6 + 1)
+    runs = max(0, int(balls * rate))
+    if target is not None and runs >= target and not live:
+        runs = target + rng.randrange(4)
+        balls = min(balls, max(1, int(target / rate)))
+        wickets = min(wickets, 9)
+    elif target is not None and live and runs >= target:
+        runs = target - 1 - rng.randrange(min(target, 30))
+    return {'runs': runs, 'wickets': wickets, 'balls': balls}
+
+
+def _innings_text(innings: Dict, limit: Optional[int]) -> str:
+    text = str(innings['runs']) if innings['wickets'] >= 10 else f"{innings['runs']}/{innings['wickets']}"
+    if innings.get('declared'):
+        text += 'd'
+    if limit is not None:
+        text += f" ({_overs(innings['balls'])} ov)"
+    return text
+
+
+def score_text(rng, team1: str, team2: str, limit: Optional[int], status: str) -> Optional[str]:
+    """Строка счета: первой указана команда, отбивавшая первой"""
+    if status == 'Scheduled':
+        return None
+    live = status == 'Live'
+    if limit is not None:
+        if live and rng.random() < 0.3:
+            return f"{team1} {_innings_text(_limited_innings(rng, limit, live=True), limit)}"
+        first = _limited_innings(rng, limit)
+        second = _limited_innings(rng, limit, target=first['runs'] + 1, live=live)
+        return f"{team1} {_innings_text(first, limit)}, {team2} {_innings_text(second, limit)}"
+
+    # Тест: иннинги команд по очереди, в live последний не закончен
+    count = rng.randint(1, 4) if live else rng.choice((3, 4, 4))
+    innings = {team1: [], team2: []}
+    for number in range(count):
+        open_innings = live and number == count - 1
+        wickets = rng.randrange(10) if open_innings else (10 if rng.random() < 0.8 else rng.randrange(4, 10))
+        runs = int(rng.gauss(300, 110) * (0.35 + wickets / 15.5)) if wickets < 10 else int(rng.gauss(290, 100))
+        innings[team1 if number % 2 == 0 else team2].append(
+            {'runs': max(10, runs), 'wickets': wickets, 'declared': wickets < 10 and number < count - 1})
+    return ', '.join(f"{team} " + ' & '.join(_innings_text(i, None) for i in team_innings)
+                     for team, team_innings in innings.items() if team_innings)
+
+
+def player_line(rng, role: str, limit: Optional[int], overs_cap: int) -> Dict:
+    """Статистика игрока за матч: итоги для Player и входные данные расчета очков"""
+    strike, mean_balls = BATTING[limit]
+    if role == 'bowler':
+        mean_balls /= 4
+    elif role == 'all-rounder':
+        mean_balls /= 1.6
+    balls_faced = int(rng.expovariate(1 / mean_balls))
+    runs = max(0, int(balls_faced * rng.gauss(strike, strike / 4)))
+    sixes = int(runs * rng.uniform(0, 0.35 if limit == 20 else 0.15)) // 6
+    fours = int((runs - sixes * 6) * rng.uniform(0.3, 0.6)) // 4
+
+    overs_bowled = maidens = wickets = runs_conceded = 0
+    if role in ('bowler', 'all-rounder'):
+        overs_bowled = rng.randint(1, overs_cap) if role == 'bowler' else rng.randint(0, max(1, overs_cap // 2))
+        runs_conceded = max(0, int(overs_bowled * rng.gauss(ECONOMY[limit], 1.5)))
+        wickets = min(10, sum(1 for _ in range(overs_bowled) if rng.random() < (0.22 if limit == 20 else 0.12)))
+        maidens = sum(1 for _ in range(overs_bowled) if rng.random() < (0.02 if limit == 20 else 0.15))
+
+    return {
+        'role': role,
+        'runs': runs,
+        'balls_faced': max(balls_faced, 1),
+        'fours': fours,
+        'sixes': sixes,
+        'dismissal_type': _weighted(rng, DISMISSALS) if balls_faced else 'not_out',
+        'wickets': wickets,
+        'runs_conceded': runs_conceded,
+        'overs_bowled': overs_bowled,
+        'maidens': maidens,
+        'catches': int(rng.random() < (0.45 if role == 'wicket-keeper' else 0.2)),
+        'stumpings': int(role == 'wicket-keeper' and rng.random() < 0.15),
+        'run_outs': int(rng.random() < 0.04),
+    }
+
+
+class Squads:
+    """Постоянные составы команд: (имя, роль, person_id) на каждого игрока"""
+
+    def __init__(self, rng, teams):
+        pool = [f'{first} {last}' for first in FIRST_NAMES for last in LAST_NAMES]
+        names = rng.sample(pool, len(teams) * len(SQUAD_ROLES))
+        self.members = {
+            team: [(names[t * len(SQUAD_ROLES) + i], role) for i, role in enumerate(SQUAD_ROLES)]
+            for t, team in enumerate(teams)
+        }
+        self.persons = self._identities([name for members in self.members.values() for name, _ in members])
+
+    @staticmethod
+    def _identities(names: List[str]) -> Dict[str, int]:
+        keys = {name_key(name): name for name in names}
+        known = dict(db.session.query(PlayerIdentity.name_key, PlayerIdentity.id)
+                     .filter(PlayerIdentity.name_key.in_(keys)))
+        new = [{'name': name, 'name_key': key} for key, name in keys.items() if key not in known]
+        if new:
+            db.session.execute(insert(PlayerIdentity), new)
+            known.update(db.session.query(PlayerIdentity.name_key, PlayerIdentity.id)
+                         .filter(PlayerIdentity.name_key.in_([row['name_key'] for row in new])))
+        return {name: known[key] for key, name in keys.items()}
+
+    def lineup(self, rng, team: str) -> List[tuple]:
+        """Одиннадцать по раскладу ролей, за ними - запасные (если в матч выходит больше 11)"""
+        members = self.members[team]
+        chosen = []
+        for role, count in XI.items():
+            chosen.extend(rng.sample([m for m in members if m[1] == role], count))
+        bench = [m for m in members if m not in chosen]
+        rng.shuffle(bench)
+        return chosen + bench
+
+
+def _statuses(rng, matches: int) -> bytes:
+    """Статус каждого матча заранее (индекс в STATUSES) - чтобы проверить число очков до записи"""
+    return bytes(_weighted(rng, [(i, weight) for i, (_, weight) in enumerate(STATUSES)]) for _ in range(matches))
+
+
+def _players_of(match_index: int, matches: int, players: int) -> range:
+    return range(match_index * players // matches, (match_index + 1) * players // matches)
+
+
+def _insert(model, rows: List[Dict]) -> List[int]:
+    """
+    Пакетная вставка и id новых строк в порядке rows. Без RETURNING с
+    сохранением порядка: в SQLite он выполняется построчно, а executemany
+    в одной транзакции выдает id по порядку - их читаем одним запросом.
+    """
+    if not rows:
+        return []
+    last_id = db.session.query(func.max(model.id)).scalar() or 0
+    db.session.execute(insert(model), rows)
+    return [row_id for (row_id,) in db.session.query(model.id).filter(model.id > last_id)
+            .order_by(model.id).limit(len(rows))]
+
+
+def generate(matches: int, players: Optional[int] = None, points: Optional[int] = None, seed: int = 1,
+             chunk_size: int = CHUNK, rollups: bool = True, verbose: bool = True) -> Dict[str, int]:
+    """
+    Записывает набор в текущую БД (в app_context, схема создана upgrade()).
+    players - по умолчанию 22 на матч; points - по умолчанию очки всех
+    игроков сыгранных матчей. Возвращает число записанных строк по таблицам.
+    """
+    players = matches * PLAYERS_PER_MATCH if players is None else players
+    if matches < 1 or players < 0:
+        raise ValueError("matches must be >= 1 and players >= 0")
+    statuses = _statuses(random.Random(seed), matches)
+    played = sum(len(_players_of(m, matches, players)) for m in range(matches) if STATUSES[statuses[m]][0] != 'Scheduled')
+    points = played if points is None else points
+    if not 0 <= points <= played:
+        raise ValueError(f"points must be between 0 and {played:,}: one points row per player of a played match "
+                         f"(increase players or matches)")
+
+    rng = random.Random(seed + 1)
+    teams = NATIONAL_TEAMS + FRANCHISES
+    squads = Squads(rng, teams)
+    book = get_rule_book()
+    weights = [(f, f[2]) for f in FORMATS]
+    used_keys = set()
+    counts = {'matches': 0, 'innings': 0, 'players': 0, 'points': 0, 'rollup_matches': 0}
+    eligible = 0  # игроков сыгранных матчей пройдено - очки распределяются по ним равномерно
+    per_batch = max(1, chunk_size // max(1, -(-players // matches)))
+    started = time.perf_counter()
+
+    for batch_start in range(0, matches, per_batch):
+        batch = range(batch_start, min(batch_start + per_batch, matches))
+        match_rows, match_meta = [], []
+        for m in batch:
+            status = STATUSES[statuses[m]][0]
+            match_format, limit, _, overs_cap = _weighted(rng, weights)
+            pool = NATIONAL_TEAMS if match_format != 'T20' else FRANCHISES
+            team1, team2 = rng.sample(pool, 2)
+            for attempt in range(100):
+                span = 1 + attempt // 10  # календарь занят - раздвигаем его
+                if status == 'Scheduled':
+                    day = ANCHOR + timedelta(days=rng.randint(0, SCHEDULE_DAYS * span))
+                elif status == 'Live' and attempt < 10:
+                    day = ANCHOR - timedelta(days=rng.randrange(5 if limit is None else 1))
+                else:
+                    day = ANCHOR - timedelta(days=rng.randint(1, HISTORY_DAYS * span))
+                if (day, team1, team2, match_format) not in used_keys:
+                    break
+                if attempt % 10 == 9:
+                    team1, team2 = rng.sample(pool, 2)
+            else:
+                raise ValueError(f"Could not place match {m}: too many matches for the calendar")
+            used_keys.add((day, team1, team2, match_format))
+            match_rows.append({
+                'team1': team1, 'team2': team2, 'format': match_format, 'status': status,
+                'venue': rng.choice(VENUES), 'match_day': day,
+                'match_date': datetime.combine(day, datetime.min.time()) + timedelta(hours=rng.choice((10, 14, 19))),
+                'score': score_text(rng, team1, team2, limit, status),
+            })
+            match_meta.append((limit, overs_cap))
+
+        match_ids = _insert(Match, match_rows)
+        table_stats.add_rows(Match, len(match_ids))
+        counts['innings'] += store_scores((match_id, row['score'], row['format'])
+                                          for match_id, row in zip(match_ids, match_rows))
+        counts['matches'] += len(match_ids)
+
+        player_rows, lines = [], []
+        for m, match_id, row, (limit, overs_cap) in zip(batch, match_ids, match_rows, match_meta):
+            slots = _players_of(m, matches, players)
+            sides = ((row['team1'], squads.lineup(rng, row['team1'])), (row['team2'], squads.lineup(rng, row['team2'])))
+            for k in range(len(slots)):
+                team, lineup = sides[k * 2 // len(slots)]
+                name, role = lineup[(k if k * 2 < len(slots) else k - (len(slots) + 1) // 2) % len(lineup)]
+                line = None
+                if row['status'] != 'Scheduled':
+                    line = player_line(rng, role, limit, overs_cap)
+                    if (eligible + 1) * points // played > eligible * points // played:
+                        lines.append((len(player_rows), match_id, row, line))
+                    eligible += 1
+                player_rows.append({
+                    'name': name, 'role': role, 'team': team, 'match_id': match_id, 'person_id': squads.persons[name],
+                    'runs': line['runs'] if line else 0, 'wickets': line['wickets'] if line else 0,
+                    'balls_faced': line['balls_faced'] if line else 0,
+                    'runs_conceded': line['runs_conceded'] if line else 0,
+                })
+
+        player_ids = _insert(Player, player_rows)
+        table_stats.add_rows(Player, len(player_ids))
+        counts['players'] += len(player_ids)
+
+        if lines:
+            rules = [book.for_format(row['format']) for _, _, row, _ in lines]
+            scored = score_by_rules([line for _, _, _, line in lines], rules)
+            points_rows = []
+            for (index, match_id, row, line), match_rules, value in zip(lines, rules, scored):
+                inputs_json = serialize_inputs(line)
+                points_rows.append({
+                    'player_id': player_ids[index], 'match_id': match_id, 'points': value,
+                    'calculation_date': row['match_date'] + timedelta(hours=4),
+                    'rules_version': match_rules.version, 'inputs_hash': fingerprint(inputs_json, match_rules),
+                    'inputs': inputs_json,
+                })
+            db.session.execute(insert(PlayerPoints), points_rows)
+            table_stats.add_rows(PlayerPoints, len(points_rows))
+            counts['points'] += len(points_rows)
+        db.session.commit()
+        if verbose:
+            elapsed = time.perf_counter() - started
+            print(f"  матчей {counts['matches']:,}/{matches:,}, игроков {counts['players']:,}, "
+                  f"очков {counts['points']:,} ({elapsed:.1f} с)", flush=True)
+
+    if rollups:
+        folded = {'folded': 0}
+        for folded in fold_pending():
+            pass
+        counts['rollup_matches'] = folded['folded']
+    return counts
+
+
+def create_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    init_database(app)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--database', help='файл SQLite (по умолчанию - DATABASE_URL окружения)')
+    parser.add_argument('--matches', type=int, default=50000)
+    parser.add_argument('--players', type=int, help=f'по умолчанию {PLAYERS_PER_MATCH} на матч')
+    parser.add_argument('--points', type=int, help='по умолчанию - все игроки сыгранных матчей')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--chunk', type=int, default=CHUNK, help='строк в одном insert')
+    parser.add_argument('--no-rollups', action='store_true', help='не сворачивать матчи в витрины')
+    args = parser.parse_args()
+
+    if args.database:
+        app = create_app(os.path.abspath(args.database))
+    else:
+        app = Flask(__name__)
+        init_database(app)
+    with app.app_context():
+        print(f"=== Генерация данных в {app.config['SQLALCHEMY_DATABASE_URI']}: {args.matches:,} матчей, seed {args.seed} ===")
+        upgrade()
+        table_stats.ensure()
+        started = time.perf_counter()
+        try:
+            counts = generate(args.matches, args.players, args.points, args.seed, args.chunk, not args.no_rollups)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(2)
+        elapsed = time.perf_counter() - started
+        rows = counts['matches'] + counts['innings'] + counts['players'] + counts['points']
+        print(f"✅ Записано за {elapsed:.1f} с ({rows / elapsed:,.0f} строк/с): матчей {counts['matches']:,}, "
+              f"иннингов {counts['innings']:,}, игроков {counts['players']:,}, очков {counts['points']:,}, "
+              f"в витринах матчей {counts['rollup_matches']:,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Локальный HTTP-сервер с записанными страницами live-матчей.
+
+Отдает /matches/<n> - копии fixtures/live_scores.html, где команды помечены
+номером страницы, поддерживает ETag / Last-Modified и 304 Not Modified.
+Метод bump() меняет счет на выбранных страницах (новая версия страницы).
+
+Запуск: python benchmarks/fixture_server.py [--port 8765] [--pages 100]
+Затем: SCRAPE_SOURCES=http://127.0.0.1:8765/matches/0,... python app.py
+"""
+import argparse
+import os
+import re
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures', 'live_scores.html')
+
+
+class FixtureServer:
+    def __init__(self, pages: int = 100, port: int = 0, validators: bool = True, delay: float = 0.0):
+        with open(FIXTURE, encoding='utf-8') as f:
+            self.template = f.read()
+        self.pages = pages
+        self.validators = validators
+        self.delay = delay
+        self.versions = [0] * pages
+        self.modified = [time.time()] * pages
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def port(self) -> int:
+        return self.httpd.server_address[1]
+
+    def urls(self):
+        return [f'http://127.0.0.1:{self.port}/matches/{n}' for n in range(self.pages)]
+
+    def render(self, page: int) -> bytes:
+        version = self.versions[page]
+        html = re.sub(r'class="(team[12])">([^<]+)<', rf'class="\1">\2 {page}<', self.template)
+        # Новая версия страницы - меняется счет первого матча
+        html = html.replace('150/3', f'{150 + version}/3')
+        return html.encode('utf-8')
+
+    def bump(self, pages):
+        with self._lock:
+            for page in pages:
+                self.versions[page] += 1
+                self.modified[page] = time.time()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests += 1
+                match = re.fullmatch(r'/matches/(\d+)', self.path)
+                if not match or int(match.group(1)) >= server.pages:
+                    self.send_error(404)
+                    return
+                page = int(match.group(1))
+                if server.delay:
+                    time.sleep(server.delay)
+
+                etag = f'"p{page}-v{server.versions[page]}"'
+                last_modified = formatdate(server.modified[page], usegmt=True)
+                if server.validators and (self.headers.get('If-None-Match') == etag
+                                          or self.headers.get('If-Modified-Since') == last_modified):
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = server.render(page)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                if server.validators:
+                    self.send_header('ETag', etag)
+                    self.send_header('Last-Modified', last_modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Локальный сервер с записанными страницами матчей')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--pages', type=int, default=100)
+    args = parser.parse_args()
+
+    server = FixtureServer(pages=args.pages, port=args.port)
+    print(f"Сервер фикстур: http://127.0.0.1:{server.port}/matches/0 .. /matches/{args.pages - 1}")
+    server.httpd.serve_forever()
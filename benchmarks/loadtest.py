@@ -0,0 +1,518 @@
+"""
+Нагрузочный тест HTTP API: каждый маршрут app.py на сгенерированных
+данных, локально (127.0.0.1, без внешней сети: скрапер - на mock-данных).
+
+1. Подготовка: flask deploy и набор datagen.py во временной SQLite (или
+   в --database - тогда набор генерируется, только если база пуста);
+   сервер - отдельный процесс (werkzeug, поток на запрос, HTTP/1.1
+   keep-alive). С --url тест идет против уже запущенного сервера
+   (например, gunicorn по Procfile на той же базе).
+2. Фикстуры - через сам API: контест с командами, матчи для изменения и
+   удаления, матч для подач, id профиля запроса.
+3. Сценарий на маршрут: --requests запросов из --concurrency потоков
+   (у каждого свое keep-alive соединение), перед замером - --warmup
+   запросов. Потоковые ответы (экспорт, пересчет) читаются целиком, у
+   SSE - время до первого события. Маршрут app.py без сценария - ошибка.
+4. Смешанная нагрузка (--duration с): взвешенная смесь частых запросов.
+
+Отчет: p50/p95/p99/среднее/максимум, запросов в секунду и коды ответов
+по маршрутам; --json сохраняет результаты, --baseline сравнивает с
+прошлым релизом (p50, p95 и пропускная способность). Код возврата 1 -
+ошибки, непокрытые маршруты или регрессия.
+
+Запуск: python benchmarks/loadtest.py [--matches 2000] [--requests 200] [--concurrency 4] [--json load.json] [--baseline prev.json]
+"""
+import argparse
+import http.client
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from queue import Empty
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import report
+
+PROFILE_TOKEN = 'loadtest'
+TEAM_ENTRIES = 200  # команд в контесте до замера
+UPDATE_POOL = 20  # матчей, которые меняет PUT
+TIMEOUT = 300
+IGNORED_METHODS = {'HEAD', 'OPTIONS'}
+
+# Смешанная нагрузка: (метод, маршрут) -> вес
+MIX = {
+    ('GET', '/api/matches'): 25,
+    ('GET', '/api/matches/<int:match_id>'): 15,
+    ('GET', '/api/players'): 20,
+    ('GET', '/api/players/<int:player_id>'): 10,
+    ('GET', '/api/players/top/<role>'): 8,
+    ('GET', '/api/points/history'): 5,
+    ('GET', '/api/contests/<int:contest_id>/leaderboard'): 5,
+    ('GET', '/api/health'): 2,
+    ('POST', '/api/calculate'): 5,
+    ('POST', '/api/matches/<int:match_id>/deliveries'): 5,
+}
+
+
+class Scenario(NamedTuple):
+    method: str
+    rule: str  # как в app.url_map - для проверки покрытия
+    request: Callable[[int], Tuple[str, Optional[bytes], Dict[str, str]]]  # n -> (путь, тело, заголовки)
+    expect: Tuple[int, ...] = (200,)
+    requests: Optional[int] = None  # None - --requests
+    stream: bool = False  # SSE: время до первого события, затем соединение закрывается
+
+    @property
+    def name(self) -> str:
+        return f'{self.method} {self.rule}'
+
+
+class Client:
+    """Keep-alive соединение одного потока; после ошибки или SSE - переподключение"""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.connection = None
+
+    def request(self, method: str, path: str, body: Optional[bytes] = None, headers: Optional[Dict] = None,
+                stream: bool = False) -> Tuple[int, http.client.HTTPMessage, bytes]:
+        if self.connection is None:
+            self.connection = http.client.HTTPConnection(self.host, self.port, timeout=TIMEOUT)
+        try:
+            self.connection.request(method, path, body=body, headers=headers or {})
+            response = self.connection.getresponse()
+            if stream:
+                data = response.readline()
+                self.close()
+            else:
+                data = response.read()
+                if response.will_close:
+                    self.close()
+            return response.status, response.headers, data
+        except (OSError, http.client.HTTPException):
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+def json_body(value) -> Tuple[bytes, Dict[str, str]]:
+    return json.dumps(value).encode(), {'Content-Type': 'application/json'}
+
+
+def get(path: str):
+    return lambda n: (path, None, {})
+
+
+def post(path: str, make_body: Callable[[int], object]):
+    def request(n):
+        body, headers = json_body(make_body(n))
+        return path, body, headers
+    return request
+
+
+# --- Сервер ---
+
+def serve(env: Dict[str, str], dataset: Dict, results):
+    """Процесс сервера: выкладка, данные (если база пуста), werkzeug до завершения процесса"""
+    try:
+        os.environ.update(env)
+        from werkzeug.serving import WSGIRequestHandler, make_server
+
+        from app import app, deploy
+        from datagen import generate
+        from models import db, Match
+        from stats import table_stats
+
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        with app.app_context():
+            deploy()
+            if db.session.query(Match.id).first() is None:
+                print(f"=== Генерация данных: {dataset['matches']:,} матчей ===", flush=True)
+                generate(dataset['matches'], dataset['players'], dataset['points'], dataset['seed'])
+            counts = table_stats.counts()
+            db.session.remove()
+        WSGIRequestHandler.protocol_version = 'HTTP/1.1'  # keep-alive, как за обратным прокси
+        server = make_server('127.0.0.1', dataset['port'], app, threaded=True)
+    except Exception as e:
+        results.put({'error': f'{type(e).__name__}: {e}'})
+        raise
+    results.put({'port': server.server_port, 'counts': counts})
+    server.serve_forever()
+
+
+def start_server(db_path: str, args) -> Tuple[multiprocessing.Process, int, Dict]:
+    env = {
+        'DATABASE_URL': f'sqlite:///{db_path}',
+        'STATS_RECOUNT_INTERVAL': '0',
+        'SCRAPE_SCHEDULER': '0',
+        'SCRAPE_SOURCES': '',  # mock-данные скрапера, без сети
+        'PROFILE_TOKEN': PROFILE_TOKEN,
+        'CACHE_ENABLED': '0' if args.no_cache else '1',
+    }
+    dataset = {'matches': args.matches, 'players': args.players, 'points': args.points, 'seed': args.seed,
+               'port': args.port}
+    ctx = multiprocessing.get_context('spawn')  # сервер читает окружение заново, как воркер
+    results = ctx.Queue()
+    process = ctx.Process(target=serve, args=(env, dataset, results), daemon=True)
+    process.start()
+    while True:
+        try:
+            ready = results.get(timeout=1)
+            break
+        except Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"server exited with code {process.exitcode}")
+    if 'error' in ready:
+        process.join()
+        raise RuntimeError(ready['error'])
+    return process, ready['port'], ready['counts']
+
+
+def app_routes(db_path: Optional[str]) -> set:
+    """(метод, маршрут) всех эндпоинтов приложения"""
+    if db_path:
+        os.environ['DATABASE_URL'] = f'sqlite:///{db_path}'  # модуль app создает движок (без подключения)
+    from app import app
+    return {(method, rule.rule) for rule in app.url_map.iter_rules()
+            for method in rule.methods - IGNORED_METHODS}
+
+
+# --- Фикстуры ---
+
+def prepare(client: Client, deletes: int, seed: int) -> Dict:
+    """Данные сценариев - через API, поэтому работает и против внешнего сервера (--url)"""
+    rng = random.Random(seed)
+    token = f'{os.getpid()}-{int(time.time())}'  # уникальные имена матчей при повторных прогонах на одной базе
+
+    def call(method, path, value=None, expect=(200,), headers=None):
+        body, json_headers = json_body(value) if value is not None else (None, {})
+        status, response_headers, data = client.request(method, path, body, {**json_headers, **(headers or {})})
+        if status not in expect:
+            raise RuntimeError(f"{method} {path}: {status} {data[:200]!r}")
+        return json.loads(data) if data else None, response_headers
+
+    finished = call('GET', '/api/matches?status=Finished&limit=100')[0]
+    live = call('GET', '/api/matches?status=Live&limit=100')[0]
+    if not finished:
+        raise RuntimeError("No finished matches in the database")
+    match = finished[0]
+    players = call('GET', f"/api/players?match_id={match['id']}&limit=50")[0]
+    if len(players) < 11:
+        raise RuntimeError(f"Match {match['id']} has fewer than 11 players")
+    pool = call('GET', '/api/players?limit=500')[0]
+    player_ids = [p['id'] for p in players]
+
+    def lineup(user):
+        picked = rng.sample(player_ids, 11)
+        return {'user': user, 'players': picked, 'captain_id': picked[0], 'vice_captain_id': picked[1]}
+
+    contest = call('POST', '/api/contests', {'name': f'Load test {token}', 'match_id': match['id']},
+                   expect=(201,))[0]['contest']
+    team_ids = call('POST', f"/api/contests/{contest['id']}/teams",
+                    {'teams': [lineup(f'user{i}') for i in range(TEAM_ENTRIES)]}, expect=(201,))[0]['team_ids']
+
+    def create(label, i, status='Scheduled'):
+        value = {'team1': f'Load {token}', 'team2': f'{label} {i}', 'format': 'T20', 'status': status}
+        return call('POST', '/api/match', value, expect=(201,))[0]['match']['id']
+
+    deliveries_match = create('Deliveries', 0, 'Live')
+    profile_id = call('GET', '/api/health/live', headers={'X-Profile': PROFILE_TOKEN})[1].get('X-Profile-Id')
+    return {
+        'token': token,
+        'match_ids': [m['id'] for m in finished + live],
+        'live_id': (live or finished)[0]['id'],
+        'match_players': player_ids,
+        'player_ids': [p['id'] for p in pool],
+        'team': match['team1'],
+        'contest_id': contest['id'],
+        'team_ids': team_ids,
+        'lineup': lineup,
+        'update_ids': [create('Update', i) for i in range(UPDATE_POOL)],
+        'delete_ids': [create('Delete', i) for i in range(deletes)],
+        'deliveries_match': deliveries_match,
+        'profile_id': profile_id,
+    }
+
+
+def scenarios(fx: Dict, args) -> List[Scenario]:
+    match_ids, player_ids = fx['match_ids'], fx['player_ids']
+    batters, bowlers = fx['match_players'][:6], fx['match_players'][-5:]
+    contest, token = fx['contest_id'], fx['token']
+    overs = itertools.count()  # подачи: каждый запрос - новый овер
+
+    match_lists = ('', '?status=Live&sort=-date', '?q=india', '?min_required_rate=8&sort=-required_rate',
+                   '?format=ODI&date_from=2020-01-01&date_to=2022-12-31', '?min_runs=250')
+    player_lists = ('', '?role=batsman&sort=-runs', '?q=vir', f"?team={quote(fx['team'])}&min_wickets=2",
+                    '?sort=name')
+    top_roles = ('batsman', 'bowler', 'all-rounder')
+
+    def over(n):
+        number = next(overs)
+        return {'deliveries': [
+            {'innings': 1, 'over': number, 'ball': ball, 'batter_id': batters[number % len(batters)],
+             'bowler_id': bowlers[number % len(bowlers)], 'runs': (number + ball) % 7 if (number + ball) % 7 != 5 else 1,
+             'wicket': 'bowled' if ball == 6 and number % 9 == 0 else None}
+            for ball in range(1, 7)]}
+
+    def import_rows(n):
+        rows = [{'team1': f'Import {token}', 'team2': f'Rival {n}-{k}', 'format': 'T20', 'status': 'Finished',
+                 'match_day': '2024-06-01', 'score': f'Import {140 + k}/6 (20), Rival {120 + n % 30}/9 (20)'}
+                for k in range(10)]
+        return (f'/api/import/matches?format=ndjson',
+                ''.join(json.dumps(row) + '\n' for row in rows).encode(), {'Content-Type': 'application/x-ndjson'})
+
+    def profile_request(n):
+        return f"/metrics/profiles/{fx['profile_id']}", None, {'X-Profile': PROFILE_TOKEN}
+
+    few = max(1, min(args.requests, 5))
+    return [
+        # Страницы
+        Scenario('GET', '/', get('/')),
+        Scenario('GET', '/matches', lambda n: ('/matches' + match_lists[n % len(match_lists)], None, {})),
+        Scenario('GET', '/players', lambda n: ('/players' + player_lists[n % len(player_lists)], None, {})),
+        Scenario('GET', '/calculate', get('/calculate')),
+        Scenario('GET', '/admin', get('/admin')),
+        Scenario('GET', '/static/<path:filename>', lambda n: (('/static/css/style.css', '/static/js/main.js')[n % 2],
+                                                              None, {})),
+        # Служебные
+        Scenario('GET', '/api/health', get('/api/health')),
+        Scenario('GET', '/api/health/live', get('/api/health/live')),
+        Scenario('GET', '/api/health/ready', get('/api/health/ready')),
+        Scenario('GET', '/metrics', get('/metrics')),
+        Scenario('GET', '/metrics/profiles/<int:profile_id>', profile_request),
+        Scenario('GET', '/api/cache/stats', get('/api/cache/stats')),
+        Scenario('GET', '/api/scrape/status', get('/api/scrape/status')),
+        Scenario('GET', '/api/scoring/rules', get('/api/scoring/rules')),
+        # Матчи
+        Scenario('GET', '/api/matches', lambda n: ('/api/matches' + match_lists[n % len(match_lists)], None, {})),
+        Scenario('GET', '/api/matches/<int:match_id>',
+                 lambda n: (f'/api/matches/{match_ids[n % len(match_ids)]}', None, {})),
+        Scenario('GET', '/api/matches/<int:match_id>/stats',
+                 lambda n: (f"/api/matches/{fx['deliveries_match']}/stats", None, {})),
+        Scenario('GET', '/api/matches/<int:match_id>/projections',
+                 lambda n: (f"/api/matches/{fx['live_id']}/projections?simulations={args.simulations}&seed={n % 5}",
+                            None, {}), requests=min(args.requests, 20)),
+        Scenario('POST', '/api/matches/<int:match_id>/deliveries',
+                 post(f"/api/matches/{fx['deliveries_match']}/deliveries", over)),
+        Scenario('POST', '/api/match', post('/api/match', lambda n: {
+            'team1': f'Load {token}', 'team2': f'Created {n}', 'format': 'ODI', 'venue': 'Eden Gardens',
+            'status': 'Live', 'score': f'Load {200 + n % 100}/4 (35.2 ov)'}), expect=(201,)),
+        Scenario('PUT', '/api/match/<int:match_id>', lambda n: (
+            f"/api/match/{fx['update_ids'][n % UPDATE_POOL]}",
+            *json_body({'status': 'Live', 'score': f'Load {100 + n % 150}/{n % 10} ({n % 20}.{n % 6} ov)'}))),
+        Scenario('DELETE', '/api/match/<int:match_id>',
+                 lambda n: (f"/api/match/{fx['delete_ids'][n]}", None, {}), requests=args.requests),
+        Scenario('GET', '/api/scrape/matches', get('/api/scrape/matches'), requests=few),
+        Scenario('GET', '/api/stream/matches', get('/api/stream/matches'), requests=min(args.requests, 20),
+                 stream=True),
+        # Игроки и очки
+        Scenario('GET', '/api/players', lambda n: ('/api/players' + player_lists[n % len(player_lists)], None, {})),
+        Scenario('GET', '/api/players/<int:player_id>',
+                 lambda n: (f'/api/players/{player_ids[n % len(player_ids)]}', None, {})),
+        Scenario('GET', '/api/players/<int:player_id>/summary',
+                 lambda n: (f'/api/players/{player_ids[n % len(player_ids)]}/summary', None, {})),
+        Scenario('GET', '/api/players/top/<role>',
+                 lambda n: (f'/api/players/top/{top_roles[n % 3]}?k={(5, 10, 50)[n % 3]}', None, {})),
+        Scenario('GET', '/api/teams/<team>/summary', get(f"/api/teams/{quote(fx['team'])}/summary")),
+        Scenario('GET', '/api/points/history', lambda n: (f'/api/points/history?limit={(10, 100)[n % 2]}', None, {})),
+        Scenario('POST', '/api/calculate', post('/api/calculate', lambda n: {
+            'player_id': player_ids[n % len(player_ids)], 'fours': n % 6, 'sixes': n % 3, 'catches': n % 2})),
+        Scenario('POST', '/api/calculate/batch', post('/api/calculate/batch', lambda n: {
+            'items': [{'player_id': pid, 'fours': (n + i) % 6} for i, pid in enumerate(fx['match_players'])]})),
+        Scenario('POST', '/api/points/recompute', post('/api/points/recompute', lambda n: {'job': 'rules'}),
+                 requests=few),
+        # Контесты
+        Scenario('POST', '/api/contests', post('/api/contests', lambda n: {
+            'name': f'Contest {token} {n}', 'match_id': match_ids[0]}), expect=(201,)),
+        Scenario('GET', '/api/contests/<int:contest_id>', get(f'/api/contests/{contest}')),
+        Scenario('POST', '/api/contests/<int:contest_id>/teams',
+                 post(f'/api/contests/{contest}/teams', lambda n: fx['lineup'](f'load{n}')), expect=(201,)),
+        Scenario('GET', '/api/contests/<int:contest_id>/leaderboard',
+                 lambda n: (f'/api/contests/{contest}/leaderboard?limit={(10, 100)[n % 2]}', None, {})),
+        Scenario('GET', '/api/contests/<int:contest_id>/teams/<int:team_id>',
+                 lambda n: (f"/api/contests/{contest}/teams/{fx['team_ids'][n % len(fx['team_ids'])]}", None, {})),
+        # Выгрузка и загрузка
+        Scenario('GET', '/api/export/<table>',
+                 lambda n: (f"/api/export/matches?format={('ndjson', 'csv')[n % 2]}", None, {}), requests=few),
+        Scenario('POST', '/api/import/<table>', import_rows),
+    ]
+
+
+# --- Прогон ---
+
+def run(host: str, port: int, count: int, concurrency: int, pick: Callable[[int], Scenario],
+        duration: Optional[float] = None, start: int = 0) -> Dict:
+    """
+    count запросов с номерами от start (или сколько успеется за duration с)
+    из concurrency потоков; pick(n) - сценарий n-го запроса. Возвращает
+    длительности и коды ответов.
+    """
+    counter = itertools.count(start)
+    latencies, statuses, failures = [], Counter(), []
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def worker():
+        client = Client(host, port)
+        local, codes = [], Counter()
+        while True:
+            n = next(counter)
+            if (deadline is None and n >= start + count) or (deadline is not None and time.perf_counter() >= deadline):
+                break
+            scenario = pick(n)
+            path, body, headers = scenario.request(n)
+            started = time.perf_counter()
+            try:
+                status, _, data = client.request(scenario.method, path, body, headers, scenario.stream)
+            except (OSError, http.client.HTTPException) as e:
+                status, data = type(e).__name__, str(e).encode()
+            local.append(time.perf_counter() - started)
+            codes[status] += 1
+            if status not in scenario.expect:
+                with lock:
+                    failures.append(f'{scenario.method} {path}: {status} {data[:200]!r}')
+        client.close()
+        with lock:
+            latencies.extend(local)
+            statuses.update(codes)
+
+    threads = [threading.Thread(target=worker) for _ in range(max(1, min(concurrency, count or concurrency)))]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return {'latencies': latencies, 'statuses': statuses, 'failures': failures, 'elapsed': elapsed}
+
+
+def summarize(outcome: Dict) -> Dict:
+    requests = len(outcome['latencies'])
+    return {
+        'requests': requests,
+        'errors': len(outcome['failures']),
+        'rps': round(requests / outcome['elapsed'], 2) if outcome['elapsed'] else 0.0,
+        **report.latency_summary(outcome['latencies']),
+        'statuses': {str(code): value for code, value in sorted(outcome['statuses'].items(), key=str)},
+    }
+
+
+def print_result(name: str, result: Dict):
+    mark = '✅' if not result['errors'] else '❌'
+    codes = ' '.join(f'{code}×{value}' for code, value in result['statuses'].items())
+    print(f"  {name:<52} {result['requests']:6,} запр. | p50 {result['p50_ms']:8.2f}  p95 {result['p95_ms']:8.2f}  "
+          f"p99 {result['p99_ms']:8.2f} мс | {result['rps']:8,.1f} запр/с | {codes} {mark}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--matches', type=int, default=2000, help='размер набора datagen.py')
+    parser.add_argument('--players', type=int, help='по умолчанию 22 на матч')
+    parser.add_argument('--points', type=int, help='по умолчанию - все игроки сыгранных матчей')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--database', help='файл SQLite (сохраняется; набор генерируется, если база пуста)')
+    parser.add_argument('--url', help='уже запущенный сервер, например http://127.0.0.1:8000')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--requests', type=int, default=200, help='запросов на маршрут')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=3, help='запросов на маршрут до замера')
+    parser.add_argument('--duration', type=float, default=10, help='смешанная нагрузка, с (0 - без нее)')
+    parser.add_argument('--simulations', type=int, default=10000, help='симуляций в запросе прогноза')
+    parser.add_argument('--only', help='только маршруты, в имени которых есть эта строка')
+    parser.add_argument('--no-cache', action='store_true', help='без кэша ответов (CACHE_ENABLED=0)')
+    report.add_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.abspath(args.database) if args.database else os.path.join(tmp, 'loadtest.db')
+        process = None
+        if args.url:
+            parts = urlsplit(args.url)
+            host, port, counts = parts.hostname, parts.port or 80, {}
+            server = args.url
+        else:
+            process, port, counts = start_server(db_path, args)
+            host, server = '127.0.0.1', 'werkzeug threaded'
+        try:
+            code = load_test(host, port, server, counts, None if args.url else db_path, args)
+        finally:
+            if process is not None:
+                process.terminate()
+                process.join()
+    sys.exit(code)
+
+
+def load_test(host: str, port: int, server: str, counts: Dict, db_path: Optional[str], args) -> int:
+    print(f"=== Нагрузочный тест: {server}, {host}:{port}, {args.concurrency} потоков, "
+          f"{args.requests} запросов на маршрут ===")
+    if counts:
+        print(f"  данные: " + ', '.join(f'{table} {value:,}' for table, value in counts.items()))
+
+    routes = app_routes(db_path)
+    fx = prepare(Client(host, port), args.requests + args.warmup, args.seed)
+    plan = scenarios(fx, args)
+    covered = {(s.method, s.rule) for s in plan}
+    missing, unknown = sorted(routes - covered), sorted(covered - routes)
+    for method, rule in missing:
+        print(f"❌ Нет сценария: {method} {rule}")
+    for method, rule in unknown:
+        print(f"❌ Сценарий для несуществующего маршрута: {method} {rule}")
+    print(f"  маршрутов {len(routes)}, со сценарием {len(routes & covered)}\n")
+
+    results, failures = {}, []
+    for scenario in plan:
+        if args.only and args.only not in scenario.name:
+            continue
+        # Прогрев (кэши, соединения с БД) - теми же запросами; номера запросов
+        # замера идут после него (удаляемые матчи и т.п. используются по разу)
+        client = Client(host, port)
+        for n in range(args.warmup):
+            client.request(scenario.method, *scenario.request(n), stream=scenario.stream)
+        client.close()
+        outcome = run(host, port, scenario.requests or args.requests, args.concurrency,
+                      lambda n, s=scenario: s, start=args.warmup)
+        results[scenario.name] = summarize(outcome)
+        failures.extend(outcome['failures'])
+        print_result(scenario.name, results[scenario.name])
+
+    if args.duration and not args.only:
+        mix = [(s, MIX[(s.method, s.rule)]) for s in plan if (s.method, s.rule) in MIX]
+        rng = random.Random(args.seed)
+        weighted = [s for s, weight in mix for _ in range(weight)]
+        choices = [rng.choice(weighted) for _ in range(4096)]
+        print(f"\n  смешанная нагрузка {args.duration:g} с: "
+              + ', '.join(f'{s.method} {s.rule} ×{weight}' for s, weight in mix))
+        outcome = run(host, port, 0, args.concurrency, lambda n: choices[n % len(choices)], args.duration)
+        results['MIX'] = summarize(outcome)
+        failures.extend(outcome['failures'])
+        print_result('MIX', results['MIX'])
+
+    for failure in failures[:10]:
+        print(f"    {failure}")
+    if failures:
+        print(f"❌ Неожиданных ответов: {len(failures)}")
+
+    parameters = {'server': server, 'concurrency': args.concurrency, 'requests': args.requests,
+                  'warmup': args.warmup, 'duration': args.duration, 'simulations': args.simulations,
+                  'cache': not args.no_cache, 'seed': args.seed, 'rows': counts}
+    code = report.finish(args, 'loadtest', parameters, results, {'p50_ms': False, 'p95_ms': False, 'rps': True})
+    return 1 if failures or missing or unknown else code
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Общие части отчетов бенчмарков: перцентили, окружение запуска, сохранение
+результатов в JSON и сравнение с базовым прогоном (baseline) прошлого
+релиза.
+
+Файл результатов: {"benchmark": ..., "environment": {...}, "parameters":
+{...}, "results": {имя: {метрика: значение}}}. Сравниваются одноименные
+результаты по выбранным метрикам; регрессия - ухудшение больше порога
+(по умолчанию 20%).
+"""
+import json
+import os
+import platform
+import subprocess
+from datetime import datetime
+from typing import Dict, List, Sequence, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_THRESHOLD = 0.2
+
+
+def percentile(ordered: Sequence[float], q: float) -> float:
+    """Перцентиль q (0..100) отсортированной выборки, линейная интерполяция"""
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * q / 100
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def latency_summary(latencies: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99/mean/max в миллисекундах по длительностям в секундах"""
+    ordered = sorted(latencies)
+    if not ordered:
+        return {'p50_ms': 0.0, 'p95_ms': 0.0, 'p99_ms': 0.0, 'mean_ms': 0.0, 'max_ms': 0.0}
+    return {
+        'p50_ms': round(percentile(ordered, 50) * 1000, 3),
+        'p95_ms': round(percentile(ordered, 95) * 1000, 3),
+        'p99_ms': round(percentile(ordered, 99) * 1000, 3),
+        'mean_ms': round(sum(ordered) / len(ordered) * 1000, 3),
+        'max_ms': round(ordered[-1] * 1000, 3),
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or 'unknown'
+    except (OSError, subprocess.SubprocessError):
+        return 'unknown'
+
+
+def environment() -> Dict[str, str]:
+    """С чем сравнивать: коммит, интерпретатор, машина"""
+    return {
+        'commit': git_commit(),
+        'timestamp': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count() or 1,
+    }
+
+
+def save(path: str, benchmark: str, parameters: Dict, results: Dict[str, Dict]) -> Dict:
+    report = {'benchmark': benchmark, 'environment': environment(), 'parameters': parameters, 'results': results}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2, sort_keys=True)
+    print(f"✅ Результаты сохранены: {path}")
+    return report
+
+
+def load(path: str) -> Dict:
+    with open(path, encoding='utf-8') as f:
+        report = json.load(f)
+    if not isinstance(report, dict) or not isinstance(report.get('results'), dict):
+        raise ValueError(f"{path}: not a benchmark report")
+    return report
+
+
+def compare(baseline: Dict, results: Dict[str, Dict], metrics: Dict[str, bool],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Tuple[str, str, float, float, float]]:
+    """
+    Регрессии относительно baseline: (результат, метрика, было, стало,
+    изменение). metrics - {метрика: True, если больше - лучше}.
+    Печатает таблицу сравнения.
+    """
+    regressions = []
+    base_env = baseline.get('environment', {})
+    print(f"\n=== Сравнение с baseline: коммит {base_env.get('commit', '?')} "
+          f"от {base_env.get('timestamp', '?')}, порог {threshold:.0%} ===")
+    if base_env.get('cpus') not in (None, os.cpu_count()):
+        print(f"⚠️ Baseline снят на машине с {base_env.get('cpus')} ядрами, сейчас {os.cpu_count()}")
+    for name in sorted(results):
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f"  {name:<44} нет в baseline")
+            continue
+        for metric, higher_is_better in metrics.items():
+            old, new = before.get(metric), results[name].get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if higher_is_better else change
+            mark = '❌' if worse > threshold else '✅'
+            if worse > threshold:
+                regressions.append((name, metric, old, new, change))
+            print(f"  {name:<44} {metric:<8} {old:12,.3f} → {new:12,.3f} ({change:+7.1%}) {mark}")
+    for name in sorted(set(baseline['results']) - set(results)):
+        print(f"  {name:<44} есть только в baseline")
+    if regressions:
+        print(f"❌ Регрессий: {len(regressions)}")
+    else:
+        print("✅ Регрессий нет")
+    return regressions
+
+
+def add_arguments(parser):
+    parser.add_argument('--json', help='сохранить результаты в JSON')
+    parser.add_argument('--baseline', help='JSON прошлого прогона для сравнения')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='допустимое ухудшение, доля (0.2 - 20%%)')
+
+
+def finish(args, benchmark: str, parameters: Dict, results: Dict[str, Dict], metrics: Dict[str, bool]):
+    """Сохранение и сравнение по аргументам --json/--baseline/--threshold; код возврата"""
+    if args.json:
+        save(args.json, benchmark, parameters, results)
+    if args.baseline:
+        baseline = load(args.baseline)
+        if baseline.get('benchmark') != benchmark:
+            print(f"⚠️ Baseline от другого бенчмарка ({baseline.get('benchmark')}), сравнение пропущено")
+            return 2
+        return 1 if compare(baseline, results, metrics, args.threshold) else 0
+    return 0
@@ -0,0 +1,287 @@
+"""
+Потоковый импорт и экспорт таблиц Match, Player и PlayerPoints.
+
+Форматы: NDJSON и CSV; для аналитики - Parquet и Arrow IPC (нужен pyarrow,
+импортируется только при выборе этих форматов).
+
+Экспорт читает таблицу одним запросом с потоковым курсором
+(yield_per) и отдает ее пачками: в памяти только одна пачка строк,
+сколько бы строк ни было в таблице, а все пачки - из одного снимка БД.
+Импорт разбирает вход построчно (файл или тело запроса), приводит значения
+к типам колонок и пишет пакетными вставками с коммитом на каждую пачку.
+Строки с id сохраняют его (перенос между базами), без id - получают новый;
+счет импортированных матчей разбирается в иннинги (score_parser.py).
+"""
+import csv
+import importlib.util
+import io
+import json
+from datetime import date, datetime
+from itertools import groupby
+from typing import Callable, Dict, IO, Iterable, Iterator, List
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from cache import response_cache
+from models import db, Match, Player, PlayerPoints
+from rollups import fold_matches, fold_pending_locked
+from score_parser import store_scores
+from stats import table_stats
+
+TABLES = {'matches': Match, 'players': Player, 'points': PlayerPoints}
+CACHE_TAGS = {Match: 'matches', Player: 'players', PlayerPoints: 'points'}
+TEXT_FORMATS = ('ndjson', 'csv')
+ARROW_FORMATS = ('parquet', 'arrow')
+FORMATS = TEXT_FORMATS + ARROW_FORMATS
+MIMETYPES = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv',
+             'parquet': 'application/vnd.apache.parquet', 'arrow': 'application/vnd.apache.arrow.stream'}
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def table_model(name: str):
+    if name not in TABLES:
+        raise ValueError(f"table must be one of {', '.join(TABLES)}")
+    return TABLES[name]
+
+
+def require_pyarrow():
+    """Parquet/Arrow - необязательная зависимость; проверяется до начала потока"""
+    if importlib.util.find_spec('pyarrow') is None:
+        raise RuntimeError("Parquet/Arrow require pyarrow: pip install pyarrow")
+
+
+def format_from_path(path: str, default: str = 'ndjson') -> str:
+    extension = path.rsplit('.', 1)[-1].lower() if '.' in path else ''
+    aliases = {'jsonl': 'ndjson', 'json': 'ndjson', 'pq': 'parquet', 'arrows': 'arrow', 'feather': 'arrow'}
+    extension = aliases.get(extension, extension)
+    return extension if extension in FORMATS else default
+
+
+def _columns(model) -> List:
+    return list(model.__table__.columns)
+
+
+# --- Экспорт ---
+
+def _plain(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _batches(model, chunk_size: int) -> Iterator[List]:
+    """Строки таблицы пачками через потоковый курсор (без OFFSET и без полной выборки)"""
+    table = model.__table__
+    result = db.session.execute(select(*table.columns).order_by(table.c.id)
+                                .execution_options(yield_per=chunk_size))
+    yield from result.partitions()
+
+
+def _ndjson(model, chunk_size: int) -> Iterator[str]:
+    names = [c.name for c in _columns(model)]
+    for rows in _batches(model, chunk_size):
+        yield ''.join(json.dumps(dict(zip(names, map(_plain, row))), ensure_ascii=False) + '\n' for row in rows)
+
+
+def _csv(model, chunk_size: int) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow([c.name for c in _columns(model)])
+    for rows in _batches(model, chunk_size):
+        writer.writerows([_plain(v) for v in row] for row in rows)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+class _Drain:
+    """Файл для записи pyarrow: накопленные байты забираются после каждой пачки"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def take(self) -> bytes:
+        data, self.parts = b''.join(self.parts), []
+        return data
+
+
+def _arrow_schema(pa, model):
+    types = {int: pa.int64(), float: pa.float64(), bool: pa.bool_(), str: pa.string(),
+             datetime: pa.timestamp('us'), date: pa.date32()}
+    return pa.schema([(c.name, types[c.type.python_type]) for c in _columns(model)])
+
+
+def _arrow(model, chunk_size: int, fmt: str) -> Iterator[bytes]:
+    import pyarrow as pa
+    schema = _arrow_schema(pa, model)
+    sink = _Drain()
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)  # пачка - группа строк Parquet
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    with writer:
+        for rows in _batches(model, chunk_size):
+            writer.write_table(pa.Table.from_pylist([dict(row._mapping) for row in rows], schema=schema))
+            yield sink.take()
+    yield sink.take()
+
+
+def export_rows(model, fmt: str = 'ndjson', chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator:
+    """Генератор кусков выгрузки: str для NDJSON/CSV, bytes для Parquet/Arrow"""
+    if fmt == 'ndjson':
+        return _ndjson(model, chunk_size)
+    if fmt == 'csv':
+        return _csv(model, chunk_size)
+    if fmt in ARROW_FORMATS:
+        require_pyarrow()
+        return _arrow(model, chunk_size, fmt)
+    raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+
+# --- Импорт ---
+
+def _converter(column) -> Callable:
+    python_type = column.type.python_type
+    if python_type is datetime:
+        parse = datetime.fromisoformat
+    elif python_type is date:
+        parse = date.fromisoformat
+    elif python_type is bool:
+        def parse(value):
+            return value.strip().lower() in ('1', 'true', 'yes')
+    else:
+        parse = python_type
+
+    def convert(value):
+        if value is None or value == '':
+            return None
+        if isinstance(value, python_type) and not (python_type is int and isinstance(value, bool)):
+            return value
+        if isinstance(value, str):
+            return parse(value)
+        return python_type(value)
+    return convert
+
+
+def _read_ndjson(stream: IO[str]) -> Iterator[Dict]:
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            raise ValueError(f"line {number}: invalid JSON")
+        if not isinstance(row, dict):
+            raise ValueError(f"line {number}: expected an object")
+        yield row
+
+
+def _read_arrow(path: str, fmt: str, chunk_size: int) -> Iterator[Dict]:
+    import pyarrow as pa
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_size)
+    else:
+        batches = pa.ipc.open_stream(pa.OSFile(path, 'rb'))
+    for batch in batches:
+        yield from batch.to_pylist()
+
+
+def read_rows(source, fmt: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict]:
+    """Строки входа как словари: source - текстовый поток (NDJSON/CSV) или путь (Parquet/Arrow)"""
+    if fmt == 'ndjson':
+        return _read_ndjson(source)
+    if fmt == 'csv':
+        return csv.DictReader(source)
+    if fmt in ARROW_FORMATS:
+        require_pyarrow()
+        return _read_arrow(source, fmt, chunk_size)
+    raise ValueError(f"format must be one of {', '.join(FORMATS)}")
+
+
+def _flush(model, chunk: List[Dict], first_line: int, rollups: bool):
+    table = model.__table__
+    try:
+        # Core executemany компилирует вставку по ключам первой строки - группируем по набору колонок
+        for _, rows in groupby(chunk, key=lambda row: tuple(row)):
+            if model is Match:
+                # Новые id нужны для иннингов разобранного счета
+                inserted = db.session.execute(
+                    insert(table).returning(table.c.id, table.c.score, table.c.format, sort_by_parameter_order=True),
+                    list(rows))
+                store_scores(inserted.all())
+            else:
+                db.session.execute(insert(table), list(rows))
+        table_stats.add_rows(model, len(chunk))
+        if rollups and model is not Match:
+            fold_matches({row['match_id'] for row in chunk if row.get('match_id')})
+        response_cache.invalidate_on_commit(CACHE_TAGS[model])
+        db.session.commit()
+    except IntegrityError as e:
+        db.session.rollback()
+        raise ValueError(f"rows {first_line}-{first_line + len(chunk) - 1}: {e.orig}")
+
+
+def import_rows(model, rows: Iterable[Dict], chunk_size: int = DEFAULT_CHUNK_SIZE,
+                rollups: bool = True) -> Iterator[Dict]:
+    """
+    Пишет строки пачками с коммитом на каждую; после пачки - прогресс.
+    Неизвестная колонка или неверное значение - ValueError с номером строки,
+    уже записанные пачки остаются. rollups=False - витрины не обновляются
+    (для больших загрузок с последующим `flask rebuild-rollups`).
+    """
+    converters = {c.name: _converter(c) for c in _columns(model)}
+    types = {c.name: c.type.python_type for c in _columns(model)}
+    progress = {'rows': 0, 'chunks': 0}
+    chunk: List[Dict] = []
+    for number, row in enumerate(rows, 1):
+        unknown = row.keys() - converters.keys()
+        if unknown:
+            raise ValueError(f"row {number}: unknown columns {', '.join(sorted(map(str, unknown)))}")
+        try:
+            # Значения уже нужного типа (почти все в NDJSON) - без вызова конвертера
+            chunk.append({name: value if value.__class__ is types[name] and value != '' else converters[name](value)
+                          for name, value in row.items()})
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"row {number}: {e}")
+        if len(chunk) >= chunk_size:
+            _flush(model, chunk, number - len(chunk) + 1, rollups)
+            progress['rows'] += len(chunk)
+            progress['chunks'] += 1
+            chunk = []
+            yield dict(progress)
+    if chunk:
+        _flush(model, chunk, progress['rows'] + 1, rollups)
+        progress['rows'] += len(chunk)
+        progress['chunks'] += 1
+        yield dict(progress)
+    if rollups and model is Match:
+        # Новые завершенные матчи - в витрины; параллельный импорт сворачивает
+        # под той же блокировкой, иначе один матч попадет в витрины дважды
+        fold_pending_locked()
+
+
+def text_stream(binary: IO[bytes]) -> IO[str]:
+    """Бинарный поток (тело запроса, файл) как текст для построчного разбора"""
+    return io.TextIOWrapper(binary, encoding='utf-8', newline='')
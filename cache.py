@@ -0,0 +1,343 @@
+"""
+Кэш JSON-ответов read-API с инвалидацией из путей записи.
+
+Два уровня: локальный LRU с TTL в памяти воркера и необязательный общий
+(Redis или SQLite-файл как локальная замена Redis). Ключ ответа строится
+из пути, отсортированных query-параметров и версий "тегов" (matches,
+players, points). Пути записи помечают теги в транзакции (ORM-изменения -
+автоматически по after_flush, пакетные вставки - явно), после коммита
+версии тегов увеличиваются - старые записи больше не находятся и
+вытесняются LRU/TTL. С общим уровнем версии хранятся в нем, поэтому
+инвалидация видна всем воркерам. Без него версии живут в памяти воркера:
+точно инвалидируется только воркер, выполнивший запись, остальные увидят
+изменения не позже чем через TTL - поэтому без общего уровня TTL по
+умолчанию короткий (LOCAL_TTL), а для нескольких воркеров нужен
+CACHE_SHARED_URL.
+
+На каждый ответ выдается ETag, повторный запрос с If-None-Match
+получает 304 без тела.
+"""
+import hashlib
+import json
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import wraps
+from threading import Lock
+from typing import Dict, Iterable, List, Optional
+
+from flask import Response, request
+from sqlalchemy import event
+
+from models import db, Match, Player, PlayerPoints
+
+CACHED_HEADERS = ('X-Next-Cursor', 'Link')
+SHARED_TTL = 30  # TTL по умолчанию с общим уровнем, с
+LOCAL_TTL = 2  # без общего уровня: дольше других воркеров устаревать нельзя
+TAGS_BY_MODEL = {Match: 'matches', Player: 'players', PlayerPoints: 'points'}
+
+
+class LRUCache:
+    """Ограниченный по числу записей LRU с TTL на запись"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._data: OrderedDict = OrderedDict()
+        self._lock = Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at < time.monotonic():
+                del self._data[key]
+                self.expirations += 1
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: float):
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RedisStore:
+    """Общий уровень в Redis (нужен пакет redis)"""
+
+    def __init__(self, url: str):
+        import redis
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(key)
+
+    def set(self, key: str, value: bytes, ttl: float):
+        self.client.set(key, value, ex=max(1, int(ttl)))
+
+    def versions(self, tags: List[str]) -> List[int]:
+        return [int(v or 0) for v in self.client.mget([f'cache-version:{t}' for t in tags])]
+
+    def bump(self, tags: Iterable[str]):
+        pipe = self.client.pipeline()
+        for tag in tags:
+            pipe.incr(f'cache-version:{tag}')
+        pipe.execute()
+
+
+class SQLiteStore:
+    """Локальная замена Redis: общий для воркеров SQLite-файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_entry (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)')
+            conn.execute('CREATE TABLE IF NOT EXISTS cache_version (tag TEXT PRIMARY KEY, version INTEGER)')
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=5, isolation_level=None)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._connect() as conn:
+            row = conn.execute('SELECT value FROM cache_entry WHERE key = ? AND expires_at > ?',
+                               (key, time.time())).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO cache_entry (key, value, expires_at) VALUES (?, ?, ?)',
+                         (key, value, time.time() + ttl))
+            if hash(key) % 100 == 0:
+                conn.execute('DELETE FROM cache_entry WHERE expires_at <= ?', (time.time(),))
+
+    def versions(self, tags: List[str]) -> List[int]:
+        with self._connect() as conn:
+            found = dict(conn.execute(
+                f"SELECT tag, version FROM cache_version WHERE tag IN ({','.join('?' * len(tags))})", tags
+            ).fetchall())
+        return [found.get(tag, 0) for tag in tags]
+
+    def bump(self, tags: Iterable[str]):
+        with self._connect() as conn:
+            for tag in tags:
+                conn.execute('INSERT INTO cache_version (tag, version) VALUES (?, 1) '
+                             'ON CONFLICT(tag) DO UPDATE SET version = version + 1', (tag,))
+
+
+def create_store(url: Optional[str]):
+    if not url:
+        return None
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisStore(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported CACHE_SHARED_URL: {url}")
+
+
+class ResponseCache:
+    """Кэш ответов Flask-view с тегами, ETag и счетчиками"""
+
+    def __init__(self, max_entries: int = 1024, default_ttl: float = LOCAL_TTL):
+        self.local = LRUCache(max_entries)
+        self.default_ttl = default_ttl
+        self.shared = None
+        self.enabled = True
+        self._versions: Dict[str, int] = {}
+        self._lock = Lock()
+        self.counters = {
+            'hits_local': 0,
+            'hits_shared': 0,
+            'misses': 0,
+            'not_modified': 0,
+            'invalidations': 0,
+            'shared_errors': 0,
+        }
+
+    def init_app(self, app):
+        self.enabled = app.config.get('CACHE_ENABLED', True)
+        self.local = LRUCache(app.config.get('CACHE_MAX_ENTRIES', self.local.max_entries))
+        self.shared = create_store(app.config.get('CACHE_SHARED_URL'))
+        self.default_ttl = app.config.get('CACHE_TTL') or (SHARED_TTL if self.shared is not None else LOCAL_TTL)
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        app.extensions['response_cache'] = self
+
+    # --- Инвалидация ---
+
+    def invalidate_on_commit(self, *tags: str):
+        """Помечает теги; версии увеличатся только после успешного коммита"""
+        db.session.info.setdefault('cache_tags', set()).update(tags)
+
+    def invalidate(self, *tags: str):
+        with self._lock:
+            for tag in tags:
+                self._versions[tag] = self._versions.get(tag, 0) + 1
+            self.counters['invalidations'] += len(tags)
+        if self.shared is not None:
+            try:
+                self.shared.bump(tags)
+            except Exception as e:
+                self.counters['shared_errors'] += 1
+                print(f"❌ Ошибка общего кэша: {e}")
+                # Ключи строятся по общим версиям, а они не сменились - локальные записи устарели
+                self.local.clear()
+
+    def clear(self):
+        self.local.clear()
+        with self._lock:
+            self._versions.clear()
+
+    def _after_flush(self, session, flush_context):
+        # ORM-изменения помечаются сами; пакетные insert()/update() - через invalidate_on_commit
+        tags = {TAGS_BY_MODEL.get(type(obj)) for obj in (*session.new, *session.dirty, *session.deleted)}
+        tags.discard(None)
+        if tags:
+            session.info.setdefault('cache_tags', set()).update(tags)
+
+    def _after_commit(self, session):
+        tags = session.info.pop('cache_tags', None)
+        if tags:
+            self.invalidate(*tags)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('cache_tags', None)
+
+    # --- Чтение ---
+
+    def _tag_versions(self, tags: List[str]) -> List[str]:
+        """
+        С общим уровнем - только общие версии: ключ одинаков во всех
+        воркерах, инвалидацию для всех делает bump(). Локальные версии - без
+        общего уровня и пока он недоступен (с отдельным префиксом, чтобы не
+        совпасть с ключами по общим версиям).
+        """
+        if self.shared is not None:
+            try:
+                return [str(version) for version in self.shared.versions(tags)]
+            except Exception:
+                self.counters['shared_errors'] += 1
+                return [f"local.{self._versions.get(tag, 0)}" for tag in tags]
+        return [str(self._versions.get(tag, 0)) for tag in tags]
+
+    def make_key(self, tags: List[str]) -> str:
+        args = '&'.join(f"{k}={v}" for k, v in sorted(request.args.items(multi=True)))
+        versions = ','.join(f"{tag}:{v}" for tag, v in zip(tags, self._tag_versions(tags)))
+        return f"{request.path}?{args}|{versions}"
+
+    def _entry_ttl(self, ttl: Optional[float]) -> float:
+        """TTL записи: ttl view или default_ttl; без общего уровня - не дольше default_ttl"""
+        if ttl is None:
+            return self.default_ttl
+        return ttl if self.shared is not None else min(ttl, self.default_ttl)
+
+    def cached(self, *tags: str, ttl: Optional[float] = None):
+        """Декоратор view: кэширует успешные JSON-ответы с учетом тегов"""
+        tags = list(tags)
+
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return view(*args, **kwargs)
+
+                entry_ttl = self._entry_ttl(ttl)
+                key = self.make_key(tags)
+                entry = self.local.get(key)
+                if entry is not None:
+                    self.counters['hits_local'] += 1
+                elif self.shared is not None:
+                    entry = self._shared_get(key)
+                    if entry is not None:
+                        self.counters['hits_shared'] += 1
+                        self.local.set(key, entry, entry_ttl)
+
+                if entry is None:
+                    self.counters['misses'] += 1
+                    response = view(*args, **kwargs)
+                    if isinstance(response, tuple):
+                        return response  # ошибки (404/500) не кэшируем
+                    if response.status_code != 200 or response.is_streamed:
+                        return response
+                    entry = self._entry_from_response(response)
+                    self.local.set(key, entry, entry_ttl)
+                    if self.shared is not None:
+                        self._shared_set(key, entry, entry_ttl)
+
+                return self._respond(entry)
+            return wrapper
+        return decorator
+
+    def _entry_from_response(self, response: Response) -> Dict:
+        body = response.get_data()
+        return {
+            'body': body,
+            'etag': hashlib.sha1(body).hexdigest(),
+            'mimetype': response.mimetype,
+            'headers': {h: response.headers[h] for h in CACHED_HEADERS if h in response.headers},
+        }
+
+    def _respond(self, entry: Dict) -> Response:
+        if request.if_none_match.contains(entry['etag']):
+            self.counters['not_modified'] += 1
+            response = Response(status=304)
+        else:
+            response = Response(entry['body'], mimetype=entry['mimetype'])
+        for header, value in entry['headers'].items():
+            response.headers[header] = value
+        response.set_etag(entry['etag'])
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    def _shared_get(self, key: str) -> Optional[Dict]:
+        try:
+            raw = self.shared.get(key)
+        except Exception:
+            self.counters['shared_errors'] += 1
+            return None
+        if raw is None:
+            return None
+        etag, mimetype, headers, body = raw.split(b'\n', 3)
+        return {'etag': etag.decode(), 'mimetype': mimetype.decode(),
+                'headers': json.loads(headers), 'body': body}
+
+    def _shared_set(self, key: str, entry: Dict, ttl: float):
+        raw = b'\n'.join([entry['etag'].encode(), entry['mimetype'].encode(),
+                          json.dumps(entry['headers']).encode(), entry['body']])
+        try:
+            self.shared.set(key, raw, ttl)
+        except Exception:
+            self.counters['shared_errors'] += 1
+
+    def stats(self) -> Dict:
+        hits = self.counters['hits_local'] + self.counters['hits_shared']
+        total = hits + self.counters['misses']
+        return {
+            **self.counters,
+            'evictions': self.local.evictions,
+            'expirations': self.local.expirations,
+            'entries': len(self.local),
+            'max_entries': self.local.max_entries,
+            'hit_ratio': round(hits / total, 3) if total else None,
+            'shared_tier': type(self.shared).__name__ if self.shared is not None else None,
+            'ttl': self.default_ttl,
+            'versions': dict(self._versions),
+        }
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,169 @@
+"""
+Настройки подключения к базе данных.
+
+URL берется из DATABASE_URL (по умолчанию - SQLite-файл cricket.db).
+Для SQLite каждое новое соединение переводится в режим WAL (читатели не
+блокируют писателя и друг друга), synchronous=NORMAL (в WAL безопасно,
+fsync только на checkpoint), busy_timeout (писатели ждут блокировку, а не
+падают с "database is locked") и mmap_size; писатели внутри процесса
+выстраиваются в очередь, а пул ограничивает число потоков, одновременно
+работающих с БД. Для остальных СУБД (PostgreSQL и т.п.) размер пула,
+pre-ping и recycle задаются переменными окружения.
+"""
+import os
+import threading
+from typing import Dict, Mapping
+
+from sqlalchemy import event
+
+from models import db
+
+DEFAULT_DATABASE_URL = 'sqlite:///cricket.db'
+
+SQLITE_JOURNAL_MODES = {'WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'OFF'}
+SQLITE_SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+# BEGIN IMMEDIATE (lock_schema) сразу берет блокировку записи SQLite: без очереди
+# процесса он ждал бы писателя, который сам ждет эту блокировку, до busy_timeout
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'BEGIN IMMEDIATE')
+
+
+def database_url(environ: Mapping[str, str] = os.environ) -> str:
+    url = environ.get('DATABASE_URL') or DEFAULT_DATABASE_URL
+    if url.startswith('postgres://'):  # так URL выдают Heroku и подобные хостинги
+        url = 'postgresql://' + url[len('postgres://'):]
+    return url
+
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith('sqlite')
+
+
+def is_sqlite_memory(url: str) -> bool:
+    return url in ('sqlite://', 'sqlite:///:memory:') or 'mode=memory' in url
+
+
+def _flag(value: str) -> bool:
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _choice(value: str, allowed, name: str) -> str:
+    value = value.strip().upper()
+    if value not in allowed:
+        raise ValueError(f"{name} must be one of {', '.join(sorted(allowed))}")
+    return value
+
+
+def database_settings(environ: Mapping[str, str] = os.environ) -> Dict:
+    """Ключи app.config для Flask-SQLAlchemy и прагм SQLite"""
+    url = database_url(environ)
+    settings = {'SQLALCHEMY_DATABASE_URI': url}
+
+    if is_sqlite(url):
+        busy_timeout = int(environ.get('SQLITE_BUSY_TIMEOUT', 5000))  # мс
+        settings.update({
+            'SQLITE_JOURNAL_MODE': _choice(environ.get('SQLITE_JOURNAL_MODE', 'WAL'),
+                                           SQLITE_JOURNAL_MODES, 'SQLITE_JOURNAL_MODE'),
+            'SQLITE_SYNCHRONOUS': _choice(environ.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+                                          SQLITE_SYNCHRONOUS_MODES, 'SQLITE_SYNCHRONOUS'),
+            'SQLITE_BUSY_TIMEOUT': busy_timeout,
+            'SQLITE_MMAP_SIZE': int(environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+            'SQLITE_WRITE_LOCK': _flag(environ.get('SQLITE_WRITE_LOCK', '1')),
+        })
+        options = {'connect_args': {'timeout': busy_timeout / 1000, 'check_same_thread': False}}
+        if not is_sqlite_memory(url):
+            # Не по соединению на каждый поток gthread: писатель все равно один,
+            # а лишние потоки в БД только отнимают GIL у держателя блокировки.
+            # Остальные запросы ждут соединение в очереди пула
+            options.update({
+                'pool_size': int(environ.get('DB_POOL_SIZE', 8)),
+                'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 0)),
+                'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+            })
+    else:
+        options = {
+            'pool_size': int(environ.get('DB_POOL_SIZE', 5)),
+            'max_overflow': int(environ.get('DB_MAX_OVERFLOW', 10)),
+            'pool_timeout': float(environ.get('DB_POOL_TIMEOUT', 30)),
+            'pool_recycle': int(environ.get('DB_POOL_RECYCLE', 1800)),
+            'pool_pre_ping': _flag(environ.get('DB_POOL_PRE_PING', '1')),
+        }
+
+    settings['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    return settings
+
+
+def install_sqlite_pragmas(engine, config: Mapping):
+    """Выставляет прагмы на каждом новом соединении SQLite"""
+    pragmas = (
+        ('busy_timeout', config.get('SQLITE_BUSY_TIMEOUT', 5000)),
+        ('journal_mode', config.get('SQLITE_JOURNAL_MODE', 'WAL')),
+        ('synchronous', config.get('SQLITE_SYNCHRONOUS', 'NORMAL')),
+        ('mmap_size', config.get('SQLITE_MMAP_SIZE', 0)),
+    )
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas:
+            cursor.execute(f'PRAGMA {name} = {value}')
+        cursor.close()
+
+
+def install_sqlite_write_lock(engine, timeout: float):
+    """
+    Пускает к записи по одной транзакции на процесс.
+
+    SQLite все равно допускает одного писателя, но ждущие блокировку
+    соединения спят в busy-handler с растущими паузами (до 100 мс), и при
+    десятках потоков блокировка простаивает, а часть запросов не дожидается
+    ее за busy_timeout. Очередь на threading.Lock внутри процесса будит
+    следующего писателя сразу; между процессами остается busy_timeout.
+    Чтение не ограничивается. Если блокировку не удалось взять за timeout,
+    запрос выполняется без нее (как без этой настройки).
+    """
+    lock = threading.Lock()
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def acquire(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get('write_lock') or not statement.lstrip()[:15].upper().startswith(WRITE_STATEMENTS):
+            return
+        conn.info['write_lock'] = lock.acquire(timeout=timeout)
+
+    def release(info):
+        if info.pop('write_lock', False):
+            lock.release()
+
+    event.listen(engine, 'commit', lambda conn: release(conn.info))
+    event.listen(engine, 'rollback', lambda conn: release(conn.info))
+    # Соединение вернули в пул без commit/rollback - пул откатывает его сам
+    event.listen(engine.pool, 'reset', lambda dbapi_connection, record, reset_state: release(record.info))
+    event.listen(engine.pool, 'invalidate', lambda dbapi_connection, record, exception: release(record.info))
+
+
+def install_fork_safety(engine):
+    """
+    Воркеры gunicorn с preload наследуют движок от мастера: соединения,
+    открытые до fork, в дочернем процессе не используются (их сокеты и
+    файлы общие с родителем) - пул начинается заново.
+    """
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=lambda: engine.dispose(close=False))
+
+
+def init_database(app):
+    """
+    Настраивает Flask-SQLAlchemy по окружению и подключает db к приложению.
+    Ключи, уже заданные в app.config, не перезаписываются. К БД не
+    подключается: движок создается, соединения - при первом запросе.
+    """
+    for key, value in database_settings().items():
+        app.config.setdefault(key, value)
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    db.init_app(app)
+
+    with app.app_context():
+        install_fork_safety(db.engine)
+        if is_sqlite(app.config['SQLALCHEMY_DATABASE_URI']):
+            install_sqlite_pragmas(db.engine, app.config)
+            if app.config.get('SQLITE_WRITE_LOCK'):
+                install_sqlite_write_lock(db.engine, app.config['SQLITE_BUSY_TIMEOUT'] / 1000)
@@ -0,0 +1,319 @@
+"""
+Фэнтези-контесты: команды пользователей из 11 игроков матча, капитан
+получает x2, вице-капитан x1.5, места обновляются по ходу матча.
+
+Состав команды хранится компактно - 11 id игроков одним int32-блоком,
+капитан и вице-капитан на первых двух позициях, поэтому множитель
+определяется позицией. В памяти у контеста (ContestBoard):
+- lineups: массив (n, 11) int32 и очки команд totals;
+- обратный индекс игрок -> (строка команды, позиция) в CSR-виде: при
+  изменении очков игрока пересчитываются только команды с ним, на
+  разницу очков, а не весь контест;
+- RankIndex: очки команд, отсортированные по убыванию, - место команды
+  ищется двоичным поиском, top-k - срез, изменившиеся команды
+  вливаются обратно одним слиянием.
+
+Очки игроков берутся из PlayerPoints (одна запись на игрока и матч).
+Доска подтягивает новые команды и очки матча не чаще, чем раз в
+refresh_interval секунд (так видны записи других воркеров), а после
+локального пересчета очков - при следующем чтении.
+"""
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from models import db, Contest, ContestTeam, Player, PlayerPoints
+
+TEAM_SIZE = 11
+CAPTAIN_MULTIPLIER = 2.0
+VICE_CAPTAIN_MULTIPLIER = 1.5
+SLOT_WEIGHTS = np.array([CAPTAIN_MULTIPLIER, VICE_CAPTAIN_MULTIPLIER] + [1.0] * (TEAM_SIZE - 2))
+LINEUP_DTYPE = np.dtype('<i4')
+MAX_TEAMS_PER_REQUEST = 1000
+
+
+def pack_lineup(player_ids: Sequence[int], captain_id: int, vice_captain_id: int) -> bytes:
+    """Состав в блок: капитан, вице-капитан, остальные в исходном порядке"""
+    rest = [pid for pid in player_ids if pid not in (captain_id, vice_captain_id)]
+    return np.asarray([captain_id, vice_captain_id, *rest], dtype=LINEUP_DTYPE).tobytes()
+
+
+def unpack_lineup(lineup: bytes) -> List[int]:
+    return np.frombuffer(lineup, dtype=LINEUP_DTYPE).tolist()
+
+
+def validate_team(entry: Dict, match_players: Optional[set] = None) -> bytes:
+    """Проверяет заявку команды из запроса; ValueError - неверный состав"""
+    if not isinstance(entry, dict):
+        raise ValueError("team must be an object")
+    if not entry.get('user'):
+        raise ValueError("user is required")
+    players = entry.get('players')
+    if (not isinstance(players, list) or len(players) != TEAM_SIZE
+            or any(isinstance(pid, bool) or not isinstance(pid, int) for pid in players)):
+        raise ValueError(f"players must be a list of {TEAM_SIZE} player ids")
+    if len(set(players)) != TEAM_SIZE:
+        raise ValueError("players must be distinct")
+    captain_id, vice_captain_id = entry.get('captain_id'), entry.get('vice_captain_id')
+    if captain_id not in players or vice_captain_id not in players:
+        raise ValueError("captain_id and vice_captain_id must be in players")
+    if captain_id == vice_captain_id:
+        raise ValueError("captain and vice-captain must be different players")
+    if match_players is not None and not set(players) <= match_players:
+        raise ValueError(f"Players not in the contest match: {sorted(set(players) - match_players)}")
+    return pack_lineup(players, captain_id, vice_captain_id)
+
+
+def enter_teams(contest: Contest, entries: List[Dict], commit: bool = True) -> List[int]:
+    """Записывает команды контеста и возвращает их id"""
+    if not entries:
+        raise ValueError("teams is required")
+    if len(entries) > MAX_TEAMS_PER_REQUEST:
+        raise ValueError(f"At most {MAX_TEAMS_PER_REQUEST} teams per request")
+    requested = {pid for entry in entries if isinstance(entry, dict)
+                 for pid in (entry.get('players') or []) if isinstance(pid, int)}
+    match_players = {pid for (pid,) in db.session.query(Player.id).filter(
+        Player.id.in_(requested), Player.match_id == contest.match_id)}
+
+    teams = [ContestTeam(contest_id=contest.id, user_name=str(entry['user']),
+                         lineup=validate_team(entry, match_players))
+             for entry in entries]
+    db.session.add_all(teams)
+    db.session.flush()
+    if commit:
+        db.session.commit()
+    return [team.id for team in teams]
+
+
+class RankIndex:
+    """
+    Порядковая статистика очков команд: очки по убыванию (храним -очки
+    по возрастанию) и строки команд в том же порядке. Место - число команд
+    с большими очками + 1, поэтому при равенстве место общее.
+
+    Обновление - устойчивая сортировка (timsort) уже почти упорядоченной
+    последовательности: неизменившиеся команды идут одним готовым отрезком,
+    изменившиеся - отрезками по группам с одинаковым сдвигом очков (у них
+    прежний взаимный порядок сохраняется), так что сортировка сводится
+    к слиянию нескольких отрезков.
+    """
+
+    def __init__(self):
+        self.neg = np.empty(0, dtype=np.float64)
+        self.rows = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def update(self, totals: np.ndarray, labels: Optional[np.ndarray] = None, groups: int = 0):
+        """
+        totals - очки всех команд; строки за пределами индекса - новые команды.
+        labels[row] - группа изменившейся команды 1..groups (0 - не менялась).
+        """
+        known = self.rows
+        if groups:
+            old = labels[known]
+            parts = [known[old == group] for group in range(groups + 1)]
+        else:
+            parts = [known]
+        fresh = np.arange(len(known), len(totals))
+        if len(fresh):
+            parts.append(fresh[np.argsort(-totals[fresh], kind='stable')])
+
+        rows = np.concatenate(parts)
+        neg = -totals[rows]
+        order = np.argsort(neg, kind='stable')
+        self.rows, self.neg = rows[order], neg[order]
+
+    def rank(self, total) -> np.ndarray:
+        return np.searchsorted(self.neg, -np.asarray(total, dtype=np.float64), side='left') + 1
+
+    def top(self, k: int) -> np.ndarray:
+        return self.rows[:k]
+
+
+class ContestBoard:
+    """Команды одного контеста в памяти: составы, очки, обратный индекс и места"""
+
+    def __init__(self, contest_id: int, match_id: int):
+        self.contest_id = contest_id
+        self.match_id = match_id
+        self.team_ids = np.empty(0, dtype=np.int64)
+        self.lineups = np.empty((0, TEAM_SIZE), dtype=np.int32)
+        self.totals = np.empty(0, dtype=np.float64)
+        self.points: Dict[int, float] = {}  # очки игроков, по которым посчитаны totals
+        self.ranks = RankIndex()
+        self._index = None  # (игроки, начала диапазонов, строки команд, позиции)
+        self.refreshed_at = 0.0
+        self.due = True
+
+    def __len__(self):
+        return len(self.team_ids)
+
+    @property
+    def last_team_id(self) -> int:
+        return int(self.team_ids[-1]) if len(self.team_ids) else 0
+
+    def _player_points(self, lineups: np.ndarray) -> np.ndarray:
+        """Очки игроков для массива id (нет записи - 0)"""
+        if not self.points:
+            return np.zeros(lineups.shape, dtype=np.float64)
+        ids = np.fromiter(self.points.keys(), dtype=np.int64, count=len(self.points))
+        values = np.fromiter(self.points.values(), dtype=np.float64, count=len(self.points))
+        order = np.argsort(ids)
+        ids, values = ids[order], values[order]
+        positions = np.minimum(np.searchsorted(ids, lineups), len(ids) - 1)
+        return np.where(ids[positions] == lineups, values[positions], 0.0)
+
+    def add_teams(self, team_ids: np.ndarray, lineups: np.ndarray):
+        """Новые команды (id по возрастанию, больше уже загруженных)"""
+        if not len(team_ids):
+            return
+        totals = np.round((self._player_points(lineups) * SLOT_WEIGHTS).sum(axis=1), 3)
+        self.team_ids = np.concatenate([self.team_ids, team_ids])
+        self.lineups = np.concatenate([self.lineups, lineups])
+        self.totals = np.concatenate([self.totals, totals])
+        self._index = None
+        self.ranks.update(self.totals)
+
+    def _build_index(self):
+        flat = self.lineups.ravel()
+        order = np.argsort(flat)
+        players, starts = np.unique(flat[order], return_index=True)
+        starts = np.append(starts, len(flat))
+        self._index = (players, starts, (order // TEAM_SIZE).astype(np.int64), (order % TEAM_SIZE).astype(np.int8))
+
+    def teams_with(self, player_id: int) -> np.ndarray:
+        """Строки команд с игроком (через обратный индекс)"""
+        if self._index is None:
+            self._build_index()
+        players, starts, rows, _ = self._index
+        i = np.searchsorted(players, player_id)
+        if i == len(players) or players[i] != player_id:
+            return rows[:0]
+        return rows[starts[i]:starts[i + 1]]
+
+    def apply_points(self, points: Dict[int, float]) -> int:
+        """
+        Новые очки игроков матча (кого нет в points - 0). Очки команд меняются
+        на разницу только у команд с этими игроками; возвращает число команд,
+        у которых изменились очки.
+        """
+        deltas = {pid: points.get(pid, 0.0) - self.points.get(pid, 0.0)
+                  for pid in set(points) | set(self.points)}
+        deltas = {pid: delta for pid, delta in deltas.items() if delta}
+        self.points = {pid: value for pid, value in points.items() if value}
+        if not deltas or not len(self.team_ids):
+            return 0
+
+        if self._index is None:
+            self._build_index()
+        players, starts, rows, slots = self._index
+        # Игрок входит в команду не больше одного раза, поэтому сложение
+        # по индексам без повторов; у одного игрока сдвиг команды зависит
+        # только от позиции: капитан, вице-капитан или остальные
+        team_delta = np.zeros(len(self.team_ids))
+        labels = np.zeros(len(self.team_ids), dtype=np.int8)
+        for player_id, delta in deltas.items():
+            i = np.searchsorted(players, player_id)
+            if i == len(players) or players[i] != player_id:
+                continue
+            teams, positions = rows[starts[i]:starts[i + 1]], slots[starts[i]:starts[i + 1]]
+            team_delta[teams] += SLOT_WEIGHTS[positions] * delta
+            labels[teams] = np.minimum(positions, 2) + 1
+        changed = np.flatnonzero(team_delta)
+        if not len(changed):
+            return 0
+
+        self.totals[changed] = np.round(self.totals[changed] + team_delta[changed], 3)
+        if len(deltas) == 1:
+            self.ranks.update(self.totals, labels, groups=3)
+        else:
+            # Сдвиги нескольких игроков складываются - общий порядок групп не гарантирован
+            labels[changed] = 1
+            self.ranks.update(self.totals, labels, groups=1)
+        return len(changed)
+
+    def row_of(self, team_id: int) -> Optional[int]:
+        row = int(np.searchsorted(self.team_ids, team_id))
+        if row < len(self.team_ids) and self.team_ids[row] == team_id:
+            return row
+        return None
+
+    def standing(self, team_id: int) -> Optional[Dict]:
+        row = self.row_of(team_id)
+        if row is None:
+            return None
+        return {'team_id': team_id, 'points': float(self.totals[row]),
+                'rank': int(self.ranks.rank(self.totals[row])), 'teams': len(self.team_ids)}
+
+    def top(self, k: int) -> List[Dict]:
+        rows = self.ranks.top(k)
+        totals = self.totals[rows]
+        return [{'rank': int(rank), 'team_id': int(team_id), 'points': float(total)}
+                for rank, team_id, total in zip(self.ranks.rank(totals), self.team_ids[rows], totals)]
+
+
+class ContestEngine:
+    """Доски контестов процесса с инкрементальным обновлением"""
+
+    def __init__(self, refresh_interval: float = 2.0):
+        self.refresh_interval = refresh_interval
+        self._boards: Dict[int, ContestBoard] = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.refresh_interval = app.config.get('CONTEST_REFRESH_INTERVAL', self.refresh_interval)
+        app.extensions['contests'] = self
+
+    def points_changed(self, match_ids: Optional[Iterable[int]] = None):
+        """Очки игроков матчей пересчитаны (None - всех матчей)"""
+        match_ids = None if match_ids is None else set(match_ids)
+        with self._lock:
+            for board in self._boards.values():
+                if match_ids is None or board.match_id in match_ids:
+                    board.due = True
+
+    def teams_added(self, contest_id: int):
+        with self._lock:
+            board = self._boards.get(contest_id)
+            if board:
+                board.due = True
+
+    def reset(self):
+        with self._lock:
+            self._boards.clear()
+
+    def board(self, contest_id: int) -> Optional[ContestBoard]:
+        with self._lock:
+            board = self._boards.get(contest_id)
+            if board is None:
+                contest = db.session.get(Contest, contest_id)
+                if contest is None:
+                    return None
+                board = self._boards[contest_id] = ContestBoard(contest.id, contest.match_id)
+            if board.due or time.monotonic() - board.refreshed_at > self.refresh_interval:
+                self._refresh(board)
+            return board
+
+    def _refresh(self, board: ContestBoard):
+        teams = ContestTeam.__table__
+        rows = db.session.execute(
+            db.select(teams.c.id, teams.c.lineup)
+            .where(teams.c.contest_id == board.contest_id, teams.c.id > board.last_team_id)
+            .order_by(teams.c.id)
+        ).all()
+        # Очки до новых команд - новые сразу считаются по текущим очкам
+        board.apply_points(dict(db.session.query(PlayerPoints.player_id, PlayerPoints.points)
+                                .filter(PlayerPoints.match_id == board.match_id)))
+        if rows:
+            board.add_teams(np.fromiter((row.id for row in rows), dtype=np.int64, count=len(rows)),
+                            np.frombuffer(b''.join(row.lineup for row in rows), dtype=LINEUP_DTYPE)
+                            .reshape(-1, TEAM_SIZE).astype(np.int32))
+        board.refreshed_at = time.monotonic()
+        board.due = False
+
+
+contests = ContestEngine()
@@ -0,0 +1,283 @@
+"""
+Журнал подач (ball-by-ball) и агрегаты игроков за матч.
+
+Каждая подача - строка Delivery; журнал только дописывается, позиция
+(match_id, innings, over, ball) уникальна, поэтому повторная отправка
+тех же мячей не задваивает статистику. Вместе с подачами в той же
+транзакции обновляются агрегаты PlayerMatchStats: к уже посчитанным
+значениям прибавляется только вклад новых мячей, журнал заново не
+суммируется. Расчет очков читает готовые агрегаты, а rebuild_match_stats
+восстанавливает их из журнала для проверки.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, func, insert, tuple_, update
+
+from cache import response_cache
+from models import db, Delivery, Player, PlayerMatchStats
+from rollups import fold_matches
+
+EXTRA_TYPES = {'wide', 'no_ball', 'bye', 'leg_bye'}
+BOWLER_EXTRAS = {'wide', 'no_ball'}  # записываются на боулера; bye/leg_bye - нет
+BOWLER_WICKETS = {'bowled', 'lbw', 'caught', 'caught_and_bowled', 'stumped', 'hit_wicket'}
+WICKET_KINDS = BOWLER_WICKETS | {'run_out', 'retired_out', 'obstructing_field', 'timed_out', 'handled_ball'}
+FIELDER_CREDIT = {'caught': 'catches', 'caught_and_bowled': 'catches', 'stumped': 'stumpings', 'run_out': 'run_outs'}
+
+COUNTER_FIELDS = ('runs', 'balls_faced', 'fours', 'sixes', 'legal_balls', 'runs_conceded',
+                  'wickets', 'maidens', 'catches', 'stumpings', 'run_outs', 'over_runs', 'over_balls')
+STATS_FIELDS = COUNTER_FIELDS + ('dismissal_type', 'over_key')
+# Итоги Player, которые подачи увеличивают
+PLAYER_TOTALS = ('runs', 'balls_faced', 'wickets', 'runs_conceded')
+
+
+@dataclass
+class AppendResult:
+    appended: int = 0
+    duplicates: int = 0
+    players_updated: int = 0
+    player_ids: List[int] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'appended': self.appended, 'duplicates': self.duplicates, 'players_updated': self.players_updated}
+
+
+def _int(item: Dict, name: str, default: Optional[int] = None, minimum: int = 0) -> Optional[int]:
+    value = item.get(name, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int) or value < minimum:
+        raise ValueError(f"{name} must be an integer >= {minimum}")
+    return value
+
+
+def normalize_delivery(match_id: int, item: Dict) -> Dict:
+    """Проверяет подачу из запроса и приводит ее к колонкам Delivery"""
+    extra_type = item.get('extra_type') or None
+    if extra_type is not None and extra_type not in EXTRA_TYPES:
+        raise ValueError(f"extra_type must be one of {', '.join(sorted(EXTRA_TYPES))}")
+    wicket = item.get('wicket') or None
+    if wicket is not None and wicket not in WICKET_KINDS:
+        raise ValueError(f"Unknown wicket kind: {wicket}")
+
+    delivery = {
+        'match_id': match_id,
+        'innings': _int(item, 'innings', 1, minimum=1),
+        'over': _int(item, 'over'),
+        'ball': _int(item, 'ball', minimum=1),
+        'batter_id': _int(item, 'batter_id', minimum=1),
+        'bowler_id': _int(item, 'bowler_id', minimum=1),
+        'runs': _int(item, 'runs', 0),
+        'extras': _int(item, 'extras', 0),
+        'extra_type': extra_type,
+        'wicket': wicket,
+        'dismissed_id': _int(item, 'dismissed_id', minimum=1),
+        'fielder_id': _int(item, 'fielder_id', minimum=1),
+    }
+    for name in ('over', 'ball', 'batter_id', 'bowler_id'):
+        if delivery[name] is None:
+            raise ValueError(f"{name} is required")
+    if wicket and delivery['dismissed_id'] is None:
+        delivery['dismissed_id'] = delivery['batter_id']
+    return delivery
+
+
+def delivery_key(delivery) -> Tuple[int, int, int, int]:
+    return (delivery['match_id'], delivery['innings'], delivery['over'], delivery['ball'])
+
+
+def empty_stats() -> Dict:
+    stats = {name: 0 for name in COUNTER_FIELDS}
+    stats['dismissal_type'] = 'not_out'
+    stats['over_key'] = None
+    return stats
+
+
+def apply_delivery(stats_for, delivery: Dict):
+    """Прибавляет вклад одной подачи к агрегатам; stats_for(player_id) -> dict"""
+    extra_type = delivery['extra_type']
+    runs = delivery['runs']
+
+    batter = stats_for(delivery['batter_id'])
+    batter['runs'] += runs
+    if extra_type != 'wide':
+        batter['balls_faced'] += 1
+    if runs == 4:
+        batter['fours'] += 1
+    elif runs == 6:
+        batter['sixes'] += 1
+
+    bowler = stats_for(delivery['bowler_id'])
+    conceded = runs + (delivery['extras'] if extra_type in BOWLER_EXTRAS else 0)
+    bowler['runs_conceded'] += conceded
+    over_key = delivery['innings'] * 1000 + delivery['over']
+    if bowler['over_key'] != over_key:
+        bowler['over_key'] = over_key
+        bowler['over_runs'] = 0
+        bowler['over_balls'] = 0
+    bowler['over_runs'] += conceded
+    if extra_type not in BOWLER_EXTRAS:
+        bowler['legal_balls'] += 1
+        bowler['over_balls'] += 1
+        if bowler['over_balls'] == 6 and bowler['over_runs'] == 0:
+            bowler['maidens'] += 1
+
+    wicket = delivery['wicket']
+    if wicket:
+        stats_for(delivery['dismissed_id'])['dismissal_type'] = wicket
+        if wicket in BOWLER_WICKETS:
+            bowler['wickets'] += 1
+        credit = FIELDER_CREDIT.get(wicket)
+        fielder_id = delivery['fielder_id'] or (delivery['bowler_id'] if wicket == 'caught_and_bowled' else None)
+        if credit and fielder_id:
+            stats_for(fielder_id)[credit] += 1
+
+
+def _ordered(deliveries: Iterable[Dict]) -> List[Dict]:
+    return sorted(deliveries, key=delivery_key)
+
+
+def append_deliveries(match_id: int, items: Iterable[Dict], commit: bool = True) -> AppendResult:
+    """
+    Дописывает подачи матча и обновляет агрегаты игроков.
+    Уже записанные позиции пропускаются; ValueError - неверные данные.
+    Подачи одного матча должны приходить по порядку (внутри пачки они
+    сортируются сами) - от этого зависит подсчет maiden-оверов.
+    """
+    incoming = {}
+    for item in items:
+        delivery = normalize_delivery(match_id, item)
+        incoming[delivery_key(delivery)] = delivery
+
+    result = AppendResult()
+    if not incoming:
+        return result
+
+    existing = {
+        (match_id, row.innings, row.over, row.ball)
+        for row in db.session.query(Delivery.innings, Delivery.over, Delivery.ball)
+        .filter(Delivery.match_id == match_id,
+                tuple_(Delivery.innings, Delivery.over, Delivery.ball).in_(
+                    [key[1:] for key in incoming]))
+    }
+    new = _ordered(d for key, d in incoming.items() if key not in existing)
+    result.duplicates = len(incoming) - len(new)
+    if not new:
+        return result
+
+    player_ids = set()
+    for d in new:
+        player_ids.update(pid for pid in (d['batter_id'], d['bowler_id'], d['dismissed_id'], d['fielder_id']) if pid)
+    known = {pid for (pid,) in db.session.query(Player.id).filter(Player.id.in_(player_ids))}
+    if player_ids - known:
+        raise ValueError(f"Unknown player ids: {sorted(player_ids - known)}")
+
+    # Вставка журнала первой: запись берет блокировку, и агрегаты ниже читаются
+    # уже в ней (для PostgreSQL - FOR UPDATE), так параллельные пачки не теряют приращения
+    db.session.execute(insert(Delivery), new)
+
+    stored = {
+        row.player_id: row for row in db.session.query(
+            PlayerMatchStats.player_id, *(getattr(PlayerMatchStats, name) for name in STATS_FIELDS))
+        .filter(PlayerMatchStats.match_id == match_id, PlayerMatchStats.player_id.in_(player_ids))
+        .with_for_update()
+    }
+    current: Dict[int, Dict] = {}
+
+    def stats_for(player_id):
+        stats = current.get(player_id)
+        if stats is None:
+            row = stored.get(player_id)
+            stats = {name: getattr(row, name) for name in STATS_FIELDS} if row else empty_stats()
+            current[player_id] = stats
+        return stats
+
+    for delivery in new:
+        apply_delivery(stats_for, delivery)
+
+    inserts, updates, player_deltas = [], [], []
+    for player_id, stats in current.items():
+        row = stored.get(player_id)
+        if row is None:
+            inserts.append({'player_id': player_id, 'match_id': match_id, **stats})
+            before = empty_stats()
+        else:
+            updates.append({'player_id': player_id, 'match_id': match_id, **stats})
+            before = {name: getattr(row, name) for name in PLAYER_TOTALS}
+        delta = {f'd_{name}': stats[name] - before[name] for name in PLAYER_TOTALS}
+        if any(delta.values()):
+            player_deltas.append({'pid': player_id, **delta})
+
+    if inserts:
+        db.session.execute(insert(PlayerMatchStats), inserts)
+    if updates:
+        db.session.execute(update(PlayerMatchStats), updates)
+    if player_deltas:
+        # Итоги Player - приращением в SQL, без чтения текущих значений
+        players = Player.__table__
+        db.session.connection().execute(
+            players.update().where(players.c.id == bindparam('pid'))
+            .values({name: func.coalesce(players.c[name], 0) + bindparam(f'd_{name}') for name in PLAYER_TOTALS}),
+            player_deltas
+        )
+
+    response_cache.invalidate_on_commit('players')
+    fold_matches([match_id])  # поправки завершенного матча - сразу в витрины
+    if commit:
+        db.session.commit()
+
+    result.appended = len(new)
+    result.players_updated = len(player_deltas)
+    result.player_ids = sorted(current)
+    return result
+
+
+def rebuild_match_stats(match_id: int) -> Dict[int, Dict]:
+    """Агрегаты матча, заново посчитанные по журналу (для проверки/аудита)"""
+    columns = [getattr(Delivery, name) for name in
+               ('match_id', 'innings', 'over', 'ball', 'batter_id', 'bowler_id', 'runs',
+                'extras', 'extra_type', 'wicket', 'dismissed_id', 'fielder_id')]
+    rebuilt: Dict[int, Dict] = {}
+
+    def stats_for(player_id):
+        return rebuilt.setdefault(player_id, empty_stats())
+
+    for row in (db.session.query(*columns).filter(Delivery.match_id == match_id)
+                .order_by(Delivery.innings, Delivery.over, Delivery.ball)):
+        apply_delivery(stats_for, row._asdict())
+    return rebuilt
+
+
+# --- Входные данные для score_calculator ---
+
+def load_match_stats(pairs: Iterable[Tuple[int, int]]) -> Dict[Tuple[int, int], PlayerMatchStats]:
+    """Агрегаты по парам (player_id, match_id) одним запросом"""
+    pairs = list(set(pairs))
+    if not pairs:
+        return {}
+    rows = db.session.query(PlayerMatchStats).filter(
+        tuple_(PlayerMatchStats.player_id, PlayerMatchStats.match_id).in_(pairs))
+    return {(row.player_id, row.match_id): row for row in rows}
+
+
+def batting_inputs(stats: PlayerMatchStats) -> Dict:
+    return {
+        'runs': stats.runs,
+        'balls_faced': stats.balls_faced if stats.balls_faced > 0 else 1,
+        'fours': stats.fours,
+        'sixes': stats.sixes,
+        'dismissal_type': stats.dismissal_type
+    }
+
+
+def bowling_inputs(stats: PlayerMatchStats) -> Dict:
+    return {
+        'wickets': stats.wickets,
+        'runs_conceded': stats.runs_conceded,
+        'overs_bowled': stats.overs_bowled,
+        'maidens': stats.maidens
+    }
+
+
+def fielding_inputs(stats: PlayerMatchStats) -> Dict:
+    return {'catches': stats.catches, 'stumpings': stats.stumpings, 'run_outs': stats.run_outs}
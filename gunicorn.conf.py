@@ -0,0 +1,15 @@
+"""
+Настройки gunicorn (читаются автоматически из рабочего каталога).
+
+Приложение импортируется один раз в мастере (preload_app) и достается
+воркерам через fork: импорт и создание приложения в БД не обращаются, пул
+соединений после fork начинается заново (config.install_fork_safety), а
+фоновые потоки запускаются уже в воркере. Схему и служебные данные
+готовит flask deploy до старта (release в Procfile).
+"""
+preload_app = True
+
+
+def post_worker_init(worker):
+    from app import start_background_jobs
+    start_background_jobs(worker.wsgi)
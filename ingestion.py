@@ -0,0 +1,238 @@
+"""
+Конвейер загрузки live-матчей с внешних страниц.
+
+Страницы качаются параллельно в пуле потоков через общую requests.Session
+с пулом соединений. Повторные запросы условные (If-None-Match /
+If-Modified-Since), поэтому неизменившиеся страницы отдаются сервером как
+304 и не разбираются. Разбор HTML выполняется в тех же рабочих потоках,
+а дальше (в БД) передаются только матчи, данные которых действительно
+изменились с прошлого прогона.
+"""
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from threading import Lock, Thread
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from metrics import metrics
+from scraper import parse_matches_html
+
+USER_AGENT = 'CricketScoreAPI/1.0 (+live score ingestion)'
+MATCH_FIELDS = ('venue', 'format', 'status', 'score', 'match_date')
+
+if TYPE_CHECKING:
+    import requests
+
+
+@dataclass
+class PageResult:
+    url: str
+    status: str  # fetched, not_modified, unchanged, error
+    matches: List[Dict] = field(default_factory=list)
+    error: Optional[str] = None
+
+
+@dataclass
+class IngestionResult:
+    changed: List[Dict] = field(default_factory=list)
+    pages_fetched: int = 0
+    pages_not_modified: int = 0
+    pages_unchanged: int = 0
+    pages_failed: int = 0
+    matches_seen: int = 0
+    elapsed: float = 0.0
+    errors: List[str] = field(default_factory=list)
+
+    @property
+    def pages_total(self) -> int:
+        return self.pages_fetched + self.pages_not_modified + self.pages_unchanged + self.pages_failed
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages_total / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> Dict:
+        return {
+            'matches_changed': len(self.changed),
+            'matches_seen': self.matches_seen,
+            'pages_fetched': self.pages_fetched,
+            'pages_not_modified': self.pages_not_modified,
+            'pages_unchanged': self.pages_unchanged,
+            'pages_failed': self.pages_failed,
+            'elapsed': round(self.elapsed, 3),
+            'pages_per_second': round(self.pages_per_second, 1),
+            'errors': self.errors[:10]
+        }
+
+
+def create_session(pool_size: int = 16, retries: int = 2) -> 'requests.Session':
+    """Session с пулом keep-alive соединений и повтором временных ошибок"""
+    import requests
+    from requests.adapters import HTTPAdapter
+    from urllib3.util.retry import Retry
+
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(total=retries, backoff_factor=0.3,
+                          status_forcelist=(502, 503, 504), allowed_methods=('GET',))
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['User-Agent'] = USER_AGENT
+    return session
+
+
+def match_key(match: Dict) -> tuple:
+    return (match.get('team1'), match.get('team2'), match.get('format'), match.get('match_date'))
+
+
+class IngestionPipeline:
+    """Параллельная инкрементальная загрузка страниц с матчами"""
+
+    def __init__(self, urls: List[str], max_workers: int = 8, timeout: float = 10.0,
+                 session: Optional['requests.Session'] = None,
+                 parser: Callable[[bytes], List[Dict]] = parse_matches_html):
+        self.urls = list(urls)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._session = session
+        self._session_lock = Lock()
+        self.parser = parser
+        self._validators: Dict[str, Dict[str, str]] = {}
+        self._page_hashes: Dict[str, str] = {}
+        self._fingerprints: Dict[tuple, tuple] = {}
+        self.page_statuses: Dict[str, set] = {}  # статусы матчей на странице при последнем разборе
+        self._run_lock = Lock()
+        self._thread: Optional[Thread] = None
+        self.last_result: Optional[IngestionResult] = None
+
+    @property
+    def session(self) -> 'requests.Session':
+        """Session создается при первой загрузке - уже в воркере, а не при импорте приложения"""
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    self._session = create_session(pool_size=self.max_workers)
+        return self._session
+
+    def fetch_page(self, url: str) -> PageResult:
+        """Условный GET и разбор одной страницы (выполняется в рабочем потоке)"""
+        import requests
+
+        headers = {}
+        validators = self._validators.get(url, {})
+        if 'etag' in validators:
+            headers['If-None-Match'] = validators['etag']
+        if 'last_modified' in validators:
+            headers['If-Modified-Since'] = validators['last_modified']
+
+        started = time.perf_counter()
+        try:
+            response = self.session.get(url, headers=headers, timeout=self.timeout)
+            if response.status_code == 304:
+                metrics.scrape_fetch.observe(time.perf_counter() - started, ('not_modified',))
+                return PageResult(url, 'not_modified')
+            response.raise_for_status()
+        except requests.RequestException as e:
+            metrics.scrape_fetch.observe(time.perf_counter() - started, ('error',))
+            return PageResult(url, 'error', error=f"{url}: {e}")
+        metrics.scrape_fetch.observe(time.perf_counter() - started, ('fetched',))
+
+        new_validators = {}
+        if response.headers.get('ETag'):
+            new_validators['etag'] = response.headers['ETag']
+        if response.headers.get('Last-Modified'):
+            new_validators['last_modified'] = response.headers['Last-Modified']
+        self._validators[url] = new_validators
+
+        # Сервер без ETag/Last-Modified: не разбираем тот же самый HTML повторно
+        digest = hashlib.sha1(response.content).hexdigest()
+        if self._page_hashes.get(url) == digest:
+            return PageResult(url, 'unchanged')
+
+        started = time.perf_counter()
+        try:
+            matches = self.parser(response.content)
+        except Exception as e:
+            return PageResult(url, 'error', error=f"{url}: ошибка разбора: {e}")
+        finally:
+            metrics.scrape_parse.observe(time.perf_counter() - started)
+
+        self._page_hashes[url] = digest
+        return PageResult(url, 'fetched', matches=matches)
+
+    def run(self, urls: Optional[List[str]] = None) -> IngestionResult:
+        """
+        Один проход по источникам (по умолчанию - по всем);
+        возвращает только изменившиеся матчи.
+        """
+        with self._run_lock:
+            result = IngestionResult()
+            start = time.perf_counter()
+
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='ingest') as pool:
+                pages = list(pool.map(self.fetch_page, self.urls if urls is None else urls))
+
+            for page in pages:
+                if page.status == 'not_modified':
+                    result.pages_not_modified += 1
+                elif page.status == 'unchanged':
+                    result.pages_unchanged += 1
+                elif page.status == 'error':
+                    result.pages_failed += 1
+                    result.errors.append(page.error)
+                else:
+                    result.pages_fetched += 1
+                    self.page_statuses[page.url] = {match.get('status') for match in page.matches}
+                    for match in page.matches:
+                        result.matches_seen += 1
+                        key = match_key(match)
+                        fingerprint = tuple(match.get(f) for f in MATCH_FIELDS)
+                        if self._fingerprints.get(key) != fingerprint:
+                            self._fingerprints[key] = fingerprint
+                            result.changed.append(match)
+
+            result.elapsed = time.perf_counter() - start
+            self.last_result = result
+
+        print(f"🕷️  Загрузка: {result.pages_total} страниц за {result.elapsed:.2f} с "
+              f"({result.pages_per_second:.0f} стр/с), изменилось матчей: {len(result.changed)}")
+        for error in result.errors[:5]:
+            print(f"❌ {error}")
+        return result
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, sink: Callable[[List[Dict]], None]) -> bool:
+        """
+        Запускает проход в фоновом потоке, чтобы не занимать воркер запроса.
+        Изменившиеся матчи передаются в sink. False - проход уже идет.
+        """
+        if self.running:
+            return False
+
+        def worker():
+            try:
+                result = self.run()
+                if result.changed:
+                    sink(result.changed)
+            except Exception as e:
+                # Изменения не дошли до БД - следующий проход должен быть полным
+                self.forget()
+                print(f"❌ Ошибка фоновой загрузки матчей: {e}")
+
+        self._thread = Thread(target=worker, name='ingestion', daemon=True)
+        self._thread.start()
+        return True
+
+    def forget(self):
+        """Сбрасывает сохраненные валидаторы и отпечатки (следующий проход - полный)"""
+        self._validators.clear()
+        self._page_hashes.clear()
+        self._fingerprints.clear()
+        self.page_statuses.clear()
@@ -0,0 +1,241 @@
+"""
+Поддерживаемые рейтинги игроков (top-K) для /api/players/top/<role>.
+
+Каждая доска (метрика + роль + команда + формат) хранит в памяти не более
+`capacity` лучших игроков. Изменения Player/PlayerPoints копятся в очереди
+после коммита и применяются к доскам инкрементально при следующем чтении,
+поэтому на горячем пути нет ORDER BY по всей таблице. Доска перечитывается
+из БД (по составному индексу) только если из нее выпал участник и
+неизвестно, кто его заменит, либо по истечении max_age - чтобы подхватить
+записи, сделанные другими воркерами gunicorn.
+"""
+import time
+from bisect import bisect_left, insort
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event, func
+
+from models import db, Match, Player, PlayerPoints
+
+METRICS = ('runs', 'wickets', 'points')
+
+
+class TopKBoard:
+    """Отсортированный список лучших `capacity` игроков одной доски"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.entries: List[Tuple[float, int]] = []  # (-score, player_id)
+        self.scores: Dict[int, float] = {}
+        self.complete = False  # True, если в доске все подходящие игроки
+        self.stale = True
+        self.loaded_at = 0.0
+
+    def load(self, rows):
+        self.entries = sorted((-float(score or 0), player_id) for player_id, score in rows)
+        self.scores = {player_id: -neg for neg, player_id in self.entries}
+        self.complete = len(self.entries) < self.capacity
+        self.stale = False
+        self.loaded_at = time.monotonic()
+
+    def _discard(self, player_id: int) -> bool:
+        score = self.scores.pop(player_id, None)
+        if score is None:
+            return False
+        del self.entries[bisect_left(self.entries, (-score, player_id))]
+        return True
+
+    def remove(self, player_id: int):
+        if self._discard(player_id) and not self.complete:
+            # Неизвестно, кто следующий за выбывшим - перечитаем при чтении
+            self.stale = True
+
+    def offer(self, player_id: int, score: float):
+        was_member = self._discard(player_id)
+        entry = (-float(score), player_id)
+
+        if self.complete or (self.entries and entry < self.entries[-1]):
+            insort(self.entries, entry)
+            self.scores[player_id] = float(score)
+            if len(self.entries) > self.capacity:
+                _, dropped = self.entries.pop()
+                del self.scores[dropped]
+                self.complete = False
+        elif was_member:
+            # Игрок опустился ниже последнего известного места
+            self.stale = True
+
+    def top(self, k: int) -> List[Tuple[int, float]]:
+        return [(player_id, -neg) for neg, player_id in self.entries[:k]]
+
+
+class Leaderboard:
+    """Набор досок top-K с инкрементальным обновлением"""
+
+    def __init__(self, capacity: int = 100, max_age: float = 60.0):
+        self.capacity = capacity
+        self.max_age = max_age
+        self._boards: Dict[tuple, TopKBoard] = {}
+        self._pending_players = set()
+        self._pending_points = set()
+        self._deleted_players = set()
+        self._changed_matches = set()
+        self._formats: Dict[int, Optional[str]] = {}
+        self._lock = Lock()
+
+    def init_app(self, app):
+        self.capacity = app.config.get('LEADERBOARD_CAPACITY', self.capacity)
+        self.max_age = app.config.get('LEADERBOARD_MAX_AGE', self.max_age)
+        event.listen(db.session, 'after_flush', self._after_flush)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+        app.extensions['leaderboard'] = self
+
+    # --- Отслеживание изменений ---
+
+    def _after_flush(self, session, flush_context):
+        changes = session.info.setdefault('leaderboard', {
+            'players': set(), 'points': set(), 'deleted': set(), 'matches': set()
+        })
+        for obj in list(session.new) + list(session.dirty):
+            if isinstance(obj, Player):
+                changes['players'].add(obj.id)
+            elif isinstance(obj, PlayerPoints):
+                changes['points'].add(obj.player_id)
+            elif isinstance(obj, Match):
+                changes['matches'].add(obj.id)
+        for obj in session.deleted:
+            if isinstance(obj, Player):
+                changes['deleted'].add(obj.id)
+            elif isinstance(obj, PlayerPoints):
+                changes['points'].add(obj.player_id)
+
+    def _after_commit(self, session):
+        changes = session.info.pop('leaderboard', None)
+        if changes:
+            with self._lock:
+                self._pending_players |= changes['players']
+                self._pending_points |= changes['points']
+                self._deleted_players |= changes['deleted']
+                self._changed_matches |= changes['matches']
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('leaderboard', None)
+
+    def players_changed(self, player_ids):
+        """Для изменений в обход ORM (bulk insert/update)"""
+        with self._lock:
+            self._pending_players |= set(player_ids)
+
+    def points_changed(self, player_ids):
+        """Для PlayerPoints, записанных bulk insert-ом"""
+        with self._lock:
+            self._pending_points |= set(player_ids)
+
+    def reset(self):
+        with self._lock:
+            self._boards.clear()
+            self._formats.clear()
+            self._pending_players.clear()
+            self._pending_points.clear()
+            self._deleted_players.clear()
+            self._changed_matches.clear()
+
+    # --- Чтение ---
+
+    def top(self, metric: str, role: str, team: Optional[str] = None,
+            match_format: Optional[str] = None, k: int = 5) -> List[Tuple[int, float]]:
+        """Возвращает [(player_id, score)] лучших k игроков доски"""
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric: {metric}")
+        if k > self.capacity:
+            return self._query(metric, role, team, match_format, k)
+
+        with self._lock:
+            self._apply_pending()
+            key = (metric, role, team, match_format)
+            board = self._boards.get(key)
+            if board is None:
+                board = self._boards[key] = TopKBoard(self.capacity)
+            if board.stale or time.monotonic() - board.loaded_at > self.max_age:
+                board.load(self._query(metric, role, team, match_format, self.capacity))
+            return board.top(k)
+
+    def _apply_pending(self):
+        if self._changed_matches:
+            # Формат матча мог измениться - доски по формату перечитываются целиком
+            for match_id in self._changed_matches:
+                self._formats.pop(match_id, None)
+            self._changed_matches = set()
+            for (_, _, _, board_format), board in self._boards.items():
+                if board_format is not None:
+                    board.stale = True
+
+        if not (self._pending_players or self._pending_points or self._deleted_players):
+            return
+        changed = self._pending_players | self._pending_points
+        deleted = self._deleted_players
+        self._pending_players, self._pending_points, self._deleted_players = set(), set(), set()
+
+        for board in self._boards.values():
+            for player_id in deleted:
+                board.remove(player_id)
+        changed -= deleted
+        if not changed or not self._boards:
+            return
+
+        players = Player.query.with_entities(
+            Player.id, Player.role, Player.team, Player.match_id, Player.runs, Player.wickets
+        ).filter(Player.id.in_(changed)).all()
+        totals = dict(
+            db.session.query(PlayerPoints.player_id, func.sum(PlayerPoints.points))
+            .filter(PlayerPoints.player_id.in_(changed))
+            .group_by(PlayerPoints.player_id)
+            .all()
+        )
+        formats = self._match_formats({p.match_id for p in players})
+
+        for player in players:
+            scores = {
+                'runs': player.runs or 0,
+                'wickets': player.wickets or 0,
+                'points': totals.get(player.id, 0.0) or 0.0,
+            }
+            match_format = formats.get(player.match_id)
+            for (metric, role, team, board_format), board in self._boards.items():
+                matches = (role == player.role
+                           and team in (None, player.team)
+                           and board_format in (None, match_format))
+                if not matches:
+                    board.remove(player.id)
+                elif metric != 'points' or player.id in totals or player.id in board.scores:
+                    board.offer(player.id, scores[metric])
+
+    def _match_formats(self, match_ids) -> Dict[int, Optional[str]]:
+        missing = [m for m in match_ids if m is not None and m not in self._formats]
+        if missing:
+            for match_id, match_format in db.session.query(Match.id, Match.format).filter(Match.id.in_(missing)):
+                self._formats[match_id] = match_format
+        return self._formats
+
+    def _query(self, metric, role, team, match_format, limit):
+        if metric == 'points':
+            score = func.sum(PlayerPoints.points)
+            query = db.session.query(Player.id, score).join(PlayerPoints, PlayerPoints.player_id == Player.id)
+        else:
+            score = getattr(Player, metric)
+            query = db.session.query(Player.id, score)
+
+        query = query.filter(Player.role == role)
+        if team:
+            query = query.filter(Player.team == team)
+        if match_format:
+            query = query.join(Match, Match.id == Player.match_id).filter(Match.format == match_format)
+        if metric == 'points':
+            query = query.group_by(Player.id)
+
+        return query.order_by(score.desc(), Player.id).limit(limit).all()
+
+
+leaderboard = Leaderboard()
@@ -0,0 +1,156 @@
+"""
+Синхронизация матчей из скрапинга с таблицей Match.
+
+Вместо запроса на каждый матч: существующие записи за нужные дни читаются
+одним запросом по уникальному индексу (match_day, team1, team2, format),
+новые матчи вставляются одной пакетной вставкой, изменившиеся (счет, статус,
+стадион) обновляются одним пакетным UPDATE по первичному ключу, иннинги
+новых и изменившихся строк счета пересобираются (score_parser.py) - все в
+одной транзакции.
+
+Если тот же матч между чтением и вставкой успел вставить параллельный
+синк (другой воркер, планировщик, фоновая загрузка), вставка упирается в
+уникальный индекс: транзакция откатывается и синк повторяется с новым
+чтением - матч попадает уже в обновления.
+"""
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from cache import response_cache
+from models import db, Match
+from rollups import fold_matches
+from score_parser import store_scores
+from stats import table_stats
+from stream import stream_hub
+
+UPDATABLE_FIELDS = ('venue', 'status', 'score')
+
+
+@dataclass
+class SyncResult:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    inserted_ids: List[int] = field(default_factory=list)
+    updated_ids: List[int] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'inserted': self.inserted, 'updated': self.updated, 'unchanged': self.unchanged}
+
+
+def parse_match_day(value) -> Optional[date]:
+    """'2024-12-26', '2024-12-26T14:30:00', date или datetime -> date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.strptime(value[:10], '%Y-%m-%d').date()
+        except ValueError:
+            return None
+    return None
+
+
+def normalize(match_data: Dict, today: date) -> Dict:
+    """Приводит словарь из скрапера к колонкам Match (с теми же значениями по умолчанию)"""
+    match_day = parse_match_day(match_data.get('match_date')) or today
+    return {
+        'team1': match_data.get('team1') or 'Team A',
+        'team2': match_data.get('team2') or 'Team B',
+        'format': match_data.get('format') or 'Неизвестно',
+        'match_day': match_day,
+        'venue': match_data.get('venue', 'Неизвестно'),
+        'status': match_data.get('status', 'Scheduled'),
+        'score': match_data.get('score', ''),
+    }
+
+
+def natural_key(row) -> tuple:
+    return (row['match_day'], row['team1'], row['team2'], row['format'])
+
+
+def sync_matches(matches_data: Iterable[Dict], commit: bool = True, attempts: int = 3) -> SyncResult:
+    """
+    Вставляет новые и обновляет изменившиеся матчи.
+    Повторы одного матча внутри пачки схлопываются (побеждает последний).
+    При конфликте с параллельной вставкой - откат и повтор (только с
+    commit=True: без коммита транзакцией владеет вызывающий код).
+    """
+    today = datetime.utcnow().date()
+    incoming: Dict[tuple, Dict] = {}
+    for match_data in matches_data:
+        row = normalize(match_data, today)
+        incoming[natural_key(row)] = row
+
+    if not incoming:
+        return SyncResult()
+    for attempt in range(1, attempts + 1):
+        try:
+            return _sync(incoming, today, commit)
+        except IntegrityError:
+            if not commit:
+                raise
+            db.session.rollback()
+            if attempt == attempts:
+                raise
+
+
+def _sync(incoming: Dict[tuple, Dict], today: date, commit: bool) -> SyncResult:
+    result = SyncResult()
+    days = {key[0] for key in incoming}
+    existing = {}
+    for row in db.session.query(Match.id, Match.match_day, Match.team1, Match.team2, Match.format,
+                                *(getattr(Match, f) for f in UPDATABLE_FIELDS)) \
+            .filter(Match.match_day.in_(days)):
+        existing[(row.match_day, row.team1, row.team2, row.format)] = row
+
+    to_insert: List[Dict] = []
+    to_update: List[Dict] = []
+    scores: List[tuple] = []  # (id, score, format) для разбора счета
+    now = datetime.utcnow()
+    for key, row in incoming.items():
+        current = existing.get(key)
+        if current is None:
+            match_date = now if row['match_day'] == today else datetime.combine(row['match_day'], datetime.min.time())
+            to_insert.append({**row, 'match_date': match_date})
+        elif any(getattr(current, f) != row[f] for f in UPDATABLE_FIELDS):
+            to_update.append({'id': current.id, **{f: row[f] for f in UPDATABLE_FIELDS}})
+            if current.score != row['score']:
+                scores.append((current.id, row['score'], row['format']))
+        else:
+            result.unchanged += 1
+
+    if to_insert:
+        db.session.execute(insert(Match), to_insert)
+        table_stats.add_rows(Match, len(to_insert))
+        inserted = {natural_key(row): row for row in to_insert}
+        inserted_days = {row['match_day'] for row in to_insert}
+        for row in db.session.query(Match.id, Match.match_day, Match.team1, Match.team2, Match.format) \
+                .filter(Match.match_day.in_(inserted_days)):
+            key = (row.match_day, row.team1, row.team2, row.format)
+            if key in inserted:
+                result.inserted_ids.append(row.id)
+                scores.append((row.id, inserted[key]['score'], row.format))
+    if to_update:
+        db.session.execute(update(Match), to_update)
+        result.updated_ids = [row['id'] for row in to_update]
+    store_scores(scores)
+
+    # Дельты для live-потока пишутся в той же транзакции
+    stream_hub.record_matches(result.inserted_ids, 'inserted')
+    stream_hub.record_matches(result.updated_ids, 'updated')
+    if to_insert or to_update:
+        response_cache.invalidate_on_commit('matches')
+    # Завершившиеся матчи сворачиваются в витрины, вернувшиеся в Live - вычитаются
+    fold_matches(result.inserted_ids + result.updated_ids)
+    if commit:
+        db.session.commit()
+
+    result.inserted = len(to_insert)
+    result.updated = len(to_update)
+    return result
@@ -0,0 +1,326 @@
+"""
+Метрики производительности в текстовом формате Prometheus (/metrics).
+
+Что собирается (в памяти воркера, без внешних зависимостей):
+- время ответа и число запросов по маршруту (шаблон URL, а не путь -
+  число рядов не растет с id), методу и коду ответа;
+- SQL: число запросов и их время на один HTTP-запрос (события движка
+  SQLAlchemy before/after_cursor_execute), общее время запросов вне
+  HTTP (фоновые потоки) и счетчик медленных;
+- скрапер: время загрузки и разбора страниц;
+- движок очков: число вызовов и посчитанных игроков.
+
+Медленные SQL-запросы (дольше SLOW_QUERY_MS) печатаются с текстом и
+маршрутом, из которого пришли. Выборочный профилировщик включается на один
+запрос заголовком X-Profile со значением PROFILE_TOKEN: поток-сэмплер
+снимает стек потока запроса и складывает стеки в формат flamegraph
+(collapsed stacks); результат - по id из заголовка X-Profile-Id.
+
+Каждый воркер gunicorn отдает свои значения - Prometheus собирает их по
+адресам воркеров или суммирует через sum().
+"""
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from threading import Lock, Thread
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from flask import request
+from sqlalchemy import event
+
+from models import db
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+BACKGROUND = 'background'
+UNMATCHED = 'unmatched'
+MAX_PROFILES = 32
+MAX_LOGGED_SQL = 1000
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Монотонный счетчик с метками"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple, float] = {}
+        self._lock = Lock()
+
+    def inc(self, labels: Tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple = ()) -> float:
+        return self._values.get(labels, 0)
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин (как у prometheus_client)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        # метки -> [счетчики по корзинам (не накопительные), сумма, количество]
+        self._values: Dict[Tuple, List] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, labels: Tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            item = self._values.get(labels)
+            if item is None:
+                item = self._values[labels] = [[0] * len(self.buckets), 0.0, 0]
+            item[0][index] += 1
+            item[1] += value
+            item[2] += 1
+
+    def count(self, labels: Tuple = ()) -> int:
+        item = self._values.get(labels)
+        return item[2] if item else 0
+
+    def samples(self) -> Iterable[str]:
+        with self._lock:
+            items = sorted((labels, (list(item[0]), item[1], item[2])) for labels, item in self._values.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _number(bound)
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {count}"
+
+
+class RequestStats:
+    """SQL одного HTTP-запроса (живет в threading.local потока запроса)"""
+
+    __slots__ = ('route', 'method', 'started', 'queries', 'query_time', 'status', 'profile')
+
+    def __init__(self, route: str, method: str):
+        self.route = route
+        self.method = method
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        self.status = None
+        self.profile = None
+
+
+class Sampler:
+    """Выборочный профилировщик одного потока: стеки раз в interval секунд"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = Thread(target=self._run, name='profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> str:
+        self._stopped.set()
+        self._thread.join()
+        lines = sorted(self.stacks.items(), key=lambda item: -item[1])
+        return ''.join(f"{stack} {count}\n" for stack, count in lines)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                break
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                frame = frame.f_back
+            key = ';'.join(reversed(stack))
+            self.stacks[key] = self.stacks.get(key, 0) + 1
+            self.samples += 1
+
+
+class Metrics:
+    """Реестр метрик воркера и хуки Flask/SQLAlchemy, которые их наполняют"""
+
+    def __init__(self, slow_query_ms: float = 250, profile_token: Optional[str] = None,
+                 profile_interval: float = 0.005):
+        self.slow_query_ms = slow_query_ms
+        self.profile_token = profile_token
+        self.profile_interval = profile_interval
+        self.started_at = time.time()
+        self._local = threading.local()
+        self._profiles: OrderedDict = OrderedDict()
+        self._profile_ids = itertools.count(1)
+        self._profile_lock = Lock()
+        self._registry: List = []
+
+        self.requests = self.counter('http_requests_total', 'HTTP-запросы по маршруту, методу и коду ответа',
+                                     ('route', 'method', 'status'))
+        self.request_latency = self.histogram('http_request_duration_seconds', 'Время ответа до заголовков',
+                                              ('route', 'method'))
+        self.request_queries = self.histogram('http_request_db_queries', 'SQL-запросов на один HTTP-запрос',
+                                              ('route',), QUERY_COUNT_BUCKETS)
+        self.request_query_time = self.histogram('http_request_db_seconds', 'Время SQL на один HTTP-запрос',
+                                                 ('route',))
+        self.queries = self.counter('db_queries_total', 'SQL-запросы (route="background" - вне HTTP)', ('route',))
+        self.query_time = self.counter('db_query_seconds_total', 'Суммарное время SQL-запросов', ('route',))
+        self.slow_queries = self.counter('db_slow_queries_total', 'SQL-запросы дольше SLOW_QUERY_MS', ('route',))
+        self.scrape_fetch = self.histogram('scrape_fetch_seconds', 'Загрузка страницы скрапером', ('result',))
+        self.scrape_parse = self.histogram('scrape_parse_seconds', 'Разбор страницы скрапером')
+        self.scoring_calls = self.counter('scoring_calls_total', 'Вызовы движка очков', ('mode',))
+        self.scoring_players = self.counter('scoring_players_total', 'Игроков посчитано движком очков', ('mode',))
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._registry.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._registry.append(metric)
+        return metric
+
+    def init_app(self, app):
+        self.slow_query_ms = app.config.get('SLOW_QUERY_MS', self.slow_query_ms)
+        self.profile_token = app.config.get('PROFILE_TOKEN', self.profile_token)
+        self.profile_interval = app.config.get('PROFILE_INTERVAL', self.profile_interval)
+        app.extensions['metrics'] = self
+        if not app.config.get('METRICS_ENABLED', True):
+            return
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._before_cursor_execute)
+            event.listen(db.engine, 'after_cursor_execute', self._after_cursor_execute)
+
+    # --- HTTP ---
+
+    def _before_request(self):
+        rule = request.url_rule
+        stats = RequestStats(rule.rule if rule is not None else UNMATCHED, request.method)
+        token = request.headers.get('X-Profile')
+        if self.profile_token and token == self.profile_token and not request.path.startswith('/metrics'):
+            stats.profile = Sampler(threading.get_ident(), self.profile_interval)
+            stats.profile.start()
+        self._local.stats = stats
+
+    def _after_request(self, response):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            return response
+        elapsed = time.perf_counter() - stats.started
+        stats.status = response.status_code
+        self.requests.inc((stats.route, stats.method, str(response.status_code)))
+        self.request_latency.observe(elapsed, (stats.route, stats.method))
+        if stats.profile is not None:
+            response.headers['X-Profile-Id'] = str(self._save_profile(stats))
+            response.headers['X-Profile-Samples'] = str(stats.profile.samples)
+            stats.profile = None
+        return response
+
+    def _teardown_request(self, exc=None):
+        # SQL потоковых ответов (stream_with_context) выполняется после after_request - считаем здесь
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            return
+        self._local.stats = None
+        if stats.profile is not None:
+            self._save_profile(stats)
+        self.request_queries.observe(stats.queries, (stats.route,))
+        self.request_query_time.observe(stats.query_time, (stats.route,))
+
+    # --- SQL ---
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_started', []).append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['metrics_started'].pop()
+        elapsed = time.perf_counter() - started
+        stats = getattr(self._local, 'stats', None)
+        route = stats.route if stats is not None else BACKGROUND
+        if stats is not None:
+            stats.queries += 1
+            stats.query_time += elapsed
+        self.queries.inc((route,))
+        self.query_time.inc((route,), elapsed)
+        if self.slow_query_ms and elapsed * 1000 >= self.slow_query_ms:
+            self.slow_queries.inc((route,))
+            source = f"{stats.method} {stats.route}" if stats is not None else threading.current_thread().name
+            sql = re.sub(r'\s+', ' ', statement).strip()[:MAX_LOGGED_SQL]
+            print(f"⚠️ Медленный SQL-запрос {elapsed * 1000:.1f} мс [{source}]"
+                  f"{' (executemany)' if executemany else ''}: {sql}")
+
+    # --- Профилировщик ---
+
+    def _save_profile(self, stats: RequestStats) -> int:
+        profile = stats.profile.stop()
+        with self._profile_lock:
+            profile_id = next(self._profile_ids)
+            self._profiles[profile_id] = f"# {stats.method} {stats.route}\n{profile}"
+            while len(self._profiles) > MAX_PROFILES:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def profile(self, profile_id: int) -> Optional[str]:
+        """Стеки профиля в формате collapsed (flamegraph.pl, speedscope)"""
+        with self._profile_lock:
+            return self._profiles.get(profile_id)
+
+    # --- Выдача ---
+
+    def render(self) -> str:
+        lines = [
+            '# HELP process_start_time_seconds Время запуска воркера (unix)',
+            '# TYPE process_start_time_seconds gauge',
+            f'process_start_time_seconds {self.started_at}',
+        ]
+        for metric in self._registry:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
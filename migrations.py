@@ -0,0 +1,336 @@
+"""
+Версионированные миграции схемы БД.
+
+Схему меняет только команда выкладки (flask deploy), один раз до запуска
+воркеров; импорт приложения и старт воркера в БД не пишут. Примененные
+версии хранятся в таблице schema_migrations, все недостающие миграции
+выполняются в одной транзакции под блокировкой базы (SQLite - BEGIN
+IMMEDIATE, PostgreSQL - advisory lock), поэтому одновременные запуски
+deploy не мешают друг другу: второй дождется первого и ничего не сделает.
+
+Новая миграция - функция с декоратором @migration(<следующая версия>,
+'<описание>'), получающая соединение с открытой транзакцией. Модели
+models.py уже описывают итоговую схему, поэтому шаги пишутся с проверкой
+(таблица, колонка или индекс могут уже существовать в новой базе).
+"""
+from datetime import datetime
+from typing import Callable, List, NamedTuple
+
+from flask import current_app
+from sqlalchemy import (Column, Date, DateTime, Integer, MetaData, String, Table, and_, cast, delete, exists, func,
+                        insert, inspect, select, text, update)
+from sqlalchemy.schema import AddConstraint, CreateIndex
+
+from models import (db, Match, Player, PlayerPoints, PointsHistory, ChangeEvent, TableCounter, Delivery,
+                    PlayerMatchStats, Contest, ContestTeam, PlayerIdentity, PlayerRollup, TeamRollup,
+                    RollupMatch, RollupLine, MatchInnings)
+from queries import ensure_search_indexes
+from score_parser import store_scores
+
+SCHEMA_TABLE = Table(
+    'schema_migrations', MetaData(),
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False),
+)
+LOCK_TIMEOUT_MS = 120000  # сколько второй deploy/seed ждет первого (SQLite)
+ADVISORY_LOCK_KEY = 0x637269636b6574  # 'cricket' (PostgreSQL)
+
+# Таблицы приложения на момент введения миграций
+BASELINE_MODELS = (Match, Player, PlayerPoints, PointsHistory, ChangeEvent, TableCounter, Delivery,
+                   PlayerMatchStats, Contest, ContestTeam, PlayerIdentity, PlayerRollup, TeamRollup,
+                   RollupMatch, RollupLine)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    upgrade: Callable
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, name: str):
+    def register(upgrade):
+        assert not MIGRATIONS or MIGRATIONS[-1].version < version, 'версии миграций должны возрастать'
+        MIGRATIONS.append(Migration(version, name, upgrade))
+        return upgrade
+    return register
+
+
+def head() -> int:
+    return MIGRATIONS[-1].version
+
+
+# --- Блокировка и версия ---
+
+def lock_schema(connection):
+    """
+    Берет блокировку схемы в текущей транзакции connection (до commit или
+    rollback): так же сериализуются миграции и заполнение тестовыми данными.
+    """
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        # Ждем другой deploy/seed дольше обычного busy_timeout, дальше - как обычно
+        connection.exec_driver_sql(f'PRAGMA busy_timeout = {LOCK_TIMEOUT_MS}')
+        try:
+            connection.exec_driver_sql('BEGIN IMMEDIATE')
+        finally:
+            connection.exec_driver_sql(
+                f"PRAGMA busy_timeout = {current_app.config.get('SQLITE_BUSY_TIMEOUT', 5000)}")
+    elif dialect == 'postgresql':
+        connection.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+
+
+def applied_versions(connection) -> List[int]:
+    if not inspect(connection).has_table(SCHEMA_TABLE.name):
+        return []
+    return [version for (version,) in connection.execute(
+        SCHEMA_TABLE.select().with_only_columns(SCHEMA_TABLE.c.version).order_by(SCHEMA_TABLE.c.version))]
+
+
+def pending(connection) -> List[Migration]:
+    applied = set(applied_versions(connection))
+    return [m for m in MIGRATIONS if m.version not in applied]
+
+
+def upgrade(engine=None) -> List[Migration]:
+    """Применяет недостающие миграции одной транзакцией, возвращает примененные"""
+    engine = engine or db.engine
+    with engine.connect() as connection:
+        try:
+            lock_schema(connection)
+            SCHEMA_TABLE.create(connection, checkfirst=True)
+            applied = pending(connection)
+            for m in applied:
+                m.upgrade(connection)
+                connection.execute(SCHEMA_TABLE.insert().values(
+                    version=m.version, name=m.name, applied_at=datetime.utcnow()))
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+    return applied
+
+
+# --- Помощники для шагов ---
+
+def _add_missing_columns(connection, model, names) -> List[str]:
+    """ALTER TABLE ADD COLUMN для колонок модели, которых нет в таблице (только nullable)"""
+    table = model.__table__
+    existing = {c['name'] for c in inspect(connection).get_columns(table.name)}
+    added = []
+    for name in names:
+        if name in existing:
+            continue
+        column = table.c[name]
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{name}" {column_type}'))
+        added.append(name)
+    return added
+
+
+def _create_missing_indexes(connection, models):
+    """Индексы моделей, которых нет в таблице (по еще не добавленным колонкам - создаст их миграция)"""
+    inspector = inspect(connection)
+    for model in models:
+        table = model.__table__
+        existing = {index['name'] for index in inspector.get_indexes(table.name)}
+        columns = {c['name'] for c in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            if index.name not in existing and {c.name for c in index.columns} <= columns:
+                connection.execute(CreateIndex(index))
+
+
+def _create_missing_unique(connection, model, name):
+    """
+    Уникальное ограничение из модели. В SQLite ограничение к существующей
+    таблице не добавить - создается уникальный индекс с тем же именем
+    (ON CONFLICT с ним работает так же). Дубликаты в данных нужно убрать до
+    вызова (_merge_duplicate_matches, _collapse_duplicate_points).
+    """
+    table = model.__table__
+    inspector = inspect(connection)
+    existing = {c['name'] for c in inspector.get_unique_constraints(table.name)}
+    existing |= {index['name'] for index in inspector.get_indexes(table.name)}
+    if name in existing:
+        return
+    constraint = next(c for c in table.constraints if c.name == name)
+    if connection.dialect.name == 'sqlite':
+        listed = ', '.join(f'"{c.name}"' for c in constraint.columns)
+        connection.execute(text(f'CREATE UNIQUE INDEX "{name}" ON "{table.name}" ({listed})'))
+    else:
+        connection.execute(AddConstraint(constraint))
+
+
+KEYS_PER_STATEMENT = 500  # id в одном IN (...) - ниже лимита переменных SQLite
+# Ссылки на матч: (модель, колонки, вместе с match_id уникальные в таблице)
+MATCH_REFERENCES = ((Player, ()), (PlayerPoints, ()), (PointsHistory, ()), (Contest, ()),
+                    (Delivery, ('innings', 'over', 'ball')), (PlayerMatchStats, ('player_id',)))
+ROLLUP_MODELS = (PlayerRollup, TeamRollup, RollupLine, RollupMatch)
+
+
+def _chunks(values: List, size: int = KEYS_PER_STATEMENT):
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _shift_counter(connection, model, delta: int):
+    """Поправка счетчика строк (stats.py), если счетчики уже созданы"""
+    if delta and inspect(connection).has_table(TableCounter.__tablename__):
+        counters = TableCounter.__table__
+        connection.execute(update(counters).where(counters.c.table == model.__tablename__)
+                           .values(count=counters.c.count + delta))
+
+
+def _repoint(connection, model, unique, old_ids: List[int], new_id: int):
+    """
+    Переносит строки model с матчей old_ids на new_id. Если вместе с
+    match_id уникальны колонки unique, строка, чье место у new_id уже
+    занято, остается за new_id, а перенесенная удаляется.
+    """
+    table = model.__table__
+    if not inspect(connection).has_table(table.name):
+        return
+    statement = update(table).where(table.c.match_id.in_(old_ids)).values(match_id=new_id)
+    if unique:
+        taken = table.alias('taken')
+        statement = statement.where(~exists().where(
+            taken.c.match_id == new_id, *(taken.c[name] == table.c[name] for name in unique)))
+    connection.execute(statement)
+    if unique:
+        connection.execute(delete(table).where(table.c.match_id.in_(old_ids)))
+
+
+def _merge_duplicate_matches(connection) -> int:
+    """
+    Матчи с одинаковым естественным ключом (до ключа их создавал и POST
+    /api/match) сливаются в самый ранний: он получает непустые venue,
+    status, score и match_date самого нового дубликата, ссылки остальных
+    переносятся на него, сами дубликаты удаляются. Если в витринах уже
+    были слитые матчи, витрины очищаются - deploy свернет их заново.
+    Возвращает число удаленных матчей.
+    """
+    table = Match.__table__
+    key = (table.c.match_day, table.c.team1, table.c.team2, table.c.format)
+    groups = connection.execute(
+        select(*key).where(*(column.isnot(None) for column in key))
+        .group_by(*key).having(func.count() > 1)).all()
+    inspector = inspect(connection)
+    merged = []
+    for group in groups:
+        rows = connection.execute(
+            select(table.c.id, table.c.match_date, table.c.venue, table.c.status, table.c.score)
+            .where(*(column == value for column, value in zip(key, group)))
+            .order_by(table.c.id)).all()
+        keep, newest, old_ids = rows[0].id, rows[-1], [row.id for row in rows[1:]]
+        values = {name: getattr(newest, name) for name in ('match_date', 'venue', 'status', 'score')
+                  if getattr(newest, name) is not None}
+        connection.execute(update(table).where(table.c.id == keep).values(**values))
+        for model, unique in MATCH_REFERENCES:
+            _repoint(connection, model, unique, old_ids, keep)
+        if inspector.has_table(MatchInnings.__tablename__):
+            # Иннинги пересобираются из счета (миграция 5, store_scores)
+            innings = MatchInnings.__table__
+            connection.execute(delete(innings).where(innings.c.match_id.in_(old_ids)))
+        connection.execute(delete(table).where(table.c.id.in_(old_ids)))
+        merged.extend([keep] + old_ids)
+
+    rollup_matches = RollupMatch.__table__
+    if merged and inspector.has_table(rollup_matches.name) and any(
+            connection.execute(select(func.count()).where(rollup_matches.c.match_id.in_(chunk))).scalar()
+            for chunk in _chunks(merged)):
+        for model in ROLLUP_MODELS:
+            connection.execute(delete(model.__table__))
+    removed = len(merged) - len(groups)
+    _shift_counter(connection, Match, -removed)
+    return removed
+
+
+def _collapse_duplicate_points(connection) -> int:
+    """
+    До идемпотентного пересчета /api/calculate добавлял строку очков на
+    каждый вызов. На пару (player_id, match_id) остается самая новая
+    строка (по calculation_date, затем id), прежние значения уходят в
+    PointsHistory так же, как при пересчете. Возвращает число удаленных строк.
+    """
+    table = PlayerPoints.__table__
+    pairs = (select(table.c.player_id, table.c.match_id)
+             .where(table.c.player_id.isnot(None), table.c.match_id.isnot(None))
+             .group_by(table.c.player_id, table.c.match_id).having(func.count() > 1).subquery())
+    rows = connection.execute(
+        select(table.c.id, table.c.player_id, table.c.match_id, table.c.rules_version, table.c.points,
+               table.c.calculation_date)
+        .join(pairs, and_(table.c.player_id == pairs.c.player_id, table.c.match_id == pairs.c.match_id))
+        .order_by(table.c.player_id, table.c.match_id, table.c.calculation_date, table.c.id)).all()
+    now = datetime.utcnow()
+    history, old_ids = [], []
+    for row, following in zip(rows, rows[1:]):
+        if (row.player_id, row.match_id) != (following.player_id, following.match_id):
+            continue  # row - самая новая строка своей пары
+        history.append({'player_id': row.player_id, 'match_id': row.match_id, 'rules_version': row.rules_version,
+                        'points': row.points, 'calculated_at': row.calculation_date,
+                        'replaced_at': following.calculation_date or now})
+        old_ids.append(row.id)
+    if history:
+        connection.execute(insert(PointsHistory.__table__), history)
+    for chunk in _chunks(old_ids):
+        connection.execute(delete(table).where(table.c.id.in_(chunk)))
+    _shift_counter(connection, PlayerPoints, -len(old_ids))
+    return len(old_ids)
+
+
+# --- Миграции ---
+
+@migration(1, 'baseline')
+def create_tables(connection):
+    """Таблицы приложения (в базе, созданной до миграций через create_all, уже есть)"""
+    db.metadata.create_all(connection, tables=[model.__table__ for model in BASELINE_MODELS])
+
+
+@migration(2, 'columns added before versioning')
+def add_columns(connection):
+    """
+    create_all не добавляет колонки в существующие таблицы: базы, созданные
+    ранними версиями, догоняют модели здесь. match_day заполняется по
+    match_date, остальные колонки заполнят пересчет очков и витрины.
+    """
+    if 'match_day' in _add_missing_columns(connection, Match, ['match_day']):
+        match_table = Match.__table__
+        day = func.date(match_table.c.match_date) if connection.dialect.name == 'sqlite' \
+            else cast(match_table.c.match_date, Date)
+        connection.execute(update(match_table).values(match_day=day))
+    _add_missing_columns(connection, Player, ['person_id'])
+    _add_missing_columns(connection, PlayerPoints, ['rules_version', 'inputs_hash', 'inputs'])
+
+
+@migration(3, 'list indexes and natural keys')
+def add_indexes(connection):
+    """
+    Индексы моделей, которых нет в старых базах (в т.ч. ix_match_status_day и
+    ix_player_name). Перед уникальными ключами дубликаты схлопываются:
+    матчи сливаются, из строк очков пары остается самая новая.
+    """
+    _merge_duplicate_matches(connection)
+    _create_missing_unique(connection, Match, 'uq_match_natural_key')
+    _collapse_duplicate_points(connection)
+    _create_missing_unique(connection, PlayerPoints, 'uq_player_points_player_match')
+    _create_missing_indexes(connection, BASELINE_MODELS)
+
+
+@migration(4, 'full-text search')
+def add_search_indexes(connection):
+    ensure_search_indexes(connection)
+
+
+@migration(5, 'structured scores')
+def add_match_innings(connection):
+    """Иннинги и колонки погони по уже сохраненным строкам счета"""
+    _add_missing_columns(connection, Match, ['target', 'required_rate'])
+    MatchInnings.__table__.create(connection, checkfirst=True)
+    _create_missing_indexes(connection, (Match, MatchInnings))
+    match_table = Match.__table__
+    store_scores(connection.execute(
+        match_table.select().with_only_columns(match_table.c.id, match_table.c.score, match_table.c.format)
+        .where(match_table.c.score.isnot(None), match_table.c.score != '')).all(), connection)
@@ -3,16 +3,31 @@ from datetime import datetime
 
 db = SQLAlchemy()
 
+def _default_match_day(context):
+    match_date = context.get_current_parameters().get('match_date')
+    return (match_date or datetime.utcnow()).date()
+
 class Match(db.Model):
     """Модель для хранения информации о матчах (соответствует вариантам заданий из ЛР №2)"""
     id = db.Column(db.Integer, primary_key=True)
     team1 = db.Column(db.String(100), nullable=False)
     team2 = db.Column(db.String(100), nullable=False)
     match_date = db.Column(db.DateTime, default=datetime.utcnow)
+    match_day = db.Column(db.Date, default=_default_match_day)  # часть естественного ключа матча
     venue = db.Column(db.String(200))
     format = db.Column(db.String(50))  # T20, ODI, Test
     status = db.Column(db.String(50))  # Live, Finished, Scheduled
     score = db.Column(db.String(200))
+    # Погоня по разобранному счету (score_parser.py): цель и требуемый темп, ранов за овер
+    target = db.Column(db.Integer)
+    required_rate = db.Column(db.Float)
+
+    # Естественный ключ: один матч этих команд в этом формате в этот день
+    __table_args__ = (
+        db.UniqueConstraint('match_day', 'team1', 'team2', 'format', name='uq_match_natural_key'),
+        db.Index('ix_match_status_day', 'status', 'match_day'),  # фильтр status + сортировка по дате
+        db.Index('ix_match_status_required_rate', 'status', 'required_rate'),  # "live, нужно > 10 за овер"
+    )
     
     # Связь с игроками (как в вариантах заданий с JOIN)
     players = db.relationship('Player', backref='match', lazy=True)
@@ -26,9 +41,31 @@ class Match(db.Model):
             'venue': self.venue,
             'format': self.format,
             'status': self.status,
-            'score': self.score
+            'score': self.score,
+            'target': self.target,
+            'required_rate': self.required_rate
         }
 
+class MatchInnings(db.Model):
+    """Иннинг из строки счета Match.score; пересобирается при каждой записи счета (score_parser.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    position = db.Column(db.Integer, nullable=False)  # порядок в строке счета, с 1
+    team = db.Column(db.String(100))  # как в строке счета
+    team_innings = db.Column(db.Integer, nullable=False)  # 1 или 2 - какой иннинг команды
+    runs = db.Column(db.Integer, nullable=False)
+    wickets = db.Column(db.Integer)  # 10 - all out
+    balls = db.Column(db.Integer)  # легальные мячи (оверы * 6)
+    run_rate = db.Column(db.Float)  # ранов за овер
+    declared = db.Column(db.Boolean, nullable=False, default=False)
+    follow_on = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.UniqueConstraint('match_id', 'position', name='uq_match_innings_position'),
+        db.Index('ix_match_innings_runs', 'runs'),
+        db.Index('ix_match_innings_run_rate', 'run_rate'),
+    )
+
 class Player(db.Model):
     """Модель для хранения информации об игроках"""
     id = db.Column(db.Integer, primary_key=True)
@@ -36,12 +73,22 @@ class Player(db.Model):
     role = db.Column(db.String(50))  # batsman, bowler, all-rounder
     team = db.Column(db.String(100))
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'))
+    person_id = db.Column(db.Integer, db.ForeignKey('player_identity.id'), index=True)  # один реальный игрок во всех матчах
     
     # Статистика (как в вариантах заданий с фильтрацией)
     runs = db.Column(db.Integer, default=0)
     wickets = db.Column(db.Integer, default=0)
     balls_faced = db.Column(db.Integer, default=0)
     runs_conceded = db.Column(db.Integer, default=0)
+
+    # Индексы под фильтры /api/players и рейтинги /api/players/top/<role>
+    __table_args__ = (
+        db.Index('ix_player_role_runs', 'role', 'runs'),
+        db.Index('ix_player_role_wickets', 'role', 'wickets'),
+        db.Index('ix_player_team_role', 'team', 'role'),
+        db.Index('ix_player_match_id', 'match_id'),
+        db.Index('ix_player_name', 'name'),  # сортировка списка по имени
+    )
     
     def to_dict(self):
         return {
@@ -56,13 +103,24 @@ class Player(db.Model):
         }
 
 class PlayerPoints(db.Model):
-    """Модель для хранения расчетных очков игроков"""
+    """Модель для хранения расчетных очков игроков (одна текущая запись на игрока в матче)"""
     id = db.Column(db.Integer, primary_key=True)
     player_id = db.Column(db.Integer, db.ForeignKey('player.id'))
     match_id = db.Column(db.Integer, db.ForeignKey('match.id'))
     points = db.Column(db.Float, nullable=False)
     calculation_date = db.Column(db.DateTime, default=datetime.utcnow)
-    
+    rules_version = db.Column(db.Integer)  # версия правил подсчета
+    inputs_hash = db.Column(db.String(40))  # отпечаток входных данных и версии правил
+    inputs = db.Column(db.Text)  # JSON входных данных - для пересчета по новым правилам
+
+    # Индексы под историю расчетов и суммы очков по игроку
+    __table_args__ = (
+        db.UniqueConstraint('player_id', 'match_id', name='uq_player_points_player_match'),
+        db.Index('ix_player_points_calculation_date', 'calculation_date'),
+        db.Index('ix_player_points_player_points', 'player_id', 'points'),
+        db.Index('ix_player_points_match_id', 'match_id'),
+    )
+
     # Связи
     player = db.relationship('Player', backref='points_history')
     match = db.relationship('Match', backref='points_history')
@@ -75,3 +133,203 @@ class PlayerPoints(db.Model):
             'points': self.points,
             'calculation_date': self.calculation_date.isoformat()
         }
+
+class PointsHistory(db.Model):
+    """Прежние значения очков; пишутся только когда результат пересчета изменился"""
+    id = db.Column(db.Integer, primary_key=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    rules_version = db.Column(db.Integer)
+    points = db.Column(db.Float, nullable=False)
+    calculated_at = db.Column(db.DateTime)  # когда было получено это значение
+    replaced_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_points_history_player_match', 'player_id', 'match_id'),
+    )
+
+class ChangeEvent(db.Model):
+    """Журнал изменений матчей и очков для live-потока (SSE)"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # match, points
+    payload = db.Column(db.Text, nullable=False)  # JSON, сериализуется один раз при записи
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+class TableCounter(db.Model):
+    """Число строк таблицы, поддерживаемое вместе со вставками и удалениями"""
+    table = db.Column(db.String(50), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    recounted_at = db.Column(db.DateTime)  # последняя сверка с COUNT(*)
+
+class Delivery(db.Model):
+    """Событие "мяч" (ball-by-ball); журнал только дописывается"""
+    id = db.Column(db.Integer, primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    innings = db.Column(db.Integer, nullable=False)
+    over = db.Column(db.Integer, nullable=False)  # с 0
+    ball = db.Column(db.Integer, nullable=False)  # порядковый номер подачи в овере, включая wide/no-ball
+    batter_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    bowler_id = db.Column(db.Integer, db.ForeignKey('player.id'), nullable=False)
+    runs = db.Column(db.Integer, nullable=False, default=0)  # очки отбивающего
+    extras = db.Column(db.Integer, nullable=False, default=0)
+    extra_type = db.Column(db.String(10))  # wide, no_ball, bye, leg_bye
+    wicket = db.Column(db.String(20))  # bowled, lbw, caught, stumped, run_out, ...
+    dismissed_id = db.Column(db.Integer, db.ForeignKey('player.id'))
+    fielder_id = db.Column(db.Integer, db.ForeignKey('player.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('match_id', 'innings', 'over', 'ball', name='uq_delivery_position'),
+    )
+
+class PlayerMatchStats(db.Model):
+    """Агрегаты игрока за матч, обновляются по мере поступления Delivery"""
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), primary_key=True)
+
+    # Отбивание
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    balls_faced = db.Column(db.Integer, nullable=False, default=0)
+    fours = db.Column(db.Integer, nullable=False, default=0)
+    sixes = db.Column(db.Integer, nullable=False, default=0)
+    dismissal_type = db.Column(db.String(20), nullable=False, default='not_out')
+
+    # Подача
+    legal_balls = db.Column(db.Integer, nullable=False, default=0)
+    runs_conceded = db.Column(db.Integer, nullable=False, default=0)
+    wickets = db.Column(db.Integer, nullable=False, default=0)
+    maidens = db.Column(db.Integer, nullable=False, default=0)
+
+    # Игра в поле
+    catches = db.Column(db.Integer, nullable=False, default=0)
+    stumpings = db.Column(db.Integer, nullable=False, default=0)
+    run_outs = db.Column(db.Integer, nullable=False, default=0)
+
+    # Текущий овер боулера - чтобы считать maiden без пересчета всего матча
+    over_key = db.Column(db.Integer)  # innings * 1000 + over
+    over_runs = db.Column(db.Integer, nullable=False, default=0)
+    over_balls = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index('ix_player_match_stats_match_id', 'match_id'),
+    )
+
+    @property
+    def overs_bowled(self) -> float:
+        return self.legal_balls / 6
+
+class Contest(db.Model):
+    """Фэнтези-контест по матчу: команды пользователей соревнуются по очкам игроков"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'match_id': self.match_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+class ContestTeam(db.Model):
+    """
+    Команда пользователя в контесте. Состав - 11 id игроков одним блоком
+    little-endian int32 (44 байта): капитан, вице-капитан, остальные девять.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    contest_id = db.Column(db.Integer, db.ForeignKey('contest.id'), nullable=False)
+    user_name = db.Column(db.String(100), nullable=False)
+    lineup = db.Column(db.LargeBinary(44), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_contest_team_contest_id', 'contest_id', 'id'),
+    )
+
+class PlayerIdentity(db.Model):
+    """Реальный игрок: строки Player одного человека в разных матчах ссылаются на одну запись"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    name_key = db.Column(db.String(100), nullable=False, unique=True)  # имя без регистра и лишних пробелов
+
+class RollupTotals:
+    """Суммы по завершенным матчам - общие колонки витрин PlayerRollup и TeamRollup"""
+    matches = db.Column(db.Integer, nullable=False, default=0)
+    runs = db.Column(db.Integer, nullable=False, default=0)
+    balls_faced = db.Column(db.Integer, nullable=False, default=0)
+    fours = db.Column(db.Integer, nullable=False, default=0)
+    sixes = db.Column(db.Integer, nullable=False, default=0)
+    outs = db.Column(db.Integer, nullable=False, default=0)
+    fifties = db.Column(db.Integer, nullable=False, default=0)
+    hundreds = db.Column(db.Integer, nullable=False, default=0)
+    wickets = db.Column(db.Integer, nullable=False, default=0)
+    legal_balls = db.Column(db.Integer, nullable=False, default=0)
+    runs_conceded = db.Column(db.Integer, nullable=False, default=0)
+    maidens = db.Column(db.Integer, nullable=False, default=0)
+    five_wickets = db.Column(db.Integer, nullable=False, default=0)
+    catches = db.Column(db.Integer, nullable=False, default=0)
+    stumpings = db.Column(db.Integer, nullable=False, default=0)
+    run_outs = db.Column(db.Integer, nullable=False, default=0)
+    points = db.Column(db.Float, nullable=False, default=0)
+
+    def totals_dict(self):
+        return {
+            'matches': self.matches,
+            'runs': self.runs,
+            'balls_faced': self.balls_faced,
+            'fours': self.fours,
+            'sixes': self.sixes,
+            'fifties': self.fifties,
+            'hundreds': self.hundreds,
+            'batting_average': round(self.runs / self.outs, 2) if self.outs else None,
+            'strike_rate': round(self.runs / self.balls_faced * 100, 2) if self.balls_faced else None,
+            'wickets': self.wickets,
+            'runs_conceded': self.runs_conceded,
+            'maidens': self.maidens,
+            'five_wickets': self.five_wickets,
+            'economy': round(self.runs_conceded / self.legal_balls * 6, 2) if self.legal_balls else None,
+            'catches': self.catches,
+            'stumpings': self.stumpings,
+            'run_outs': self.run_outs,
+            'points': round(self.points, 2)
+        }
+
+class PlayerRollup(RollupTotals, db.Model):
+    """Витрина игрока: карьера (scope=career, key=''), сезон (год), формат, команда"""
+    person_id = db.Column(db.Integer, db.ForeignKey('player_identity.id'), primary_key=True)
+    scope = db.Column(db.String(10), primary_key=True)  # career, season, format, team
+    key = db.Column(db.String(100), primary_key=True)
+
+    # Лучшие игроки команды/сезона без сортировки всей витрины
+    __table_args__ = (
+        db.Index('ix_player_rollup_scope_points', 'scope', 'key', 'points'),
+    )
+
+class TeamRollup(RollupTotals, db.Model):
+    """Витрина команды: карьера, сезон, формат; matches - сыгранные командой матчи"""
+    team = db.Column(db.String(100), primary_key=True)
+    scope = db.Column(db.String(10), primary_key=True)  # career, season, format
+    key = db.Column(db.String(100), primary_key=True)
+
+class RollupMatch(db.Model):
+    """Матч, учтенный в витринах: ключи, с которыми он учтен, хранятся для вычитания вклада"""
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), primary_key=True)
+    folded = db.Column(db.Boolean, nullable=False, default=False)
+    season = db.Column(db.String(10))
+    format = db.Column(db.String(50))
+    team1 = db.Column(db.String(100))
+    team2 = db.Column(db.String(100))
+    folded_at = db.Column(db.DateTime)
+
+class RollupLine(RollupTotals, db.Model):
+    """Вклад игрока в витрины за матч - в том виде, в каком он был учтен"""
+    player_id = db.Column(db.Integer, db.ForeignKey('player.id'), primary_key=True)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), primary_key=True)
+    person_id = db.Column(db.Integer, db.ForeignKey('player_identity.id'), nullable=False)
+    team = db.Column(db.String(100))
+
+    __table_args__ = (
+        db.Index('ix_rollup_line_match_id', 'match_id'),
+    )
@@ -0,0 +1,450 @@
+"""
+Прогноз фэнтези-очков игроков матча методом Монте-Карло.
+
+Для каждого игрока матча по его истории (витрины PlayerRollup - итоги
+Player и PlayerPoints завершенных матчей: в формате матча, иначе за
+карьеру) строятся распределения: сколько мячей он отобьет, с какой
+частотой набирает раны, 4 и 6 и выбывает; сколько мячей подаст, с какой
+частотой берет уикеты, пропускает раны и делает мейдены; сколько раз
+ловит и выбивает. Короткая история сглаживается к априорным значениям
+роли и формата.
+
+Симулируется только остаток матча: текущая стат-линия (агрегаты подач
+PlayerMatchStats или итоги Player) плюс случайное продолжение на долю
+еще не сыгранных мячей. Симуляции - массивы (симуляции x игроки), очки
+считаются теми же векторизованными правилами формата
+(score_calculator.calculate_points_batch), что и фактические.
+
+Симуляции делятся на пачки фиксированного размера с семенами
+SeedSequence(seed).spawn(...) и раздаются пулу процессов: при том же seed
+результат не зависит от числа процессов. Сводка (среднее и перцентили)
+кэшируется по отпечатку состояния матча - всех входных данных симуляции.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from threading import Lock
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import func, or_
+
+from cache import LRUCache
+from models import db, Delivery, Match, Player, PlayerIdentity, PlayerMatchStats, PlayerRollup
+from rollups import CAREER, is_finished, match_keys, name_key
+from score_calculator import calculate_points_batch
+from scoring_rules import DISMISSAL_CODES, DISMISSAL_OTHER, CompiledRules, get_rule_book
+
+CHUNK_SIZE = 12500  # симуляций в пачке - единица работы процесса пула и семени
+PERCENTILES = (10, 25, 50, 75, 90)
+LIVE_PROGRESS_UNKNOWN = 0.5  # матч идет, но подач нет - считаем сыгранной половину
+SCHEDULED_STATUSES = ('scheduled', 'upcoming', 'not started')
+
+
+class FormatProfile(NamedTuple):
+    innings_balls: int  # мячей в иннинге
+    innings: int  # иннингов в матче
+    bowler_balls: Optional[int]  # лимит мячей боулера (None - без лимита)
+    pace: float  # частоты ранов и уикетов относительно T20
+
+
+FORMATS = {
+    't20': FormatProfile(120, 2, 24, 1.0),
+    'odi': FormatProfile(300, 2, 60, 0.8),
+    'test': FormatProfile(540, 4, None, 0.55),
+}
+
+
+class Prior(NamedTuple):
+    """Априорный игрок роли в T20: мячей за матч, частоты на мяч/овер, события за матч"""
+    bat_balls: float
+    runs_per_ball: float
+    fours_per_ball: float
+    sixes_per_ball: float
+    out_rate: float  # доля матчей, в которых выбывает
+    bowl_balls: float
+    conceded_per_ball: float
+    wickets_per_ball: float
+    maidens_per_over: float
+    catches: float
+    stumpings: float
+    run_outs: float
+
+
+ROLE_PRIORS = {
+    'batsman': Prior(22, 1.25, 0.11, 0.045, 0.75, 1, 1.4, 0.03, 0.02, 0.35, 0.0, 0.05),
+    'bowler': Prior(5, 0.8, 0.06, 0.02, 0.6, 21, 1.3, 0.05, 0.03, 0.25, 0.0, 0.04),
+    'all-rounder': Prior(14, 1.15, 0.09, 0.04, 0.7, 12, 1.35, 0.045, 0.02, 0.3, 0.0, 0.05),
+    'wicket-keeper': Prior(20, 1.2, 0.1, 0.04, 0.75, 0, 1.4, 0.0, 0.0, 0.9, 0.15, 0.05),
+}
+DEFAULT_PRIOR = ROLE_PRIORS['all-rounder']
+PRIOR_BALLS = 60  # мячей истории, весящих столько же, сколько априорная частота
+PRIOR_MATCHES = 3  # матчей истории, весящих столько же, сколько априорное значение за матч
+
+# Способ выбывания в симуляции (доли - типичные для крикета)
+DISMISSAL_MIX = (('caught', 0.58), ('bowled', 0.18), ('lbw', 0.13), ('run_out', 0.06), ('stumped', 0.05))
+DISMISSAL_MIX_CODES = np.array([DISMISSAL_CODES[kind] for kind, _ in DISMISSAL_MIX], dtype=np.int8)
+DISMISSAL_MIX_CDF = np.cumsum([share for _, share in DISMISSAL_MIX])
+NOT_OUT = DISMISSAL_CODES['not_out']
+
+CURRENT_FIELDS = ('runs', 'balls_faced', 'fours', 'sixes', 'legal_balls', 'runs_conceded', 'wickets', 'maidens',
+                  'catches', 'stumpings', 'run_outs')
+PLAYER_TOTALS = ('runs', 'balls_faced', 'wickets', 'runs_conceded')  # стат-линия без подач
+PARAM_FIELDS = ('bat_balls', 'other_per_ball', 'fours_per_ball', 'sixes_per_ball', 'out_rate', 'bowl_balls',
+                'conceded_per_ball', 'wickets_per_ball', 'maidens_per_over', 'catches', 'stumpings', 'run_outs')
+
+
+def format_profile(match_format: Optional[str]) -> FormatProfile:
+    normalized = (match_format or '').lower()
+    if 'test' in normalized:
+        return FORMATS['test']
+    if 'odi' in normalized or 'one day' in normalized:
+        return FORMATS['odi']
+    return FORMATS['t20']
+
+
+# --- Модель матча ---
+
+def remaining_fraction(match: Match, profile: FormatProfile) -> float:
+    """Доля еще не сыгранных мячей матча: по подачам, иначе по статусу"""
+    if is_finished(match.status):
+        return 0.0
+    legal = db.session.query(func.count(Delivery.id)).filter(
+        Delivery.match_id == match.id,
+        or_(Delivery.extra_type.is_(None), Delivery.extra_type.notin_(('wide', 'no_ball')))).scalar()
+    if legal:
+        return max(0.0, 1.0 - legal / (profile.innings_balls * profile.innings))
+    status = (match.status or '').strip().lower()
+    if not status or any(word in status for word in SCHEDULED_STATUSES):
+        return 1.0
+    return LIVE_PROGRESS_UNKNOWN
+
+
+def _history(players, match) -> Tuple[Dict[int, PlayerRollup], Dict[str, int]]:
+    """
+    Итоги игроков в формате матча (или за карьеру, если в формате не играли)
+    по person_id и личности игроков без person_id по ключу имени (как find_person)
+    """
+    persons = {p.person_id for p in players if p.person_id is not None}
+    by_key = {}
+    missing = {name_key(p.name) for p in players if p.person_id is None}
+    if missing:
+        by_key = dict(db.session.query(PlayerIdentity.name_key, PlayerIdentity.id)
+                      .filter(PlayerIdentity.name_key.in_(missing)))
+        persons |= set(by_key.values())
+    if not persons:
+        return {}, by_key
+    match_format = match_keys(match)['format']
+    rows = (PlayerRollup.query
+            .filter(PlayerRollup.person_id.in_(persons),
+                    or_(PlayerRollup.scope == CAREER,
+                        (PlayerRollup.scope == 'format') & (PlayerRollup.key == match_format)))
+            .all())
+    history = {}
+    for row in rows:
+        if row.scope == 'format' or row.person_id not in history:
+            history[row.person_id] = row
+    return history, by_key
+
+
+def _params(prior: Prior, totals, profile: FormatProfile) -> List[float]:
+    """Параметры игрока: история, сглаженная к априорным значениям роли в формате"""
+    scale = profile.innings_balls / FORMATS['t20'].innings_balls
+    pace = profile.pace
+    matches = totals.matches if totals is not None else 0
+    balls = totals.balls_faced if totals is not None else 0
+    legal = totals.legal_balls if totals is not None else 0
+
+    def per_ball(count, balls_seen, prior_rate):
+        return (count + PRIOR_BALLS * prior_rate) / (balls_seen + PRIOR_BALLS)
+
+    def per_match(count, prior_value):
+        return (count + PRIOR_MATCHES * prior_value) / (matches + PRIOR_MATCHES)
+
+    get = (lambda name: getattr(totals, name) or 0) if totals is not None else (lambda name: 0)
+    fours_per_ball = per_ball(get('fours'), balls, prior.fours_per_ball * pace)
+    sixes_per_ball = per_ball(get('sixes'), balls, prior.sixes_per_ball * pace)
+    prior_other = max(prior.runs_per_ball - 4 * prior.fours_per_ball - 6 * prior.sixes_per_ball, 0) * pace
+    other_runs = max(get('runs') - 4 * get('fours') - 6 * get('sixes'), 0)
+    return [
+        per_match(balls, prior.bat_balls * scale),
+        per_ball(other_runs, balls, prior_other),
+        min(fours_per_ball, 0.9),
+        min(sixes_per_ball, 0.9 - min(fours_per_ball, 0.9)),
+        min(per_match(get('outs'), prior.out_rate), 1.0),
+        per_match(legal, prior.bowl_balls * scale),
+        per_ball(get('runs_conceded'), legal, prior.conceded_per_ball * pace),
+        min(per_ball(get('wickets'), legal, prior.wickets_per_ball * pace), 1.0),
+        min((get('maidens') + PRIOR_BALLS / 6 * prior.maidens_per_over) / (legal / 6 + PRIOR_BALLS / 6), 1.0),
+        per_match(get('catches'), prior.catches),
+        per_match(get('stumpings'), prior.stumpings),
+        per_match(get('run_outs'), prior.run_outs),
+    ]
+
+
+def build_model(match: Match) -> Dict:
+    """Входные данные симуляции матча: игроки, текущие стат-линии, параметры, правила"""
+    profile = format_profile(match.format)
+    rules = get_rule_book().for_format(match.format)
+    remaining = remaining_fraction(match, profile)
+    players = (db.session.query(Player.id, Player.name, Player.role, Player.team, Player.person_id,
+                                Player.runs, Player.balls_faced, Player.wickets, Player.runs_conceded)
+               .filter(Player.match_id == match.id).order_by(Player.id).all())
+    stats = {s.player_id: s for s in PlayerMatchStats.query.filter_by(match_id=match.id)}
+    history, by_key = _history(players, match)
+
+    current = {name: [] for name in CURRENT_FIELDS}
+    dismissal, params = [], []
+    for p in players:
+        s = stats.get(p.id)
+        person_id = p.person_id if p.person_id is not None else by_key.get(name_key(p.name))
+        player_params = _params(ROLE_PRIORS.get(p.role, DEFAULT_PRIOR), history.get(person_id), profile)
+        params.append(player_params)
+        for name in CURRENT_FIELDS:
+            if s is not None:
+                value = getattr(s, name)
+            elif remaining < 1.0 and name in PLAYER_TOTALS:
+                value = getattr(p, name) or 0  # подач нет - итоги игрока
+            else:
+                value = 0
+            current[name].append(value)
+        if s is None and remaining < 1.0 and p.runs_conceded:
+            # Сколько подано, в итогах игрока нет - оценка по его экономности
+            conceded_per_ball = player_params[PARAM_FIELDS.index('conceded_per_ball')]
+            current['legal_balls'][-1] = round(p.runs_conceded / conceded_per_ball)
+        dismissal.append(DISMISSAL_CODES.get(s.dismissal_type, DISMISSAL_OTHER) if s is not None else NOT_OUT)
+
+    params = np.array(params, dtype=np.float64).reshape(len(players), len(PARAM_FIELDS))
+    model = {
+        'match_id': match.id,
+        'player_ids': [p.id for p in players],
+        'names': [p.name for p in players],
+        'teams': [p.team for p in players],
+        'roles': [p.role for p in players],
+        'current': {name: np.array(values, dtype=np.float64) for name, values in current.items()},
+        'dismissal': np.array(dismissal, dtype=np.int8),
+        'params': {name: params[:, i] for i, name in enumerate(PARAM_FIELDS)},
+        'remaining': remaining,
+        # Мячей, которые еще может отбить игрок (его команда отбивает половину матча)
+        'bat_cap': int(np.ceil(profile.innings_balls * profile.innings / 2 * remaining)),
+        'bowler_balls': profile.bowler_balls,
+        'rules': rules.definition,
+        'rules_digest': rules.digest,
+        'rules_key': rules.key,
+    }
+    model['digest'] = state_digest(model)
+    return model
+
+
+def state_digest(model: Dict) -> str:
+    """Отпечаток состояния матча: все, от чего зависит результат симуляции"""
+    state = {
+        'players': model['player_ids'], 'roles': model['roles'], 'teams': model['teams'],
+        'current': {name: values.tolist() for name, values in model['current'].items()},
+        'dismissal': model['dismissal'].tolist(),
+        'params': {name: np.round(values, 9).tolist() for name, values in model['params'].items()},
+        'remaining': round(model['remaining'], 9), 'bat_cap': model['bat_cap'],
+        'bowler_balls': model['bowler_balls'], 'rules': model['rules_digest'],
+    }
+    return hashlib.sha1(json.dumps(state, sort_keys=True).encode()).hexdigest()
+
+
+# --- Симуляция (выполняется в процессах пула) ---
+
+_compiled_rules: Dict[str, CompiledRules] = {}
+
+
+def _rules_for(model: Dict) -> CompiledRules:
+    rules = _compiled_rules.get(model['rules_digest'])
+    if rules is None:
+        rules = _compiled_rules[model['rules_digest']] = CompiledRules(model['rules'])
+    return rules
+
+
+def simulate_chunk(model: Dict, size: int, seed: np.random.SeedSequence) -> np.ndarray:
+    """Очки игроков в size симуляциях остатка матча: массив (size, игроки) float32"""
+    rng = np.random.default_rng(seed)
+    current, params = model['current'], model['params']
+    shape = (size, len(model['player_ids']))
+    remaining = model['remaining']
+
+    # Отбивание: длина иннинга - геометрическая (длинные иннинги редки, но возможны),
+    # как целая часть экспоненциальной величины - втрое быстрее rng.geometric
+    can_bat = model['dismissal'] == NOT_OUT
+    mean_balls = np.where(can_bat, params['bat_balls'] * remaining, 0.0)
+    scale = 1.0 / np.log1p(1.0 / np.maximum(mean_balls, 1e-12))
+    balls = np.minimum(np.floor(rng.standard_exponential(shape) * scale), model['bat_cap']).astype(np.int64)
+    fours = rng.binomial(balls, params['fours_per_ball'])
+    sixes = rng.binomial(balls - fours, params['sixes_per_ball'] / (1.0 - params['fours_per_ball']))
+    runs = 4 * fours + 6 * sixes + rng.poisson(balls * params['other_per_ball'])
+    out = (balls > 0) & (rng.random(shape) < params['out_rate'] * remaining)
+    kinds = DISMISSAL_MIX_CODES[np.searchsorted(DISMISSAL_MIX_CDF, rng.random(shape) * DISMISSAL_MIX_CDF[-1])]
+    dismissal = np.where(out, kinds, model['dismissal'])
+
+    # Подача: мячи в пределах лимита боулера, уикеты и мейдены - биномиальные
+    mean_legal = params['bowl_balls'] * remaining
+    if model['bowler_balls'] is None:
+        legal = rng.poisson(mean_legal, size=shape)
+    else:
+        quota = np.maximum(model['bowler_balls'] - current['legal_balls'], 0)
+        share = np.divide(mean_legal, quota, out=np.zeros_like(mean_legal), where=quota > 0)
+        legal = rng.binomial(quota.astype(np.int64), np.minimum(share, 1.0), size=shape)
+    wickets = rng.binomial(legal, params['wickets_per_ball'])
+    conceded = rng.poisson(legal * params['conceded_per_ball'])
+    maidens = rng.binomial(legal // 6, params['maidens_per_over'])
+
+    total_balls = current['balls_faced'] + balls
+    total_legal = current['legal_balls'] + legal
+    batting = {
+        'runs': current['runs'] + runs,
+        'balls_faced': np.where(total_balls > 0, total_balls, 1),  # как deliveries.batting_inputs
+        'fours': current['fours'] + fours,
+        'sixes': current['sixes'] + sixes,
+        'dismissal_type': dismissal,
+    }
+    bowling = {
+        'wickets': current['wickets'] + wickets,
+        'runs_conceded': current['runs_conceded'] + conceded,
+        'overs_bowled': total_legal / 6,
+        'maidens': current['maidens'] + maidens,
+    }
+    fielding = {name: current[name] + rng.poisson(params[name] * remaining, size=shape)
+                for name in ('catches', 'stumpings', 'run_outs')}
+    return calculate_points_batch(model['roles'], batting, bowling, fielding, _rules_for(model)).astype(np.float32)
+
+
+def simulate(model: Dict, simulations: int, seed: int, executor=None) -> np.ndarray:
+    """Все симуляции пачками по CHUNK_SIZE; пачка i всегда получает i-е семя"""
+    sizes = [min(CHUNK_SIZE, simulations - start) for start in range(0, simulations, CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if executor is None or len(sizes) == 1:
+        chunks = [simulate_chunk(model, size, s) for size, s in zip(sizes, seeds)]
+    else:
+        chunks = list(executor.map(simulate_chunk, repeat(model), sizes, seeds))
+    return np.concatenate(chunks)
+
+
+def _distribution(values: np.ndarray) -> Dict:
+    """Среднее, разброс и перцентили по оси симуляций"""
+    percentiles = np.percentile(values, PERCENTILES, axis=0)
+    summary = {'mean': np.round(values.mean(axis=0), 2), 'std': np.round(values.std(axis=0), 2)}
+    for q, row in zip(PERCENTILES, percentiles):
+        summary[f'p{q}'] = np.round(row, 2)
+    return summary
+
+
+def summarize(model: Dict, points: np.ndarray) -> Dict:
+    current = calculate_points_batch(
+        model['roles'],
+        {'runs': model['current']['runs'], 'balls_faced': np.maximum(model['current']['balls_faced'], 1),
+         'fours': model['current']['fours'], 'sixes': model['current']['sixes'],
+         'dismissal_type': model['dismissal']},
+        {'wickets': model['current']['wickets'], 'runs_conceded': model['current']['runs_conceded'],
+         'overs_bowled': model['current']['legal_balls'] / 6, 'maidens': model['current']['maidens']},
+        {name: model['current'][name] for name in ('catches', 'stumpings', 'run_outs')},
+        _rules_for(model))
+    players = _distribution(points.astype(np.float64))
+    teams = sorted(set(model['teams']), key=lambda team: (team is None, team or ''))
+    team_index = np.array([teams.index(team) for team in model['teams']])
+    team_points = np.stack([points[:, team_index == i].sum(axis=1, dtype=np.float64)
+                            for i in range(len(teams))], axis=1) if teams else np.zeros((len(points), 0))
+    team_summary = _distribution(team_points)
+
+    return {
+        'players': [
+            {'player_id': player_id, 'name': model['names'][i], 'team': model['teams'][i],
+             'role': model['roles'][i], 'current_points': float(current[i]),
+             **{name: float(values[i]) for name, values in players.items()}}
+            for i, player_id in enumerate(model['player_ids'])
+        ],
+        'teams': [{'team': team, **{name: float(values[i]) for name, values in team_summary.items()}}
+                  for i, team in enumerate(teams)],
+    }
+
+
+# --- Движок процесса ---
+
+class ProjectionEngine:
+    """Пул процессов для симуляций и кэш сводок по состоянию матча"""
+
+    def __init__(self, simulations: int = 100000, max_simulations: int = 1000000,
+                 workers: Optional[int] = None, cache_ttl: float = 300, max_entries: int = 256):
+        self.simulations = simulations
+        self.max_simulations = max_simulations
+        self.workers = workers if workers is not None else min(os.cpu_count() or 1, 8)
+        self.cache_ttl = cache_ttl
+        self._cache = LRUCache(max_entries)
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._executor_pid: Optional[int] = None
+        self._lock = Lock()
+        self.runs = 0
+        self.cache_hits = 0
+
+    def init_app(self, app):
+        self.simulations = app.config.get('PROJECTION_SIMULATIONS', self.simulations)
+        self.max_simulations = app.config.get('PROJECTION_MAX_SIMULATIONS', self.max_simulations)
+        self.workers = app.config.get('PROJECTION_WORKERS', self.workers)
+        self.cache_ttl = app.config.get('PROJECTION_CACHE_TTL', self.cache_ttl)
+        app.extensions['projections'] = self
+
+    def executor(self) -> Optional[ProcessPoolExecutor]:
+        """
+        Пул создается при первом прогнозе в этом процессе (после fork воркера
+        gunicorn - свой). Процессы пула запускаются через spawn: fork
+        многопоточного воркера небезопасен.
+        """
+        if self.workers <= 1:
+            return None
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None and self._executor_pid == os.getpid():
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def project(self, match: Match, simulations: Optional[int] = None, seed: int = 0) -> Dict:
+        """Сводка прогноза матча; повторный запрос при том же состоянии - из кэша"""
+        simulations = self.simulations if simulations is None else simulations
+        if not 1 <= simulations <= self.max_simulations:
+            raise ValueError(f"simulations must be between 1 and {self.max_simulations}")
+        if seed < 0:
+            raise ValueError("seed must be non-negative")
+
+        model = build_model(match)
+        key = (model['digest'], simulations, seed)
+        cached = self._cache.get(key)
+        if cached is not None:
+            self.cache_hits += 1
+            return {**cached, 'cached': True}
+
+        started = time.perf_counter()
+        points = simulate(model, simulations, seed, self.executor()) if model['player_ids'] else \
+            np.zeros((simulations, 0), dtype=np.float32)
+        result = {
+            'match_id': match.id,
+            'status': match.status,
+            'format': match.format,
+            'rules': model['rules_key'],
+            'simulations': simulations,
+            'seed': seed,
+            'remaining_fraction': round(model['remaining'], 4),
+            'state': model['digest'],
+            **summarize(model, points),
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 1),
+        }
+        self.runs += 1
+        self._cache.set(key, result, self.cache_ttl)
+        return {**result, 'cached': False}
+
+
+projections = ProjectionEngine()
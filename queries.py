@@ -0,0 +1,310 @@
+"""
+Серверная фильтрация, поиск, сортировка и пагинация списков игроков и матчей.
+
+Один слой для API (/api/players, /api/matches) и страниц (/players,
+/matches): параметры запроса разбираются в условия SQL, в ответ идет
+только одна страница, поэтому вес страницы и время рендера не зависят от
+размера таблицы.
+
+- Фильтры: матчи - status, format, team (любая из двух), venue,
+  date_from/date_to (по match_day), min_required_rate/max_required_rate
+  (темп погони по разобранному счету), min_runs (иннинг не меньше); игроки - role, team, match_id,
+  min_runs, min_wickets. Списочные параметры - через запятую или повтором.
+- Поиск q - по префиксам слов (имя игрока; команды и стадион матча).
+  В SQLite - через FTS5-индексы player_fts и match_fts (external content,
+  синхронизируются триггерами, в т.ч. при пакетных вставках в обход ORM);
+  без FTS5 - LIKE по началу слова.
+- Сортировка sort=<поле> или sort=-<поле> (по убыванию) из белого списка,
+  id - второй ключ. Пагинация keyset: курсор хранит поле сортировки,
+  значение и id последней строки, курсор другой сортировки отклоняется.
+"""
+import re
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, column, or_, text
+from sqlalchemy.exc import OperationalError
+
+from models import db, Match, MatchInnings, Player
+from serializers import MATCH_COLUMNS, PLAYER_COLUMNS, InvalidCursor, decode_cursor, encode_cursor
+
+PAGE_SIZE = 50  # строк на HTML-странице
+
+MATCH_SORTS = {'id': Match.id, 'date': Match.match_day, 'required_rate': Match.required_rate}
+PLAYER_SORTS = {'id': Player.id, 'name': Player.name, 'runs': Player.runs, 'wickets': Player.wickets}
+
+# FTS5-таблица -> (таблица с данными, индексируемые колонки)
+SEARCH_INDEXES = {
+    'player_fts': ('player', ('name',)),
+    'match_fts': ('match', ('team1', 'team2', 'venue')),
+}
+MAX_SEARCH_TERMS = 5
+
+_search_tables: Dict[Tuple[str, str], bool] = {}  # (URL БД, FTS-таблица) -> есть ли
+
+
+class QueryError(ValueError):
+    """Неверный фильтр или сортировка списка (ответ 400)"""
+
+
+# --- Разбор параметров ---
+
+def _values(args, name: str) -> List[str]:
+    raw = args.getlist(name) if hasattr(args, 'getlist') else [args[name]] if args.get(name) else []
+    return [value.strip() for item in raw for value in item.split(',') if value.strip()]
+
+
+def _int(args, name: str) -> Optional[int]:
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"{name} must be an integer")
+    if number < 0:
+        raise QueryError(f"{name} must be non-negative")
+    return number
+
+
+def _float(args, name: str) -> Optional[float]:
+    value = args.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise QueryError(f"{name} must be a number")
+    if not 0 <= number < float('inf'):
+        raise QueryError(f"{name} must be non-negative")
+    return number
+
+
+def _date(args, name: str) -> Optional[date]:
+    value = args.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise QueryError(f"{name} must be a date (YYYY-MM-DD)")
+
+
+def search_terms(q: Optional[str]) -> List[str]:
+    """Слова поискового запроса (буквы и цифры), не больше MAX_SEARCH_TERMS"""
+    return re.findall(r'\w+', (q or '').lower())[:MAX_SEARCH_TERMS]
+
+
+def parse_sort(value: Optional[str], sorts: Dict) -> Tuple[str, bool]:
+    value = (value or 'id').strip()
+    descending = value.startswith('-')
+    name = value.lstrip('-')
+    if name not in sorts:
+        raise QueryError(f"sort must be one of {', '.join(sorts)} (prefix - for descending)")
+    return name, descending
+
+
+# --- Поиск ---
+
+def _has_search_index(name: str) -> bool:
+    """Есть ли FTS5-таблица (проверяется один раз на процесс, дальше - из памяти; создает ее миграция)"""
+    key = (str(db.engine.url), name)
+    if key not in _search_tables:
+        _search_tables[key] = db.engine.dialect.name == 'sqlite' and _table_exists(name)
+    return _search_tables[key]
+
+
+def _table_exists(name: str, connection=None) -> bool:
+    return (connection or db.session).execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"), {'name': name}
+    ).first() is not None
+
+
+def ensure_search_indexes(connection):
+    """
+    Создает FTS5-индексы и триггеры синхронизации (SQLite) в транзакции
+    connection - вызывается миграцией. Новый индекс заполняется по
+    существующим строкам; без FTS5 поиск работает через LIKE.
+    """
+    if connection.dialect.name != 'sqlite':
+        return
+    for name, (table, columns) in SEARCH_INDEXES.items():
+        exists = _table_exists(name, connection)
+        listed = ', '.join(columns)
+        new = ', '.join(f'new.{c}' for c in columns)
+        old = ', '.join(f'old.{c}' for c in columns)
+        try:
+            with connection.begin_nested():
+                connection.execute(text(
+                    f'CREATE VIRTUAL TABLE IF NOT EXISTS {name} USING fts5('
+                    f'{listed}, content=\'{table}\', content_rowid=\'id\', prefix=\'2 3\')'))
+        except OperationalError as e:
+            print(f"⚠️ FTS5 недоступен, поиск по {table} - через LIKE: {e}")
+            continue
+        connection.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {name}_ai AFTER INSERT ON "{table}" BEGIN '
+            f'INSERT INTO {name}(rowid, {listed}) VALUES (new.id, {new}); END'))
+        connection.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {name}_ad AFTER DELETE ON "{table}" BEGIN '
+            f"INSERT INTO {name}({name}, rowid, {listed}) VALUES ('delete', old.id, {old}); END"))
+        connection.execute(text(
+            f'CREATE TRIGGER IF NOT EXISTS {name}_au AFTER UPDATE OF {listed} ON "{table}" BEGIN '
+            f"INSERT INTO {name}({name}, rowid, {listed}) VALUES ('delete', old.id, {old}); "
+            f'INSERT INTO {name}(rowid, {listed}) VALUES (new.id, {new}); END'))
+        if not exists:
+            connection.execute(text(f"INSERT INTO {name}({name}) VALUES ('rebuild')"))
+
+
+def _search(model, index: str, columns, terms: List[str]):
+    """Условие: каждое слово запроса - префикс какого-либо слова в колонках"""
+    if _has_search_index(index):
+        match = ' '.join(f'"{term}"*' for term in terms)
+        rowids = (text(f'SELECT rowid FROM {index} WHERE {index} MATCH :match')
+                  .bindparams(match=match).columns(column('rowid')))
+        return model.id.in_(rowids)
+    conditions = []
+    for term in terms:
+        escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        conditions.append(or_(*[
+            condition
+            for col in columns
+            for condition in (db.func.lower(col).like(f'{escaped}%', escape='\\'),
+                              db.func.lower(col).like(f'% {escaped}%', escape='\\'))
+        ]))
+    return and_(*conditions)
+
+
+# --- Страница с сортировкой ---
+
+def _after(model, sort_column, value, last_id, descending: bool):
+    """Строки после (value, last_id) в порядке сортировки (NULL - в начале по возрастанию)"""
+    tie = model.id < last_id if descending else model.id > last_id
+    if not sort_column.nullable:
+        beyond = sort_column < value if descending else sort_column > value
+        return or_(beyond, and_(sort_column == value, tie))
+    if value is None:
+        if descending:
+            return and_(sort_column.is_(None), tie)
+        return or_(and_(sort_column.is_(None), tie), sort_column.isnot(None))
+    beyond = sort_column < value if descending else sort_column > value
+    after = or_(beyond, and_(sort_column == value, tie))
+    return or_(after, sort_column.is_(None)) if descending else after
+
+
+def _cursor_value(sort_column, value):
+    if value is None:
+        return None
+    try:
+        if sort_column.type.python_type is date:
+            return date.fromisoformat(value)
+        return sort_column.type.python_type(value)
+    except (TypeError, ValueError):
+        raise InvalidCursor('Invalid cursor')
+
+
+def sorted_page(query, model, sorts: Dict, sort: str, descending: bool, limit: int, cursor: Optional[str]):
+    """
+    Страница запроса в порядке sort (+ id) и курсор следующей. Для sort=id
+    курсор - [id], как у прежних списков, иначе [поле, значение, id].
+    """
+    sort_column = sorts[sort]
+    key = f"-{sort}" if descending else sort
+    if cursor:
+        if sort == 'id':
+            (last_id,) = decode_cursor(cursor, 1)
+            query = query.filter(model.id < last_id if descending else model.id > last_id)
+        else:
+            cursor_key, value, last_id = decode_cursor(cursor, 3)
+            if cursor_key != key:
+                raise InvalidCursor('Cursor belongs to a different sort order')
+            query = query.filter(_after(model, sort_column, _cursor_value(sort_column, value), last_id, descending))
+
+    if sort == 'id':
+        order = [model.id.desc() if descending else model.id.asc()]
+    elif descending:
+        order = [sort_column.desc().nulls_last(), model.id.desc()]
+    else:
+        order = [sort_column.asc().nulls_first(), model.id.asc()]
+    rows = query.order_by(*order).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if sort == 'id':
+        return rows, encode_cursor(last.id)
+    value = getattr(last, sort_column.key)
+    return rows, encode_cursor(key, value.isoformat() if isinstance(value, date) else value, last.id)
+
+
+# --- Списки ---
+
+def match_criteria(args) -> List:
+    criteria = []
+    statuses = _values(args, 'status')
+    if statuses:
+        criteria.append(Match.status.in_(statuses))
+    formats = _values(args, 'format')
+    if formats:
+        criteria.append(Match.format.in_(formats))
+    teams = _values(args, 'team')
+    if teams:
+        criteria.append(or_(Match.team1.in_(teams), Match.team2.in_(teams)))
+    if args.get('venue'):
+        criteria.append(Match.venue == args['venue'].strip())
+    date_from, date_to = _date(args, 'date_from'), _date(args, 'date_to')
+    if date_from and date_to and date_from > date_to:
+        raise QueryError("date_from must not be after date_to")
+    if date_from:
+        criteria.append(Match.match_day >= date_from)
+    if date_to:
+        criteria.append(Match.match_day <= date_to)
+    min_rate, max_rate = _float(args, 'min_required_rate'), _float(args, 'max_required_rate')
+    if min_rate is not None:
+        criteria.append(Match.required_rate >= min_rate)
+    if max_rate is not None:
+        criteria.append(Match.required_rate <= max_rate)
+    min_runs = _int(args, 'min_runs')
+    if min_runs is not None:
+        criteria.append(db.session.query(MatchInnings.id).filter(
+            MatchInnings.match_id == Match.id, MatchInnings.runs >= min_runs).exists())
+    terms = search_terms(args.get('q'))
+    if terms:
+        criteria.append(_search(Match, 'match_fts', (Match.team1, Match.team2, Match.venue), terms))
+    return criteria
+
+
+def player_criteria(args) -> List:
+    criteria = []
+    roles = _values(args, 'role')
+    if roles:
+        criteria.append(Player.role.in_(roles))
+    teams = _values(args, 'team')
+    if teams:
+        criteria.append(Player.team.in_(teams))
+    match_id = _int(args, 'match_id')
+    if match_id is not None:
+        criteria.append(Player.match_id == match_id)
+    min_runs = _int(args, 'min_runs')
+    if min_runs is not None:
+        criteria.append(Player.runs >= min_runs)
+    min_wickets = _int(args, 'min_wickets')
+    if min_wickets is not None:
+        criteria.append(Player.wickets >= min_wickets)
+    terms = search_terms(args.get('q'))
+    if terms:
+        criteria.append(_search(Player, 'player_fts', (Player.name,), terms))
+    return criteria
+
+
+def match_page(args, limit: int):
+    """Страница матчей по параметрам запроса (фильтры, q, sort, cursor)"""
+    sort, descending = parse_sort(args.get('sort'), MATCH_SORTS)
+    query = db.session.query(*MATCH_COLUMNS, Match.match_day).filter(*match_criteria(args))
+    return sorted_page(query, Match, MATCH_SORTS, sort, descending, limit, args.get('cursor'))
+
+
+def player_page(args, limit: int):
+    """Страница игроков по параметрам запроса (фильтры, q, sort, cursor)"""
+    sort, descending = parse_sort(args.get('sort'), PLAYER_SORTS)
+    query = db.session.query(*PLAYER_COLUMNS).filter(*player_criteria(args))
+    return sorted_page(query, Player, PLAYER_SORTS, sort, descending, limit, args.get('cursor'))
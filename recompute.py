@@ -0,0 +1,390 @@
+"""
+Идемпотентный пересчет очков игроков.
+
+На пару (player_id, match_id) хранится одна текущая запись PlayerPoints.
+Вместе с очками сохраняются входные данные расчета (JSON) и их отпечаток
+вместе с отпечатком набора правил формата матча (scoring_rules.py): если
+при следующем расчете отпечаток совпал, ничего не пишется. Если изменились
+входные данные, правила или формат матча - запись обновляется на месте, а прежнее значение очков уходит в PointsHistory,
+но только когда оно действительно изменилось.
+
+Массовые задания (rescore_all - пересчет по изменившимся правилам,
+recompute_from_deliveries - по изменившимся агрегатам подач) идут по
+таблице пачками по ключу (keyset), с коммитом на каждую пачку, поэтому
+память не зависит от размера таблицы.
+"""
+import hashlib
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import bindparam, false, insert, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from cache import response_cache
+from deliveries import batting_inputs, bowling_inputs, fielding_inputs, load_match_stats
+from models import db, Match, Player, PlayerMatchStats, PlayerPoints, PointsHistory
+from rollups import fold_matches
+from score_calculator import calculate_points_batch, encode_dismissals
+from scoring_rules import CompiledRules, get_rule_book
+from stats import table_stats
+from stream import stream_hub
+
+BATTING_FIELDS = ('runs', 'balls_faced', 'fours', 'sixes', 'dismissal_type')
+BOWLING_FIELDS = ('wickets', 'runs_conceded', 'overs_bowled', 'maidens')
+FIELDING_FIELDS = ('catches', 'stumpings', 'run_outs')
+# Порядок полей в сохраненных входных данных (JSON-массив, без имен ключей)
+INPUT_FIELDS = ('role',) + BATTING_FIELDS + BOWLING_FIELDS + FIELDING_FIELDS
+CURRENT_COLUMNS = (PlayerPoints.id, PlayerPoints.player_id, PlayerPoints.match_id, PlayerPoints.points,
+                   PlayerPoints.calculation_date, PlayerPoints.rules_version, PlayerPoints.inputs_hash)
+
+
+class MissingPlayers(LookupError):
+    def __init__(self, player_ids):
+        super().__init__('Player not found')
+        self.player_ids = sorted(player_ids)
+
+
+class ConcurrentRecompute(RuntimeError):
+    """Пару записал параллельный расчет между чтением и записью - транзакцию нужно повторить"""
+
+    def __init__(self):
+        super().__init__('Points were recomputed concurrently, retry the request')
+
+
+@dataclass
+class RecomputeResult:
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    records: List[Dict] = field(default_factory=list)  # по одной на пару, в порядке запроса
+    changed_player_ids: List[int] = field(default_factory=list)
+    changed_match_ids: List[int] = field(default_factory=list)
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'inserted': self.inserted, 'updated': self.updated, 'unchanged': self.unchanged}
+
+
+def scoring_inputs(player, stats: Optional[PlayerMatchStats], overrides: Dict) -> Dict:
+    """
+    Входные данные расчета: из агрегатов подач, если они есть,
+    иначе из итогов игрока и значений, присланных клиентом.
+    """
+    if stats is not None:
+        return {'role': player.role, **batting_inputs(stats), **bowling_inputs(stats), **fielding_inputs(stats)}
+    return {
+        'role': player.role,
+        'runs': player.runs or 0,
+        'balls_faced': player.balls_faced if player.balls_faced and player.balls_faced > 0 else 1,
+        'fours': overrides.get('fours', 0),
+        'sixes': overrides.get('sixes', 0),
+        'dismissal_type': overrides.get('dismissal_type', 'not_out'),
+        'wickets': player.wickets or 0,
+        'runs_conceded': player.runs_conceded or 0,
+        'overs_bowled': overrides.get('overs_bowled', 4),
+        'maidens': overrides.get('maidens', 0),
+        'catches': overrides.get('catches', 0),
+        'stumpings': overrides.get('stumpings', 0),
+        'run_outs': overrides.get('run_outs', 0)
+    }
+
+
+def serialize_inputs(inputs: Dict) -> str:
+    return json.dumps([inputs[name] for name in INPUT_FIELDS], separators=(',', ':'))
+
+
+def deserialize_inputs(inputs_json: str) -> Dict:
+    return dict(zip(INPUT_FIELDS, json.loads(inputs_json)))
+
+
+def fingerprint(inputs_json: str, rules: CompiledRules) -> str:
+    return hashlib.sha1(f"{rules.digest}:{inputs_json}".encode()).hexdigest()
+
+
+def score_inputs(inputs_list: List[Dict], rules: Optional[CompiledRules] = None) -> List[float]:
+    """Очки для списка входных данных одним векторным расчетом по одному набору правил"""
+    if not inputs_list:
+        return []
+
+    def column(name):
+        return [inputs[name] for inputs in inputs_list]
+
+    batting = {name: column(name) for name in BATTING_FIELDS if name != 'dismissal_type'}
+    batting['dismissal_type'] = encode_dismissals(column('dismissal_type'))
+    bowling = {name: column(name) for name in BOWLING_FIELDS}
+    fielding = {name: column(name) for name in FIELDING_FIELDS}
+    return calculate_points_batch(column('role'), batting, bowling, fielding, rules).tolist()
+
+
+def score_by_rules(inputs_list: List[Dict], rules_list: List[CompiledRules]) -> List[float]:
+    """Очки для входных данных с разными наборами правил: по расчету на набор"""
+    groups: Dict[str, List[int]] = {}
+    for index, rules in enumerate(rules_list):
+        groups.setdefault(rules.name, []).append(index)
+    points = [0.0] * len(inputs_list)
+    for indexes in groups.values():
+        scored = score_inputs([inputs_list[i] for i in indexes], rules_list[indexes[0]])
+        for index, value in zip(indexes, scored):
+            points[index] = value
+    return points
+
+
+def rules_for_matches(match_ids) -> Dict[int, CompiledRules]:
+    """Набор правил по формату каждого матча"""
+    book = get_rule_book()
+    match_ids = set(match_ids)
+    formats = dict(db.session.query(Match.id, Match.format).filter(Match.id.in_(match_ids)))
+    return {match_id: book.for_format(formats.get(match_id)) for match_id in match_ids}
+
+
+def _current_rows(pairs, lock: bool = False) -> Dict[Tuple[int, int], object]:
+    if not pairs:
+        return {}
+    rows = db.session.query(*CURRENT_COLUMNS).filter(
+        tuple_(PlayerPoints.player_id, PlayerPoints.match_id).in_(list(pairs)))
+    if lock:
+        rows = rows.with_for_update()
+    return {(row.player_id, row.match_id): row for row in rows}
+
+
+def lock_points():
+    """
+    Берет блокировку записи очков до чтения: FOR UPDATE в SQLite нет, а
+    пустой UPDATE открывает пишущую транзакцию (и очередь писателей
+    процесса) - параллельный расчет дождется нашего коммита.
+    """
+    if db.session.get_bind().dialect.name == 'sqlite':
+        table = PlayerPoints.__table__
+        db.session.execute(update(table).where(false()).values(points=table.c.points))
+
+
+def recompute(items: Iterable[Dict], commit: bool = True, now: Optional[datetime] = None,
+              lock: bool = False) -> RecomputeResult:
+    """
+    Пересчитывает очки пар (player_id, match_id) из items; остальные поля
+    item - данные клиента на случай, если подач по паре нет.
+    Пишет только пары, у которых изменились входные данные или правила.
+
+    Текущие строки читаются FOR UPDATE (PostgreSQL), обновление проходит,
+    только если отпечаток и дата расчета строки не сменились с чтения
+    (SQLite читает без блокировки). Если пару успел записать параллельный расчет -
+    ConcurrentRecompute: транзакцию нужно откатить и повторить
+    (recompute_retrying). lock=True - сначала lock_points(), без гонки.
+    """
+    items = list(items)
+    order = [(item['player_id'], item['match_id']) for item in items]
+    by_pair = {(item['player_id'], item['match_id']): item for item in items}  # повтор пары - побеждает последний
+    result = RecomputeResult()
+    if not by_pair:
+        return result
+
+    if lock:
+        lock_points()
+    player_ids = {player_id for player_id, _ in by_pair}
+    players = {p.id: p for p in db.session.query(
+        Player.id, Player.role, Player.runs, Player.balls_faced, Player.wickets, Player.runs_conceded
+    ).filter(Player.id.in_(player_ids))}
+    if player_ids - players.keys():
+        raise MissingPlayers(player_ids - players.keys())
+
+    match_stats = load_match_stats(by_pair)
+    match_rules = rules_for_matches(match_id for _, match_id in by_pair)
+    current = _current_rows(by_pair, lock=True)
+    now = now or datetime.utcnow()
+
+    outcome: Dict[Tuple[int, int], Dict] = {}
+    pending = []  # (pair, inputs, inputs_json, hash)
+    for pair, item in by_pair.items():
+        rules = match_rules[pair[1]]
+        inputs = scoring_inputs(players[pair[0]], match_stats.get(pair), item)
+        inputs_json = serialize_inputs(inputs)
+        inputs_hash = fingerprint(inputs_json, rules)
+        row = current.get(pair)
+        if row is not None and row.inputs_hash == inputs_hash:
+            result.unchanged += 1
+            outcome[pair] = {'record_id': row.id, 'points': row.points, 'changed': False}
+        else:
+            pending.append((pair, inputs, inputs_json, inputs_hash))
+
+    inserts, updates, history, inserted_ids, changed_ids = [], [], [], [], []
+    scored = score_by_rules([p[1] for p in pending], [match_rules[p[0][1]] for p in pending])
+    for (pair, _, inputs_json, inputs_hash), points in zip(pending, scored):
+        row = current.get(pair)
+        values = {'points': points, 'rules_version': match_rules[pair[1]].version,
+                  'inputs_hash': inputs_hash, 'inputs': inputs_json}
+        if row is None:
+            inserts.append({'player_id': pair[0], 'match_id': pair[1], 'calculation_date': now, **values})
+            outcome[pair] = {'points': points, 'changed': True}
+        elif row.points != points:
+            updates.append({'b_id': row.id, 'b_hash': row.inputs_hash, 'b_date': row.calculation_date,
+                            'calculation_date': now, **values})
+            history.append({'player_id': pair[0], 'match_id': pair[1], 'rules_version': row.rules_version,
+                            'points': row.points, 'calculated_at': row.calculation_date, 'replaced_at': now})
+            changed_ids.append(row.id)
+            outcome[pair] = {'record_id': row.id, 'points': points, 'changed': True}
+        else:
+            # Входные данные изменились, а очки нет - обновляем только отпечаток
+            updates.append({'b_id': row.id, 'b_hash': row.inputs_hash, 'b_date': row.calculation_date,
+                            'calculation_date': row.calculation_date, **values})
+            outcome[pair] = {'record_id': row.id, 'points': points, 'changed': False}
+
+    if inserts:
+        try:
+            db.session.execute(insert(PlayerPoints), inserts)
+        except IntegrityError:
+            raise ConcurrentRecompute()  # новую пару вставил параллельный расчет
+        table_stats.add_rows(PlayerPoints, len(inserts))
+        inserted = _current_rows([(row['player_id'], row['match_id']) for row in inserts])
+        for pair, row in inserted.items():
+            outcome[pair]['record_id'] = row.id
+            inserted_ids.append(row.id)
+    if updates:
+        table = PlayerPoints.__table__
+        written = db.session.execute(
+            update(table).where(table.c.id == bindparam('b_id'),
+                                table.c.inputs_hash.is_not_distinct_from(bindparam('b_hash')),
+                                table.c.calculation_date.is_not_distinct_from(bindparam('b_date'))),
+            updates).rowcount
+        if written != len(updates) and db.session.get_bind().dialect.supports_sane_multi_rowcount:
+            raise ConcurrentRecompute()  # строку обновили после чтения - история записала бы не то значение
+    if history:
+        db.session.execute(insert(PointsHistory), history)
+
+    stream_hub.record_points_ids(inserted_ids, 'inserted')
+    stream_hub.record_points_ids(changed_ids, 'updated')
+    if inserts or updates:
+        response_cache.invalidate_on_commit('points')
+    # Очки завершенных матчей входят в витрины - обновляем их в той же транзакции
+    fold_matches({pair[1] for pair, value in outcome.items() if value['changed']})
+    if commit:
+        db.session.commit()
+
+    result.inserted = len(inserts)
+    result.updated = len(updates)
+    result.records = [{'player_id': pair[0], 'match_id': pair[1], **outcome[pair],
+                       'rules': match_rules[pair[1]].key} for pair in order]
+    result.changed_player_ids = sorted({pair[0] for pair, value in outcome.items() if value['changed']})
+    result.changed_match_ids = sorted({pair[1] for pair, value in outcome.items() if value['changed']})
+    return result
+
+
+def recompute_retrying(items: Iterable[Dict], attempts: int = 3) -> RecomputeResult:
+    """
+    recompute с коммитом; при ConcurrentRecompute - откат и повтор с новым
+    чтением. Первая попытка без блокировки, повторы - под lock_points().
+    """
+    items = list(items)
+    for attempt in range(1, attempts + 1):
+        try:
+            return recompute(items, lock=attempt > 1)
+        except ConcurrentRecompute:
+            db.session.rollback()
+            if attempt == attempts:
+                raise
+
+
+def rescore_all(chunk_size: int = 1000) -> Iterator[Dict]:
+    """
+    Пересчитывает записи, чей отпечаток не совпадает с текущим набором
+    правил формата матча (правила изменили или у матча сменился формат);
+    после каждой пачки - коммит и отчет о прогрессе.
+    Записи без сохраненных входных данных пропускаются.
+
+    Пачка читается под той же блокировкой, что и recompute(lock=True), и
+    обновляется с той же проверкой отпечатка и даты расчета: параллельный
+    /api/calculate не может записать новые входные данные между чтением и
+    записью, а его очки не перезаписываются очками по старым данным.
+    """
+    book = get_rule_book()
+    progress = {'processed': 0, 'rescored': 0, 'changed': 0, 'skipped': 0, 'last_id': 0}
+    table = PlayerPoints.__table__
+    while True:
+        lock_points()
+        rows = (db.session.query(*CURRENT_COLUMNS, PlayerPoints.inputs, Match.format)
+                .outerjoin(Match, Match.id == PlayerPoints.match_id)
+                .filter(PlayerPoints.id > progress['last_id'])
+                .order_by(PlayerPoints.id)
+                .limit(chunk_size)
+                .with_for_update(of=PlayerPoints)
+                .all())
+        if not rows:
+            db.session.rollback()
+            break
+        progress['last_id'] = rows[-1].id
+        progress['processed'] += len(rows)
+
+        stale, stale_rules, hashes = [], [], []
+        for row in rows:
+            if not row.inputs:
+                progress['skipped'] += 1
+                continue
+            rules = book.for_format(row.format)
+            inputs_hash = fingerprint(row.inputs, rules)
+            if inputs_hash != row.inputs_hash:
+                stale.append(row)
+                stale_rules.append(rules)
+                hashes.append(inputs_hash)
+
+        now = datetime.utcnow()
+        updates, history, changed_ids = [], [], []
+        scored = score_by_rules([deserialize_inputs(row.inputs) for row in stale], stale_rules)
+        for row, rules, inputs_hash, points in zip(stale, stale_rules, hashes, scored):
+            # Одинаковый набор ключей у всех строк - иначе bulk UPDATE распадается на отдельные запросы
+            updates.append({'b_id': row.id, 'b_hash': row.inputs_hash, 'b_date': row.calculation_date,
+                            'points': points, 'rules_version': rules.version, 'inputs_hash': inputs_hash,
+                            'calculation_date': now if points != row.points else row.calculation_date})
+            if points != row.points:
+                history.append({'player_id': row.player_id, 'match_id': row.match_id,
+                                'rules_version': row.rules_version, 'points': row.points,
+                                'calculated_at': row.calculation_date, 'replaced_at': now})
+                changed_ids.append(row.id)
+
+        if updates:
+            written = db.session.execute(
+                update(table).where(table.c.id == bindparam('b_id'),
+                                    table.c.inputs_hash.is_not_distinct_from(bindparam('b_hash')),
+                                    table.c.calculation_date.is_not_distinct_from(bindparam('b_date'))),
+                updates).rowcount
+            if written != len(updates) and db.session.get_bind().dialect.supports_sane_multi_rowcount:
+                db.session.rollback()
+                raise ConcurrentRecompute()  # под блокировкой не должно случаться - строки правили в обход нее
+            response_cache.invalidate_on_commit('points')
+        if history:
+            db.session.execute(insert(PointsHistory), history)
+        stream_hub.record_points_ids(changed_ids, 'updated')
+        fold_matches({row['match_id'] for row in history})
+        db.session.commit()
+
+        progress['rescored'] += len(updates)
+        progress['changed'] += len(history)
+        yield dict(progress)
+
+
+def recompute_from_deliveries(chunk_size: int = 1000) -> Iterator[Dict]:
+    """
+    Проходит по агрегатам подач и пересчитывает пары, чьи агрегаты
+    изменились с прошлого расчета (остальные отсекаются по отпечатку).
+    """
+    progress = {'processed': 0, 'inserted': 0, 'updated': 0, 'unchanged': 0}
+    last_key = (0, 0)
+    while True:
+        keys = (db.session.query(PlayerMatchStats.match_id, PlayerMatchStats.player_id)
+                .filter(tuple_(PlayerMatchStats.match_id, PlayerMatchStats.player_id) > last_key)
+                .order_by(PlayerMatchStats.match_id, PlayerMatchStats.player_id)
+                .limit(chunk_size)
+                .all())
+        if not keys:
+            break
+        last_key = tuple(keys[-1])
+        result = recompute_retrying({'player_id': player_id, 'match_id': match_id} for match_id, player_id in keys)
+        db.session.expunge_all()
+        progress['processed'] += len(keys)
+        for name, value in result.to_dict().items():
+            progress[name] += value
+        progress['changed_player_ids'] = result.changed_player_ids
+        progress['changed_match_ids'] = result.changed_match_ids
+        yield dict(progress)
+
+
+RECOMPUTE_JOBS = {'rules': rescore_all, 'deliveries': recompute_from_deliveries}
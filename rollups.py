@@ -0,0 +1,342 @@
+"""
+Витрины игроков и команд: суммы по завершенным матчам за карьеру, по
+сезонам, форматам и командам.
+
+Строка Player привязана к одному матчу, поэтому реальный игрок - это
+PlayerIdentity (имя без регистра и лишних пробелов), а Player.person_id
+связывает с ним строки всех его матчей.
+
+Завершенный матч сворачивается в витрины: вклад каждого игрока
+(RollupLine) прибавляется к строкам PlayerRollup и TeamRollup по его
+ключам. Когда матч меняется (поправили статистику, пересчитали очки,
+сменили статус), сохраненный вклад вычитается и прибавляется заново в той
+же транзакции - по всей истории ничего не пересчитывается. API читает
+только витрины, поэтому время ответа не растет вместе с числом матчей.
+"""
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import and_, delete, func, insert, tuple_, update
+from sqlalchemy.dialects import postgresql, sqlite
+
+from cache import response_cache
+from migrations import lock_schema
+from models import (db, Match, Player, PlayerIdentity, PlayerMatchStats, PlayerPoints,
+                    PlayerRollup, RollupLine, RollupMatch, TeamRollup)
+
+FINISHED_STATUSES = ('finished', 'completed')
+CAREER = 'career'
+TOTAL_FIELDS = ('matches', 'runs', 'balls_faced', 'fours', 'sixes', 'outs', 'fifties', 'hundreds',
+                'wickets', 'legal_balls', 'runs_conceded', 'maidens', 'five_wickets',
+                'catches', 'stumpings', 'run_outs', 'points')
+STATS_FIELDS = ('fours', 'sixes', 'legal_balls', 'maidens', 'catches', 'stumpings', 'run_outs')
+TOP_PLAYERS = 10
+KEYS_PER_QUERY = 500  # составные ключи в IN - с запасом до лимита параметров SQLite
+# INSERT ... ON CONFLICT DO UPDATE по диалекту; в остальных СУБД - чтение с блокировкой
+UPSERT_INSERTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+@dataclass
+class FoldResult:
+    folded: int = 0
+    unfolded: int = 0
+    lines: int = 0
+
+    def to_dict(self) -> Dict[str, int]:
+        return {'folded': self.folded, 'unfolded': self.unfolded, 'lines': self.lines}
+
+
+def name_key(name: Optional[str]) -> str:
+    return ' '.join((name or '').lower().split())[:100]
+
+
+def is_finished(status: Optional[str]) -> bool:
+    return (status or '').strip().lower() in FINISHED_STATUSES
+
+
+def match_keys(match) -> Dict[str, str]:
+    day = match.match_day or (match.match_date or datetime.utcnow()).date()
+    return {'season': str(day.year), 'format': (match.format or 'unknown').strip()[:50],
+            'team1': match.team1, 'team2': match.team2}
+
+
+def resolve_identities(players) -> Dict[int, int]:
+    """person_id для строк Player (id, name, person_id); недостающие личности создаются"""
+    persons = {p.id: p.person_id for p in players if p.person_id is not None}
+    missing = [p for p in players if p.person_id is None]
+    if not missing:
+        return persons
+
+    names = {}
+    for p in missing:
+        names.setdefault(name_key(p.name), p.name)
+    known = dict(db.session.query(PlayerIdentity.name_key, PlayerIdentity.id)
+                 .filter(PlayerIdentity.name_key.in_(names)))
+    new = [{'name': name, 'name_key': key} for key, name in names.items() if key not in known]
+    if new:
+        db.session.execute(insert(PlayerIdentity), new)
+        known.update(db.session.query(PlayerIdentity.name_key, PlayerIdentity.id)
+                     .filter(PlayerIdentity.name_key.in_([row['name_key'] for row in new])))
+
+    for p in missing:
+        persons[p.id] = known[name_key(p.name)]
+    db.session.execute(update(Player), [{'id': p.id, 'person_id': persons[p.id]} for p in missing])
+    return persons
+
+
+def find_person(player: Player) -> Optional[int]:
+    """Личность строки Player без создания новой (матч игрока мог еще не завершиться)"""
+    if player.person_id is not None:
+        return player.person_id
+    return db.session.query(PlayerIdentity.id).filter_by(name_key=name_key(player.name)).scalar()
+
+
+def match_lines(match_ids: List[int]) -> List[Dict]:
+    """Вклад игроков матчей: итоги Player, агрегаты подач (если есть) и текущие очки"""
+    players = (db.session.query(Player.id, Player.name, Player.team, Player.person_id, Player.match_id,
+                                Player.runs, Player.balls_faced, Player.wickets, Player.runs_conceded)
+               .filter(Player.match_id.in_(match_ids)).all())
+    if not players:
+        return []
+    persons = resolve_identities(players)
+    stats = {(s.player_id, s.match_id): s for s in
+             PlayerMatchStats.query.filter(PlayerMatchStats.match_id.in_(match_ids))}
+    points = {(row.player_id, row.match_id): row.points for row in
+              db.session.query(PlayerPoints.player_id, PlayerPoints.match_id, PlayerPoints.points)
+              .filter(PlayerPoints.match_id.in_(match_ids))}
+
+    lines = []
+    for p in players:
+        runs, wickets = p.runs or 0, p.wickets or 0
+        s = stats.get((p.id, p.match_id))
+        lines.append({
+            'player_id': p.id, 'match_id': p.match_id, 'person_id': persons[p.id], 'team': p.team,
+            'matches': 1, 'runs': runs, 'balls_faced': p.balls_faced or 0,
+            'outs': int(s is not None and s.dismissal_type != 'not_out'),
+            'fifties': int(50 <= runs < 100), 'hundreds': int(runs >= 100),
+            'wickets': wickets, 'runs_conceded': p.runs_conceded or 0, 'five_wickets': int(wickets >= 5),
+            'points': points.get((p.id, p.match_id), 0.0),
+            **{f: getattr(s, f) if s is not None else 0 for f in STATS_FIELDS},
+        })
+    return lines
+
+
+def _add(deltas: Dict[Tuple, Dict[str, float]], key: Tuple, line: Dict, sign: int, fields=TOTAL_FIELDS):
+    totals = deltas[key]
+    for f in fields:
+        totals[f] = totals.get(f, 0) + sign * line.get(f, 0)
+
+
+def _collect(player_deltas, team_deltas, lines: Iterable[Dict], state: RollupMatch, sign: int):
+    """Вклад матча в ключи витрин: сезон, формат и команда - те, с которыми матч учтен"""
+    team_fields = TOTAL_FIELDS[1:]  # matches у команды - сыгранные матчи, а не строки игроков
+    for line in lines:
+        team = line['team'] or 'unknown'
+        for scope, key in ((CAREER, ''), ('season', state.season), ('format', state.format), ('team', team)):
+            _add(player_deltas, (line['person_id'], scope, key), line, sign)
+        for scope, key in ((CAREER, ''), ('season', state.season), ('format', state.format)):
+            _add(team_deltas, (team, scope, key), line, sign, team_fields)
+    for team in {state.team1, state.team2}:
+        for scope, key in ((CAREER, ''), ('season', state.season), ('format', state.format)):
+            _add(team_deltas, (team, scope, key), {'matches': 1}, sign, ('matches',))
+
+
+def _apply(model, key_columns: Tuple[str, ...], deltas: Dict[Tuple, Dict[str, float]]):
+    """
+    Прибавляет дельты к строкам витрины; обнулившиеся строки удаляются.
+    Сложение - в самом запросе (ON CONFLICT DO UPDATE SET col = col + ...):
+    параллельные сворачивания с общими личностями и командами не теряют
+    приращений и в PostgreSQL, где запись не сериализуется, как в SQLite.
+    """
+    if not deltas:
+        return
+    upsert = UPSERT_INSERTS.get(db.session.get_bind().dialect.name)
+    if upsert is None:
+        _apply_locked(model, key_columns, deltas)
+        return
+    table = model.__table__
+    statement = upsert(table)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={f: (func.round(table.c[f] + statement.excluded[f], 2) if f == 'points'
+                  else table.c[f] + statement.excluded[f]) for f in TOTAL_FIELDS})
+    rows = []
+    for key, delta in deltas.items():
+        values = {f: delta.get(f, 0) for f in TOTAL_FIELDS}
+        values['points'] = round(values['points'], 2)
+        rows.append({**dict(zip(key_columns, key)), **values})
+    db.session.execute(statement, rows)
+    # Обнулиться могут только строки, из которых что-то вычли
+    columns = [table.c[c] for c in key_columns]
+    shrunk = [key for key, delta in deltas.items() if any(value < 0 for value in delta.values())]
+    empty = and_(*(table.c[f] == 0 for f in TOTAL_FIELDS))
+    for start in range(0, len(shrunk), KEYS_PER_QUERY):
+        db.session.execute(delete(table).where(tuple_(*columns).in_(shrunk[start:start + KEYS_PER_QUERY]), empty))
+
+
+def _apply_locked(model, key_columns: Tuple[str, ...], deltas: Dict[Tuple, Dict[str, float]]):
+    """_apply без ON CONFLICT: строки читаются FOR UPDATE, суммы считаются в Python"""
+    columns = [getattr(model, c) for c in key_columns]
+    keys = list(deltas)
+    existing = {}
+    for start in range(0, len(keys), KEYS_PER_QUERY):
+        rows = (db.session.query(*columns, *(getattr(model, f) for f in TOTAL_FIELDS))
+                .filter(tuple_(*columns).in_(keys[start:start + KEYS_PER_QUERY]))
+                .with_for_update())
+        for row in rows:
+            existing[tuple(row[:len(key_columns)])] = row
+
+    inserts, updates, removed = [], [], []
+    for key, delta in deltas.items():
+        row = existing.get(key)
+        values = {f: (getattr(row, f) if row is not None else 0) + delta.get(f, 0) for f in TOTAL_FIELDS}
+        values['points'] = round(values['points'], 2)
+        if row is None:
+            inserts.append({**dict(zip(key_columns, key)), **values})
+        elif not any(values.values()):
+            removed.append(key)
+        else:
+            updates.append({**dict(zip(key_columns, key)), **values})
+    if inserts:
+        db.session.execute(insert(model), inserts)
+    if updates:
+        db.session.execute(update(model), updates)
+    for start in range(0, len(removed), KEYS_PER_QUERY):
+        db.session.execute(delete(model).where(tuple_(*columns).in_(removed[start:start + KEYS_PER_QUERY])))
+
+
+def fold_matches(match_ids: Iterable[int]) -> FoldResult:
+    """
+    Обновляет вклад матчей в витрины (без коммита): прежний вклад вычитается,
+    завершенные матчи учитываются заново, незавершенные - только вычитаются.
+    Незавершенные и еще не учтенные матчи ничего не пишут.
+    """
+    result = FoldResult()
+    match_ids = set(match_ids)
+    if not match_ids:
+        return result
+    matches = {m.id: m for m in db.session.query(Match.id, Match.status, Match.team1, Match.team2, Match.format,
+                                                 Match.match_day, Match.match_date)
+               .filter(Match.id.in_(match_ids))}
+    states = {s.match_id: s for s in RollupMatch.query.filter(RollupMatch.match_id.in_(match_ids))}
+    finished = [mid for mid, m in matches.items() if is_finished(m.status)]
+    folded = [mid for mid, s in states.items() if s.folded]
+    if not finished and not folded:
+        return result
+
+    player_deltas, team_deltas = defaultdict(dict), defaultdict(dict)
+    if folded:
+        old_lines = defaultdict(list)
+        for line in db.session.execute(db.select(RollupLine.__table__).where(RollupLine.match_id.in_(folded))):
+            old_lines[line.match_id].append(dict(line._mapping))
+        for mid in folded:
+            _collect(player_deltas, team_deltas, old_lines[mid], states[mid], -1)
+        db.session.execute(delete(RollupLine).where(RollupLine.match_id.in_(folded)))
+        result.unfolded = len(folded)
+
+    now = datetime.utcnow()
+    for mid in set(folded) - set(finished):
+        state = states[mid]
+        state.folded, state.folded_at = False, now
+    if finished:
+        lines = match_lines(finished)
+        by_match = defaultdict(list)
+        for line in lines:
+            by_match[line['match_id']].append(line)
+        for mid in finished:
+            state = states.get(mid)
+            if state is None:
+                state = states[mid] = RollupMatch(match_id=mid)
+                db.session.add(state)
+            for name, value in match_keys(matches[mid]).items():
+                setattr(state, name, value)
+            state.folded, state.folded_at = True, now
+            _collect(player_deltas, team_deltas, by_match[mid], state, 1)
+        if lines:
+            db.session.execute(insert(RollupLine), lines)
+        result.folded = len(finished)
+        result.lines = len(lines)
+
+    _apply(PlayerRollup, ('person_id', 'scope', 'key'), player_deltas)
+    _apply(TeamRollup, ('team', 'scope', 'key'), team_deltas)
+    db.session.flush()
+    response_cache.invalidate_on_commit('rollups')
+    return result
+
+
+def fold_pending(chunk_size: int = 200) -> Iterator[Dict]:
+    """Учитывает завершенные матчи, которых еще нет в витринах; коммит после каждой пачки"""
+    progress = {'folded': 0, 'unfolded': 0, 'lines': 0}
+    last_id = 0
+    while True:
+        ids = [mid for (mid,) in db.session.query(Match.id)
+               .outerjoin(RollupMatch, RollupMatch.match_id == Match.id)
+               .filter(Match.id > last_id, RollupMatch.match_id.is_(None),
+                       func.lower(Match.status).in_(FINISHED_STATUSES))
+               .order_by(Match.id)
+               .limit(chunk_size)]
+        if not ids:
+            break
+        last_id = ids[-1]
+        for name, value in fold_matches(ids).to_dict().items():
+            progress[name] += value
+        db.session.commit()
+        yield dict(progress)
+
+
+def fold_pending_locked():
+    """
+    Завершенные матчи, еще не учтенные в витринах (после обновления, импорта
+    или seed); каждая пачка - под блокировкой схемы, чтобы одновременные
+    deploy и импорты не сворачивали один матч дважды
+    """
+    folds = fold_pending()
+    while True:
+        lock_schema(db.session.connection())
+        if next(folds, None) is None:
+            break
+    db.session.commit()
+
+
+def rebuild(chunk_size: int = 200) -> Iterator[Dict]:
+    """Витрины с нуля: очистка и сворачивание всех завершенных матчей"""
+    for model in (PlayerRollup, TeamRollup, RollupLine, RollupMatch):
+        db.session.execute(delete(model))
+    response_cache.invalidate_on_commit('rollups')
+    db.session.commit()
+    yield from fold_pending(chunk_size)
+
+
+def _grouped(rows) -> Dict:
+    summary = {CAREER: None, 'seasons': [], 'formats': [], 'teams': []}
+    for row in rows:
+        totals = row.totals_dict()
+        if row.scope == CAREER:
+            summary[CAREER] = totals
+        else:
+            summary[f'{row.scope}s'].append({row.scope: row.key, **totals})
+    summary['seasons'].sort(key=lambda item: item['season'])
+    return summary
+
+
+def player_summary(person_id: Optional[int]) -> Dict:
+    rows = PlayerRollup.query.filter_by(person_id=person_id).all() if person_id is not None else []
+    return _grouped(rows)
+
+
+def team_summary(team: str, top: int = TOP_PLAYERS) -> Optional[Dict]:
+    rows = TeamRollup.query.filter_by(team=team).all()
+    if not rows:
+        return None
+    summary = _grouped(rows)
+    del summary['teams']
+    leaders = (db.session.query(PlayerRollup, PlayerIdentity.name)
+               .join(PlayerIdentity, PlayerIdentity.id == PlayerRollup.person_id)
+               .filter(PlayerRollup.scope == 'team', PlayerRollup.key == team)
+               .order_by(PlayerRollup.points.desc())
+               .limit(top))
+    summary['top_players'] = [{'person_id': row.person_id, 'name': name, **row.totals_dict()}
+                              for row, name in leaders]
+    return summary
@@ -0,0 +1,276 @@
+"""
+Фоновый планировщик скрапинга с адаптивным интервалом опроса.
+
+Работает в отдельном потоке каждого воркера gunicorn, но задачу выполняет
+только один из них - тот, кто держит файловую блокировку (flock) в
+instance-папке; остальные периодически пытаются ее перехватить, если
+лидер завершился. Частота опроса зависит от состояния матчей: страницы с
+live-матчами опрашиваются часто, с запланированными - редко, со
+сыгранными - не опрашиваются вовсе. При ошибках интервал растет
+экспоненциально. Состояние лидера пишется в JSON-файл, поэтому
+/api/scrape/status отвечает одинаково в любом воркере.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from threading import Event, Thread
+from typing import Dict, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: блокировки нет, планировщик всегда лидер
+    fcntl = None
+
+from match_sync import sync_matches
+from models import db, Match
+from scraper import fetch_live_matches
+
+FINISHED_STATUSES = {'finished', 'completed', 'result', 'cancelled', 'abandoned', 'no result'}
+SCHEDULED_STATUSES = {'scheduled', 'upcoming', 'not started'}
+
+
+def classify_status(status: Optional[str]) -> str:
+    """'live' | 'scheduled' | 'finished' (Day 2, Stumps, Innings break и т.п. - live)"""
+    value = (status or '').strip().lower()
+    if value in FINISHED_STATUSES:
+        return 'finished'
+    if not value or value in SCHEDULED_STATUSES or value.startswith('match starts'):
+        return 'scheduled'
+    return 'live'
+
+
+class ScrapeScheduler:
+    """Периодический запуск скраперов с выбором лидера через flock"""
+
+    def __init__(self, live_interval: float = 30, scheduled_interval: float = 900,
+                 idle_interval: float = 3600, max_backoff: float = 1800):
+        self.live_interval = live_interval
+        self.scheduled_interval = scheduled_interval
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self.app = None
+        self.ingestion = None
+        self.lock_path = None
+        self.state_path = None
+        self.trigger_path = None
+        self._lock_file = None
+        self._thread: Optional[Thread] = None
+        self._stop = Event()
+        self._url_due: Dict[str, float] = {}
+        self._last_trigger = 0.0
+        self.state = {
+            'leader_pid': None,
+            'last_run_at': None,
+            'last_success_at': None,
+            'last_error': None,
+            'consecutive_failures': 0,
+            'interval': None,
+            'next_run_at': None,
+            'last_result': None,
+            'runs': 0,
+        }
+
+    def init_app(self, app, ingestion=None):
+        self.app = app
+        self.ingestion = ingestion
+        self.live_interval = app.config.get('SCRAPE_LIVE_INTERVAL', self.live_interval)
+        self.scheduled_interval = app.config.get('SCRAPE_SCHEDULED_INTERVAL', self.scheduled_interval)
+        self.idle_interval = app.config.get('SCRAPE_IDLE_INTERVAL', self.idle_interval)
+        self.max_backoff = app.config.get('SCRAPE_MAX_BACKOFF', self.max_backoff)
+        os.makedirs(app.instance_path, exist_ok=True)
+        self.lock_path = os.path.join(app.instance_path, 'scrape_scheduler.lock')
+        self.state_path = os.path.join(app.instance_path, 'scrape_scheduler.json')
+        self.trigger_path = os.path.join(app.instance_path, 'scrape_scheduler.trigger')
+        app.extensions['scrape_scheduler'] = self
+
+    # --- Жизненный цикл ---
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = Thread(target=self._loop, name='scrape-scheduler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._release()
+
+    @property
+    def enabled(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None
+
+    def trigger(self):
+        """Просит лидера выполнить проход сейчас (работает из любого воркера)"""
+        with open(self.trigger_path, 'a'):
+            os.utime(self.trigger_path, None)
+
+    # --- Блокировка ---
+
+    def _acquire(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        lock_file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._lock_file = lock_file
+        self.state['leader_pid'] = os.getpid()
+        print(f"🕒 Планировщик скрапинга: воркер {os.getpid()} стал лидером")
+        return True
+
+    def _release(self):
+        if self._lock_file is not None:
+            if fcntl is not None:
+                fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _triggered(self) -> bool:
+        try:
+            mtime = os.path.getmtime(self.trigger_path)
+        except OSError:
+            return False
+        if mtime > self._last_trigger:
+            self._last_trigger = mtime
+            return True
+        return False
+
+    # --- Основной цикл ---
+
+    def _loop(self):
+        self._triggered()  # старые запросы на запуск не учитываем
+        next_run = time.time()
+        while not self._stop.is_set():
+            if not self._acquire():
+                self._stop.wait(self.live_interval)
+                continue
+
+            triggered = self._triggered()
+            if triggered:
+                self._url_due.clear()  # ручной запуск - опрашиваем все источники
+            if triggered or time.time() >= next_run:
+                interval = self.run_once()
+                next_run = time.time() + interval
+                self.state['next_run_at'] = datetime.utcfromtimestamp(next_run).isoformat()
+                self._save_state()
+
+            self._stop.wait(min(1.0, max(0.0, next_run - time.time())))
+
+    def run_once(self) -> float:
+        """Один проход; возвращает паузу до следующего"""
+        self.state['last_run_at'] = datetime.utcnow().isoformat()
+        self.state['runs'] += 1
+        try:
+            with self.app.app_context():
+                result = self._scrape()
+                interval = self._next_interval()
+        except Exception as e:
+            self.state['consecutive_failures'] += 1
+            self.state['last_error'] = str(e)
+            interval = min(self.live_interval * 2 ** self.state['consecutive_failures'], self.max_backoff)
+            print(f"❌ Планировщик скрапинга: ошибка ({e}), повтор через {interval:.0f} с")
+        else:
+            self.state['consecutive_failures'] = 0
+            self.state['last_error'] = None
+            self.state['last_success_at'] = self.state['last_run_at']
+            self.state['last_result'] = result
+        self.state['interval'] = interval
+        return interval
+
+    def _scrape(self) -> Dict:
+        if self.ingestion is None:
+            matches = fetch_live_matches()
+            return sync_matches(matches).to_dict()
+
+        now = time.time()
+        due = [url for url in self.ingestion.urls if self._url_due.get(url, 0) <= now]
+        if not due:
+            return {'inserted': 0, 'updated': 0, 'unchanged': 0, 'pages_due': 0}
+
+        result = self.ingestion.run(urls=due)
+        try:
+            sync = sync_matches(result.changed) if result.changed else None
+        except Exception:
+            db.session.rollback()
+            self.ingestion.forget()
+            raise
+
+        for url in due:
+            self._url_due[url] = now + self._page_interval(url)
+        if result.pages_failed and result.pages_failed == len(due):
+            raise RuntimeError(result.errors[0] if result.errors else 'все источники недоступны')
+
+        summary = sync.to_dict() if sync else {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        summary.update(result.to_dict())
+        summary['pages_due'] = len(due)
+        return summary
+
+    def _page_interval(self, url: str) -> float:
+        statuses = self.ingestion.page_statuses.get(url)
+        if statuses is None:
+            return self.live_interval  # страница еще не разобрана (ошибка) - повторим скоро
+        kinds = {classify_status(status) for status in statuses}
+        if 'live' in kinds:
+            return self.live_interval
+        if 'scheduled' in kinds:
+            return self.scheduled_interval
+        return float('inf') if kinds else self.idle_interval
+
+    def _next_interval(self) -> float:
+        if self.ingestion is not None:
+            pending = [due for due in self._url_due.values() if due != float('inf')]
+            if not pending:
+                return self.idle_interval
+            return max(1.0, min(pending) - time.time())
+
+        kinds = {classify_status(status) for (status,) in db.session.query(Match.status).distinct()}
+        if 'live' in kinds:
+            return self.live_interval
+        if 'scheduled' in kinds:
+            return self.scheduled_interval
+        return self.idle_interval
+
+    # --- Состояние ---
+
+    def _save_state(self):
+        tmp_path = f"{self.state_path}.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f)
+        os.replace(tmp_path, self.state_path)
+
+    def status(self) -> Dict:
+        """Состояние лидера (из файла) и роль текущего воркера"""
+        state = dict(self.state)
+        if not self.is_leader and self.state_path:
+            try:
+                with open(self.state_path) as f:
+                    state = json.load(f)
+            except (OSError, ValueError):
+                pass
+        state['enabled'] = self.enabled
+        state['worker_pid'] = os.getpid()
+        state['worker_role'] = 'leader' if self.is_leader else ('follower' if self.enabled else 'disabled')
+        state['intervals'] = {
+            'live': self.live_interval,
+            'scheduled': self.scheduled_interval,
+            'idle': self.idle_interval,
+            'max_backoff': self.max_backoff
+        }
+        if self.ingestion is not None:
+            state['sources'] = len(self.ingestion.urls)
+            state['sources_paused'] = sum(1 for due in self._url_due.values() if due == float('inf'))
+        return state
+
+
+scrape_scheduler = ScrapeScheduler()
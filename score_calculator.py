@@ -1,95 +1,163 @@
-from typing import Dict, Any
-
-def calculate_batting_points(batting_data: Dict[str, Any]) -> float:
-    """
-    Рассчитывает фэнтези-очки для отбивающего (batsman).
-    """
-    points = 0.0
-    
-    # Базовые очки за раны
-    runs = batting_data.get('runs', 0)
-    points += runs * 1.0
-    
-    # Бонус за ударные раны
-    balls_faced = batting_data.get('balls_faced', 1)  # избегаем деления на 0
-    strike_rate = (runs / balls_faced) * 100 if balls_faced > 0 else 0
-    
-    if strike_rate > 140:
-        points += 20  # бонус за высокий strike rate
-    elif strike_rate > 120:
-        points += 10
-    elif strike_rate < 60:
-        points -= 10  # штраф за низкий strike rate
-    
-    # Бонус за границы
-    fours = batting_data.get('fours', 0)
-    sixes = batting_data.get('sixes', 0)
-    
-    points += fours * 0.5   # +0.5 за каждую 4
-    points += sixes * 1.0   # +1.0 за каждую 6
-    
-    # Очки за половину века и века
-    if runs >= 100:
-        points += 25  # бонус за 100 ранов
-    elif runs >= 50:
-        points += 10  # бонус за 50 ранов
-    
-    # Штраф за способ выбывания
-    dismissal = batting_data.get('dismissal_type', 'not_out')
-    if dismissal == 'bowled' or dismissal == 'lbw':
-        points -= 5
-    elif dismissal == 'not_out':
-        points += 10  # бонус за not out
-    
-    return round(points, 2)
-
-def calculate_bowling_points(bowling_data: Dict[str, Any]) -> float:
-    """
-    Рассчитывает фэнтези-очки для боулера.
-    """
-    points = 0.0
-    
-    # Очки за уикеты
-    wickets = bowling_data.get('wickets', 0)
-    points += wickets * 20  # 20 очков за каждый уикет
-    
-    # Бонус за 3+ и 5+ уикетов в иннинге
-    if wickets >= 5:
-        points += 25  # бонус за 5 уикетов
-    elif wickets >= 3:
-        points += 10  # бонус за 3 уикета
-    
-    # Очки за экономность
-    runs_conceded = bowling_data.get('runs_conceded', 0)
-    overs_bowled = bowling_data.get('overs_bowled', 1)  # избегаем деления на 0
-    
-    economy_rate = runs_conceded / overs_bowled if overs_bowled > 0 else float('inf')
-    
-    if economy_rate < 5.0:
-        points += 20  # бонус за экономную игру
-    elif economy_rate < 7.0:
-        points += 10
-    elif economy_rate > 10.0:
-        points -= 10  # штраф за дорогую игру
-    
-    # Бонус за мейдены
-    maidens = bowling_data.get('maidens', 0)
-    points += maidens * 10  # 10 очков за каждый мейден-овер
-    
-    return round(points, 2)
-
-def calculate_fielding_points(fielding_data: Dict[str, Any]) -> float:
+from typing import Dict, Any, Optional, Sequence
+
+import numpy as np
+
+from metrics import metrics
+from scoring_rules import CompiledRules, get_rule_book
+# Коды выбываний для batch-расчета (импортируются отсюда, как и раньше)
+from scoring_rules import DISMISSAL_CODES, DISMISSAL_OTHER, encode_dismissals  # noqa: F401
+
+# Очки и пороги задаются наборами правил (rules/*.json, см. scoring_rules.py);
+# без явного rules используется набор default
+
+
+def _rules(rules: Optional[CompiledRules]) -> CompiledRules:
+    return rules if rules is not None else get_rule_book().default
+
+
+def calculate_batting_points(batting_data: Dict[str, Any], rules: Optional[CompiledRules] = None) -> float:
+    """
+    Рассчитывает фэнтези-очки для отбивающего (batsman): очки за раны,
+    бонус/штраф за strike rate, границы, вехи (50, 100) и способ выбывания.
+    """
+    return _rules(rules).batting(batting_data)
+
+def calculate_bowling_points(bowling_data: Dict[str, Any], rules: Optional[CompiledRules] = None) -> float:
+    """
+    Рассчитывает фэнтези-очки для боулера: уикеты, бонус за 3+/5+ уикетов,
+    экономность и мейден-оверы.
+    """
+    return _rules(rules).bowling(bowling_data)
+
+def calculate_fielding_points(fielding_data: Dict[str, Any], rules: Optional[CompiledRules] = None) -> float:
     """
     Рассчитывает очки за полевую игру (опционально).
     """
-    points = 0.0
-    
-    catches = fielding_data.get('catches', 0)
-    stumpings = fielding_data.get('stumpings', 0)
-    run_outs = fielding_data.get('run_outs', 0)
-    
-    points += catches * 10      # 10 очков за каждый кэтч
-    points += stumpings * 12    # 12 очков за каждый стампинг
-    points += run_outs * 15     # 15 очков за каждый ран-аут
-    
-    return round(points, 2)
\ No newline at end of file
+    return _rules(rules).fielding(fielding_data)
+
+def calculate_points(role: Optional[str], batting_data: Dict[str, Any], bowling_data: Dict[str, Any],
+                     fielding_data: Optional[Dict[str, Any]] = None,
+                     rules: Optional[CompiledRules] = None) -> float:
+    """
+    Итоговые очки одного игрока: составляющие, положенные его роли по правилам.
+    """
+    metrics.scoring_calls.inc(('scalar',))
+    metrics.scoring_players.inc(('scalar',))
+    return _rules(rules).score(role, batting_data, bowling_data, fielding_data)
+
+# --- Колоночный (векторизованный) движок подсчета очков ---
+# Те же правила, что и выше, но для массивов стат-линий: пороги - поиск
+# интервала в скомпилированных границах, выбывания и роли - индексы в
+# таблицах, поэтому стоимость расчета почти не зависит от количества
+# игроков в пачке. Колонки могут быть и двумерными (симуляции x игроки,
+# см. projections.py): роли задаются по игрокам и транслируются по строкам.
+
+def _column(columns: Dict[str, Any], name: str, size: int, default: float = 0) -> np.ndarray:
+    values = columns.get(name)
+    if values is None:
+        return np.full(size, default, dtype=np.float64)
+    return np.asarray(values, dtype=np.float64)
+
+
+def _batch_size(columns: Dict[str, Any]) -> int:
+    for values in columns.values():
+        if values is not None:
+            return len(values)
+    return 0
+
+
+def calculate_batting_points_batch(columns: Dict[str, Any], rules: Optional[CompiledRules] = None) -> np.ndarray:
+    """
+    Векторизованный аналог calculate_batting_points.
+    columns: runs, balls_faced, fours, sixes - массивы одинаковой длины,
+    dismissal_type - массив кодов (см. encode_dismissals) или строк.
+    """
+    rules = _rules(rules)
+    size = _batch_size(columns)
+    runs = _column(columns, 'runs', size)
+    balls_faced = _column(columns, 'balls_faced', size, default=1)
+    fours = _column(columns, 'fours', size)
+    sixes = _column(columns, 'sixes', size)
+
+    dismissal = columns.get('dismissal_type')
+    if dismissal is None:
+        dismissal = np.zeros(size, dtype=np.int8)
+    else:
+        dismissal = np.asarray(dismissal)
+        if dismissal.dtype.kind in ('U', 'S', 'O'):
+            dismissal = encode_dismissals(list(dismissal))
+
+    points = runs * rules.per_run
+
+    safe_balls = np.where(balls_faced > 0, balls_faced, 1)
+    strike_rate = np.where(balls_faced > 0, runs / safe_balls * 100, 0)
+    points += rules.strike_rate.lookup(strike_rate)
+
+    points += fours * rules.per_four
+    points += sixes * rules.per_six
+
+    points += rules.milestones.lookup(runs)
+
+    points += rules.dismissal_points[dismissal]
+
+    return np.round(points, 2)
+
+
+def calculate_bowling_points_batch(columns: Dict[str, Any], rules: Optional[CompiledRules] = None) -> np.ndarray:
+    """
+    Векторизованный аналог calculate_bowling_points.
+    columns: wickets, runs_conceded, overs_bowled, maidens.
+    """
+    rules = _rules(rules)
+    size = _batch_size(columns)
+    wickets = _column(columns, 'wickets', size)
+    runs_conceded = _column(columns, 'runs_conceded', size)
+    overs_bowled = _column(columns, 'overs_bowled', size, default=1)
+    maidens = _column(columns, 'maidens', size)
+
+    points = wickets * rules.per_wicket
+    points += rules.hauls.lookup(wickets)
+
+    safe_overs = np.where(overs_bowled > 0, overs_bowled, 1)
+    economy_rate = np.where(overs_bowled > 0, runs_conceded / safe_overs, np.inf)
+    points += rules.economy.lookup(economy_rate)
+
+    points += maidens * rules.per_maiden
+
+    return np.round(points, 2)
+
+
+def calculate_fielding_points_batch(columns: Dict[str, Any], rules: Optional[CompiledRules] = None) -> np.ndarray:
+    """
+    Векторизованный аналог calculate_fielding_points.
+    columns: catches, stumpings, run_outs.
+    """
+    rules = _rules(rules)
+    size = _batch_size(columns)
+    points = _column(columns, 'catches', size) * rules.per_catch
+    points += _column(columns, 'stumpings', size) * rules.per_stumping
+    points += _column(columns, 'run_outs', size) * rules.per_run_out
+    return np.round(points, 2)
+
+
+def calculate_points_batch(roles: Sequence[str],
+                           batting: Dict[str, Any],
+                           bowling: Dict[str, Any],
+                           fielding: Optional[Dict[str, Any]] = None,
+                           rules: Optional[CompiledRules] = None) -> np.ndarray:
+    """
+    Итоговые очки для пачки игроков по тем же правилам, что и calculate_points:
+    каждая составляющая умножается на вес роли из таблицы правил
+    (по умолчанию отбивающему - бэттинг, боулеру - боулинг, полевая игра - всем).
+    """
+    rules = _rules(rules)
+    metrics.scoring_calls.inc(('batch',))
+    metrics.scoring_players.inc(('batch',), len(roles))
+    weights = rules.role_weights[:, rules.encode_roles(roles)]
+
+    points = calculate_batting_points_batch(batting, rules) * weights[0]
+    points += calculate_bowling_points_batch(bowling, rules) * weights[1]
+    if fielding:
+        points += calculate_fielding_points_batch(fielding, rules) * weights[2]
+
+    return np.round(points, 2)
@@ -0,0 +1,261 @@
+"""
+Разбор строки счета Match.score в иннинги и их хранение в MatchInnings.
+
+Строка вида "India 175/4 (20), Australia 160/8 (18.2)", "England 342 &
+210/5d, Pakistan 295 & 120 (f/o)" или "NZ 185/6 (20) vs PAK 179/9 (20)"
+разбирается за один проход одним скомпилированным регулярным выражением
+(токены: счет с необязательными уточнениями в скобках, & - следующий
+иннинг той же команды, запятая/vs - следующая команда, остальное - слова
+названия команды) и небольшим автоматом поверх токенов.
+
+- Счет: раны, /уикеты или -уикеты (без уикетов - all out, 10), d/dec -
+  декларация; в скобках - оверы ("18.4", "45 overs", "18.4/20 ov" - с
+  лимитом), f/o - follow-on, target N.
+- Первой в строке указывается команда, отбивавшая первой (так пишут
+  скрапер и ручной ввод); в тестах иннинги сгруппированы по командам.
+- Не счет: время ("14:30"), даты, "25 runs", уикеты > 10 и т.п. Число
+  без уикетов, d и скобок - счет, только если за ним идет запятая, &, vs,
+  "all out" или конец строки; иначе это часть названия ("Team 1 200/3",
+  "XI 2 150").
+
+По иннингам считается цель погони и требуемый темп (ранов на овер) для
+матчей с лимитом оверов - денормализуются в Match.target и
+Match.required_rate (индекс по статусу и темпу: "live-матчи, где
+догоняющим нужно > 10 ранов за овер"). Иннинги и колонки погони
+пересобираются при каждой записи счета: store_scores(...) вызывают синхронизация
+матчей, API матчей, импорт и заполнение тестовыми данными.
+"""
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, insert, update
+
+from models import db, Match, MatchInnings
+
+MAX_INNINGS = 4  # больше в матче не бывает - остальное в строке не считается
+MAX_WICKETS = 10
+MAX_LIMIT_OVERS = 50  # "x/540 ov" - не лимит оверов
+KEYS_PER_QUERY = 500
+
+# Лимит оверов по формату (без лимита - тест и неизвестные форматы)
+FORMAT_OVERS = (
+    (re.compile(r't10\b', re.I), 10),
+    (re.compile(r't20|twenty20|ipl|bbl|psl|cpl', re.I), 20),
+    (re.compile(r'odi|one[- ]day|list a|50[- ]over', re.I), 50),
+)
+TARGET_WORDS = ('target', 'tgt')
+
+_TOKENS = re.compile(r"""
+    (?P<score>
+        (?<![\w.:/-])(?P<runs>\d{1,4})
+        (?:\s*[/-]\s*(?P<wickets>\d{1,2}))?
+        (?P<declared>\s*(?:d|dec|decl|declared)\b\.?)?
+        (?![\w.:/-])
+        (?!\s+(?:runs?|balls?|wickets?|wkts?|overs?|ov|rpo|mins?|minutes?|hours?|hrs?|days?|am|pm)\b)
+        (?:\s*\(\s*
+            (?:(?P<overs>\d{1,3})(?:\.(?P<balls>\d))?(?:\s*/\s*(?P<limit>\d{1,3}))?\s*(?:ov|ovs|overs?)?\.?)?
+            (?:\s*[,;]?\s*(?P<follow_on>f/o|fo|follow[- ]?on)\b)?
+            (?:\s*[,;]?\s*(?:target|tgt)\s*:?\s*(?P<target>\d{1,4}))?
+        \s*\))?
+    )
+  | (?P<next_innings>&)
+  | (?P<next_team>[,;|]|\b(?:vs?|versus)\b\.?)
+  | (?P<word>[^\s,;|&()]+)
+  | (?P<other>[()])
+""", re.X | re.I)
+_LETTER = re.compile(r'[^\W\d_]')
+# Что может идти за счетом без уикетов и скобок (иначе число - часть названия)
+_TEAM_END = re.compile(r'\s*(?:$|[,;|&]|(?:vs?|versus)\b|all[\s-]*out\b)', re.I)
+
+
+class Innings(NamedTuple):
+    team: Optional[str]  # как в строке счета ("NZ"), None - не указана
+    team_innings: int  # 1 или 2 - какой иннинг этой команды
+    runs: int
+    wickets: Optional[int]  # 10 - all out (в строке без уикетов), None - декларация без уикетов
+    balls: Optional[int]  # легальные мячи по оверам ("18.4" - 112), None - не указаны
+    declared: bool
+    follow_on: bool
+    target: Optional[int]  # цель, указанная в скобках
+
+    @property
+    def complete(self) -> bool:
+        return self.declared or self.wickets >= MAX_WICKETS
+
+
+class Score(NamedTuple):
+    innings: List[Innings]
+    target: Optional[int]  # раны для победы догоняющей команды
+    required_rate: Optional[float]  # ранов за овер, пока погоня идет (только с лимитом оверов)
+
+
+EMPTY = Score([], None, None)
+
+
+@lru_cache(maxsize=256)
+def format_overs(match_format: Optional[str]) -> Optional[int]:
+    for pattern, overs in FORMAT_OVERS:
+        if match_format and pattern.search(match_format):
+            return overs
+    return None
+
+
+def parse_score(text: Optional[str], match_format: Optional[str] = None) -> Score:
+    """Иннинги строки счета и цель/темп погони; строка без счета - пустой Score"""
+    if not text:
+        return EMPTY
+    innings: List[Innings] = []
+    counts: Dict[Optional[str], int] = {}
+    name: List[str] = []
+    team: Optional[str] = None
+    new_team = True
+    limit = format_overs(match_format)
+    target = None
+
+    for m in _TOKENS.finditer(text):
+        kind = m.lastgroup
+        if kind == 'score' and _bare_number(m) and not _TEAM_END.match(text, m.end()):
+            kind = 'word'  # "Team 1 200/3" - число в названии команды
+        if kind == 'word':
+            # Даты, время и т.п. - не название; число - только внутри названия
+            if _LETTER.search(m.group()) or (m.lastgroup == 'score' and name):
+                name.append(m.group().strip())
+            continue
+        if kind == 'next_team':
+            name, new_team = [], True
+            continue
+        if kind == 'next_innings':
+            name, new_team = [], False
+            continue
+        if kind != 'score' or len(innings) >= MAX_INNINGS:
+            continue
+
+        runs, wickets, declared, overs, extra, over_limit, follow_on, innings_target = m.group(
+            'runs', 'wickets', 'declared', 'overs', 'balls', 'limit', 'follow_on', 'target')
+        wickets = int(wickets) if wickets is not None else None if declared else MAX_WICKETS
+        label = ' '.join(name).strip(' :-') or None
+        name = []
+        if wickets is not None and wickets > MAX_WICKETS:
+            continue
+        if label and label.lower() in TARGET_WORDS:
+            target = int(runs)  # "..., target 176"
+            continue
+        if label or new_team:
+            team = label[:100] if label else None
+        new_team = False
+        key = team.lower() if team else None
+        counts[key] = counts.get(key, 0) + 1
+
+        balls = None
+        if overs is not None and (extra is None or extra < '6'):
+            balls = int(overs) * 6 + (int(extra) if extra else 0)
+        if over_limit and 0 < int(over_limit) <= MAX_LIMIT_OVERS:
+            limit = int(over_limit)
+        innings.append(Innings(team, counts[key], int(runs), wickets, balls, bool(declared), bool(follow_on),
+                               int(innings_target) if innings_target else None))
+
+    if not innings:
+        return EMPTY
+    return Score(innings, *_chase(innings, limit, target))
+
+
+def _bare_number(m) -> bool:
+    """Токен счета - одно число: без уикетов, декларации и скобок"""
+    return m.group('wickets') is None and m.group('declared') is None and '(' not in m.group('score')
+
+
+def _chase(innings: List[Innings], limit: Optional[int], target: Optional[int]) -> Tuple[Optional[int], Optional[float]]:
+    """Цель и требуемый темп погони"""
+    if limit:
+        chasing = next((i for i in innings if i.target), None)
+        if chasing is None and len(innings) >= 2:
+            chasing = innings[1]
+        if chasing is None:
+            return target, None
+        target = chasing.target or target or (innings[0].runs + 1 if chasing is not innings[0] else None)
+        if target is None or chasing.balls is None or chasing.complete or chasing.runs >= target:
+            return target, None
+        left = limit * 6 - chasing.balls
+        return target, round((target - chasing.runs) * 6 / left, 2) if left > 0 else None
+
+    # Без лимита оверов (тест): цель известна в четвертом иннинге, когда остальные закончены
+    if target or len(innings) != MAX_INNINGS:
+        return target, None
+    open_innings = [i for i in innings if not i.complete]
+    if len(open_innings) != 1:
+        return None, None
+    chasing = open_innings[0]
+    key = (chasing.team or '').lower()
+    own = sum(i.runs for i in innings if (i.team or '').lower() == key and i is not chasing)
+    other = sum(i.runs for i in innings if (i.team or '').lower() != key)
+    return (other - own + 1 if other - own + 1 > 0 else None), None
+
+
+# --- Хранение ---
+
+def innings_rows(match_id: int, score: Score) -> List[Dict]:
+    return [
+        {'match_id': match_id, 'position': position, 'team': i.team, 'team_innings': i.team_innings,
+         'runs': i.runs, 'wickets': i.wickets, 'balls': i.balls,
+         'run_rate': round(i.runs * 6 / i.balls, 2) if i.balls else None,
+         'declared': i.declared, 'follow_on': i.follow_on}
+        for position, i in enumerate(score.innings, 1)
+    ]
+
+
+def store_scores(matches: Iterable[Tuple[int, Optional[str], Optional[str]]], connection=None) -> int:
+    """
+    Пересобирает иннинги и Match.target/required_rate матчей по (id, score,
+    format) в текущей транзакции (connection - для миграций). Возвращает
+    число записанных иннингов.
+    """
+    matches = list(matches)
+    if not matches:
+        return 0
+    connection = connection or db.session.connection()
+    innings_table, match_table = MatchInnings.__table__, Match.__table__
+    written = 0
+    for start in range(0, len(matches), KEYS_PER_QUERY):
+        chunk = matches[start:start + KEYS_PER_QUERY]
+        rows, chases = [], []
+        for match_id, text, match_format in chunk:
+            score = parse_score(text, match_format)
+            rows.extend(innings_rows(match_id, score))
+            chases.append({'match_id': match_id, 'new_target': score.target, 'new_rate': score.required_rate})
+        connection.execute(delete(innings_table).where(innings_table.c.match_id.in_([m[0] for m in chunk])))
+        if rows:
+            connection.execute(insert(innings_table), rows)
+        connection.execute(
+            update(match_table).where(match_table.c.id == bindparam('match_id'))
+            .values(target=bindparam('new_target'), required_rate=bindparam('new_rate')),
+            chases)
+        written += len(rows)
+    return written
+
+
+def store_match_scores(match_ids: Iterable[int], connection=None) -> int:
+    """store_scores для матчей по id (счет и формат читаются из БД)"""
+    connection = connection or db.session.connection()
+    match_ids = list(match_ids)
+    match_table = Match.__table__
+    matches = []
+    for start in range(0, len(match_ids), KEYS_PER_QUERY):
+        matches.extend(connection.execute(
+            match_table.select().with_only_columns(match_table.c.id, match_table.c.score, match_table.c.format)
+            .where(match_table.c.id.in_(match_ids[start:start + KEYS_PER_QUERY]))).all())
+    return store_scores(matches, connection)
+
+
+def innings_to_dict(row) -> Dict:
+    return {
+        'position': row.position,
+        'team': row.team,
+        'team_innings': row.team_innings,
+        'runs': row.runs,
+        'wickets': row.wickets,
+        'overs': f"{row.balls // 6}.{row.balls % 6}" if row.balls is not None else None,
+        'run_rate': row.run_rate,
+        'declared': row.declared,
+        'follow_on': row.follow_on,
+    }
@@ -0,0 +1,320 @@
+"""
+Правила подсчета фэнтези-очков по форматам матчей.
+
+Наборы правил описываются декларативно в JSON-файлах каталога rules/
+(или SCORING_RULES_DIR): очки за ран, границу, уикет, мейден, полевую
+игру, пороги strike rate / economy / вех и роли, которым начисляются
+очки за бэттинг, боулинг и полевую игру. Набор может наследовать другой
+("extends"), переопределяя только отличия. Формат Match.format выбирает
+набор по подстрокам из "formats"; не подошел ни один - берется default.
+
+При загрузке каждый набор один раз компилируется: пороги превращаются в
+отсортированные массивы границ с таблицей очков (поиск интервала -
+bisect или np.searchsorted), способы выбывания и роли - в массивы,
+индексируемые кодом. Расчет пачки не разбирает правила и не ветвится
+на каждого игрока.
+
+Версия набора ("version") увеличивается при изменении правил; отпечаток
+(digest) считается по содержимому, поэтому сохраненные очки
+пересчитываются даже если версию забыли поднять.
+"""
+import copy
+import glob
+import hashlib
+import json
+import os
+import threading
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+RULES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rules')
+DEFAULT_RULES = 'default'
+
+DISMISSAL_KINDS = ('not_out', 'bowled', 'lbw', 'caught', 'caught_and_bowled', 'stumped', 'run_out',
+                   'hit_wicket', 'retired_out', 'obstructing_field', 'timed_out', 'handled_ball')
+DISMISSAL_CODES = {kind: code for code, kind in enumerate(DISMISSAL_KINDS)}
+DISMISSAL_OTHER = len(DISMISSAL_KINDS)  # неизвестный способ - без бонуса и штрафа
+
+COMPONENTS = ('batting', 'bowling', 'fielding')
+BAND_KEYS = ('below', 'at_most', 'above', 'at_least')
+SECTIONS = {
+    'batting': ('per_run', 'per_four', 'per_six', 'strike_rate', 'milestones', 'dismissal'),
+    'bowling': ('per_wicket', 'per_maiden', 'hauls', 'economy'),
+    'fielding': ('per_catch', 'per_stumping', 'per_run_out'),
+}
+
+
+def encode_dismissals(dismissals: Sequence[Optional[str]]) -> np.ndarray:
+    """
+    Переводит способы выбывания в целочисленные коды для batch-расчета.
+    """
+    return np.fromiter(
+        (DISMISSAL_CODES.get(d or 'not_out', DISMISSAL_OTHER) for d in dismissals),
+        dtype=np.int8,
+        count=len(dismissals)
+    )
+
+
+class Bands:
+    """
+    Пороговые бонусы, скомпилированные в границы интервалов: очки значения x -
+    points[bisect_right(breaks, x)]. Нижние пороги (below/at_most) и верхние
+    (above/at_least) вкладываются как в цепочке if/elif: срабатывает самый
+    жесткий, между ними - 0.
+    """
+
+    def __init__(self, bands: List[Dict], field: str):
+        lower, upper = [], []
+        for band in bands:
+            keys = [key for key in BAND_KEYS if key in band]
+            if len(keys) != 1 or set(band) != {keys[0], 'points'}:
+                raise ValueError(f"{field}: band must have points and one of {', '.join(BAND_KEYS)}")
+            key = keys[0]
+            (lower if key in ('below', 'at_most') else upper).append((float(band[key]), key, float(band['points'])))
+
+        breaks, points = [], []
+        for threshold, key, value in sorted(lower):
+            # Граница "x < t" - t уже в следующем интервале; "x <= t" - сдвигаем на шаг вверх
+            breaks.append(threshold if key == 'below' else float(np.nextafter(threshold, np.inf)))
+            points.append(value)
+        points.append(0.0)
+        for threshold, key, value in sorted(upper):
+            breaks.append(threshold if key == 'at_least' else float(np.nextafter(threshold, np.inf)))
+            points.append(value)
+        if any(previous >= current for previous, current in zip(breaks, breaks[1:])):
+            raise ValueError(f"{field}: bands overlap")
+
+        self.breaks = breaks
+        self.points = points
+        self._breaks = np.asarray(breaks, dtype=np.float64)
+        self._points = np.asarray(points, dtype=np.float64)
+
+    def value(self, x: float) -> float:
+        return self.points[bisect_right(self.breaks, x)]
+
+    def lookup(self, values: np.ndarray) -> np.ndarray:
+        return self._points[np.searchsorted(self._breaks, values, side='right')]
+
+
+class CompiledRules:
+    """Набор правил, готовый к расчету"""
+
+    def __init__(self, definition: Dict):
+        self.definition = definition
+        self.name = definition['name']
+        self.version = int(definition.get('version', 1))
+        self.key = f"{self.name}@{self.version}"
+        self.digest = hashlib.sha1(json.dumps(definition, sort_keys=True).encode()).hexdigest()
+        self.formats = tuple(f.lower() for f in definition.get('formats', ()))
+
+        sections = {}
+        for section, fields in SECTIONS.items():
+            values = definition.get(section) or {}
+            unknown = set(values) - set(fields)
+            if unknown:
+                raise ValueError(f"{self.name}: unknown {section} rules: {', '.join(sorted(unknown))}")
+            sections[section] = values
+
+        batting, bowling, fielding = sections['batting'], sections['bowling'], sections['fielding']
+        self.per_run = float(batting.get('per_run', 0))
+        self.per_four = float(batting.get('per_four', 0))
+        self.per_six = float(batting.get('per_six', 0))
+        self.strike_rate = Bands(batting.get('strike_rate', []), f'{self.name}.batting.strike_rate')
+        self.milestones = Bands(batting.get('milestones', []), f'{self.name}.batting.milestones')
+        dismissal = batting.get('dismissal', {})
+        unknown = set(dismissal) - set(DISMISSAL_KINDS)
+        if unknown:
+            raise ValueError(f"{self.name}: unknown dismissal kinds: {', '.join(sorted(unknown))}")
+        self.dismissal_points = np.zeros(DISMISSAL_OTHER + 1, dtype=np.float64)
+        for kind, value in dismissal.items():
+            self.dismissal_points[DISMISSAL_CODES[kind]] = float(value)
+        self.dismissal = {kind: float(value) for kind, value in dismissal.items()}
+
+        self.per_wicket = float(bowling.get('per_wicket', 0))
+        self.per_maiden = float(bowling.get('per_maiden', 0))
+        self.hauls = Bands(bowling.get('hauls', []), f'{self.name}.bowling.hauls')
+        self.economy = Bands(bowling.get('economy', []), f'{self.name}.bowling.economy')
+
+        self.per_catch = float(fielding.get('per_catch', 0))
+        self.per_stumping = float(fielding.get('per_stumping', 0))
+        self.per_run_out = float(fielding.get('per_run_out', 0))
+
+        # Роль -> какие составляющие очков ей начисляются; '*' - все остальные роли
+        roles = dict(definition.get('roles', {}))
+        other = roles.pop('*', [])
+        self.roles = {role: frozenset(parts) for role, parts in roles.items()}
+        self.other_role = frozenset(other)
+        for parts in (*self.roles.values(), self.other_role):
+            if parts - set(COMPONENTS):
+                raise ValueError(f"{self.name}: roles may only get {', '.join(COMPONENTS)}")
+        self.role_index = {role: index for index, role in enumerate(self.roles)}
+        self.role_weights = np.array([
+            [1.0 if component in parts else 0.0 for parts in (*self.roles.values(), self.other_role)]
+            for component in COMPONENTS
+        ])
+
+        self.batting, self.bowling, self.fielding, self.score = self._compile_scalar()
+
+    def _compile_scalar(self):
+        """
+        Поштучный расчет: замыкания над константами набора, без обращений
+        к атрибутам и разбора правил на каждый вызов.
+        """
+        per_run, per_four, per_six = self.per_run, self.per_four, self.per_six
+        sr_breaks, sr_points = self.strike_rate.breaks, self.strike_rate.points
+        ms_breaks, ms_points = self.milestones.breaks, self.milestones.points
+        dismissal_points = self.dismissal.get
+        per_wicket, per_maiden = self.per_wicket, self.per_maiden
+        haul_breaks, haul_points = self.hauls.breaks, self.hauls.points
+        eco_breaks, eco_points = self.economy.breaks, self.economy.points
+        per_catch, per_stumping, per_run_out = self.per_catch, self.per_stumping, self.per_run_out
+        roles, other_role = self.roles, self.other_role
+        inf = float('inf')
+
+        def batting(data):
+            runs = data.get('runs', 0)
+            balls_faced = data.get('balls_faced', 1)
+            strike_rate = (runs / balls_faced) * 100 if balls_faced > 0 else 0
+            points = (runs * per_run + sr_points[bisect_right(sr_breaks, strike_rate)]
+                      + data.get('fours', 0) * per_four + data.get('sixes', 0) * per_six
+                      + ms_points[bisect_right(ms_breaks, runs)]
+                      + dismissal_points(data.get('dismissal_type', 'not_out') or 'not_out', 0.0))
+            return round(points, 2)
+
+        def bowling(data):
+            wickets = data.get('wickets', 0)
+            overs_bowled = data.get('overs_bowled', 1)
+            economy_rate = data.get('runs_conceded', 0) / overs_bowled if overs_bowled > 0 else inf
+            points = (wickets * per_wicket + haul_points[bisect_right(haul_breaks, wickets)]
+                      + eco_points[bisect_right(eco_breaks, economy_rate)]
+                      + data.get('maidens', 0) * per_maiden)
+            return round(points, 2)
+
+        def fielding(data):
+            points = (data.get('catches', 0) * per_catch + data.get('stumpings', 0) * per_stumping
+                      + data.get('run_outs', 0) * per_run_out)
+            return round(points, 2)
+
+        def score(role, batting_data, bowling_data, fielding_data=None):
+            components = roles.get(role, other_role)
+            points = 0.0
+            if 'batting' in components:
+                points += batting(batting_data)
+            if 'bowling' in components:
+                points += bowling(bowling_data)
+            if fielding_data and 'fielding' in components:
+                points += fielding(fielding_data)
+            return round(points, 2)
+
+        return batting, bowling, fielding, score
+
+    def components(self, role: Optional[str]) -> frozenset:
+        return self.roles.get(role, self.other_role)
+
+    def encode_roles(self, roles) -> np.ndarray:
+        """Коды ролей для пачки: сравнение со списком ролей правил, а не поиск на каждого игрока"""
+        roles = np.asarray(roles)
+        codes = np.full(len(roles), len(self.role_index), dtype=np.int16)
+        for role, index in self.role_index.items():
+            codes[roles == role] = index
+        return codes
+
+    def to_dict(self) -> Dict:
+        return {'key': self.key, 'digest': self.digest, **self.definition}
+
+
+class RuleBook:
+    """Скомпилированные наборы правил и выбор набора по формату матча"""
+
+    def __init__(self, rule_sets: Dict[str, CompiledRules]):
+        if DEFAULT_RULES not in rule_sets:
+            raise ValueError(f"Rule set '{DEFAULT_RULES}' is required")
+        self.rule_sets = rule_sets
+        self.default = rule_sets[DEFAULT_RULES]
+        self._by_format: Dict[Optional[str], CompiledRules] = {}
+
+    def for_format(self, match_format: Optional[str]) -> CompiledRules:
+        rules = self._by_format.get(match_format)
+        if rules is None:
+            rules = self.default
+            normalized = (match_format or '').lower()
+            for candidate in self.rule_sets.values():
+                if any(keyword in normalized for keyword in candidate.formats):
+                    rules = candidate
+                    break
+            self._by_format[match_format] = rules
+        return rules
+
+    def to_list(self) -> List[Dict]:
+        return [rules.to_dict() for rules in self.rule_sets.values()]
+
+
+def _merge(base: Dict, override: Dict) -> Dict:
+    merged = copy.deepcopy(base)
+    for key, value in override.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = _merge(merged[key], value)
+        else:
+            merged[key] = copy.deepcopy(value)
+    return merged
+
+
+def resolve_definitions(raw: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Раскрывает наследование "extends"; ValueError на циклы и неизвестных родителей"""
+    resolved: Dict[str, Dict] = {}
+
+    def resolve(name, chain=()):
+        if name in resolved:
+            return resolved[name]
+        if name in chain:
+            raise ValueError(f"Rule sets extend each other: {' -> '.join(chain + (name,))}")
+        if name not in raw:
+            raise ValueError(f"Unknown rule set: {name}")
+        definition = dict(raw[name])
+        parent = definition.pop('extends', None)
+        if parent:
+            base = {k: v for k, v in resolve(parent, chain + (name,)).items()
+                    if k not in ('name', 'version', 'formats')}
+            definition = _merge(base, definition)
+        resolved[name] = definition
+        return definition
+
+    for name in raw:
+        resolve(name)
+    return resolved
+
+
+def load_rule_book(directory: Optional[str] = None) -> RuleBook:
+    """Читает и компилирует все *.json каталога правил"""
+    directory = directory or os.environ.get('SCORING_RULES_DIR') or RULES_DIR
+    raw = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, encoding='utf-8') as f:
+            definition = json.load(f)
+        definition.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+        raw[definition['name']] = definition
+    return RuleBook({name: CompiledRules(definition) for name, definition in resolve_definitions(raw).items()})
+
+
+_rule_book: Optional[RuleBook] = None
+_lock = threading.Lock()
+
+
+def get_rule_book() -> RuleBook:
+    global _rule_book
+    if _rule_book is None:
+        with _lock:
+            if _rule_book is None:
+                _rule_book = load_rule_book()
+    return _rule_book
+
+
+def reload_rule_book(directory: Optional[str] = None) -> RuleBook:
+    """Перечитывает правила (после правки файлов); старый набор остается в силе при ошибке"""
+    global _rule_book
+    book = load_rule_book(directory)
+    with _lock:
+        _rule_book = book
+    return book
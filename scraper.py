@@ -1,15 +1,19 @@
-import requests
-from bs4 import BeautifulSoup
 from typing import List, Dict, Optional
 import time
 from datetime import datetime
 
+from metrics import metrics
+
+# requests и bs4 импортируются в функциях: импорт приложения и старт
+# воркера не платят за них, пока скрапинг не понадобился
+
 def fetch_live_matches() -> List[Dict]:
     """
     Функция для получения списка текущих крикет-матчей.
     Возвращает mock-данные для надежности (можно заменить на реальный парсинг).
     """
     print("Запуск веб-скрапинга матчей...")
+    started = time.perf_counter()
     
     try:
         # Для курсовой работы используем надежные mock-данные
@@ -56,6 +60,7 @@ def fetch_live_matches() -> List[Dict]:
             }
         ]
         
+        metrics.scrape_fetch.observe(time.perf_counter() - started, ('mock',))
         print(f"✅ Успешно получено {len(matches)} матчей")
         return matches
         
@@ -64,11 +69,41 @@ def fetch_live_matches() -> List[Dict]:
         # Возвращаем пустой список в случае ошибки
         return []
 
+def parse_matches_html(content) -> List[Dict]:
+    """
+    Разбирает страницу с блоками матчей вида
+    <div class="match-info"> <span class="team1">...</span> ... </div>.
+    Отсутствующие поля пропускаются, блоки без команд игнорируются.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(content, 'html.parser')
+    matches = []
+
+    for block in soup.find_all('div', class_='match-info'):
+        match = {}
+        for field in ('team1', 'team2', 'venue', 'format', 'status', 'score'):
+            element = block.find(class_=field)
+            if element:
+                match[field] = element.get_text(strip=True)
+
+        date_element = block.find(class_='match-date')
+        if date_element:
+            match['match_date'] = date_element.get('datetime') or date_element.get_text(strip=True)
+
+        if match.get('team1') and match.get('team2'):
+            matches.append(match)
+
+    return matches
+
 def scrape_real_cricket_data() -> Dict:
     """
     Пример реального скрапинга (для демонстрации в курсовой).
     В реальном использовании нужно соблюдать robots.txt и условия использования сайта.
     """
+    import requests
+    from bs4 import BeautifulSoup
+
     try:
         # Пример URL (замените на реальный источник)
         url = "https://www.espncricinfo.com/live-cricket-score"
@@ -78,11 +113,19 @@ def scrape_real_cricket_data() -> Dict:
         }
         
         print(f"🕷️  Пытаемся получить данные с {url}")
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        started = time.perf_counter()
+        try:
+            response = requests.get(url, headers=headers, timeout=10)
+            response.raise_for_status()
+        except requests.RequestException:
+            metrics.scrape_fetch.observe(time.perf_counter() - started, ('error',))
+            raise
+        metrics.scrape_fetch.observe(time.perf_counter() - started, ('fetched',))
         
         # Парсим HTML
+        started = time.perf_counter()
         soup = BeautifulSoup(response.content, 'html.parser')
+        metrics.scrape_parse.observe(time.perf_counter() - started)
         
         # Здесь была бы реальная логика парсинга
         # Например: soup.find_all('div', class_='match-info')
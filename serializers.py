@@ -0,0 +1,149 @@
+"""
+Сериализация Match / Player / PlayerPoints для API без ленивых загрузок.
+
+Все выборки строятся одним запросом по нужным колонкам (с JOIN там, где
+нужны связанные данные) и превращаются в словари прямо из строк результата,
+не создавая ORM-объекты. Пагинация - keyset (по курсору), без OFFSET.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, or_
+
+from models import db, Match, Player, PlayerPoints
+
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 500
+HISTORY_DEFAULT_LIMIT = 10
+HISTORY_MAX_LIMIT = 100
+
+MATCH_COLUMNS = (Match.id, Match.team1, Match.team2, Match.match_date,
+                 Match.venue, Match.format, Match.status, Match.score, Match.target, Match.required_rate)
+PLAYER_COLUMNS = (Player.id, Player.name, Player.role, Player.team,
+                  Player.runs, Player.wickets, Player.balls_faced, Player.runs_conceded)
+POINTS_COLUMNS = (PlayerPoints.id, Player.name.label('player_name'),
+                  Match.team1, Match.team2, PlayerPoints.points, PlayerPoints.calculation_date)
+
+
+class InvalidCursor(ValueError):
+    """Курсор пагинации поврежден или не относится к этому списку"""
+
+
+def encode_cursor(*values) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+def decode_cursor(token: str, size: int) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor('Invalid cursor')
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor('Invalid cursor')
+    return values
+
+
+def match_row_to_dict(row) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'team1': row.team1,
+        'team2': row.team2,
+        'match_date': row.match_date.isoformat() if row.match_date else None,
+        'venue': row.venue,
+        'format': row.format,
+        'status': row.status,
+        'score': row.score,
+        'target': row.target,
+        'required_rate': row.required_rate
+    }
+
+
+def player_row_to_dict(row) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'name': row.name,
+        'role': row.role,
+        'team': row.team,
+        'runs': row.runs,
+        'wickets': row.wickets,
+        'balls_faced': row.balls_faced,
+        'runs_conceded': row.runs_conceded
+    }
+
+
+def points_row_to_dict(row) -> Dict[str, Any]:
+    return {
+        'id': row.id,
+        'player_name': row.player_name,
+        'match_info': f"{row.team1} vs {row.team2}" if row.team1 is not None else None,
+        'points': row.points,
+        'calculation_date': row.calculation_date.isoformat()
+    }
+
+
+def _page(rows, limit) -> Tuple[list, bool]:
+    return rows[:limit], len(rows) > limit
+
+
+def match_rows(limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Страница матчей по возрастанию id и курсор следующей страницы"""
+    query = db.session.query(*MATCH_COLUMNS)
+    if cursor:
+        (last_id,) = decode_cursor(cursor, 1)
+        query = query.filter(Match.id > last_id)
+    rows, has_more = _page(query.order_by(Match.id).limit(limit + 1).all(), limit)
+    return rows, encode_cursor(rows[-1].id) if has_more else None
+
+
+def points_history_rows(limit: int = HISTORY_DEFAULT_LIMIT, cursor: Optional[str] = None):
+    """
+    Страница истории расчетов от новых к старым одним запросом с JOIN
+    на игрока и матч. Курсор - (calculation_date, id) последней записи.
+    """
+    query = (
+        db.session.query(*POINTS_COLUMNS)
+        .outerjoin(Player, Player.id == PlayerPoints.player_id)
+        .outerjoin(Match, Match.id == PlayerPoints.match_id)
+    )
+    if cursor:
+        last_date, last_id = decode_cursor(cursor, 2)
+        try:
+            last_date = datetime.fromisoformat(last_date)
+        except (TypeError, ValueError):
+            raise InvalidCursor('Invalid cursor')
+        query = query.filter(or_(
+            PlayerPoints.calculation_date < last_date,
+            and_(PlayerPoints.calculation_date == last_date, PlayerPoints.id < last_id)
+        ))
+    query = query.order_by(PlayerPoints.calculation_date.desc(), PlayerPoints.id.desc())
+    rows, has_more = _page(query.limit(limit + 1).all(), limit)
+    next_cursor = encode_cursor(rows[-1].calculation_date, rows[-1].id) if has_more else None
+    return rows, next_cursor
+
+
+def match_rows_by_ids(ids) -> list:
+    """Матчи по списку id одним запросом"""
+    if not ids:
+        return []
+    return db.session.query(*MATCH_COLUMNS).filter(Match.id.in_(ids)).order_by(Match.id).all()
+
+
+def points_rows_where(*criteria) -> list:
+    """Записи очков (с игроком и матчем) по произвольному условию одним запросом"""
+    return (
+        db.session.query(*POINTS_COLUMNS)
+        .outerjoin(Player, Player.id == PlayerPoints.player_id)
+        .outerjoin(Match, Match.id == PlayerPoints.match_id)
+        .filter(*criteria)
+        .order_by(PlayerPoints.id)
+        .all()
+    )
+
+
+def page_limit(value: Optional[int], default: int, maximum: int) -> int:
+    if value is None:
+        return default
+    return max(1, min(value, maximum))
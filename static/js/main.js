@@ -150,8 +150,8 @@ async function calculatePlayerPoints() {
         
         showAlert(`Points calculated: ${result.points} for ${result.player}`, 'success');
         
-        // Обновляем историю, если на странице есть таблица истории
-        if (typeof updatePointsHistory === 'function') {
+        // История обновится сама через live-поток; без EventSource перечитываем ее
+        if (!window.EventSource) {
             updatePointsHistory();
         }
         
@@ -161,6 +161,65 @@ async function calculatePlayerPoints() {
     }
 }
 
+/**
+ * Подписка на live-поток изменений (/api/stream/matches) вместо периодических
+ * перезапросов целых списков. Сервер присылает только дельты:
+ * handlers.match(match) - матч добавлен/обновлен/удален (match.change),
+ * handlers.points(record) - новый расчет очков,
+ * handlers.reset() - часть событий пропущена, список нужно перечитать.
+ * EventSource сам переподключается и досылает пропущенное по Last-Event-ID.
+ */
+function subscribeLiveUpdates(handlers) {
+    if (!window.EventSource) {
+        console.warn('EventSource не поддерживается браузером, live-обновления отключены');
+        return null;
+    }
+    
+    const source = new EventSource('/api/stream/matches');
+    
+    ['match', 'points'].forEach(type => {
+        source.addEventListener(type, event => {
+            if (handlers[type]) {
+                handlers[type](JSON.parse(event.data));
+            }
+        });
+    });
+    
+    source.addEventListener('reset', () => {
+        if (handlers.reset) handlers.reset();
+    });
+    
+    return source;
+}
+
+// Строка таблицы истории расчетов
+function createPointsHistoryRow(record) {
+    const row = document.createElement('tr');
+    row.dataset.recordId = record.id;
+    row.innerHTML = `
+        <td>${record.id}</td>
+        <td>${record.player_name}</td>
+        <td>${record.match_info}</td>
+        <td><strong>${record.points}</strong></td>
+        <td>${new Date(record.calculation_date).toLocaleDateString()}</td>
+    `;
+    return row;
+}
+
+// Добавляет новый расчет в начало таблицы истории (из live-потока);
+// пересчитанная запись переносится наверх, а не дублируется
+function prependPointsHistoryRow(record, tbodyId = 'pointsHistory', maxRows = 10) {
+    const tbody = document.getElementById(tbodyId);
+    if (!tbody) return;
+    
+    const existing = tbody.querySelector(`tr[data-record-id="${record.id}"]`);
+    if (existing) existing.remove();
+    tbody.prepend(createPointsHistoryRow(record));
+    while (tbody.rows.length > maxRows) {
+        tbody.deleteRow(tbody.rows.length - 1);
+    }
+}
+
 // Функция для обновления истории очков
 async function updatePointsHistory() {
     try {
@@ -171,15 +230,7 @@ async function updatePointsHistory() {
             tbody.innerHTML = '';
             
             history.forEach(record => {
-                const row = document.createElement('tr');
-                row.innerHTML = `
-                    <td>${record.id}</td>
-                    <td>${record.player_name}</td>
-                    <td>${record.match_info}</td>
-                    <td><strong>${record.points}</strong></td>
-                    <td>${new Date(record.calculation_date).toLocaleDateString()}</td>
-                `;
-                tbody.appendChild(row);
+                tbody.appendChild(createPointsHistoryRow(record));
             });
         }
     } catch (error) {
@@ -218,10 +269,13 @@ async function loadMatchesForSelect(selectId) {
     }
 }
 
-// Функция для загрузки игроков в выпадающий список
-async function loadPlayersForSelect(selectId) {
+// Функция для загрузки игроков в выпадающий список; query - поиск по началу имени
+// (список ограничен одной страницей, поэтому для больших баз нужен поиск)
+async function loadPlayersForSelect(selectId, query = '') {
     try {
-        const players = await fetchData('/api/players');
+        const params = new URLSearchParams({limit: 100, sort: 'name'});
+        if (query) params.set('q', query);
+        const players = await fetchData(`/api/players?${params}`);
         const select = document.getElementById(selectId);
         
         if (select) {
@@ -245,8 +299,9 @@ async function loadPlayersForSelect(selectId) {
                 select.value = currentValue;
             }
             
-            // Добавляем обработчик изменения для обновления формы в зависимости от роли
-            select.addEventListener('change', function() {
+            // Обработчик изменения для обновления формы в зависимости от роли
+            // (присваивание, а не addEventListener: список перезагружается при каждом поиске)
+            select.onchange = function() {
                 const selectedOption = this.options[this.selectedIndex];
                 const role = selectedOption.dataset.role;
                 
@@ -262,7 +317,7 @@ async function loadPlayersForSelect(selectId) {
                 if (roleField) {
                     roleField.value = role || '';
                 }
-            });
+            };
         }
     } catch (error) {
         console.error('Failed to load players:', error);
@@ -0,0 +1,150 @@
+"""
+Счетчики строк таблиц для главной страницы и /api/health без COUNT(*).
+
+Счетчики лежат в таблице TableCounter и меняются в той же транзакции, что
+и данные: ORM-вставки и удаления учитываются автоматически (after_flush),
+пакетные insert() - явным вызовом add_rows(). Чтение - один запрос по
+первичному ключу маленькой таблицы вместо трех полных сканов. Фоновый
+поток периодически сверяет счетчики с COUNT(*) (например, после правок
+БД в обход приложения); сверку выполняет один воркер - тот, чье условное
+UPDATE по recounted_at успело первым.
+"""
+from datetime import datetime, timedelta
+from threading import Event, Lock, Thread
+from typing import Dict, Optional
+
+from sqlalchemy import event, func, select
+from sqlalchemy.exc import IntegrityError
+
+from models import db, Match, Player, PlayerPoints, TableCounter
+
+COUNTED_MODELS = (Match, Player, PlayerPoints)
+
+
+class TableStats:
+    """Поддерживаемые счетчики строк и их периодическая сверка"""
+
+    def __init__(self, recount_interval: float = 300):
+        self.recount_interval = recount_interval
+        self.app = None
+        self._tables = {model: model.__tablename__ for model in COUNTED_MODELS}
+        self._thread: Optional[Thread] = None
+        self._stopped = Event()
+        self._lock = Lock()
+        self.recounts = 0
+        self.last_drift: Dict[str, int] = {}
+
+    def init_app(self, app):
+        self.app = app
+        self.recount_interval = app.config.get('STATS_RECOUNT_INTERVAL', self.recount_interval)
+        event.listen(db.session, 'after_flush', self._after_flush)
+        app.extensions['table_stats'] = self
+
+    # --- Поддержание счетчиков (в транзакции пути записи) ---
+
+    def add_rows(self, model, delta: int, connection=None):
+        """Изменяет счетчик таблицы; для пакетных insert()/delete() в обход ORM"""
+        if not delta:
+            return
+        table = TableCounter.__table__
+        statement = (table.update()
+                     .where(table.c.table == self._tables[model])
+                     .values(count=table.c.count + delta))
+        (connection or db.session.connection()).execute(statement)
+
+    def _after_flush(self, session, flush_context):
+        deltas = {}
+        for obj in session.new:
+            if type(obj) in self._tables:
+                deltas[type(obj)] = deltas.get(type(obj), 0) + 1
+        for obj in session.deleted:
+            if type(obj) in self._tables:
+                deltas[type(obj)] = deltas.get(type(obj), 0) - 1
+        if deltas:
+            connection = session.connection()
+            for model, delta in deltas.items():
+                self.add_rows(model, delta, connection)
+
+    # --- Чтение ---
+
+    def counts(self) -> Dict[str, int]:
+        """{'match': N, 'player': N, 'player_points': N} одним запросом"""
+        self._ensure_recounter()
+        rows = dict(db.session.query(TableCounter.table, TableCounter.count).all())
+        return {table: rows.get(table, 0) for table in self._tables.values()}
+
+    def count(self, model) -> int:
+        return self.counts()[self._tables[model]]
+
+    # --- Создание и сверка ---
+
+    def ensure(self):
+        """Создает недостающие счетчики по COUNT(*) (при первом запуске на базе)"""
+        existing = {table for (table,) in db.session.query(TableCounter.table)}
+        missing = [model for model, table in self._tables.items() if table not in existing]
+        if not missing:
+            return
+        with db.session.no_autoflush:  # конфликт с другим воркером - на commit, а не в COUNT(*)
+            for model in missing:
+                db.session.add(TableCounter(table=self._tables[model],
+                                            count=db.session.query(func.count(model.id)).scalar(),
+                                            recounted_at=datetime.utcnow()))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # другой воркер создал счетчики одновременно с нами
+
+    def recount(self, force: bool = False) -> Dict[str, int]:
+        """
+        Сверяет счетчики с COUNT(*), возвращает расхождения.
+        Без force строка пересчитывается, только если ее давно не сверяли.
+        """
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.recount_interval)
+        before = dict(db.session.query(TableCounter.table, TableCounter.count).all())
+        table = TableCounter.__table__
+        recounted = []
+        for model, name in self._tables.items():
+            statement = (table.update()
+                         .where(table.c.table == name)
+                         .values(count=select(func.count(model.id)).scalar_subquery(), recounted_at=now))
+            if not force:
+                statement = statement.where(table.c.recounted_at < cutoff)
+            if db.session.execute(statement).rowcount:
+                recounted.append(name)
+        after = dict(db.session.query(TableCounter.table, TableCounter.count).all())
+        db.session.commit()
+
+        drift = {name: after[name] - before.get(name, 0) for name in recounted if after[name] != before.get(name, 0)}
+        if recounted:
+            self.recounts += 1
+            self.last_drift = drift
+        if drift:
+            print(f"⚠️ Счетчики строк расходились с COUNT(*): {drift}")
+        return drift
+
+    def _ensure_recounter(self):
+        if not self.recount_interval or self.app is None:
+            return
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped.clear()
+                    self._thread = Thread(target=self._recount_loop, name='table-stats', daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _recount_loop(self):
+        while not self._stopped.wait(self.recount_interval):
+            try:
+                with self.app.app_context():
+                    self.recount()
+            except Exception as e:
+                print(f"❌ Ошибка сверки счетчиков: {e}")
+
+
+table_stats = TableStats()
@@ -0,0 +1,250 @@
+"""
+Live-поток изменений матчей и очков (Server-Sent Events).
+
+Пути записи (синхронизация матчей, расчет очков) кладут дельты в таблицу
+ChangeEvent в той же транзакции, что и сами данные. В каждом воркере один
+поток-опросчик читает новые события (id > последнего) и рассылает их всем
+локальным подписчикам: событие сериализуется в SSE-кадр один раз и
+раздается N подписчикам как готовые байты. Так дельты доходят до клиентов
+любого воркера, а нагрузка на БД не зависит от числа открытых вкладок.
+
+id событий должны только расти: очистка журнала не удаляет последнее
+событие, иначе SQLite (id - rowid) начал бы нумерацию заново. Пропуски в
+id (в PostgreSQL транзакции фиксируются не в порядке выдачи id)
+перечитываются еще GAP_TIMEOUT секунд.
+"""
+import json
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from queue import Empty, Full, Queue
+from threading import Event, Lock, Thread
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, insert
+
+from models import db, ChangeEvent, PlayerPoints
+from serializers import match_row_to_dict, match_rows_by_ids, points_row_to_dict, points_rows_where
+
+HEARTBEAT = b': keep-alive\n\n'
+RESET = b'event: reset\ndata: {}\n\n'
+GAP_TIMEOUT = 30.0  # сколько ждать события с пропущенным id (транзакция еще не зафиксирована)
+MAX_GAPS = 1000
+
+
+def format_frame(event_id: int, kind: str, payload: str) -> bytes:
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n".encode('utf-8')
+
+
+class Subscriber:
+    def __init__(self, maxsize: int):
+        self.queue: Queue = Queue(maxsize=maxsize)
+        self.overflowed = False
+
+    def push(self, frame: bytes):
+        try:
+            self.queue.put_nowait(frame)
+        except Full:
+            # Клиент не успевает читать - отключаем, он переподключится и перечитает списки
+            self.overflowed = True
+
+
+class StreamHub:
+    """Раздача событий ChangeEvent подписчикам SSE внутри одного воркера"""
+
+    def __init__(self, poll_interval: float = 1.0, max_subscribers: int = 1000,
+                 queue_size: int = 256, buffer_size: int = 1000, retention: float = 3600):
+        self.poll_interval = poll_interval
+        self.max_subscribers = max_subscribers
+        self.queue_size = queue_size
+        self.retention = retention
+        self.app = None
+        self._subscribers: List[Subscriber] = []
+        self._recent = deque(maxlen=buffer_size)  # (id, frame) для Last-Event-ID
+        self._lock = Lock()
+        self._wake = Event()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self._last_id: Optional[int] = None
+        self._gaps: Dict[int, float] = {}  # пропущенный id -> когда замечен
+        self._last_cleanup = 0.0
+        self.events_published = 0
+        self.frames_delivered = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.poll_interval = app.config.get('STREAM_POLL_INTERVAL', self.poll_interval)
+        self.max_subscribers = app.config.get('STREAM_MAX_SUBSCRIBERS', self.max_subscribers)
+        event.listen(db.session, 'after_commit', self._after_commit)
+        app.extensions['stream_hub'] = self
+
+    # --- Запись событий (в транзакции пути записи) ---
+
+    def record(self, kind: str, items: Iterable[Dict]):
+        rows = [{'kind': kind, 'payload': json.dumps(item, ensure_ascii=False), 'created_at': datetime.utcnow()}
+                for item in items]
+        if rows:
+            db.session.execute(insert(ChangeEvent), rows)
+            db.session.info['stream_changed'] = True
+
+    def record_matches(self, match_ids, change: str):
+        self.record('match', ({'change': change, **match_row_to_dict(row)}
+                              for row in match_rows_by_ids(match_ids)))
+
+    def record_points(self, change: str, *criteria):
+        self.record('points', ({'change': change, **points_row_to_dict(row)}
+                               for row in points_rows_where(*criteria)))
+
+    def record_points_ids(self, ids, change: str):
+        if ids:
+            self.record_points(change, PlayerPoints.id.in_(ids))
+
+    def _after_commit(self, session):
+        if session.info.pop('stream_changed', False):
+            self._wake.set()
+
+    # --- Подписчики ---
+
+    @property
+    def subscribers(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> Optional[Subscriber]:
+        with self._lock:
+            if len(self._subscribers) >= self.max_subscribers:
+                return None
+            subscriber = Subscriber(self.queue_size)
+            if last_event_id is not None:
+                replay = [frame for event_id, frame in self._recent if event_id > last_event_id]
+                oldest = self._recent[0][0] if self._recent else None
+                if oldest is not None and last_event_id < oldest - 1:
+                    subscriber.push(RESET)  # пропущено больше, чем помнит буфер
+                for frame in replay:
+                    subscriber.push(frame)
+            self._subscribers.append(subscriber)
+        self._ensure_poller()
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    def stream(self, subscriber: Subscriber, heartbeat: float = 15.0):
+        """Генератор байтов для ответа text/event-stream"""
+        try:
+            yield b'retry: 3000\n\n'
+            while not subscriber.overflowed:
+                try:
+                    frame = subscriber.queue.get(timeout=heartbeat)
+                except Empty:
+                    yield HEARTBEAT
+                    continue
+                yield frame
+            yield RESET
+        finally:
+            self.unsubscribe(subscriber)
+
+    def publish(self, event_id: int, kind: str, payload: str):
+        frame = format_frame(event_id, kind, payload)
+        with self._lock:
+            self._recent.append((event_id, frame))
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            subscriber.push(frame)
+        self.events_published += 1
+        self.frames_delivered += len(subscribers)
+
+    # --- Опрос журнала ---
+
+    def _ensure_poller(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._stopped.clear()
+                    self._thread = Thread(target=self._poll_loop, name='stream-hub', daemon=True)
+                    self._thread.start()
+
+    def stop(self):
+        """Останавливает опросчик (подписчики получат события после следующего subscribe)"""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _poll_loop(self):
+        while not self._stopped.is_set():
+            try:
+                with self.app.app_context():
+                    self.poll()
+                    self._cleanup()
+            except Exception as e:
+                print(f"❌ Ошибка live-потока: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def poll(self, batch: int = 500) -> int:
+        """Рассылает новые события журнала; возвращает их число"""
+        if not self._subscribers:
+            self._last_id = None  # без подписчиков события не копим
+            self._gaps.clear()
+            return 0
+        if self._last_id is None:
+            self._last_id = db.session.query(func.max(ChangeEvent.id)).scalar() or 0
+        columns = (ChangeEvent.id, ChangeEvent.kind, ChangeEvent.payload)
+        late = []
+        if self._gaps:
+            late = (db.session.query(*columns)
+                    .filter(ChangeEvent.id.in_(list(self._gaps)))
+                    .order_by(ChangeEvent.id)
+                    .all())
+        rows = (db.session.query(*columns)
+                .filter(ChangeEvent.id > self._last_id)
+                .order_by(ChangeEvent.id)
+                .limit(batch)
+                .all())
+        restarted = not rows and (db.session.query(func.max(ChangeEvent.id)).scalar() or 0) < self._last_id
+        db.session.rollback()  # не держим читающую транзакцию между опросами
+        if restarted:
+            # Журнал очищен или база заменена - id начались заново
+            with self._lock:
+                self._recent.clear()
+            self._last_id = 0
+            self._gaps.clear()
+            return 0
+        for row in late:
+            self._gaps.pop(row.id, None)
+            self.publish(row.id, row.kind, row.payload)
+        now = time.monotonic()
+        for row in rows:
+            for missing in range(self._last_id + 1, min(row.id, self._last_id + 1 + MAX_GAPS)):
+                self._gaps[missing] = now
+            self.publish(row.id, row.kind, row.payload)
+            self._last_id = row.id
+        for missing, seen in list(self._gaps.items()):
+            if now - seen > GAP_TIMEOUT or len(self._gaps) > MAX_GAPS:
+                del self._gaps[missing]
+        return len(late) + len(rows)
+
+    def _cleanup(self):
+        if time.monotonic() - self._last_cleanup < 300:
+            return
+        self._last_cleanup = time.monotonic()
+        cutoff = datetime.utcnow() - timedelta(seconds=self.retention)
+        newest = db.session.query(func.max(ChangeEvent.id)).scalar_subquery()
+        # Последнее событие остается: по нему SQLite продолжает нумерацию id
+        ChangeEvent.query.filter(ChangeEvent.created_at < cutoff, ChangeEvent.id < newest) \
+            .delete(synchronize_session=False)
+        db.session.commit()
+
+    def stats(self) -> Dict:
+        return {
+            'subscribers': self.subscribers,
+            'max_subscribers': self.max_subscribers,
+            'events_published': self.events_published,
+            'frames_delivered': self.frames_delivered,
+            'last_event_id': self._last_id
+        }
+
+
+stream_hub = StreamHub()